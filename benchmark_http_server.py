@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark HTTP Server Backend
+Mô phỏng nhiều EA, mỗi EA gửi liên tục 3 request như GetData_v4:
+receive_data → receive_positions → get_signal
+So sánh các backend trong server_settings.json (werkzeug / pooled / waitress)
+và 3 request/vòng so với /api/sync + get_signal (2 request/vòng)
+
+Chạy: python benchmark_http_server.py [số EA] [số giây mỗi backend]
+"""
+
+import http.client
+import json
+import multiprocessing
+import sys
+import threading
+import time
+
+import gap_spike_detector as gsd
+from benchmark_ingest import make_getdata_v4_payload
+
+
+class CountingConnection(http.client.HTTPConnection):
+    """HTTPConnection đếm số lần mở kết nối TCP mới"""
+    opened = 0
+
+    def connect(self):
+        super().connect()
+        self.opened += 1
+
+
+def run_ea(port, ea_index, deadline, results, use_sync=False):
+    """1 EA = 1 process riêng (không tranh GIL với server)"""
+    latencies, errors = [], []
+    broker = f"Bench-EA{ea_index:02d}"
+    payload = make_getdata_v4_payload(50, seed=ea_index, broker=broker)
+    positions = {"broker": broker, "positions": []}
+    rounds = 0
+    conn = CountingConnection('127.0.0.1', port, timeout=10)
+    headers = {'Content-Type': 'application/json'}
+    while time.time() < deadline:
+        payload['timestamp'] = int(time.time())
+        if use_sync:
+            requests = (
+                ('POST', '/api/sync', json.dumps({"market": payload, "positions": positions})),
+                ('GET', f'/api/get_signal?broker={broker}', None),
+            )
+        else:
+            requests = (
+                ('POST', '/api/receive_data', json.dumps(payload)),
+                ('POST', '/api/receive_positions', json.dumps(positions)),
+                ('GET', f'/api/get_signal?broker={broker}', None),
+            )
+        rounds += 1
+        for method, path, body in requests:
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers if body else {})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors.append(response.status)
+            except Exception as e:
+                errors.append(type(e).__name__)
+                conn.close()
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    results.put((latencies, errors, conn.opened, rounds))
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def benchmark_backend(backend, ea_count, duration, use_sync=False):
+    server = gsd.make_http_server(backend, host='127.0.0.1', port=0)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    results = multiprocessing.Queue()
+    deadline = time.time() + duration + 1  # +1s khởi động process
+    processes = [
+        multiprocessing.Process(target=run_ea, args=(server.server_port, i, deadline, results, use_sync))
+        for i in range(ea_count)
+    ]
+    latencies, errors, opened, rounds = [], [], 0, 0
+    try:
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ea_latencies, ea_errors, ea_opened, ea_rounds = results.get()
+            rounds += ea_rounds
+            latencies.extend(ea_latencies)
+            errors.extend(ea_errors)
+            opened += ea_opened
+        for process in processes:
+            process.join()
+    finally:
+        server.shutdown()
+        server.server_close()
+    gsd.ingest_queue.wait_idle(10)
+
+    latencies.sort()
+    name = f"{backend} + sync" if use_sync else backend
+    print(f"   {name:<16} {rounds / duration:6.0f} vòng EA/s {len(latencies) / duration:6.0f} req/s   "
+          f"p50 {percentile(latencies, 0.50):6.2f} ms   p95 {percentile(latencies, 0.95):6.2f} ms   "
+          f"p99 {percentile(latencies, 0.99):7.2f} ms   {opened:6d} kết nối TCP   "
+          f"{len(errors)} lỗi")
+
+
+if __name__ == '__main__':
+    ea_count = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    gsd.app_startup_time = 0
+    gsd.screenshot_settings['enabled'] = False
+    gsd.symbol_filter_settings['enabled'] = False
+    gsd.broker_selection_settings['enabled_brokers'] = []
+
+    print("=" * 100)
+    print(f"BENCHMARK HTTP SERVER - {ea_count} EA, {duration:.0f}s mỗi backend")
+    print("=" * 100)
+    for backend in gsd.HTTP_SERVER_BACKENDS:
+        if backend == 'waitress':
+            try:
+                import waitress  # noqa: F401
+            except ImportError:
+                print(f"   {'waitress':<16} (chưa cài - bỏ qua)")
+                continue
+        benchmark_backend(backend, ea_count, duration)
+    benchmark_backend('pooled', ea_count, duration, use_sync=True)
+    print("=" * 100)
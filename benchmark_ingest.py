@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Ingest
+Đo thời gian decode payload market data theo đúng cấu trúc GetData_v4 gửi lên
+- Decode payload v1 (đường cũ / decode_ea_payload)
+- Delta ingest v2 (metadata tĩnh đăng ký 1 lần) so với v1
+- Binary ingest (/api/v2/receive_binary) so với JSON: decode + prepare_ingest
+
+Chạy: python benchmark_ingest.py [số symbols]
+"""
+
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import gap_spike_detector as gsd
+
+DAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+GROUPS = ["Forex\\Majors", "Forex\\Minors", "Metals", "Indices\\US", "Crypto", "Energies"]
+
+
+def make_trade_sessions(rng):
+    """trade_sessions giống GetTradeSessionsJSON() trong GetData_v4.mq5"""
+    days = []
+    for day in DAYS:
+        if day in ("Sunday", "Saturday") and rng.random() < 0.7:
+            sessions = []
+        elif rng.random() < 0.5:
+            sessions = [{"start": "00:05", "end": "23:55"}]
+        else:
+            sessions = [{"start": "01:00", "end": "12:00"}, {"start": "12:15", "end": "23:50"}]
+        days.append({"day": day, "sessions": sessions})
+    return {"current_day": rng.choice(DAYS[1:6]), "days": days}
+
+
+def make_getdata_v4_payload(symbol_count=1000, seed=1, broker="Exness-MT5Real8", timestamp=None):
+    """Payload /api/receive_data giống GetMarketWatchData() trong GetData_v4.mq5"""
+    rng = random.Random(seed)
+    data = []
+    for i in range(symbol_count):
+        digits = rng.choice([2, 3, 5])
+        point = 10 ** -digits
+        prev_close = round(rng.uniform(0.5, 3000), digits)
+        current_open = round(prev_close * (1 + rng.uniform(-0.003, 0.003)), digits)
+        bid = round(current_open * (1 + rng.uniform(-0.001, 0.001)), digits)
+        ask = round(bid + point * rng.randint(1, 30), digits)
+        data.append({
+            "symbol": f"SYM{i:04d}.m",
+            "group": rng.choice(GROUPS),
+            "trade_mode": "FULL",
+            "bid": bid,
+            "ask": ask,
+            "digits": digits,
+            "points": point,
+            "isOpen": True,
+            "prev_ohlc": {"open": prev_close, "high": prev_close, "low": prev_close, "close": prev_close},
+            "current_ohlc": {"open": current_open, "high": max(current_open, bid),
+                             "low": min(current_open, bid), "close": bid},
+            "trade_sessions": make_trade_sessions(rng)
+        })
+    return {
+        "timestamp": timestamp if timestamp is not None else int(time.time()),
+        "broker": broker,
+        "data": data
+    }
+
+
+def encode_json_body(payload):
+    """Body JSON như EA gửi (không có khoảng trắng)"""
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+STATIC_FIELDS = ('group', 'trade_mode', 'digits', 'points', 'trade_sessions')
+
+
+def make_v2_payloads(payload):
+    """
+    Encoder tham chiếu cho delta ingest v2
+
+    Returns:
+        (register_payload, tick_payload) - tick chỉ có giá/OHLC + hash metadata
+    """
+    register = {"broker": payload["broker"], "symbols": []}
+    data = []
+    for item in payload["data"]:
+        register["symbols"].append({"symbol": item["symbol"], **{f: item[f] for f in STATIC_FIELDS if f in item}})
+        meta_hash = gsd.symbol_metadata_hash(gsd.decode_symbol_metadata(item))
+        tick = {k: v for k, v in item.items() if k not in STATIC_FIELDS}
+        tick["meta"] = meta_hash
+        data.append(tick)
+    tick_payload = {"timestamp": payload["timestamp"], "broker": payload["broker"], "data": data}
+    return register, tick_payload
+
+
+def decode_current_path(body):
+    """Đường cũ: request.get_json() + copy từng field thành market record"""
+    data = json.loads(body)
+    timestamp = data.get('timestamp', int(time.time()))
+    records = {}
+    for symbol_data in data.get('data', []):
+        symbol = symbol_data.get('symbol', '')
+        if not symbol:
+            continue
+        records[symbol] = {
+            'timestamp': timestamp,
+            'bid': symbol_data.get('bid', 0),
+            'ask': symbol_data.get('ask', 0),
+            'digits': symbol_data.get('digits', 5),
+            'points': symbol_data.get('points', 0.00001),
+            'isOpen': symbol_data.get('isOpen', True),
+            'prev_ohlc': symbol_data.get('prev_ohlc', {}),
+            'current_ohlc': symbol_data.get('current_ohlc', {}),
+            'trade_sessions': symbol_data.get('trade_sessions', {}),
+            'group': symbol_data.get('group', '')
+        }
+    return records
+
+
+def time_it(func, repeat):
+    """Thời gian trung bình (ms) mỗi lần gọi, lấy best of 3"""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_decoding(symbol_count, repeat=20):
+    body = encode_json_body(make_getdata_v4_payload(symbol_count))
+    print(f"Payload: {symbol_count} symbols, {len(body) / 1024:.1f} KB JSON")
+
+    results = [("Hiện tại (json + copy dict)", time_it(lambda: decode_current_path(body), repeat))]
+
+    original_loads = gsd._json_loads
+    try:
+        gsd._json_loads = json.loads
+        results.append(("decode_ea_payload (json stdlib)", time_it(lambda: gsd.decode_ea_payload(body), repeat)))
+    finally:
+        gsd._json_loads = original_loads
+    if gsd.JSON_DECODER != 'json':
+        results.append((f"decode_ea_payload ({gsd.JSON_DECODER})", time_it(lambda: gsd.decode_ea_payload(body), repeat)))
+
+    baseline = results[0][1]
+    for name, ms in results:
+        print(f"   {name:<40} {ms:8.2f} ms/payload   x{baseline / ms:.2f}")
+
+
+def peak_memory_kb(func):
+    """Bộ nhớ cấp phát tối đa (KB) trong 1 lần gọi"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_delta(symbol_count, repeat=20):
+    payload = make_getdata_v4_payload(symbol_count)
+    register, tick = make_v2_payloads(payload)
+    gsd.register_symbol_metadata(payload["broker"], register["symbols"])
+
+    v1_body = encode_json_body(payload)
+    v2_body = encode_json_body(tick)
+    v1_ms = time_it(lambda: gsd.decode_ea_payload(v1_body), repeat)
+    v2_ms = time_it(lambda: gsd.decode_ea_payload_v2(v2_body), repeat)
+    v1_mem = peak_memory_kb(lambda: gsd.decode_ea_payload(v1_body))
+    v2_mem = peak_memory_kb(lambda: gsd.decode_ea_payload_v2(v2_body))
+
+    print(f"Payload/tick: {symbol_count} symbols (đăng ký 1 lần: {len(encode_json_body(register)) / 1024:.1f} KB)")
+    print(f"   {'v1 /api/receive_data':<28} {len(v1_body) / 1024:8.1f} KB {v1_ms:8.2f} ms {v1_mem:8.0f} KB cấp phát")
+    print(f"   {'v2 /api/v2/receive_data':<28} {len(v2_body) / 1024:8.1f} KB {v2_ms:8.2f} ms {v2_mem:8.0f} KB cấp phát")
+
+
+def benchmark_binary(symbol_count, repeat=20):
+    gsd.app_startup_time = 0
+    gsd.screenshot_settings['enabled'] = False
+    gsd.symbol_filter_settings['enabled'] = False
+    payload = make_getdata_v4_payload(symbol_count, broker="Binary-Bench")
+    register, tick = make_v2_payloads(payload)
+    hashes, _ = gsd.register_symbol_metadata(payload["broker"], register["symbols"])
+    ids = gsd.assign_binary_symbol_ids(payload["broker"], hashes)
+
+    bodies = [
+        ("v1 JSON", encode_json_body(payload), lambda body: gsd.decode_ea_payload(body)[2]),
+        ("v2 JSON delta", encode_json_body(tick), lambda body: gsd.decode_ea_payload_v2(body)[2]),
+        ("binary", gsd.encode_binary_frame(payload["broker"], payload["timestamp"], payload["data"], ids),
+         lambda body: gsd.decode_binary_frame(body)[2]),
+    ]
+    print(f"Payload/tick: {symbol_count} symbols")
+    baseline = None
+    for name, body, decode in bodies:
+        decode_ms = time_it(lambda: decode(body), repeat)
+        ingest_ms = time_it(lambda: gsd.prepare_ingest(payload["broker"], payload["timestamp"], decode(body)), repeat)
+        baseline = baseline or ingest_ms
+        print(f"   {name:<16} {len(body) / 1024:8.1f} KB  decode {decode_ms:7.2f} ms  "
+              f"decode+prepare_ingest {ingest_ms:7.2f} ms   x{baseline / ingest_ms:.2f}")
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print("=" * 70)
+    print("BENCHMARK INGEST - DECODE PAYLOAD")
+    print("=" * 70)
+    benchmark_decoding(count)
+    print("=" * 70)
+    print("BENCHMARK INGEST - DELTA INGEST v2")
+    print("=" * 70)
+    benchmark_delta(count)
+    print("=" * 70)
+    print("BENCHMARK INGEST - BINARY INGEST")
+    print("=" * 70)
+    benchmark_binary(count)
+    print("=" * 70)
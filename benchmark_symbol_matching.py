@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Symbol Matching
+Đo find_symbol_config() (cache rỗng) trên tất cả symbols đã thấy từ các broker
+- Nguồn symbols: symbol_filter_settings.json, file ghi traffic (traffic_recordings/, nếu có)
+  + key "Broker_Symbol" trong gap/spike settings của các broker đã biết từ 2 nguồn trên
+- So sánh với cách dò cũ (duyệt toàn bộ aliases ở Bước 2 và Bước 3), kiểm tra kết quả giống hệt
+
+Chạy: python benchmark_symbol_matching.py [folder ghi traffic]
+"""
+
+import json
+import os
+import sys
+import time
+
+import gap_spike_detector as gsd
+
+SETTINGS_FILES = ('gap_settings.json', 'spike_settings.json')
+
+
+def linear_find_symbol_config(symbol):
+    """find_symbol_config() cũ: Bước 2 startswith() + Bước 3 is_subsequence_match() trên mọi alias"""
+    symbol_lower = symbol.lower().strip()
+    symbol_chuan = gsd.gap_config_reverse_map.get(symbol_lower)
+    if symbol_chuan:
+        return gsd.find_symbol_config(symbol)
+
+    best_match = None
+    best_match_len = 0
+    best_matched_alias = None
+    for alias_lower, symbol_chuan in gsd.gap_config_reverse_map.items():
+        if symbol_lower.startswith(alias_lower):
+            if len(alias_lower) > best_match_len:
+                best_match = symbol_chuan
+                best_match_len = len(alias_lower)
+                config = gsd.gap_config[symbol_chuan]
+                for alias in config['aliases']:
+                    if alias.lower() == alias_lower:
+                        best_matched_alias = alias
+                        break
+                if not best_matched_alias:
+                    best_matched_alias = symbol_chuan
+    if best_match:
+        return best_match, gsd.gap_config[best_match], best_matched_alias
+
+    for alias_lower, symbol_chuan in gsd.gap_config_reverse_map.items():
+        if gsd.is_subsequence_match(symbol_lower, alias_lower):
+            config = gsd.gap_config[symbol_chuan]
+            for alias in config['aliases']:
+                if alias.lower() == alias_lower:
+                    return symbol_chuan, config, alias
+            return symbol_chuan, config, symbol_chuan
+    return None, None, None
+
+
+def collect_broker_symbols(recordings_folder=None):
+    """Tất cả symbols đã thấy từ các broker (không trùng)"""
+    symbols = set()
+    brokers = set()
+    if os.path.exists(gsd.SYMBOL_FILTER_FILE):
+        with open(gsd.SYMBOL_FILTER_FILE, 'r', encoding='utf-8') as f:
+            for broker, selected in json.load(f).get('selection', {}).items():
+                brokers.add(broker)
+                symbols.update(selected or ())
+    if recordings_folder:
+        for path in gsd.list_traffic_recordings(recordings_folder):
+            for _, endpoint, body in gsd.iter_traffic_records(path):
+                if endpoint == 'receive_data':
+                    broker, _, records, _ = gsd.decode_ea_payload(body)
+                    brokers.add(broker)
+                    symbols.update(record.symbol for record in records)
+    symbols.update(settings_key_symbols(brokers))
+    symbols.discard('*')
+    return sorted(symbols)
+
+
+def settings_key_symbols(brokers):
+    """
+    Symbol trong key "Broker_Symbol" của gap/spike settings, tách bằng gsd.split_symbol_key()
+
+    Broker phải đã biết (partition đang có, symbol_filter_settings.json, file ghi traffic) -
+    key của broker khác bị bỏ qua, không đoán theo dấu '_' (sai với broker có '_' trong tên)
+    """
+    created = [broker for broker in brokers if broker not in gsd.broker_partitions]
+    for broker in created:
+        gsd.get_broker_partition(broker)
+    symbols = set()
+    try:
+        for path in SETTINGS_FILES:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    for key in json.load(f):
+                        try:
+                            symbols.add(gsd.split_symbol_key(key)[1])
+                        except ValueError:
+                            continue
+    finally:
+        for broker in created:
+            gsd.broker_partitions.pop(broker, None)
+    return symbols
+
+
+def time_all(func, symbols):
+    gsd.symbol_config_cache.clear()
+    start = time.perf_counter()
+    results = [func(symbol) for symbol in symbols]
+    return (time.perf_counter() - start) * 1000, results
+
+
+def benchmark_matching(symbols):
+    gsd.load_gap_config_file()
+    index = gsd.get_gap_config_subsequence_index()
+    linear_ms, expected = time_all(linear_find_symbol_config, symbols)
+    indexed_ms, results = time_all(gsd.find_symbol_config, symbols)
+    assert results == expected, "Kết quả dò khác cách cũ"
+
+    unmatched = [s for s, r in zip(symbols, results) if r[0] is None]
+    candidates = [len(index.candidates(gsd.normalize_symbol(s.lower()).lower())) for s in unmatched]
+    print(f"   {len(symbols)} symbols, {len(gsd.gap_config_reverse_map)} aliases, "
+          f"{len(symbols) - len(unmatched)} khớp config, {len(unmatched)} không khớp")
+    print(f"   Cách cũ (duyệt mọi alias):  {linear_ms:8.1f} ms")
+    print(f"   Trie + index subsequence:    {indexed_ms:8.1f} ms   x{linear_ms / indexed_ms:.1f}")
+    if candidates:
+        print(f"   Symbol không khớp: so khớp {sum(candidates) / len(candidates):.1f} alias/symbol "
+              f"(trước đây {len(gsd.gap_config_reverse_map)})")
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else gsd.traffic_recorder_settings['folder']
+    symbols = collect_broker_symbols(folder)
+    print("=" * 70)
+    print("BENCHMARK SYMBOL MATCHING - find_symbol_config()")
+    print("=" * 70)
+    benchmark_matching(symbols)
+    print("=" * 70)
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cấu hình pytest dùng chung cho các file test_*.py
+- Cache matching (symbol_match_cache.json) ghi vào thư mục tạm của từng test, không ghi vào thư mục repo
+"""
+
+import pytest
+
+import gap_spike_detector as gsd
+
+
+@pytest.fixture(autouse=True)
+def symbol_match_cache_file(tmp_path, monkeypatch):
+    """Trỏ SYMBOL_MATCH_CACHE_FILE vào tmp_path (ingest/dò symbol đều lên lịch ghi cache)"""
+    monkeypatch.setattr(gsd, 'SYMBOL_MATCH_CACHE_FILE', str(tmp_path / 'symbol_match_cache.json'))
+    yield gsd.SYMBOL_MATCH_CACHE_FILE
+    # Lượt ghi debounce còn chờ sẽ chạy sau khi trả lại đường dẫn gốc → bỏ để không ghi ra thư mục repo
+    with gsd.write_lock:
+        gsd.pending_writes['symbol_match_cache'] = False
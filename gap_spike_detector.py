@@ -13,8 +13,13 @@ import time
 import sys
 from datetime import datetime, timezone
 from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import quote, unquote
 import logging
-from collections import defaultdict
+from collections import defaultdict, deque, namedtuple
+from collections.abc import Mapping, MutableMapping, Sequence
+from bisect import bisect_left, bisect_right
 import os
 import platform
 import subprocess
@@ -30,8 +35,28 @@ import glob
 import gspread
 from google.oauth2.service_account import Credentials
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
 import difflib
+import gc
+import gzip
+import hashlib
+import io
+import math
 import re
+import selectors
+import socket
+import sqlite3
+import struct
+
+# ⚡ Optional: JSON decoder nhanh cho payload từ EA (không bắt buộc cài)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
 
 # ===================== CONFIGURATION =====================
 HTTP_PORT = 80
@@ -53,28 +78,148 @@ app.logger.disabled = True
 log = logging.getLogger('werkzeug')
 log.disabled = True
 
+# ===================== OBSERVED SETTINGS =====================
+# gap_settings / spike_settings / custom_thresholds báo key nào thay đổi cho các bảng đã resolve
+# (vd threshold_table) → sửa settings có hiệu lực ngay, không cần cache theo thời gian
+settings_change_listeners = []  # [callback(name, keys)] - keys=None: thay đổi toàn bộ
+
+def add_settings_listener(callback):
+    """Đăng ký callback(name, keys) khi settings (ObservedSettings) thay đổi"""
+    settings_change_listeners.append(callback)
+
+def notify_settings_changed(name, keys):
+    for callback in list(settings_change_listeners):
+        try:
+            callback(name, keys)
+        except Exception as e:
+            logger.error(f"Error notifying settings change ({name}): {e}")
+
+class ObservedSettings(dict):
+    """
+    dict settings báo key thay đổi qua notify_settings_changed()
+
+    nested=True: value dạng dict (custom_thresholds[key]['gap_point']) cũng được theo dõi,
+    sửa bên trong báo thay đổi của key cha. Đọc (get, in, []) giữ nguyên tốc độ của dict.
+    Ghi giữ _lock (dùng chung với các dict lồng) → snapshot() không thấy nội dung đang thay dở
+    (vd replace() giữa clear và nạp lại khi timer ghi file đang chạy).
+    """
+
+    def __init__(self, name, data=None, nested=False, parent=None):
+        super().__init__()
+        self.name = name
+        self._nested = nested
+        self._parent = parent  # (ObservedSettings cha, key) nếu là value lồng
+        self._lock = parent[0]._lock if parent is not None else threading.RLock()
+        if data:
+            for key, value in data.items():
+                dict.__setitem__(self, key, self._wrap(key, value))
+
+    def _wrap(self, key, value):
+        if self._nested and isinstance(value, dict):
+            return ObservedSettings(self.name, value, parent=(self, key))
+        return value
+
+    def _changed(self, keys):
+        if self._parent is not None:
+            parent, key = self._parent
+            parent._changed((key,))
+        elif keys:
+            notify_settings_changed(self.name, keys)
+
+    def snapshot(self):
+        """Bản copy dict thường (kể cả dict lồng) tại 1 thời điểm - dùng khi ghi file/store"""
+        with self._lock:
+            return {
+                key: value.snapshot() if isinstance(value, ObservedSettings) else value
+                for key, value in dict.items(self)
+            }
+
+    def __setitem__(self, key, value):
+        value = self._wrap(key, value)
+        with self._lock:
+            dict.__setitem__(self, key, value)
+        self._changed((key,))
+
+    def __delitem__(self, key):
+        with self._lock:
+            dict.__delitem__(self, key)
+        self._changed((key,))
+
+    def pop(self, key, *default):
+        with self._lock:
+            existed = key in self
+            value = dict.pop(self, key, *default)
+        if existed:
+            self._changed((key,))
+        return value
+
+    def popitem(self):
+        with self._lock:
+            key, value = dict.popitem(self)
+        self._changed((key,))
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        changes = {key: self._wrap(key, value) for key, value in dict(*args, **kwargs).items()}
+        with self._lock:
+            dict.update(self, changes)
+        self._changed(tuple(changes))
+
+    def clear(self):
+        with self._lock:
+            keys = tuple(self)
+            dict.clear(self)
+        self._changed(keys)
+
+    def replace(self, data):
+        """Thay toàn bộ nội dung (load file/lưu từ GUI) - chỉ báo các key thực sự khác"""
+        data = dict(data or {})
+        wrapped = {key: self._wrap(key, value) for key, value in data.items()}
+        with self._lock:
+            changed = [key for key in self if key not in data or self[key] != data[key]]
+            changed += [key for key in data if key not in self]
+            dict.clear(self)
+            dict.update(self, wrapped)
+        self._changed(tuple(changed))
+
+    def apply_changes(self, sets, deletes=()):
+        """
+        Đặt/xóa nhiều key trong 1 lần báo (bulk threshold) - chỉ báo các key thực sự khác
+
+        Returns:
+            int: Số key đã thay đổi
+        """
+        with self._lock:
+            changed = [key for key in deletes if key in self]
+            for key in changed:
+                dict.__delitem__(self, key)
+            for key, value in sets.items():
+                if key not in self or self[key] != value:
+                    dict.__setitem__(self, key, self._wrap(key, value))
+                    changed.append(key)
+        self._changed(tuple(changed))
+        return len(changed)
+
 # ===================== GLOBAL DATA STORAGE =====================
-market_data = {}  # {broker: {symbol: data}}
-gap_settings = {}  # {symbol: threshold%} or {broker_symbol: threshold%}
-spike_settings = {}  # {symbol: threshold%} or {broker_symbol: threshold%}
+# market_data, gap_spike_results, gap_spike_point_results, alert_board, bid_tracking, candle_data
+# → state runtime theo từng broker, xem BROKER PARTITIONS
+gap_settings = ObservedSettings('gap_settings')  # {symbol: threshold%} or {broker_symbol: threshold%}
+spike_settings = ObservedSettings('spike_settings')  # {symbol: threshold%} or {broker_symbol: threshold%}
 
 DEFAULT_GAP_THRESHOLD = 0.3
 DEFAULT_SPIKE_THRESHOLD = 1.3
 
 # Custom thresholds (user-defined overrides)
 # Format: {broker_symbol: {'gap_point': float, 'gap_percent': float, 'spike_percent': float}}
-custom_thresholds = {}
-gap_spike_results = {}  # {broker_symbol: {gap_info, spike_info}}
-alert_board = {}  # {broker_symbol: {data, last_detected_time, grace_period_start}}
-bid_tracking = {}  # {broker_symbol: {last_bid, last_change_time, first_seen_time}}
-candle_data = {}  # {broker_symbol: [(timestamp, open, high, low, close), ...]}
+custom_thresholds = ObservedSettings('custom_thresholds', nested=True)
 manual_hidden_delays = {}  # {broker_symbol: True} - Manually hidden symbols
 hidden_alert_items = {}  # {broker_symbol: {'hidden_until': timestamp or None (permanent), 'reason': 'user_hide'}}
 
-# ⚡ OPTIMIZATION: Cache threshold lookups (TTL: 60 seconds)
-threshold_cache = {}  # {broker_symbol_type: (threshold_value, timestamp)}
-THRESHOLD_CACHE_TTL = 60  # seconds
-
 # ⚡ OPTIMIZATION: Cache tree items to enable delta updates
 tree_cache = {
     'legacy': {},  # {broker_symbol: (values_tuple, tag)}
@@ -115,6 +260,10 @@ screenshot_settings = {
 # Track application startup time for screenshot delay
 app_startup_time = time.time()
 
+# Đồng hồ của pipeline ingest/detection (bid tracking, Bảng Kèo, cleanup, startup delay)
+# replay_traffic.py thay bằng đồng hồ ảo để phát lại traffic đã ghi theo thời gian gốc
+clock = time.time
+
 # ===================== AUDIO ALERT SETTINGS =====================
 audio_settings = {
     'enabled': True,  # Enable audio alerts
@@ -184,13 +333,668 @@ python_reset_settings = {
 
 PYTHON_RESET_SETTINGS_FILE = 'python_reset_settings.json'
 
+# HTTP server nhận dữ liệu từ EA (xem HTTP SERVER BACKEND)
+server_settings = {
+    'backend': 'pooled',  # 'werkzeug' (Flask dev server) | 'pooled' | 'waitress' (cần pip install waitress)
+    'max_workers': 64,  # Số worker tối đa (worker chỉ bị chiếm khi đang xử lý 1 request)
+    'max_connections': 500,  # Số kết nối keep-alive idle tối đa (vượt quá → đóng kết nối sau response)
+    'keep_alive_timeout': 10,  # Giây - đóng kết nối keep-alive không có request mới
+    'request_timeout': 30,  # Giây - đóng kết nối gửi request quá chậm
+    'max_request_mb': 32,  # Body lớn hơn → 413, không đọc vào RAM
+    'backlog': 256  # Hàng đợi kết nối chờ accept
+}
+
+SERVER_SETTINGS_FILE = 'server_settings.json'
+
+# Ghi traffic EA để phát lại offline (xem TRAFFIC RECORDER, replay_traffic.py)
+traffic_recorder_settings = {
+    'enabled': False,  # Opt-in: chỉ bật khi cần ghi lại burst thật (tin tức, mở phiên)
+    'folder': 'traffic_recordings',  # Folder chứa file traffic_*.gsr.gz
+    'max_file_mb': 64,  # Đổi sang file mới khi file hiện tại vượt quá (MB sau khi nén)
+    'max_files': 20  # Giữ tối đa N file mới nhất
+}
+
+TRAFFIC_RECORDER_SETTINGS_FILE = 'traffic_recorder_settings.json'
+
 # Google Sheets integration
 accepted_screenshots = []  # List of accepted screenshots to send to Google Sheets
 GOOGLE_SHEET_NAME = "Chấm công TestSanPython"  # Name of the Google Sheet
 CREDENTIALS_FILE = "credentials.json"  # Google service account credentials
 SHEET_ID_CACHE_FILE = "sheet_id_cache.json"  # Cache sheet ID to reuse (avoid creating duplicates)
 
-data_lock = threading.Lock()
+# ===================== INSTRUMENTED DATA LOCK =====================
+class InstrumentedLock:
+    """
+    threading.Lock có đo thời gian chờ (wait) và thời gian giữ lock (hold)
+
+    Dùng giống hệt threading.Lock (with data_lock: ...). Có thể gắn tên section
+    để thống kê riêng từng chỗ giữ lock:
+        with data_lock.section('receive_data'):
+            ...
+
+    reentrant=True → dùng RLock (chỉ đo lần acquire ngoài cùng)
+    """
+
+    def __init__(self, name, reentrant=False):
+        self.name = name
+        self._lock = threading.RLock() if reentrant else threading.Lock()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {}  # {section: {count, wait_total, wait_max, hold_total, hold_max}}
+
+    def acquire(self, blocking=True, timeout=-1):
+        depth = getattr(self._local, 'depth', 0)
+        if depth:
+            # Đã giữ lock (RLock lồng nhau) → không đo lại
+            acquired = self._lock.acquire(blocking, timeout)
+            if acquired:
+                self._local.depth = depth + 1
+            return acquired
+
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            now = time.perf_counter()
+            self._local.depth = 1
+            self._local.acquired_at = now
+            self._local.wait = now - start
+        return acquired
+
+    def release(self):
+        depth = getattr(self._local, 'depth', 1)
+        if depth > 1:
+            self._local.depth = depth - 1
+            self._lock.release()
+            return
+
+        acquired_at = getattr(self._local, 'acquired_at', None)
+        wait = getattr(self._local, 'wait', 0.0)
+        section = getattr(self._local, 'section', None) or 'other'
+        self._local.depth = 0
+        self._local.acquired_at = None
+        self._lock.release()
+        if acquired_at is not None:
+            self._record(section, wait, time.perf_counter() - acquired_at)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+    @contextmanager
+    def section(self, name):
+        """Giữ lock với tên section (để thống kê hold/wait theo từng chỗ dùng)"""
+        previous = getattr(self._local, 'section', None)
+        self._local.section = name
+        try:
+            with self:
+                yield self
+        finally:
+            self._local.section = previous
+
+    def _record(self, section, wait, hold):
+        with self._stats_lock:
+            stats = self._stats.get(section)
+            if stats is None:
+                stats = self._stats[section] = {
+                    'count': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'hold_total': 0.0, 'hold_max': 0.0
+                }
+            stats['count'] += 1
+            stats['wait_total'] += wait
+            stats['hold_total'] += hold
+            if wait > stats['wait_max']:
+                stats['wait_max'] = wait
+            if hold > stats['hold_max']:
+                stats['hold_max'] = hold
+
+    def get_stats(self):
+        """Thống kê theo section (đơn vị ms)"""
+        with self._stats_lock:
+            result = {}
+            for section, stats in self._stats.items():
+                count = stats['count'] or 1
+                result[section] = {
+                    'count': stats['count'],
+                    'wait_avg_ms': round(stats['wait_total'] / count * 1000, 3),
+                    'wait_max_ms': round(stats['wait_max'] * 1000, 3),
+                    'hold_avg_ms': round(stats['hold_total'] / count * 1000, 3),
+                    'hold_max_ms': round(stats['hold_max'] * 1000, 3),
+                    'hold_total_ms': round(stats['hold_total'] * 1000, 3)
+                }
+            return result
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+# Ingest chỉ giữ lock của partition broker (xem BROKER PARTITIONS), không dùng data_lock.
+# data_lock chỉ còn dùng cho thao tác sửa state của nhiều broker 1 lượt (all_partitions_locked);
+# GUI đọc qua các view (snapshot từng partition) và market_data/candle_data (copy-on-write)
+data_lock = InstrumentedLock('data_lock')
+
+# ===================== INGEST METRICS =====================
+# Thời gian từng giai đoạn ingest (histogram p50/p95/p99), kích thước payload, tốc độ theo broker
+# → /metrics (Prometheus text), /metrics.json (GUI: Cài đặt → Công cụ → Hiệu năng ingest)
+# Mỗi payload chỉ observe 1 lần cho mỗi giai đoạn (thời gian cộng dồn của tất cả symbols)
+INGEST_STAGES = (
+    'decode',               # Parse JSON/binary body
+    'symbol_filter',        # is_symbol_selected_for_detection()
+    'find_symbol_config',   # Dò symbol trong THAM_SO_GAP_INDICATOR.txt
+    'candles',              # build_candle_update()
+    'detection',            # Tính Gap/Spike (batch + scalar)
+    'prepare',              # prepare_ingest() tổng
+    'commit_lock_wait',     # Chờ lock của partition để commit (+ chờ payload trước của cùng broker)
+    'commit',               # commit_ingest() tổng (giữ lock)
+    'update_alert_board',   # Cập nhật Bảng Kèo (trong commit)
+    'board_alert',          # check_and_play_board_alert() gap/spike/delay
+    'cleanup',              # cleanup_stale_data()
+    'total',                # process_ingest_payload() tổng
+)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)  # giây
+PAYLOAD_SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)  # bytes
+BROKER_RATE_WINDOW = 60  # Giây - cửa sổ tính payloads/s, symbols/s theo broker
+
+class Histogram:
+    """Histogram bucket cố định (giống Prometheus), observe O(log n)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)  # Phần tử cuối: > bucket lớn nhất (+Inf)
+            self._count = 0
+            self._sum = 0.0
+            self._max = 0.0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {count, sum, max, counts, p50, p95, p99}
+            - p50/p95/p99: ước lượng nội suy tuyến tính trong bucket (giống histogram_quantile)
+        """
+        with self._lock:
+            counts = list(self._counts)
+            count, total, maximum = self._count, self._sum, self._max
+        result = {'count': count, 'sum': total, 'max': maximum, 'counts': counts}
+        for name, q in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99)):
+            result[name] = self._quantile(q, counts, count, maximum)
+        return result
+
+    def _quantile(self, q, counts, count, maximum):
+        if count == 0:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else maximum
+                return min(lower + (upper - lower) * (rank - cumulative) / bucket_count, maximum)
+            cumulative += bucket_count
+        return maximum
+
+class StageTimer:
+    """Cộng dồn thời gian từng giai đoạn trong 1 payload, flush() → observe 1 lần/giai đoạn"""
+    __slots__ = ('durations',)
+
+    def __init__(self):
+        self.durations = {}
+
+    def add(self, stage, seconds):
+        self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    def flush(self, metrics=None):
+        (metrics or ingest_metrics).observe_stages(self.durations)
+        self.durations = {}
+
+class IngestMetrics:
+    """Metrics của pipeline ingest (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {stage: Histogram(LATENCY_BUCKETS) for stage in INGEST_STAGES}
+        self.payload_bytes = {}  # {endpoint: Histogram}
+        self._broker_totals = {}  # {broker: [payloads, symbols]}
+        self._broker_recent = {}  # {broker: deque[(time, symbols)]}
+
+    def observe_stage(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(stage, Histogram(LATENCY_BUCKETS))
+        histogram.observe(seconds)
+
+    def observe_stages(self, durations):
+        for stage, seconds in durations.items():
+            self.observe_stage(stage, seconds)
+
+    @contextmanager
+    def stage(self, stage):
+        """with ingest_metrics.stage('cleanup'): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def observe_payload(self, endpoint, size):
+        histogram = self.payload_bytes.get(endpoint)
+        if histogram is None:
+            with self._lock:
+                histogram = self.payload_bytes.setdefault(endpoint, Histogram(PAYLOAD_SIZE_BUCKETS))
+        histogram.observe(size)
+
+    def record_broker_payload(self, broker, symbol_count):
+        now = time.time()
+        with self._lock:
+            totals = self._broker_totals.setdefault(broker, [0, 0])
+            totals[0] += 1
+            totals[1] += symbol_count
+            recent = self._broker_recent.setdefault(broker, deque())
+            recent.append((now, symbol_count))
+            while recent and now - recent[0][0] > BROKER_RATE_WINDOW:
+                recent.popleft()
+
+    def broker_rates(self):
+        """{broker: {payloads_total, symbols_total, payloads_per_sec, symbols_per_sec}}"""
+        now = time.time()
+        result = {}
+        with self._lock:
+            for broker, (payloads, symbols) in self._broker_totals.items():
+                recent = [item for item in self._broker_recent.get(broker, ()) if now - item[0] <= BROKER_RATE_WINDOW]
+                # Chia cho khoảng thời gian thực có dữ liệu (tối thiểu 1s) để broker mới kết nối không bị tính thấp
+                span = max(1.0, min(BROKER_RATE_WINDOW, now - recent[0][0])) if recent else BROKER_RATE_WINDOW
+                result[broker] = {
+                    'payloads_total': payloads,
+                    'symbols_total': symbols,
+                    'payloads_per_sec': round(len(recent) / span, 3),
+                    'symbols_per_sec': round(sum(count for _, count in recent) / span, 1)
+                }
+        return result
+
+    def reset(self):
+        for histogram in list(self.stages.values()) + list(self.payload_bytes.values()):
+            histogram.reset()
+        with self._lock:
+            self._broker_totals.clear()
+            self._broker_recent.clear()
+
+ingest_metrics = IngestMetrics()
+
+# ===================== SYMBOL REGISTRY =====================
+# Mỗi cặp (broker, symbol) được cấp 1 ID số nguyên + 1 key "broker_symbol" duy nhất (tạo 1 lần)
+# - Hot loop lấy key bằng 1 lần tra dict thay vì format f"{broker}_{symbol}" mỗi lần
+# - Key → (broker, symbol) tra ngược thay vì key.split('_', 1)
+#   (split sai với broker có dấu '_' trong tên, vd "IC_Markets_EURUSD")
+class SymbolRegistry:
+    """Intern (broker, symbol) → ID số nguyên, key "broker_symbol" và tra ngược"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}      # {(broker, symbol): symbol_id}
+        self._key_ids = {}  # {broker_symbol: symbol_id}
+        self._pairs = []    # symbol_id → (broker, symbol)
+        self._keys = []     # symbol_id → broker_symbol
+
+    def intern(self, broker, symbol):
+        """ID của (broker, symbol) - cấp mới nếu chưa có"""
+        symbol_id = self._ids.get((broker, symbol))
+        if symbol_id is None:
+            with self._lock:
+                symbol_id = self._ids.get((broker, symbol))
+                if symbol_id is None:
+                    symbol_id = len(self._pairs)
+                    key = sys.intern(f"{broker}_{symbol}")
+                    # Ghi list trước, publish ID sau → thread khác thấy ID là đọc được ngay
+                    self._pairs.append((broker, symbol))
+                    self._keys.append(key)
+                    self._key_ids.setdefault(key, symbol_id)
+                    self._ids[(broker, symbol)] = symbol_id
+        return symbol_id
+
+    def key(self, broker, symbol):
+        """Key "broker_symbol" (cùng 1 object cho mỗi cặp → hash đã cache sẵn)"""
+        symbol_id = self._ids.get((broker, symbol))
+        if symbol_id is None:
+            symbol_id = self.intern(broker, symbol)
+        return self._keys[symbol_id]
+
+    def key_of(self, symbol_id):
+        return self._keys[symbol_id]
+
+    def pair_of(self, symbol_id):
+        """(broker, symbol) của ID"""
+        return self._pairs[symbol_id]
+
+    def id_of_key(self, key):
+        """ID của key "broker_symbol" đã đăng ký, None nếu chưa có"""
+        return self._key_ids.get(key)
+
+    def pair_of_key(self, key):
+        """(broker, symbol) của key đã đăng ký, None nếu chưa có"""
+        symbol_id = self._key_ids.get(key)
+        return self._pairs[symbol_id] if symbol_id is not None else None
+
+    def __len__(self):
+        return len(self._pairs)
+
+symbol_registry = SymbolRegistry()
+
+def symbol_key(broker, symbol):
+    """Key "broker_symbol" của symbol (lấy từ symbol_registry, không format lại)"""
+    return symbol_registry.key(broker, symbol)
+
+def split_symbol_key(key):
+    """
+    Tách key "broker_symbol" thành (broker, symbol)
+
+    - Key đã đăng ký trong symbol_registry → tra ngược (đúng cả broker có dấu '_')
+    - Key chưa đăng ký (vd đọc từ file settings) → broker dài nhất đang có partition khớp prefix
+    Không đoán theo dấu '_' đầu tiên (sai với broker có dấu '_' trong tên)
+
+    Raises:
+        ValueError: không xác định được broker của key (broker chưa từng gửi data)
+    """
+    pair = symbol_registry.pair_of_key(key)
+    if pair is not None:
+        return pair
+    partition = partition_for_key(key)
+    if partition is not None:
+        return partition.broker, key[len(partition.broker) + 1:]
+    raise ValueError(f"unknown broker for key {key!r}")
+
+# ===================== BROKER PARTITIONS =====================
+# Mỗi broker (EA) có 1 partition riêng với lock riêng → 2 EA gửi cùng lúc không phải chờ nhau
+# Các biến global (market_data, bid_tracking, ...) là "view" gộp tất cả partitions:
+#   - Đọc/ghi theo key → route tới đúng partition (ghi giữ lock của partition đó)
+#   - Duyệt (items/keys/values/copy) → snapshot từng partition dưới lock của nó,
+#     không khóa tất cả partitions cùng lúc
+class BrokerPartition:
+    """State runtime của 1 broker (mỗi broker 1 lock riêng)"""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.lock = InstrumentedLock(f"broker:{broker}", reentrant=True)
+        # Two-phase ingest: prepare đọc state ngoài lock → 2 payload cùng broker phải prepare+commit lần lượt
+        # (ingest_queue đã chỉ cho 1 worker/broker, cần khi xử lý ngay trong request - ASYNC_INGEST=False)
+        self.ingest_lock = threading.Lock()
+        self.market = None  # {symbol: data} - None = broker chưa có trong market_data
+        self.bid_tracking = {}  # {broker_symbol: {last_bid, last_change_time, first_seen_time}}
+        self.candle_data = {}  # {broker_symbol: [(timestamp, open, high, low, close), ...]}
+        self.gap_spike_results = {}  # {broker_symbol: DetectionRecord} - đọc như dict {gap, spike, ...}
+        self.gap_spike_point_results = {}  # {broker_symbol: DetectionRecord} - thêm symbol_chuan, matched_alias, ...
+        self.alert_board = {}  # {broker_symbol: {data, last_detected_time, grace_period_start}}
+        self.routes = {}  # {broker_symbol: SymbolRoute} - bảng Point/Percent đã tính (xem CALCULATION ROUTING)
+        self.positions = None  # {timestamp, received_at, positions: [...]} - lần gửi positions mới nhất của EA
+        self.pending_signals = deque()  # Lệnh chờ EA lấy (queue_signal → get_signal), FIFO
+
+    def commit_market(self, records):
+        """
+        Ghi market data của các symbols ({symbol: MarketRecord} của tick mới)
+
+        - Symbol đã có → ghi đè giá trị vào MarketRecord đang có (không giữ object mới mỗi tick)
+        - Có symbol mới → dict mới rồi swap con trỏ (copy-on-write): reader đang duyệt
+          market_data[broker] không bị đổi size giữa chừng
+        Reader không giữ lock đọc từng field (bid, ask, ...) của 1 symbol có thể thấy tick cũ/mới xen nhau
+        """
+        market = self.market
+        added = {}
+        for symbol, record in records.items():
+            current = market.get(symbol) if market is not None else None
+            if type(current) is MarketRecord:
+                if current is not record:
+                    current.update_from(record)
+            else:
+                added[symbol] = record
+        if added or market is None:
+            market = dict(market) if market else {}
+            market.update(added)
+            self.market = market
+
+broker_partitions = {}  # {broker: BrokerPartition}
+broker_partitions_lock = threading.Lock()
+# {broker_symbol: BrokerPartition} - chỉ key đã đăng ký trong symbol_registry (broker chính xác)
+# → tối đa len(symbol_registry) entry, key lạ (đọc từ settings) không được cache
+_key_partition_cache = {}
+
+def get_broker_partition(broker):
+    """Lấy (hoặc tạo) partition của broker"""
+    partition = broker_partitions.get(broker)
+    if partition is None:
+        with broker_partitions_lock:
+            partition = broker_partitions.get(broker)
+            if partition is None:
+                partition = BrokerPartition(broker)
+                broker_partitions[broker] = partition
+    return partition
+
+def partition_for_key(key, create=False):
+    """
+    Tìm partition của key "broker_symbol"
+    (key trong symbol_registry → broker đã đăng ký, không thì broker dài nhất khớp prefix "broker_")
+
+    Args:
+        key: broker_symbol
+        create: Tạo partition nếu chưa có - CHỈ với key đã đăng ký (biết chính xác broker);
+            key lạ không khớp broker nào → None (không đoán broker theo dấu '_')
+    """
+    partition = _key_partition_cache.get(key)
+    if partition is not None and broker_partitions.get(partition.broker) is partition:
+        return partition
+
+    # Key đã đăng ký → biết chính xác broker (không đoán theo prefix)
+    pair = symbol_registry.pair_of_key(key)
+    if pair is not None:
+        partition = broker_partitions.get(pair[0])
+        if partition is None:
+            if not create:
+                _key_partition_cache.pop(key, None)
+                return None
+            partition = get_broker_partition(pair[0])
+        _key_partition_cache[key] = partition
+        return partition
+
+    best = None
+    for broker, candidate in list(broker_partitions.items()):
+        if len(key) > len(broker) and key[len(broker)] == '_' and key.startswith(broker):
+            if best is None or len(broker) > len(best.broker):
+                best = candidate
+    return best
+
+def iter_broker_partitions():
+    """Snapshot danh sách partitions (an toàn khi broker mới được thêm trong lúc duyệt)"""
+    return list(broker_partitions.values())
+
+@contextmanager
+def all_partitions_locked(section='all_partitions'):
+    """
+    Giữ data_lock + lock của mọi partition (thứ tự theo tên broker)
+
+    Cho thao tác GUI sửa state của nhiều broker 1 lượt (reset, xóa alerts, bỏ symbol không chọn):
+    ingest không commit xen giữa. Ingest chỉ giữ 1 lock partition mỗi lần và không lấy data_lock
+    → không deadlock. Broker mới xuất hiện trong lúc giữ không bị khóa (chỉ có data mới).
+    """
+    partitions = sorted(iter_broker_partitions(), key=lambda partition: partition.broker)
+    with data_lock.section(section):
+        with ExitStack() as stack:
+            for partition in partitions:
+                stack.enter_context(partition.lock.section(section))
+            yield partitions
+
+class PartitionedKeyView(MutableMapping):
+    """
+    dict {broker_symbol: value} gộp từ 1 field của tất cả BrokerPartition
+
+    Ghi/xóa giữ lock của partition chứa key. Duyệt trả về snapshot.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __getitem__(self, key):
+        partition = partition_for_key(key)
+        if partition is None:
+            raise KeyError(key)
+        return getattr(partition, self.field)[key]
+
+    def __setitem__(self, key, value):
+        partition = partition_for_key(key, create=True)
+        if partition is None:
+            raise KeyError(f"unknown broker for key {key!r} (dùng symbol_key(broker, symbol))")
+        with partition.lock:
+            getattr(partition, self.field)[key] = value
+
+    def __delitem__(self, key):
+        partition = partition_for_key(key)
+        if partition is None:
+            raise KeyError(key)
+        with partition.lock:
+            del getattr(partition, self.field)[key]
+
+    def __contains__(self, key):
+        partition = partition_for_key(key)
+        return partition is not None and key in getattr(partition, self.field)
+
+    def get(self, key, default=None):
+        partition = partition_for_key(key)
+        if partition is None:
+            return default
+        return getattr(partition, self.field).get(key, default)
+
+    def pop(self, key, *default):
+        partition = partition_for_key(key)
+        if partition is None:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        with partition.lock:
+            return getattr(partition, self.field).pop(key, *default)
+
+    def clear(self):
+        for partition in iter_broker_partitions():
+            with partition.lock:
+                getattr(partition, self.field).clear()
+
+    def snapshot(self):
+        """dict gộp - mỗi partition được copy dưới lock của nó"""
+        result = {}
+        for partition in iter_broker_partitions():
+            with partition.lock.section('snapshot'):
+                result.update(getattr(partition, self.field))
+        return result
+
+    def copy(self):
+        return self.snapshot()
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def keys(self):
+        return self.snapshot().keys()
+
+    def items(self):
+        return self.snapshot().items()
+
+    def values(self):
+        return self.snapshot().values()
+
+    def __len__(self):
+        return sum(len(getattr(partition, self.field)) for partition in iter_broker_partitions())
+
+    def __repr__(self):
+        return f"PartitionedKeyView({self.field}: {len(self)} items)"
+
+class PartitionedMarketView(MutableMapping):
+    """
+    market_data {broker: {symbol: data}} - mỗi broker là partition.market
+
+    partition.market được thay bằng dict mới mỗi lần commit (copy-on-write),
+    nên có thể duyệt market_data[broker] mà không cần giữ lock.
+    """
+
+    def __getitem__(self, broker):
+        partition = broker_partitions.get(broker)
+        if partition is None or partition.market is None:
+            raise KeyError(broker)
+        return partition.market
+
+    def __setitem__(self, broker, symbols):
+        partition = get_broker_partition(broker)
+        with partition.lock:
+            partition.market = symbols
+
+    def __delitem__(self, broker):
+        partition = broker_partitions.get(broker)
+        if partition is None or partition.market is None:
+            raise KeyError(broker)
+        with partition.lock:
+            partition.market = None
+
+    def __contains__(self, broker):
+        partition = broker_partitions.get(broker)
+        return partition is not None and partition.market is not None
+
+    def get(self, broker, default=None):
+        partition = broker_partitions.get(broker)
+        if partition is None or partition.market is None:
+            return default
+        return partition.market
+
+    def clear(self):
+        for partition in iter_broker_partitions():
+            with partition.lock:
+                partition.market = None
+
+    def snapshot(self):
+        return {
+            partition.broker: partition.market
+            for partition in iter_broker_partitions()
+            if partition.market is not None
+        }
+
+    def copy(self):
+        return self.snapshot()
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def keys(self):
+        return self.snapshot().keys()
+
+    def items(self):
+        return self.snapshot().items()
+
+    def values(self):
+        return self.snapshot().values()
+
+    def __len__(self):
+        return sum(1 for partition in iter_broker_partitions() if partition.market is not None)
+
+    def __repr__(self):
+        return f"PartitionedMarketView({len(self)} brokers)"
+
+market_data = PartitionedMarketView()  # {broker: {symbol: data}}
+gap_spike_results = PartitionedKeyView('gap_spike_results')  # {broker_symbol: {gap_info, spike_info}}
+# Results for symbols with Point-based calculation
+gap_spike_point_results = PartitionedKeyView('gap_spike_point_results')  # {broker_symbol: {gap_info, spike_info, matched_alias, ...}}
+alert_board = PartitionedKeyView('alert_board')  # {broker_symbol: {data, last_detected_time, grace_period_start}}
+bid_tracking = PartitionedKeyView('bid_tracking')  # {broker_symbol: {last_bid, last_change_time, first_seen_time}}
+candle_data = PartitionedKeyView('candle_data')  # {broker_symbol: [(timestamp, open, high, low, close), ...]}
 
 # ===================== OPTIMIZED FILE WRITING =====================
 # Debouncing và background write queue để giảm số lần ghi file
@@ -207,6 +1011,7 @@ pending_writes = {
     'market_open_settings': False,
     'auto_send_settings': False,
     'python_reset_settings': False,
+    'symbol_match_cache': False,
 }
 write_timer = None
 write_lock = threading.Lock()
@@ -296,6 +1101,9 @@ def perform_pending_writes():
             elif setting_type == 'python_reset_settings':
                 save_python_reset_settings()
                 saved_count += 1
+            elif setting_type == 'symbol_match_cache':
+                save_symbol_match_cache()
+                saved_count += 1
         except Exception as e:
             logger.error(f"Error saving {setting_type}: {e}")
 
@@ -306,11 +1114,18 @@ def perform_pending_writes():
 # Cấu hình Gap/Spike từ file THAM_SO_GAP_INDICATOR.txt
 gap_config = {}  # {symbol_chuan: {aliases: [...], default_gap_percent: float, custom_gap: int}}
 gap_config_reverse_map = {}  # {alias_lower: symbol_chuan} - for fast lookup
+gap_config_prefix_trie = None  # AliasPrefixTrie trên gap_config_reverse_map (prefix match, Bước 2)
+gap_config_subsequence_index = None  # SubsequenceAliasIndex (subsequence match, Bước 3)
 symbol_config_cache = {}  # {symbol: (symbol_chuan, config, matched_alias)} - cache matching results
+symbol_match_levels = {}  # {symbol: 'exact' | 'prefix' | 'subsequence' | 'none'} - mức độ khớp (lưu cùng cache)
+gap_config_file_hash = None  # sha256 nội dung THAM_SO_GAP_INDICATOR.txt đang dùng
 GAP_CONFIG_FILE = 'THAM_SO_GAP_INDICATOR.txt'
-
-# Results for symbols with Point-based calculation
-gap_spike_point_results = {}  # {broker_symbol: {gap_info, spike_info, matched_alias, ...}}
+# Kết quả matching lưu xuống file, dùng lại khi khởi động nếu nội dung file config không đổi
+SYMBOL_MATCH_CACHE_FILE = 'symbol_match_cache.json'
+SYMBOL_MATCH_CACHE_VERSION = 1
+# Hot reload: find_symbol_config() dò symbol mới + swap config giữ lock này
+gap_config_lock = threading.RLock()
+GAP_CONFIG_WATCH_INTERVAL = 2.0  # Giây giữa 2 lần kiểm tra file config
 
 # ✨ Loading state and progress tracking
 loading_state = {
@@ -322,6 +1137,101 @@ loading_state = {
     'loading_complete_logged': False  # Track if we've logged "Loading complete!" to avoid spam
 }
 
+def parse_gap_config_text(text):
+    """
+    Parse nội dung file THAM_SO_GAP_INDICATOR.txt
+
+    Format file:
+    SYMBOL;ALIAS1;ALIAS2;ALIAS3;...;DEFAULT_GAP;CUSTOM_GAP
+
+    Returns:
+        tuple: (config, reverse_map)
+    """
+    config = {}
+    reverse_map = {}
+
+    for line_num, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+
+        # Skip empty lines and comments (both # and //)
+        if not line or line.startswith('#') or line.startswith('//'):
+            continue
+
+        # Parse line
+        parts = line.split(';')
+
+        if len(parts) < 3:
+            logger.warning(f"Line {line_num} in {GAP_CONFIG_FILE} has invalid format (< 3 fields): {line}")
+            continue
+
+        # Extract fields
+        symbol_chuan = parts[0].strip()
+
+        # All fields except first and last 2 are aliases
+        aliases = [p.strip() for p in parts[1:-2] if p.strip()]
+
+        # Last 2 fields
+        try:
+            default_gap_percent = float(parts[-2].strip())
+            custom_gap = float(parts[-1].strip())  # Changed from int to float to support decimal values
+        except (ValueError, IndexError) as e:
+            logger.warning(f"Line {line_num} in {GAP_CONFIG_FILE} has invalid numeric values: {line} - {e}")
+            continue
+
+        # Store config
+        config[symbol_chuan] = {
+            'aliases': aliases,
+            'default_gap_percent': default_gap_percent,
+            'custom_gap': custom_gap
+        }
+
+        # Build reverse map for fast lookup (case-insensitive)
+        # Map symbol_chuan itself
+        reverse_map[symbol_chuan.lower()] = symbol_chuan
+
+        # Map all aliases
+        for alias in aliases:
+            reverse_map[alias.lower()] = symbol_chuan
+
+        logger.info(f"Loaded config for {symbol_chuan}: {len(aliases)} aliases, gap={default_gap_percent}%")
+
+    return config, reverse_map
+
+def read_gap_config_file():
+    """
+    Đọc file config 1 lần (hash + parse trên cùng nội dung)
+
+    Returns:
+        tuple: (config, reverse_map, sha256) hoặc None nếu file không tồn tại
+    """
+    if not os.path.exists(GAP_CONFIG_FILE):
+        return None
+    with open(GAP_CONFIG_FILE, 'rb') as f:
+        raw = f.read()
+    config, reverse_map = parse_gap_config_text(raw.decode('utf-8'))
+    return config, reverse_map, hashlib.sha256(raw).hexdigest()
+
+def swap_gap_config(config, reverse_map, file_hash, cache, levels):
+    """
+    Thay toàn bộ config + index + cache matching (GỌI TRONG gap_config_lock)
+
+    find_symbol_config() dò symbol mới trong gap_config_lock → không bao giờ thấy
+    config mới đi cùng reverse_map/index cũ (hoặc ngược lại)
+    """
+    global gap_config, gap_config_reverse_map, gap_config_prefix_trie, gap_config_subsequence_index
+    global symbol_config_cache, symbol_match_levels, gap_config_file_hash
+
+    prefix_trie = AliasPrefixTrie(reverse_map, config)
+    subsequence_index = SubsequenceAliasIndex(reverse_map, config)
+    gap_config = config
+    gap_config_reverse_map = reverse_map
+    gap_config_prefix_trie = prefix_trie
+    gap_config_subsequence_index = subsequence_index
+    symbol_config_cache = cache
+    symbol_match_levels = levels
+    gap_config_file_hash = file_hash
+    invalidate_symbol_filter_cache()  # Prefix match của symbol filter dựa trên gap_config
+
 def load_gap_config_file():
     """
     Đọc file THAM_SO_GAP_INDICATOR.txt và parse thành gap_config
@@ -332,74 +1242,436 @@ def load_gap_config_file():
     Returns:
         dict: gap_config dictionary
     """
-    global gap_config, gap_config_reverse_map, symbol_config_cache
-
-    # ✅ Clear cache khi reload config (để dò lại sản phẩm)
-    symbol_config_cache.clear()
+    try:
+        loaded = read_gap_config_file()
+        if loaded is None:
+            logger.warning(f"File {GAP_CONFIG_FILE} không tồn tại. Hệ thống sẽ dùng tính toán Gap/Spike theo % cho tất cả symbols.")
+            # ✅ Clear cache khi reload config (để dò lại sản phẩm)
+            with gap_config_lock:
+                symbol_config_cache.clear()
+                symbol_match_levels.clear()
+            invalidate_symbol_routes()
+            return {}
+
+        config, reverse_map, file_hash = loaded
+        with gap_config_lock:
+            # ✅ Cache mới (rỗng) khi load lại toàn bộ config (để dò lại sản phẩm)
+            swap_gap_config(config, reverse_map, file_hash, {}, {})
+            # ⚡ Dùng lại kết quả matching của lần chạy trước (nếu file config không đổi)
+            load_symbol_match_cache()
+        invalidate_symbol_routes()
+
+        logger.info(f"✅ Loaded {len(config)} symbols from {GAP_CONFIG_FILE}")
+        return config
 
-    if not os.path.exists(GAP_CONFIG_FILE):
-        logger.warning(f"File {GAP_CONFIG_FILE} không tồn tại. Hệ thống sẽ dùng tính toán Gap/Spike theo % cho tất cả symbols.")
+    except Exception as e:
+        logger.error(f"Error loading {GAP_CONFIG_FILE}: {e}", exc_info=True)
         return {}
 
+def file_sha256(path):
+    """sha256 (hex) nội dung file, None nếu không đọc được"""
     try:
-        config = {}
-        reverse_map = {}
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def gap_config_alias_signatures(config, reverse_map):
+    """{alias_lower: (symbol_chuan, alias gốc, default_gap_percent, custom_gap, aliases)} - để so sánh 2 lần load"""
+    signatures = {}
+    for alias_lower, symbol_chuan in reverse_map.items():
+        entry = config[symbol_chuan]
+        signatures[alias_lower] = (symbol_chuan, find_original_alias(entry, alias_lower),
+                                   entry['default_gap_percent'], entry['custom_gap'], tuple(entry['aliases']))
+    return signatures
+
+def find_affected_symbols(old_config, old_reverse_map, new_config, new_reverse_map, cache, levels):
+    """
+    Symbols trong cache matching có thể cho kết quả khác với config mới
 
-        with open(GAP_CONFIG_FILE, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
+    Alias "đổi" = thêm, xóa, đổi symbol_chuan/alias gốc hoặc cấu hình của symbol_chuan.
+    Symbol bị ảnh hưởng khi có alias đổi:
+    - là prefix của symbol (Bước 1 exact + Bước 2 prefix)
+    - khớp subsequence với symbol, nếu symbol chưa khớp ở Bước 1/2 (Bước 3)
+    Thứ tự các alias giữ nguyên bị đổi → kết quả phụ thuộc thứ tự → coi tất cả bị ảnh hưởng
 
-                # Skip empty lines and comments (both # and //)
-                if not line or line.startswith('#') or line.startswith('//'):
-                    continue
+    Returns:
+        tuple: (affected_symbols_set, changed_alias_count)
+    """
+    old_signatures = gap_config_alias_signatures(old_config, old_reverse_map)
+    new_signatures = gap_config_alias_signatures(new_config, new_reverse_map)
+    changed = {alias_lower: old_signatures.get(alias_lower, new_signatures.get(alias_lower))[0]
+               for alias_lower in old_signatures.keys() | new_signatures.keys()
+               if old_signatures.get(alias_lower) != new_signatures.get(alias_lower)}
+
+    kept_old_order = [alias_lower for alias_lower in old_reverse_map if alias_lower in new_signatures]
+    kept_new_order = [alias_lower for alias_lower in new_reverse_map if alias_lower in old_signatures]
+    if kept_old_order != kept_new_order:
+        return set(cache), len(changed)
+    if not changed:
+        return set(), 0
+
+    # ⚡ Trie + index subsequence trên riêng các alias đổi (thay vì so từng cặp symbol × alias)
+    changed_trie = AliasPrefixTrie(changed, {})
+    changed_index = SubsequenceAliasIndex(changed, {})
+    affected = set()
+    for symbol in cache:
+        symbol_lower = symbol.lower().strip()
+        if symbol_lower in changed or changed_trie.prefixes(symbol_lower):
+            affected.add(symbol)
+        elif levels.get(symbol) not in ('exact', 'prefix') and changed_index.first_match(symbol_lower)[0] is not None:
+            affected.add(symbol)
+    return affected, len(changed)
+
+def drop_stale_detection_results(symbols):
+    """
+    Xóa kết quả bảng Point/Percent của các symbols có kết quả matching đổi
+    (lượt ingest tiếp theo sẽ xếp lại symbol vào đúng bảng Point/Percent)
+    """
+    dropped = 0
+    for partition in iter_broker_partitions():
+        with partition.lock.section('gap_config_reload'):
+            for table in (partition.gap_spike_point_results, partition.gap_spike_results):
+                for key in [key for key, result in table.items() if result.get('symbol') in symbols]:
+                    del table[key]
+                    dropped += 1
+    return dropped
+
+def hot_reload_gap_config():
+    """
+    Load lại THAM_SO_GAP_INDICATOR.txt khi đang chạy, chỉ hủy kết quả matching bị ảnh hưởng
 
-                # Parse line
-                parts = line.split(';')
+    - Parse file mới NGOÀI lock, so sánh alias cũ/mới
+    - Cấu hình không đổi của symbol_chuan giữ nguyên object (kết quả cache vẫn trỏ đúng)
+    - Swap config + index + cache trong gap_config_lock (ingest không thấy config load dở)
 
-                if len(parts) < 3:
-                    logger.warning(f"Line {line_num} in {GAP_CONFIG_FILE} has invalid format (< 3 fields): {line}")
-                    continue
+    Returns:
+        set: symbols có kết quả matching bị hủy, None nếu không load lại
+    """
+    loaded = read_gap_config_file()
+    if loaded is None or loaded[2] == gap_config_file_hash:
+        return None
+    config, reverse_map, file_hash = loaded
+
+    with gap_config_lock:
+        old_config, old_reverse_map = gap_config, gap_config_reverse_map
+        # Giữ object config cũ cho symbol_chuan không đổi (id(config) dùng trong Batch Detection)
+        for symbol_chuan, entry in config.items():
+            if old_config.get(symbol_chuan) == entry:
+                config[symbol_chuan] = old_config[symbol_chuan]
+
+        affected, changed_count = find_affected_symbols(
+            old_config, old_reverse_map, config, reverse_map, symbol_config_cache, symbol_match_levels
+        )
+        cache = {}
+        levels = {}
+        for symbol, result in symbol_config_cache.items():
+            if symbol in affected or (result[0] is not None and config.get(result[0]) is not result[1]):
+                affected.add(symbol)
+                continue
+            cache[symbol] = result
+            if symbol in symbol_match_levels:
+                levels[symbol] = symbol_match_levels[symbol]
+        swap_gap_config(config, reverse_map, file_hash, cache, levels)
+
+    if affected:
+        invalidate_symbol_routes(symbols=affected)
+    dropped = drop_stale_detection_results(affected) if affected else 0
+    schedule_save('symbol_match_cache')  # Lưu cache kèm hash mới
+    logger.info(f"🔄 Hot reload {GAP_CONFIG_FILE}: {len(config)} symbols, {changed_count} alias đổi → "
+                f"dò lại {len(affected)} symbols (giữ {len(cache)}), xóa {dropped} kết quả Point/Percent cũ")
+    return affected
+
+def reload_gap_config_if_changed():
+    """
+    Load lại THAM_SO_GAP_INDICATOR.txt nếu nội dung file đã thay đổi
 
-                # Extract fields
-                symbol_chuan = parts[0].strip()
+    Returns:
+        bool: True nếu đã load lại (chỉ kết quả matching bị ảnh hưởng mới phải dò lại)
+    """
+    if file_sha256(GAP_CONFIG_FILE) == gap_config_file_hash:
+        return False
+    if not gap_config or gap_config_file_hash is None:
+        load_gap_config_file()
+        return True
+    try:
+        return hot_reload_gap_config() is not None
+    except Exception as e:
+        logger.error(f"Error hot reloading {GAP_CONFIG_FILE}: {e}", exc_info=True)
+        return False
 
-                # All fields except first and last 2 are aliases
-                aliases = [p.strip() for p in parts[1:-2] if p.strip()]
+class GapConfigWatcher:
+    """
+    Theo dõi THAM_SO_GAP_INDICATOR.txt (mtime + size) trong background thread
 
-                # Last 2 fields
-                try:
-                    default_gap_percent = float(parts[-2].strip())
-                    custom_gap = float(parts[-1].strip())  # Changed from int to float to support decimal values
-                except (ValueError, IndexError) as e:
-                    logger.warning(f"Line {line_num} in {GAP_CONFIG_FILE} has invalid numeric values: {line} - {e}")
-                    continue
+    File đổi → chờ thêm 1 chu kỳ cho file ổn định (editor đang ghi dở) rồi mới hot reload
+    """
 
-                # Store config
-                config[symbol_chuan] = {
-                    'aliases': aliases,
-                    'default_gap_percent': default_gap_percent,
-                    'custom_gap': custom_gap
-                }
+    def __init__(self, interval=GAP_CONFIG_WATCH_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_signature = self._signature()
+        self._pending = False
+        self.reloads = 0
 
-                # Build reverse map for fast lookup (case-insensitive)
-                # Map symbol_chuan itself
-                reverse_map[symbol_chuan.lower()] = symbol_chuan
+    @staticmethod
+    def _signature():
+        try:
+            stat = os.stat(GAP_CONFIG_FILE)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
 
-                # Map all aliases
-                for alias in aliases:
-                    reverse_map[alias.lower()] = symbol_chuan
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._last_signature = self._signature()
+        self._thread = threading.Thread(target=self._watch_loop, name="GapConfigWatcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {GAP_CONFIG_FILE} for changes (every {self.interval}s)")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        thread = self._thread
+        self._thread = None
+        if thread is not None:
+            thread.join(timeout)
+
+    def poll(self):
+        """1 lần kiểm tra - Returns: True nếu đã hot reload"""
+        signature = self._signature()
+        if signature != self._last_signature:
+            self._last_signature = signature
+            self._pending = True
+            return False
+        if not self._pending or signature is None:
+            return False
+        self._pending = False
+        if reload_gap_config_if_changed():
+            self.reloads += 1
+            return True
+        return False
 
-                logger.info(f"Loaded config for {symbol_chuan}: {len(aliases)} aliases, gap={default_gap_percent}%")
+    def _watch_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Gap config watcher error: {e}")
 
-        gap_config = config
-        gap_config_reverse_map = reverse_map
+def load_symbol_match_cache():
+    """
+    Nạp kết quả matching đã lưu vào symbol_config_cache
 
-        logger.info(f"✅ Loaded {len(gap_config)} symbols from {GAP_CONFIG_FILE}")
-        return config
+    Chỉ dùng khi hash nội dung THAM_SO_GAP_INDICATOR.txt giống lúc lưu,
+    ngược lại bỏ qua (file sẽ được ghi đè khi có kết quả matching mới)
+    """
+    try:
+        if gap_config_file_hash is None or not os.path.exists(SYMBOL_MATCH_CACHE_FILE):
+            return 0
+        with open(SYMBOL_MATCH_CACHE_FILE, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        if (not isinstance(stored, dict) or stored.get('version') != SYMBOL_MATCH_CACHE_VERSION
+                or stored.get('config_hash') != gap_config_file_hash):
+            logger.info(f"{GAP_CONFIG_FILE} đã thay đổi → bỏ cache matching cũ, sẽ dò lại sản phẩm")
+            return 0
+
+        loaded = 0
+        for symbol, (symbol_chuan, matched_alias, level) in stored.get('matches', {}).items():
+            if symbol_chuan is None:
+                symbol_config_cache[symbol] = (None, None, None)
+            elif symbol_chuan in gap_config:
+                symbol_config_cache[symbol] = (symbol_chuan, gap_config[symbol_chuan], matched_alias)
+            else:
+                continue
+            symbol_match_levels[symbol] = level
+            loaded += 1
+        logger.info(f"✅ Loaded {loaded} cached symbol matches from {SYMBOL_MATCH_CACHE_FILE}")
+        return loaded
+    except Exception as e:
+        logger.error(f"Error loading symbol match cache: {e}")
+        return 0
 
+def save_symbol_match_cache():
+    """Lưu symbol_config_cache (symbol → symbol_chuan, alias, mức độ khớp) kèm hash file config"""
+    try:
+        if gap_config_file_hash is None:
+            return
+        matches = {}
+        for symbol, (symbol_chuan, _, matched_alias) in list(symbol_config_cache.items()):
+            level = symbol_match_levels.get(symbol)
+            if level is not None:
+                matches[symbol] = [symbol_chuan, matched_alias, level]
+        temp_file = SYMBOL_MATCH_CACHE_FILE + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': SYMBOL_MATCH_CACHE_VERSION,
+                'config_file': GAP_CONFIG_FILE,
+                'config_hash': gap_config_file_hash,
+                'matches': matches
+            }, f, ensure_ascii=False)
+        os.replace(temp_file, SYMBOL_MATCH_CACHE_FILE)  # Ghi nguyên tử: không để lại file hỏng nếu app tắt giữa chừng
+        logger.info(f"Saved {len(matches)} symbol matches to {SYMBOL_MATCH_CACHE_FILE}")
     except Exception as e:
-        logger.error(f"Error loading {GAP_CONFIG_FILE}: {e}", exc_info=True)
-        return {}
+        logger.error(f"Error saving symbol match cache: {e}")
+
+def remember_symbol_match(symbol, result, level):
+    """Lưu kết quả find_symbol_config() vào cache (và lên lịch ghi xuống file)"""
+    symbol_config_cache[symbol] = result
+    symbol_match_levels[symbol] = level
+    if not pending_writes['symbol_match_cache']:
+        schedule_save('symbol_match_cache')
+    return result
+
+def find_original_alias(config, alias_lower):
+    """Alias gốc (giữ nguyên chữ hoa/thường) trong file txt ứng với alias_lower, None nếu không có"""
+    for alias in config['aliases']:
+        if alias.lower() == alias_lower:
+            return alias
+    return None
+
+class AliasPrefixTrie:
+    """
+    Trie ký tự trên alias lowercase của gap_config_reverse_map
+
+    ⚡ Tìm tất cả alias là prefix của symbol trong O(len(symbol)) thay vì duyệt
+    toàn bộ aliases với startswith(). Mỗi node kết thúc alias lưu sẵn
+    (thứ tự trong reverse_map, độ dài, symbol_chuan, alias gốc trong file txt).
+    """
+
+    def __init__(self, reverse_map, config):
+        self.source = reverse_map
+        self.source_size = len(reverse_map)
+        self._root = {}
+        for order, (alias_lower, symbol_chuan) in enumerate(reverse_map.items()):
+            if not alias_lower:
+                continue  # Alias rỗng không bao giờ là prefix match (len phải > 0)
+            node = self._root
+            for char in alias_lower:
+                node = node.setdefault(char, {})
+            # Key None: không trùng với ký tự nào
+            node[None] = (order, len(alias_lower), symbol_chuan,
+                          find_original_alias(config.get(symbol_chuan, {'aliases': []}), alias_lower))
+
+    def is_current(self, reverse_map):
+        """False nếu reverse_map đã được thay/sửa (thêm, xóa alias) sau khi build"""
+        return reverse_map is self.source and len(reverse_map) == self.source_size
+
+    def prefixes(self, text):
+        """Các alias là prefix của text: [(order, length, symbol_chuan, original_alias), ...]"""
+        found = []
+        node = self._root
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            entry = node.get(None)
+            if entry is not None:
+                found.append(entry)
+        return found
+
+    def longest_prefix_match(self, text):
+        """
+        Returns:
+            tuple: (symbol_chuan, matched_alias) hoặc (None, None)
+
+        Kết quả giống hệt vòng lặp startswith() cũ trên gap_config_reverse_map:
+        duyệt theo thứ tự của reverse_map, chỉ nhận prefix dài hơn prefix tốt nhất hiện tại.
+        Nếu prefix được nhận không có alias gốc (vd symbol_chuan) thì giữ alias của
+        prefix trước đó (nếu có), không thì dùng symbol_chuan.
+        """
+        best_match = None
+        best_match_len = 0
+        best_matched_alias = None
+        for _, length, symbol_chuan, original_alias in sorted(self.prefixes(text)):
+            if length > best_match_len:
+                best_match = symbol_chuan
+                best_match_len = length
+                if original_alias:
+                    best_matched_alias = original_alias
+                elif not best_matched_alias:
+                    best_matched_alias = symbol_chuan
+        return best_match, best_matched_alias
+
+class SubsequenceAliasIndex:
+    """
+    Alias đã normalize sẵn, chia bucket theo ký tự đầu và sắp theo độ dài
+
+    ⚡ is_subsequence_match() chỉ khớp khi (cả 2 chiều đều cần):
+    - Ký tự đầu giống nhau
+    - Số ký tự khớp <= chuỗi ngắn hơn → chuỗi ngắn hơn >= min_length
+    - similarity <= ngắn/dài → độ dài alias trong [len × min_similarity, len / min_similarity]
+    → chỉ chạy so khớp trên các alias còn lại, không gọi regex normalize lại cho alias
+    """
+
+    def __init__(self, reverse_map, config):
+        self.source = reverse_map
+        self.source_size = len(reverse_map)
+        buckets = {}
+        for order, (alias_lower, symbol_chuan) in enumerate(reverse_map.items()):
+            normalized = normalize_symbol(alias_lower).lower()
+            if not normalized:
+                continue  # is_subsequence_match() luôn False với chuỗi rỗng
+            original_alias = find_original_alias(config.get(symbol_chuan, {'aliases': []}), alias_lower)
+            buckets.setdefault(normalized[0], []).append(
+                (len(normalized), order, normalized, symbol_chuan, original_alias or symbol_chuan)
+            )
+        self._buckets = {}
+        for first_char, entries in buckets.items():
+            entries.sort()
+            self._buckets[first_char] = ([entry[0] for entry in entries], entries)
+
+    def is_current(self, reverse_map):
+        """False nếu reverse_map đã được thay/sửa (thêm, xóa alias) sau khi build"""
+        return reverse_map is self.source and len(reverse_map) == self.source_size
+
+    def candidates(self, normalized, min_length=5, min_similarity=0.5):
+        """Alias có thể khớp với symbol đã normalize, theo thứ tự trong reverse_map"""
+        length = len(normalized)
+        if not normalized or length < min_length or min_similarity <= 0:
+            return []
+        bucket = self._buckets.get(normalized[0])
+        if bucket is None:
+            return []
+        lengths, entries = bucket
+        # similarity = matched / max(len) <= min(len) / max(len) → cần >= min_similarity
+        low = max(min_length, math.ceil(length * min_similarity - 1e-9))
+        high = math.floor(length / min_similarity + 1e-9)
+        found = entries[bisect_left(lengths, low):bisect_right(lengths, high)]
+        found.sort(key=lambda entry: entry[1])
+        return found
+
+    def first_match(self, symbol_lower, min_length=5, min_similarity=0.5):
+        """
+        Returns:
+            tuple: (symbol_chuan, matched_alias) của alias ĐẦU TIÊN (theo thứ tự reverse_map)
+                   khớp is_subsequence_match(), hoặc (None, None) - giống vòng lặp cũ
+        """
+        normalized = normalize_symbol(symbol_lower).lower()
+        for _, _, alias_normalized, symbol_chuan, matched_alias in self.candidates(normalized, min_length, min_similarity):
+            if is_normalized_subsequence_match(normalized, alias_normalized, min_length, min_similarity):
+                return symbol_chuan, matched_alias
+        return None, None
+
+def get_gap_config_subsequence_index():
+    """Index subsequence của gap_config_reverse_map hiện tại (build lại nếu reverse_map bị thay/sửa trực tiếp)"""
+    global gap_config_subsequence_index
+    index = gap_config_subsequence_index
+    if index is None or not index.is_current(gap_config_reverse_map):
+        index = SubsequenceAliasIndex(gap_config_reverse_map, gap_config)
+        gap_config_subsequence_index = index
+    return index
+
+def get_gap_config_prefix_trie():
+    """Trie của gap_config_reverse_map hiện tại (build lại nếu reverse_map bị thay/sửa trực tiếp)"""
+    global gap_config_prefix_trie
+    trie = gap_config_prefix_trie
+    if trie is None or not trie.is_current(gap_config_reverse_map):
+        trie = AliasPrefixTrie(gap_config_reverse_map, gap_config)
+        gap_config_prefix_trie = trie
+    return trie
 
 def normalize_symbol(symbol):
     """
@@ -436,7 +1708,10 @@ def is_subsequence_match(str1, str2, min_length=5, min_similarity=0.5):
     # Normalize: loại bỏ ký tự đặc biệt
     norm1 = normalize_symbol(str1).lower()
     norm2 = normalize_symbol(str2).lower()
+    return is_normalized_subsequence_match(norm1, norm2, min_length, min_similarity)
 
+def is_normalized_subsequence_match(norm1, norm2, min_length=5, min_similarity=0.5):
+    """is_subsequence_match() cho 2 chuỗi đã normalize_symbol() + lower()"""
     # Nếu sau khi normalize mà rỗng hoặc quá ngắn → không match
     if not norm1 or not norm2:
         return False
@@ -504,94 +1779,196 @@ def find_symbol_config(symbol):
         return None, None, None
 
     # ✅ Check cache first (để tránh matching lại mỗi lần)
-    if symbol in symbol_config_cache:
-        return symbol_config_cache[symbol]
+    cached = symbol_config_cache.get(symbol)
+    if cached is not None:
+        return cached
 
-    symbol_lower = symbol.lower().strip()
+    # Dò trong lock: hot reload không swap config giữa chừng
+    with gap_config_lock:
+        return match_symbol_config(symbol)
 
-    # Bước 1: Thử exact match (O(1) - very fast)
-    symbol_chuan = gap_config_reverse_map.get(symbol_lower)
+def match_symbol_config(symbol):
+    """Dò symbol trong gap_config (Bước 1-3) và lưu vào cache - GỌI TRONG gap_config_lock"""
+    if not gap_config:
+        return None, None, None
+
+    result, level = compute_symbol_match(
+        symbol.lower().strip(), gap_config, gap_config_reverse_map,
+        get_gap_config_prefix_trie(), get_gap_config_subsequence_index()
+    )
+    # ✅ Lưu vào cache trước khi return (cache cả trường hợp không tìm thấy để tránh tìm lại)
+    return remember_symbol_match(symbol, result, level)
+
+def match_exact_symbol_config(symbol_lower, config_map, reverse_map):
+    """
+    Bước 1: exact match (O(1) - very fast)
+
+    Returns:
+        tuple: (symbol_chuan, config_dict, matched_alias) hoặc None
+    """
+    symbol_chuan = reverse_map.get(symbol_lower)
+    if not symbol_chuan:
+        return None
 
-    if symbol_chuan:
-        config = gap_config[symbol_chuan]
+    config = config_map[symbol_chuan]
 
-        # Tìm alias từ file txt đã khớp
-        if symbol_lower == symbol_chuan.lower():
-            matched_alias = symbol_chuan  # Exact match với symbol chính
+    # Tìm alias từ file txt đã khớp
+    if symbol_lower == symbol_chuan.lower():
+        matched_alias = symbol_chuan  # Exact match với symbol chính
+    else:
+        # Tìm alias nào trong danh sách khớp với symbol
+        for alias in config['aliases']:
+            if alias.lower() == symbol_lower:
+                matched_alias = alias  # Trả về alias từ file txt
+                break
         else:
-            # Tìm alias nào trong danh sách khớp với symbol
-            for alias in config['aliases']:
-                if alias.lower() == symbol_lower:
-                    matched_alias = alias  # Trả về alias từ file txt
-                    break
-            else:
-                matched_alias = symbol_chuan  # Fallback
+            matched_alias = symbol_chuan  # Fallback
 
-        # ✅ Lưu vào cache trước khi return
-        result = (symbol_chuan, config, matched_alias)
-        symbol_config_cache[symbol] = result
-        return result
+    return symbol_chuan, config, matched_alias
+
+def compute_symbol_match(symbol_lower, config_map, reverse_map, prefix_trie, subsequence_index):
+    """
+    Dò symbol (Bước 1-3) trên 1 snapshot config - KHÔNG ghi cache
+
+    Returns:
+        tuple: ((symbol_chuan, config_dict, matched_alias), level)
+               level: 'exact' | 'prefix' | 'subsequence' | 'none'
+    """
+    # Bước 1: Thử exact match (O(1) - very fast)
+    exact = match_exact_symbol_config(symbol_lower, config_map, reverse_map)
+    if exact is not None:
+        return exact, 'exact'
 
-    # Bước 2: Thử prefix match (O(n) where n = số aliases)
+    # Bước 2: Thử prefix match (⚡ trie - O(len(symbol)))
     # Tìm alias dài nhất là prefix của symbol để tránh false positive
     # Ví dụ: BTCUSDM nên match BTCUSD chứ không phải BTC
-    best_match = None
-    best_match_len = 0
-    best_matched_alias = None
-
-    for alias_lower, symbol_chuan in gap_config_reverse_map.items():
-        if symbol_lower.startswith(alias_lower):
-            if len(alias_lower) > best_match_len:
-                best_match = symbol_chuan
-                best_match_len = len(alias_lower)
-                # Tìm alias gốc (không lowercase) từ config
-                config = gap_config[symbol_chuan]
-                for alias in config['aliases']:
-                    if alias.lower() == alias_lower:
-                        best_matched_alias = alias  # Alias từ file txt
-                        break
-                if not best_matched_alias:
-                    best_matched_alias = symbol_chuan
+    best_match, best_matched_alias = prefix_trie.longest_prefix_match(symbol_lower)
 
     if best_match:
-        config = gap_config[best_match]
-        # ✅ Lưu vào cache trước khi return
-        result = (best_match, config, best_matched_alias)
-        symbol_config_cache[symbol] = result
-        return result
+        return (best_match, config_map[best_match], best_matched_alias), 'prefix'
 
-    # Bước 3: Thử subsequence match (O(n) - fallback cuối cùng)
+    # Bước 3: Thử subsequence match (fallback cuối cùng)
     # Tìm alias có ít nhất 5 ký tự khớp theo thứ tự từ trái qua phải
-    best_match = None
-    best_matched_alias = None
-
-    for alias_lower, symbol_chuan in gap_config_reverse_map.items():
-        if is_subsequence_match(symbol_lower, alias_lower):
-            best_match = symbol_chuan
-            # Tìm alias gốc (không lowercase) từ config
-            config = gap_config[symbol_chuan]
-            for alias in config['aliases']:
-                if alias.lower() == alias_lower:
-                    best_matched_alias = alias
-                    break
-            if not best_matched_alias:
-                best_matched_alias = symbol_chuan
-            # Tìm được match đầu tiên thì dừng ngay (không cần tìm best match)
-            break
+    # ⚡ Chỉ so khớp với alias cùng ký tự đầu + độ dài phù hợp (SubsequenceAliasIndex)
+    # Tìm được match đầu tiên thì dừng ngay (không cần tìm best match)
+    best_match, best_matched_alias = subsequence_index.first_match(symbol_lower)
 
     if best_match:
-        config = gap_config[best_match]
         # ✅ Tắt log subsequence match để tránh spam log (chỉ dò 1 lần khi khởi động)
         # logger.info(f"✅ Subsequence match: '{symbol}' → '{best_matched_alias}'")
-        # ✅ Lưu vào cache trước khi return
-        result = (best_match, config, best_matched_alias)
-        symbol_config_cache[symbol] = result
-        return result
+        return (best_match, config_map[best_match], best_matched_alias), 'subsequence'
+
+    return (None, None, None), 'none'
+
+# ===================== BULK SYMBOL RESOLUTION =====================
+# Broker mới kết nối → payload đầu có hàng nghìn symbol chưa dò (prefix/subsequence)
+# - Ingest chỉ dò exact match (O(1)) ngay, symbol còn lại gửi cho SymbolResolver:
+#   dò theo lô trên thread pool, trên snapshot config NGOÀI gap_config_lock, ghi cache trong lock
+# - Trong lúc chờ dò xong, symbol áp dụng chính sách tạm SYMBOL_RESOLVE_INTERIM_POLICY:
+#     'skip'    → vẫn lưu market data/bid tracking/nến, CHƯA tính Gap/Spike (không có kết quả tạm)
+#     'percent' → tính theo % như symbol không có cấu hình, chuyển sang Point khi dò xong
+ASYNC_SYMBOL_RESOLVE = True
+SYMBOL_RESOLVE_INTERIM_POLICY = 'skip'
+SYMBOL_RESOLVER_WORKERS = 2
+SYMBOL_RESOLVE_CHUNK = 128  # Số symbols mỗi lô
+
+class SymbolResolver:
+    """Dò symbol config theo lô trên thread pool (ngoài đường ingest)"""
+
+    def __init__(self, workers=SYMBOL_RESOLVER_WORKERS, chunk_size=SYMBOL_RESOLVE_CHUNK):
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='symbol_resolver')
+        self._cond = threading.Condition()
+        self._pending = set()
+        self._stats = {'submitted': 0, 'resolved': 0, 'batches': 0, 'retried': 0}
+
+    def is_pending(self, symbol):
+        return symbol in self._pending
+
+    def submit(self, symbols):
+        """Gửi symbols chưa có trong cache (và chưa chờ dò) - Returns: số symbols mới"""
+        with self._cond:
+            new = sorted({symbol for symbol in symbols
+                          if symbol not in self._pending and symbol not in symbol_config_cache})
+            self._pending.update(new)
+            self._stats['submitted'] += len(new)
+        # Sắp xếp → symbol cùng ký tự đầu/prefix nằm chung lô (dùng chung nhánh trie + bucket index)
+        for start in range(0, len(new), self.chunk_size):
+            self._executor.submit(self._resolve_batch, new[start:start + self.chunk_size])
+        return len(new)
+
+    def _resolve_batch(self, symbols):
+        resolved_with_config = set()
+        try:
+            while True:
+                with gap_config_lock:
+                    config_map, reverse_map = gap_config, gap_config_reverse_map
+                    if not config_map:
+                        break
+                    prefix_trie = get_gap_config_prefix_trie()
+                    subsequence_index = get_gap_config_subsequence_index()
+
+                # ⚡ Dò ngoài lock - ingest/lô khác không phải chờ
+                matches = [
+                    (symbol, *compute_symbol_match(symbol.lower().strip(), config_map, reverse_map,
+                                                   prefix_trie, subsequence_index))
+                    for symbol in symbols
+                ]
+
+                with gap_config_lock:
+                    if gap_config_reverse_map is not reverse_map or not prefix_trie.is_current(reverse_map):
+                        # Config đổi trong lúc dò (hot reload) → dò lại trên config mới
+                        self._stats['retried'] += 1
+                        continue
+                    for symbol, result, level in matches:
+                        if symbol not in symbol_config_cache:
+                            remember_symbol_match(symbol, result, level)
+                            if result[0] is not None:
+                                resolved_with_config.add(symbol)
+                break
 
-    # ✅ Cache cả trường hợp không tìm thấy để tránh tìm lại
-    result = (None, None, None)
-    symbol_config_cache[symbol] = result
-    return result
+            if resolved_with_config and SYMBOL_RESOLVE_INTERIM_POLICY == 'percent':
+                # Kết quả tạm theo % → lượt ingest sau tính lại theo Point
+                drop_stale_detection_results(resolved_with_config)
+        except Exception as e:
+            logger.error(f"Error resolving symbol batch ({len(symbols)} symbols): {e}", exc_info=True)
+        finally:
+            with self._cond:
+                self._pending.difference_update(symbols)
+                self._stats['resolved'] += len(symbols)
+                self._stats['batches'] += 1
+                self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Chờ dò xong tất cả symbols đang chờ - Returns: True nếu không còn symbol nào chờ"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending, timeout)
+
+    def get_stats(self):
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending))
+
+symbol_resolver = SymbolResolver()
+
+def lookup_symbol_config(symbol):
+    """
+    Symbol config cho ingest - không dò prefix/subsequence trên đường ingest
+
+    Returns:
+        tuple: ((symbol_chuan, config_dict, matched_alias), pending)
+               pending=True → symbol chưa dò xong (gửi cho symbol_resolver, áp dụng chính sách tạm)
+    """
+    cached = symbol_config_cache.get(symbol)
+    if cached is not None:
+        return cached, False
+    if not ASYNC_SYMBOL_RESOLVE or not gap_config:
+        return find_symbol_config(symbol), False
+
+    with gap_config_lock:
+        exact = match_exact_symbol_config(symbol.lower().strip(), gap_config, gap_config_reverse_map)
+        if exact is not None:
+            return remember_symbol_match(symbol, exact, 'exact'), False
+    return (None, None, None), True
 
 def calculate_gap_point(symbol, broker, data, spread_percent=None):
     """
@@ -717,7 +2094,7 @@ def calculate_gap_point(symbol, broker, data, spread_percent=None):
             'message': f'Lỗi: {str(e)}'
         }
 
-def calculate_spike_point(symbol, broker, data, spread_percent=None):
+def calculate_spike_point(symbol, broker, data, spread_percent=None, tracking=None):
     """
     Tính toán SPIKE theo Point (cho symbols có cấu hình trong file txt)
 
@@ -732,11 +2109,15 @@ def calculate_spike_point(symbol, broker, data, spread_percent=None):
         broker: Broker name
         data: Market data dictionary
         spread_percent: Pre-calculated spread percent (optional)
+        tracking: Bid tracking dùng để lấy Bid_prev (mặc định: bid_tracking global)
 
     Returns:
         dict: Spike detection result
     """
     try:
+        if tracking is None:
+            tracking = bid_tracking
+
         # Find symbol config
         symbol_chuan, config, matched_alias = find_symbol_config(symbol)
 
@@ -768,9 +2149,9 @@ def calculate_spike_point(symbol, broker, data, spread_percent=None):
         threshold_point = default_gap_percent / point_value
 
         # Track previous bid for this symbol
-        key = f"{broker}_{symbol}"
+        key = symbol_key(broker, symbol)
 
-        if key not in bid_tracking:
+        if key not in tracking:
             # First time - no previous bid
             return {
                 'detected': False,
@@ -782,7 +2163,7 @@ def calculate_spike_point(symbol, broker, data, spread_percent=None):
                 'matched_alias': matched_alias
             }
 
-        prev_bid = bid_tracking[key].get('last_bid', current_bid)
+        prev_bid = tracking[key].get('last_bid', current_bid)
 
         # Calculate spike in points
         spike_point = abs(current_bid - prev_bid) / point_value
@@ -897,7 +2278,7 @@ def update_tree_delta(tree, cache_key, new_data_dict, format_func):
     return cache
 
 # ===================== MARKET OPEN HELPER =====================
-def is_within_skip_period_after_open(symbol, broker, current_timestamp):
+def is_within_skip_period_after_open(symbol, broker, current_timestamp, symbol_data=None):
     """
     Kiểm tra xem có đang trong khoảng thời gian skip sau khi market mở cửa không
     
@@ -905,6 +2286,7 @@ def is_within_skip_period_after_open(symbol, broker, current_timestamp):
         symbol: Symbol name
         broker: Broker name
         current_timestamp: Unix timestamp hiện tại
+        symbol_data: Market data của symbol (mặc định: lấy từ market_data)
     
     Returns:
         True nếu đang trong skip period, False nếu không
@@ -915,10 +2297,10 @@ def is_within_skip_period_after_open(symbol, broker, current_timestamp):
             return False  # Không skip
         
         # Lấy data
-        if broker not in market_data or symbol not in market_data[broker]:
-            return False
-        
-        symbol_data = market_data[broker][symbol]
+        if symbol_data is None:
+            if broker not in market_data or symbol not in market_data[broker]:
+                return False
+            symbol_data = market_data[broker][symbol]
         trade_sessions = symbol_data.get('trade_sessions', {})
         
         if not trade_sessions:
@@ -1124,18 +2506,71 @@ def push_to_google_sheets(accepted_items):
         return False, error_msg
 
 # ===================== AUDIO ALERT FUNCTIONS =====================
-def check_and_play_board_alert(alert_type):
+def board_alert_presence(alert_types=('gap', 'spike', 'delay')):
     """
-    Kiểm tra và phát âm thanh cho toàn bộ bảng (không phải từng sản phẩm)
+    Bảng Kèo (gap/spike, bỏ item đang ẩn) / Bảng Delay có item không
 
-    Logic:
-    - Chỉ báo 1 lần khi có item trong bảng
-    - Sau 3 phút vẫn còn item thì báo lại
+    Duyệt thẳng từng partition (chỉ copy values của 1 partition dưới lock của nó,
+    không snapshot cả view), dừng ngay khi đã thấy đủ các loại cần tìm
+
+    Returns:
+        dict: {alert_type: bool}
+    """
+    found = dict.fromkeys(alert_types, False)
+    pending = set(alert_types)
+    current_time = clock()
+    delay_threshold = delay_settings.get('threshold', 180)
+
+    for partition in iter_broker_partitions():
+        if 'delay' in pending:
+            with partition.lock.section('board_alert'):
+                tracking = list(partition.bid_tracking.values())
+            if any(current_time - info['last_change_time'] >= delay_threshold for info in tracking):
+                found['delay'] = True
+                pending.discard('delay')
+
+        if 'gap' in pending or 'spike' in pending:
+            with partition.lock.section('board_alert'):
+                board = list(partition.alert_board.values())
+            for alert_info in board:
+                result = alert_info.get('data', {})
+                gap = 'gap' in pending and result.get('gap', {}).get('detected', False)
+                spike = 'spike' in pending and result.get('spike', {}).get('detected', False)
+                if not (gap or spike):
+                    continue
+                # Skip hidden items
+                if is_alert_hidden(result.get('broker', ''), result.get('symbol', '')):
+                    continue
+                for alert_type, detected in (('gap', gap), ('spike', spike)):
+                    if detected:
+                        found[alert_type] = True
+                        pending.discard(alert_type)
+                if 'gap' not in pending and 'spike' not in pending:
+                    break
+
+        if not pending:
+            break
+    return found
+
+def check_and_play_board_alert(alert_type):
+    """
+    Kiểm tra và phát âm thanh cho toàn bộ bảng (không phải từng sản phẩm)
+
+    Logic:
+    - Chỉ báo 1 lần khi có item trong bảng
+    - Sau 3 phút vẫn còn item thì báo lại
     - Nếu bảng hết item rồi có lại thì báo lại
 
     Args:
         alert_type: 'gap', 'spike', hoặc 'delay'
     """
+    check_board_alerts((alert_type,))
+
+def check_board_alerts(alert_types=('gap', 'spike', 'delay')):
+    """
+    check_and_play_board_alert() cho nhiều loại alert với 1 lượt duyệt các bảng
+    (gọi sau mỗi payload ingest)
+    """
     try:
         # Check if audio alerts are enabled
         if not audio_settings.get('enabled', True):
@@ -1144,7 +2579,7 @@ def check_and_play_board_alert(alert_type):
         # ✨ Check startup delay - không phát cảnh báo trong thời gian khởi động
         startup_delay_minutes = audio_settings.get('startup_delay_minutes', 5)
         startup_delay_seconds = startup_delay_minutes * 60
-        current_time_check = time.time()
+        current_time_check = clock()
         time_since_startup = current_time_check - app_startup_time
 
         if time_since_startup < startup_delay_seconds:
@@ -1154,64 +2589,42 @@ def check_and_play_board_alert(alert_type):
             return
 
         # Check if this alert type exists
-        if alert_type not in audio_alert_state:
+        alert_types = [alert_type for alert_type in alert_types if alert_type in audio_alert_state]
+        if not alert_types:
             return
 
         # Count items in board with this alert type
-        current_time = time.time()
-        has_items = False
-
-        if alert_type == 'delay':
-            # Check delay board
-            delay_threshold = delay_settings.get('threshold', 180)
-            for key, bid_info in bid_tracking.items():
-                delay_duration = current_time - bid_info['last_change_time']
-                if delay_duration >= delay_threshold:
-                    has_items = True
-                    break
-        else:
-            # Check alert board for gap/spike (exclude hidden items)
-            for key, alert_info in alert_board.items():
-                result = alert_info.get('data', {})
-                broker = result.get('broker', '')
-                symbol = result.get('symbol', '')
-
-                # Skip hidden items
-                if is_alert_hidden(broker, symbol):
-                    continue
-
-                if alert_type == 'gap' and result.get('gap', {}).get('detected', False):
-                    has_items = True
-                    break
-                elif alert_type == 'spike' and result.get('spike', {}).get('detected', False):
-                    has_items = True
-                    break
-
-        # Get state
-        state = audio_alert_state[alert_type]
-        board_had_items = state['board_had_items']
-        last_alert_time = state['last_alert_time']
-
-        # Determine if we should play alert
-        should_play = False
-
-        if has_items:
-            if not board_had_items:
-                # Board was empty, now has items -> Play alert
-                should_play = True
-                logger.info(f"Board alert: {alert_type} - First detection (board was empty)")
-            elif current_time - last_alert_time >= AUDIO_ALERT_REPEAT_INTERVAL:
-                # Board has items for 3+ minutes -> Play alert again
-                should_play = True
-                logger.info(f"Board alert: {alert_type} - Repeat after {AUDIO_ALERT_REPEAT_INTERVAL}s")
-
-        # Update state
-        state['board_had_items'] = has_items
-
-        # Play audio if needed
-        if should_play:
-            state['last_alert_time'] = current_time
-            _play_audio_for_type(alert_type)
+        current_time = clock()
+        presence = board_alert_presence(alert_types)
+
+        for alert_type in alert_types:
+            has_items = presence[alert_type]
+
+            # Get state
+            state = audio_alert_state[alert_type]
+            board_had_items = state['board_had_items']
+            last_alert_time = state['last_alert_time']
+
+            # Determine if we should play alert
+            should_play = False
+
+            if has_items:
+                if not board_had_items:
+                    # Board was empty, now has items -> Play alert
+                    should_play = True
+                    logger.info(f"Board alert: {alert_type} - First detection (board was empty)")
+                elif current_time - last_alert_time >= AUDIO_ALERT_REPEAT_INTERVAL:
+                    # Board has items for 3+ minutes -> Play alert again
+                    should_play = True
+                    logger.info(f"Board alert: {alert_type} - Repeat after {AUDIO_ALERT_REPEAT_INTERVAL}s")
+
+            # Update state
+            state['board_had_items'] = has_items
+
+            # Play audio if needed
+            if should_play:
+                state['last_alert_time'] = current_time
+                _play_audio_for_type(alert_type)
 
     except Exception as e:
         logger.error(f"Error checking board alert: {e}")
@@ -1304,71 +2717,584 @@ def reset_audio_tracking():
     audio_played_tracking.clear()
     logger.info("Audio tracking reset - all sounds can be played again")
 
+# ===================== SETTINGS STORE =====================
+# Tùy chọn: lưu settings theo từng key thay vì ghi lại toàn bộ file JSON mỗi lần sửa
+# - Mỗi key của settings = 1 dòng (namespace, key, value JSON) → sửa 1 ngưỡng chỉ ghi 1 dòng
+# - gap_settings/spike_settings/custom_thresholds (ObservedSettings): chỉ ghi các key đã báo thay đổi
+#   Settings khác: so với nội dung đã ghi lần trước, chỉ ghi dòng khác
+# - Lần đầu bật: settings chưa có trong store được đọc từ file JSON cũ rồi import vào store
+# - Import/export qua lại với file JSON: migrate_settings.py
+# Backend (settings_store.json):
+# - 'sqlite':  1 file SQLite (WAL), upsert từng dòng          {"backend": "sqlite", "path": "settings.db"}
+# - 'journal': append từng thay đổi vào file journal (fsync theo lô), background compact thành snapshot
+#              {"backend": "journal", "journal_folder": "settings_journal"}
+settings_store_settings = {
+    'backend': 'json',  # 'json' (file JSON như cũ) | 'sqlite' | 'journal'
+    'path': 'settings.db',
+    'journal_folder': 'settings_journal',
+    'journal_fsync_interval': 1.0,  # Giây - fsync các dòng journal đã ghi theo lô
+    'journal_compact_interval': 300,  # Giây - chu kỳ kiểm tra compact journal → snapshot
+    'journal_compact_min_kb': 256  # Chỉ compact khi journal lớn hơn mức này
+}
+
+SETTINGS_STORE_FILE = 'settings_store.json'
+SETTINGS_STORE_BACKENDS = ('json', 'sqlite', 'journal')
+
+# Namespace trong store → file JSON tương ứng (import/export)
+# split: field dạng dict lưu mỗi key con 1 dòng (vd selection của từng broker)
+SETTINGS_STORE_NAMESPACES = {
+    'gap_settings': {'file': 'gap_settings.json'},
+    'spike_settings': {'file': 'spike_settings.json'},
+    'custom_thresholds': {'file': 'custom_thresholds.json'},
+    'product_delay_settings': {'file': 'product_delay_settings.json'},
+    'hidden_products': {'file': 'hidden_products.json'},
+    'manual_hidden_delays': {'file': 'manual_hidden_delays.json'},
+    'hidden_alert_items': {'file': 'hidden_alert_items.json'},
+    'symbol_filter_settings': {'file': SYMBOL_FILTER_FILE, 'split': ('selection',)},
+}
+
+# Settings là ObservedSettings → store chỉ ghi các key đã báo thay đổi
+OBSERVED_SETTINGS_NAMESPACES = ('gap_settings', 'spike_settings', 'custom_thresholds')
+
+class SettingsStoreBase:
+    """
+    Phần chung của các backend: settings → các dòng {key: value JSON}, mỗi lần save chỉ ghi dòng đổi
+
+    Backend cài _read(namespace) và _write(namespace, upserts, removed, replace)
+    (_write được gọi khi đang giữ self._lock)
+    read_only: công cụ offline (replay, audit) đọc settings của server, save() không ghi gì
+    """
+
+    WHOLE_VALUE_KEY = ''  # Settings không phải dict (vd hidden_products là list) → 1 dòng
+
+    def __init__(self, tracked=(), read_only=False):
+        self.tracked = set(tracked)  # Namespace báo key đổi qua mark_dirty()
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._synced = {}  # {namespace: {key: value JSON}} - nội dung đang có trong store
+        self._dirty = {}   # {namespace: set(key)} - key đã báo thay đổi, None = so toàn bộ
+        self.stats = {'upserts': 0, 'deletes': 0, 'saves': 0}
+
+    def close(self):
+        pass
+
+    def has_namespace(self, namespace):
+        with self._lock:
+            return self._read(namespace) is not None
+
+    def load(self, namespace, split=()):
+        """
+        Returns:
+            dict/list đã lưu, None nếu namespace chưa có trong store
+        """
+        with self._lock:
+            rows = self._read(namespace)
+            if rows is None:
+                return None
+            self._synced[namespace] = dict(rows)
+            self._reset_dirty(namespace)
+        if len(rows) == 1 and rows[0][0] == self.WHOLE_VALUE_KEY:
+            return json.loads(rows[0][1])
+        data = {}
+        for key, value in rows:
+            field, separator, sub_key = key.partition('/')
+            if separator and field in split:
+                group = data.setdefault(field, {})
+                if sub_key:
+                    group[sub_key] = json.loads(value)
+            else:
+                data[key] = json.loads(value)
+        return data
+
+    def _reset_dirty(self, namespace):
+        # Chỉ settings báo thay đổi qua listener (ObservedSettings) mới ghi theo key đổi
+        self._dirty[namespace] = set() if namespace in self.tracked else None
+
+    def mark_dirty(self, namespace, keys):
+        """Listener của ObservedSettings: ghi nhớ key đổi để lần save sau chỉ ghi các dòng này"""
+        with self._lock:
+            dirty = self._dirty.get(namespace)
+            if dirty is None:
+                return  # Chưa đồng bộ / không theo dõi → lần save sau so toàn bộ
+            if keys is None:
+                self._dirty[namespace] = None
+            else:
+                dirty.update(keys)
+
+    def _rows(self, data, split, keys=None):
+        """{key: value JSON} của các key cần ghi (keys=None → tất cả)"""
+        if not isinstance(data, dict):
+            return {self.WHOLE_VALUE_KEY: json.dumps(data, ensure_ascii=False)}
+        rows = {}
+        for key in (data if keys is None else keys):
+            if key not in data:
+                continue
+            value = data[key]
+            if key in split and isinstance(value, dict):
+                rows[f"{key}/"] = '{}'  # Giữ field kể cả khi rỗng
+                for sub_key, sub_value in value.items():
+                    rows[f"{key}/{sub_key}"] = json.dumps(sub_value, ensure_ascii=False)
+            else:
+                rows[key] = json.dumps(value, ensure_ascii=False)
+        return rows
+
+    def save(self, namespace, data, split=()):
+        """
+        Ghi settings - chỉ các dòng khác với store
+
+        Returns:
+            tuple: (số dòng upsert, số dòng xóa)
+        """
+        if self.read_only:
+            return 0, 0
+        with self._lock:
+            synced = self._synced.get(namespace)
+            dirty = self._dirty.get(namespace)
+            if synced is None:
+                # Chưa đọc/ghi namespace trong phiên này → thay toàn bộ dòng cũ
+                upserts = list(self._rows(data, split).items())
+                removed = []
+            elif dirty is not None and isinstance(data, dict) and not split:
+                # ⚡ Chỉ các key đã báo thay đổi (O(số key đổi), không phụ thuộc số broker/symbol)
+                rows = self._rows(data, split, dirty)
+                upserts = [(key, value) for key, value in rows.items() if synced.get(key) != value]
+                removed = [key for key in dirty if key not in data and key in synced]
+            else:
+                rows = self._rows(data, split)
+                upserts = [(key, value) for key, value in rows.items() if synced.get(key) != value]
+                removed = [key for key in synced if key not in rows]
+
+            self._write(namespace, upserts, removed, synced is None)
+
+            if synced is None:
+                synced = self._synced[namespace] = {}
+            synced.update(upserts)
+            for key in removed:
+                synced.pop(key, None)
+            self._reset_dirty(namespace)
+            self.stats['upserts'] += len(upserts)
+            self.stats['deletes'] += len(removed)
+            self.stats['saves'] += 1
+            return len(upserts), len(removed)
+
+class SQLiteSettingsStore(SettingsStoreBase):
+    """Settings trong 1 file SQLite (WAL): bảng settings(namespace, key, value JSON)"""
+
+    def __init__(self, path, tracked=(), read_only=False):
+        super().__init__(tracked, read_only)
+        self.path = path
+        if read_only:
+            # mode=ro: file phải có sẵn, không tạo bảng / đổi journal_mode của file server đang dùng
+            uri = f"file:{quote(os.path.abspath(path).replace(os.sep, '/'))}?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None)
+            return
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS settings ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+            'PRIMARY KEY (namespace, key)) WITHOUT ROWID'
+        )
+        # Namespace đã từng được lưu (phân biệt "rỗng" với "chưa import")
+        self._conn.execute('CREATE TABLE IF NOT EXISTS namespaces (namespace TEXT PRIMARY KEY)')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _read(self, namespace):
+        if self._conn.execute('SELECT 1 FROM namespaces WHERE namespace = ?', (namespace,)).fetchone() is None:
+            return None
+        return self._conn.execute('SELECT key, value FROM settings WHERE namespace = ?', (namespace,)).fetchall()
+
+    def _write(self, namespace, upserts, removed, replace):
+        """1 transaction: upsert/xóa các dòng đổi"""
+        self._conn.execute('BEGIN')
+        try:
+            self._conn.execute('INSERT OR IGNORE INTO namespaces (namespace) VALUES (?)', (namespace,))
+            if replace:
+                self._conn.execute('DELETE FROM settings WHERE namespace = ?', (namespace,))
+            self._conn.executemany(
+                'INSERT INTO settings (namespace, key, value) VALUES (?, ?, ?) '
+                'ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value',
+                [(namespace, key, value) for key, value in upserts]
+            )
+            self._conn.executemany('DELETE FROM settings WHERE namespace = ? AND key = ?',
+                                   [(namespace, key) for key in removed])
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+
+class SettingsJournal(SettingsStoreBase):
+    """
+    Settings dạng append-only: mỗi thay đổi = 1 dòng JSON nhỏ trong settings.journal
+      ["r", namespace]              - tạo/thay toàn bộ namespace
+      ["s", namespace, key, value]  - đặt 1 key
+      ["d", namespace, key]         - xóa 1 key
+    - Ghi + flush ngay, fsync theo lô (background mỗi fsync_interval, hoặc khi dồn quá FSYNC_BATCH_BYTES)
+    - Background compact: ghi toàn bộ settings ra settings.snapshot (file tạm → os.replace) rồi xóa journal
+    - Khởi động: replay snapshot + journal; dòng cuối ghi dở (crash) bị cắt bỏ
+      → không còn trường hợp file JSON ghi dở làm hỏng toàn bộ settings
+    """
+
+    JOURNAL_FILE = 'settings.journal'
+    SNAPSHOT_FILE = 'settings.snapshot'
+    FSYNC_BATCH_BYTES = 64 * 1024
+
+    def __init__(self, folder, tracked=(), fsync_interval=1.0, compact_interval=300, compact_min_bytes=256 * 1024,
+                 read_only=False):
+        super().__init__(tracked, read_only)
+        if read_only and not os.path.isdir(folder):
+            raise FileNotFoundError(folder)
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.journal_path = os.path.join(folder, self.JOURNAL_FILE)
+        self.snapshot_path = os.path.join(folder, self.SNAPSHOT_FILE)
+        self.fsync_interval = fsync_interval
+        self.compact_interval = compact_interval
+        self.compact_min_bytes = compact_min_bytes
+        self.stats.update({'bytes': 0, 'fsyncs': 0, 'compactions': 0, 'replayed': 0, 'truncated': 0})
+        self._unsynced_bytes = 0
+        # Journal là nguồn sự thật → nội dung đã replay chính là nội dung store
+        self._replay(self.snapshot_path)
+        # read_only: server có thể đang ghi dở dòng cuối → bỏ qua, không cắt file
+        self._replay(self.journal_path, truncate_partial=not read_only)
+        self._file = None if read_only else open(self.journal_path, 'ab')
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------- Replay ----------
+    def _apply(self, record):
+        op, namespace = record[0], record[1]
+        if op == 'r':
+            self._synced[namespace] = {}
+        elif op == 's':
+            self._synced.setdefault(namespace, {})[record[2]] = json.dumps(record[3], ensure_ascii=False)
+        elif op == 'd':
+            self._synced.get(namespace, {}).pop(record[2], None)
+
+    def _replay(self, path, truncate_partial=False):
+        if not os.path.exists(path):
+            return
+        good_offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if not line.endswith(b'\n'):
+                        raise ValueError("incomplete line")
+                    self._apply(record)
+                except (ValueError, IndexError, TypeError) as e:
+                    logger.error(f"Settings journal {path}: bỏ dữ liệu hỏng từ byte {good_offset} ({e})")
+                    break
+                good_offset += len(line)
+                self.stats['replayed'] += 1
+        if truncate_partial and good_offset < os.path.getsize(path):
+            # Dòng ghi dở lúc crash → cắt để các dòng ghi sau không bị dính vào
+            self.stats['truncated'] += os.path.getsize(path) - good_offset
+            with open(path, 'r+b') as f:
+                f.truncate(good_offset)
+
+    # ---------- Ghi ----------
+    def _read(self, namespace):
+        rows = self._synced.get(namespace)
+        return None if rows is None else list(rows.items())
+
+    @staticmethod
+    def _record(op, namespace, key=None, value=None):
+        if op == 'r':
+            return json.dumps([op, namespace], ensure_ascii=False) + '\n'
+        if op == 'd':
+            return json.dumps([op, namespace, key], ensure_ascii=False) + '\n'
+        # value đã là JSON → ghép thẳng, không encode lại
+        return json.dumps([op, namespace, key], ensure_ascii=False)[:-1] + ', ' + value + ']\n'
+
+    def _write(self, namespace, upserts, removed, replace):
+        lines = [self._record('r', namespace)] if replace else []
+        lines.extend(self._record('s', namespace, key, value) for key, value in upserts)
+        lines.extend(self._record('d', namespace, key) for key in removed)
+        if not lines:
+            return
+        data = ''.join(lines).encode('utf-8')
+        self._file.write(data)
+        self._file.flush()
+        self._unsynced_bytes += len(data)
+        self.stats['bytes'] += len(data)
+        if self._unsynced_bytes >= self.FSYNC_BATCH_BYTES:
+            self._fsync()
+
+    def _fsync(self):
+        if self._unsynced_bytes:
+            os.fsync(self._file.fileno())
+            self._unsynced_bytes = 0
+            self.stats['fsyncs'] += 1
+
+    def sync(self):
+        """fsync các dòng đã ghi (gọi định kỳ từ background thread)"""
+        with self._lock:
+            self._fsync()
+
+    def journal_size(self):
+        with self._lock:
+            return self._file.tell()
+
+    def compact(self):
+        """Ghi toàn bộ settings ra snapshot (atomic) rồi xóa journal"""
+        with self._lock:
+            self._fsync()
+            temp_path = self.snapshot_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8', newline='\n') as f:
+                for namespace, rows in self._synced.items():
+                    f.write(self._record('r', namespace))
+                    for key, value in rows.items():
+                        f.write(self._record('s', namespace, key, value))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            # Crash trước dòng này: replay journal cũ trên snapshot mới vẫn ra đúng nội dung
+            self._file.seek(0)
+            self._file.truncate()
+            os.fsync(self._file.fileno())
+            self.stats['compactions'] += 1
+        logger.info(f"Compacted settings journal → {self.snapshot_path}")
+
+    # ---------- Background ----------
+    def start(self):
+        if self.read_only or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._maintenance_loop, name="SettingsJournal", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        thread = self._thread
+        self._thread = None
+        if thread is not None:
+            thread.join(timeout)
+
+    def _maintenance_loop(self):
+        last_compact = time.time()
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                self.sync()
+                if time.time() - last_compact >= self.compact_interval:
+                    last_compact = time.time()
+                    if self.journal_size() >= self.compact_min_bytes:
+                        self.compact()
+            except Exception as e:
+                logger.error(f"Settings journal maintenance error: {e}")
+
+    def close(self):
+        self.stop()
+        if self._file is None:
+            return
+        with self._lock:
+            self._fsync()
+            self._file.close()
+
+settings_store = None  # SQLiteSettingsStore / SettingsJournal khi backend không phải 'json'
+
+def load_settings_store_settings():
+    """Load settings_store.json (backend json/sqlite/journal)"""
+    try:
+        if os.path.exists(SETTINGS_STORE_FILE):
+            with open(SETTINGS_STORE_FILE, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    settings_store_settings.update(loaded)
+        if settings_store_settings.get('backend') not in SETTINGS_STORE_BACKENDS:
+            logger.error(f"Unknown settings store backend {settings_store_settings.get('backend')!r}, using 'json'")
+            settings_store_settings['backend'] = 'json'
+        logger.info(f"Settings store: {settings_store_settings['backend']}")
+    except Exception as e:
+        logger.error(f"Error loading settings store settings: {e}")
+
+def save_settings_store_settings():
+    """Save settings_store.json"""
+    try:
+        with open(SETTINGS_STORE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(settings_store_settings, f, ensure_ascii=False, indent=2)
+        logger.info(f"Saved settings store settings: backend={settings_store_settings['backend']}")
+    except Exception as e:
+        logger.error(f"Error saving settings store settings: {e}")
+
+def open_settings_store(path=None, backend=None, read_only=False):
+    """
+    Mở settings store (gọi trước các load_*_settings) - None nếu backend là 'json' hoặc mở lỗi
+
+    Args:
+        path: File SQLite / folder journal (mặc định theo settings_store_settings)
+        backend: 'sqlite' | 'journal' (mặc định: 'sqlite' nếu truyền path, không thì theo settings)
+        read_only: Công cụ offline đọc settings của server: không import file JSON, không ghi,
+            không cắt/compact journal
+    """
+    global settings_store
+    if backend is None:
+        backend = 'sqlite' if path is not None else settings_store_settings.get('backend')
+    if backend not in ('sqlite', 'journal'):
+        return None
+    try:
+        if backend == 'sqlite':
+            path = path or settings_store_settings.get('path') or 'settings.db'
+            settings_store = SQLiteSettingsStore(path, tracked=OBSERVED_SETTINGS_NAMESPACES, read_only=read_only)
+            logger.info(f"✅ Settings store: SQLite {path} ({'read-only' if read_only else 'WAL'})")
+        else:
+            path = path or settings_store_settings.get('journal_folder') or 'settings_journal'
+            settings_store = SettingsJournal(
+                path, tracked=OBSERVED_SETTINGS_NAMESPACES,
+                fsync_interval=float(settings_store_settings.get('journal_fsync_interval', 1.0)),
+                compact_interval=float(settings_store_settings.get('journal_compact_interval', 300)),
+                compact_min_bytes=int(settings_store_settings.get('journal_compact_min_kb', 256)) * 1024,
+                read_only=read_only
+            )
+            settings_store.start()
+            logger.info(f"✅ Settings store: journal {path} "
+                        f"({settings_store.stats['replayed']} records replayed)")
+    except Exception as e:
+        logger.error(f"Error opening settings store {path}: {e} - dùng file JSON")
+        settings_store = None
+    return settings_store
+
+def close_settings_store():
+    global settings_store
+    if settings_store is not None:
+        settings_store.close()
+        settings_store = None
+
+def on_store_settings_changed(name, keys):
+    """Listener của ObservedSettings: key đổi → lần save sau chỉ ghi các dòng này"""
+    store = settings_store
+    if store is not None and name in SETTINGS_STORE_NAMESPACES:
+        store.mark_dirty(name, keys)
+
+add_settings_listener(on_store_settings_changed)
+
+def load_settings_json(namespace, path):
+    """
+    Đọc settings: settings store (nếu bật) → file JSON
+    Lần đầu bật store: namespace chưa có trong store → đọc file JSON rồi import vào store
+
+    Returns:
+        dict/list đã lưu, None nếu chưa có
+    """
+    store = settings_store
+    split = SETTINGS_STORE_NAMESPACES.get(namespace, {}).get('split', ())
+    if store is not None:
+        data = store.load(namespace, split)
+        if data is not None:
+            return data
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if store is not None:
+        try:
+            store.save(namespace, data, split)
+            logger.info(f"Imported {path} into settings store ({namespace})")
+        except Exception as e:
+            logger.error(f"Error importing {path} into settings store: {e}")
+    return data
+
+def save_settings_json(namespace, path, data):
+    """Ghi settings: settings store (chỉ các dòng đổi) hoặc ghi lại toàn bộ file JSON"""
+    # Ghi từ bản copy: timer ghi file chạy song song với GUI/ingest đang sửa settings
+    if isinstance(data, ObservedSettings):
+        data = data.snapshot()
+    elif isinstance(data, dict):
+        data = dict(data)
+    elif isinstance(data, list):
+        data = list(data)
+    store = settings_store
+    if store is not None:
+        store.save(namespace, data, SETTINGS_STORE_NAMESPACES.get(namespace, {}).get('split', ()))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def import_json_settings(store, folder='.'):
+    """Import các file JSON settings vào store (ghi đè nội dung trong store)"""
+    imported = []
+    for namespace, spec in SETTINGS_STORE_NAMESPACES.items():
+        path = os.path.join(folder, spec['file'])
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            store.save(namespace, json.load(f), spec.get('split', ()))
+        imported.append(namespace)
+    return imported
+
+def export_json_settings(store, folder='.'):
+    """Export settings trong store ra các file JSON (format như khi dùng backend 'json')"""
+    exported = []
+    for namespace, spec in SETTINGS_STORE_NAMESPACES.items():
+        data = store.load(namespace, spec.get('split', ()))
+        if data is None:
+            continue
+        with open(os.path.join(folder, spec['file']), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        exported.append(namespace)
+    return exported
+
 # ===================== LOAD/SAVE SETTINGS =====================
 def load_gap_settings():
     """Load gap settings from JSON file"""
-    global gap_settings, threshold_cache
     try:
-        if os.path.exists('gap_settings.json'):
-            with open('gap_settings.json', 'r', encoding='utf-8') as f:
-                gap_settings = json.load(f)
-                logger.info(f"Loaded {len(gap_settings)} gap settings")
+        loaded = load_settings_json('gap_settings', 'gap_settings.json')
+        if loaded is not None:
+            # ⚡ Thay tại chỗ → threshold_table chỉ bỏ các ngưỡng có key thay đổi
+            gap_settings.replace(loaded)
+            logger.info(f"Loaded {len(gap_settings)} gap settings")
         else:
             # Default settings
-            gap_settings = {
+            gap_settings.replace({
                 "EURUSD": DEFAULT_GAP_THRESHOLD,
                 "GBPUSD": DEFAULT_GAP_THRESHOLD,
                 "USDJPY": DEFAULT_GAP_THRESHOLD,
                 "BTCUSD": 700,
                 "XAUUSD": 5
-            }
+            })
             save_gap_settings()
-
-        # ⚡ OPTIMIZATION: Clear threshold cache when settings reload
-        threshold_cache.clear()
     except Exception as e:
         logger.error(f"Error loading gap settings: {e}")
-        gap_settings = {}
+        gap_settings.replace({})
 
 def save_gap_settings():
-    """Save gap settings to JSON file"""
+    """Save gap settings to JSON file (hoặc settings store)"""
     try:
-        with open('gap_settings.json', 'w', encoding='utf-8') as f:
-            json.dump(gap_settings, f, ensure_ascii=False, indent=2)
+        save_settings_json('gap_settings', 'gap_settings.json', gap_settings)
         logger.info("Gap settings saved")
     except Exception as e:
         logger.error(f"Error saving gap settings: {e}")
 
 def load_spike_settings():
     """Load spike settings from JSON file"""
-    global spike_settings, threshold_cache
     try:
-        if os.path.exists('spike_settings.json'):
-            with open('spike_settings.json', 'r', encoding='utf-8') as f:
-                spike_settings = json.load(f)
-                logger.info(f"Loaded {len(spike_settings)} spike settings")
+        loaded = load_settings_json('spike_settings', 'spike_settings.json')
+        if loaded is not None:
+            # ⚡ Thay tại chỗ → threshold_table chỉ bỏ các ngưỡng có key thay đổi
+            spike_settings.replace(loaded)
+            logger.info(f"Loaded {len(spike_settings)} spike settings")
         else:
             # Default settings
-            spike_settings = {
+            spike_settings.replace({
                 "EURUSD": DEFAULT_SPIKE_THRESHOLD,
                 "GBPUSD": DEFAULT_SPIKE_THRESHOLD,
                 "USDJPY": DEFAULT_SPIKE_THRESHOLD,
                 "BTCUSD": DEFAULT_SPIKE_THRESHOLD,
                 "XAUUSD": DEFAULT_SPIKE_THRESHOLD
-            }
+            })
             save_spike_settings()
-
-        # ⚡ OPTIMIZATION: Clear threshold cache when settings reload
-        threshold_cache.clear()
     except Exception as e:
         logger.error(f"Error loading spike settings: {e}")
-        spike_settings = {}
+        spike_settings.replace({})
 
 def save_spike_settings():
-    """Save spike settings to JSON file"""
+    """Save spike settings to JSON file (hoặc settings store)"""
     try:
-        with open('spike_settings.json', 'w', encoding='utf-8') as f:
-            json.dump(spike_settings, f, ensure_ascii=False, indent=2)
+        save_settings_json('spike_settings', 'spike_settings.json', spike_settings)
         logger.info("Spike settings saved")
     except Exception as e:
         logger.error(f"Error saving spike settings: {e}")
@@ -1377,30 +3303,28 @@ def load_manual_hidden_delays():
     """Load manual hidden delays from JSON file"""
     global manual_hidden_delays
     try:
-        if os.path.exists('manual_hidden_delays.json'):
-            with open('manual_hidden_delays.json', 'r', encoding='utf-8') as f:
-                manual_hidden_delays = json.load(f)
+        loaded = load_settings_json('manual_hidden_delays', 'manual_hidden_delays.json')
+        if loaded is not None:
+            manual_hidden_delays = loaded
             logger.info(f"Loaded {len(manual_hidden_delays)} manual hidden delays")
     except Exception as e:
         logger.error(f"Error loading manual hidden delays: {e}")
         manual_hidden_delays = {}
 
 def save_manual_hidden_delays():
-    """Save manual hidden delays to JSON file"""
+    """Save manual hidden delays to JSON file (hoặc settings store)"""
     try:
-        with open('manual_hidden_delays.json', 'w', encoding='utf-8') as f:
-            json.dump(manual_hidden_delays, f, ensure_ascii=False, indent=2)
+        save_settings_json('manual_hidden_delays', 'manual_hidden_delays.json', manual_hidden_delays)
         logger.info(f"Saved {len(manual_hidden_delays)} manual hidden delays")
     except Exception as e:
         logger.error(f"Error saving manual hidden delays: {e}")
 
 def load_custom_thresholds():
     """Load custom thresholds from JSON file and apply to gap/spike settings"""
-    global custom_thresholds, gap_settings, spike_settings
     try:
-        if os.path.exists('custom_thresholds.json'):
-            with open('custom_thresholds.json', 'r', encoding='utf-8') as f:
-                custom_thresholds = json.load(f)
+        loaded = load_settings_json('custom_thresholds', 'custom_thresholds.json')
+        if loaded is not None:
+            custom_thresholds.replace(loaded)
             logger.info(f"Loaded {len(custom_thresholds)} custom thresholds")
 
             # Apply custom thresholds to gap_settings and spike_settings
@@ -1412,16 +3336,15 @@ def load_custom_thresholds():
 
             logger.info(f"Applied custom thresholds to gap_settings and spike_settings")
         else:
-            custom_thresholds = {}
+            custom_thresholds.replace({})
     except Exception as e:
         logger.error(f"Error loading custom thresholds: {e}")
-        custom_thresholds = {}
+        custom_thresholds.replace({})
 
 def save_custom_thresholds():
-    """Save custom thresholds to JSON file"""
+    """Save custom thresholds to JSON file (hoặc settings store)"""
     try:
-        with open('custom_thresholds.json', 'w', encoding='utf-8') as f:
-            json.dump(custom_thresholds, f, ensure_ascii=False, indent=2)
+        save_settings_json('custom_thresholds', 'custom_thresholds.json', custom_thresholds)
         logger.info(f"Saved {len(custom_thresholds)} custom thresholds")
     except Exception as e:
         logger.error(f"Error saving custom thresholds: {e}")
@@ -1430,10 +3353,9 @@ def load_symbol_filter_settings():
     """Load symbol filter settings from JSON file"""
     global symbol_filter_settings
     try:
-        if os.path.exists(SYMBOL_FILTER_FILE):
-            with open(SYMBOL_FILTER_FILE, 'r', encoding='utf-8') as f:
-                loaded = json.load(f) or {}
-
+        loaded = load_settings_json('symbol_filter_settings', SYMBOL_FILTER_FILE)
+        if loaded is not None:
+            loaded = loaded or {}
             enabled = bool(loaded.get('enabled', False))
             raw_selection = loaded.get('selection', {}) or {}
             selection = {}
@@ -1464,6 +3386,7 @@ def load_symbol_filter_settings():
 
             symbol_filter_settings['enabled'] = enabled
             symbol_filter_settings['selection'] = selection
+            invalidate_symbol_filter_cache()
 
             logger.info(
                 "Loaded symbol filter settings: enabled=%s, brokers=%d",
@@ -1480,15 +3403,14 @@ def load_symbol_filter_settings():
         symbol_filter_settings['selection'] = {}
 
 def save_symbol_filter_settings():
-    """Save symbol filter settings to JSON file"""
+    """Save symbol filter settings to JSON file (hoặc settings store - mỗi broker 1 dòng)"""
     try:
         payload = {
             'enabled': bool(symbol_filter_settings.get('enabled', False)),
             'selection': symbol_filter_settings.get('selection', {}) or {}
         }
 
-        with open(SYMBOL_FILTER_FILE, 'w', encoding='utf-8') as f:
-            json.dump(payload, f, ensure_ascii=False, indent=2)
+        save_settings_json('symbol_filter_settings', SYMBOL_FILTER_FILE, payload)
 
         logger.info(
             "Saved symbol filter settings: enabled=%s, brokers=%d",
@@ -1552,78 +3474,107 @@ def is_broker_enabled(broker):
     return broker in enabled_brokers
 
 # ===================== SYMBOL FILTER HELPERS =====================
-def is_symbol_selected_for_detection(broker, symbol):
+# ⚡ symbol_filter_settings['selection'] biên dịch sẵn + quyết định đã nhớ theo (broker, symbol)
+# Tự biên dịch lại khi selection bị thay (load/lưu settings) hoặc gap_config đổi
+symbol_filter_version = 0
+compiled_symbol_filter = None
+
+def invalidate_symbol_filter_cache():
+    """Bỏ symbol filter đã biên dịch (gọi khi symbol filter settings hoặc gap_config thay đổi)"""
+    global symbol_filter_version
+    symbol_filter_version += 1
+
+class CompiledSymbolFilter:
     """
-    Return True if the symbol should be processed for Gap/Spike detection
+    Symbol filter đã biên dịch
 
-    Hỗ trợ 2 mức độ matching:
-    1. Exact match: Symbol khớp chính xác với danh sách filter
-    2. Prefix match với gap_config: Symbol có prefix khớp với bất kỳ symbol nào trong file txt
-       Ví dụ: EURUSD.ra, EURUSD.m, GBPUSD_ra đều được chấp nhận nếu EURUSD, GBPUSD có trong file txt
+    - Danh sách symbol của mỗi broker (và '*') → frozenset
+    - Prefix match với gap_config → AliasPrefixTrie (O(len(symbol)))
+    - Quyết định cho mỗi (broker, symbol) chỉ tính 1 lần
     """
-    try:
-        if not symbol_filter_settings.get('enabled', False):
-            return True
 
-        selection = symbol_filter_settings.get('selection', {}) or {}
-        if not selection:
-            # No selection stored → treat as allow all (backward compatible)
+    def __init__(self, selection, version):
+        self.selection = selection
+        self.version = version
+        self.reverse_map = gap_config_reverse_map
+        self.reverse_map_size = len(gap_config_reverse_map)
+        selection = selection or {}
+        # No selection stored → treat as allow all (backward compatible)
+        self.allow_all = not selection
+        self.broker_symbols = {broker: frozenset(symbols or ()) for broker, symbols in selection.items()}
+        self.wildcard_symbols = self.broker_symbols.get('*')
+        self.use_prefix = bool(gap_config)
+        self.prefix_trie = get_gap_config_prefix_trie() if self.use_prefix else None
+        self.has_empty_alias = '' in self.reverse_map  # ''.startswith('') → mọi symbol đều khớp
+        self.decisions = {}
+
+    def is_current(self, selection):
+        return (selection is self.selection and self.version == symbol_filter_version
+                and self.reverse_map is gap_config_reverse_map
+                and self.reverse_map_size == len(gap_config_reverse_map))
+
+    def is_selected(self, broker, symbol):
+        key = (broker, symbol)
+        decision = self.decisions.get(key)
+        if decision is None:
+            decision = self._decide(broker, symbol)
+            self.decisions[key] = decision
+        return decision
+
+    def _decide(self, broker, symbol):
+        if self.allow_all:
             return True
 
-        # Highest priority: broker specific list
-        if broker in selection:
-            broker_symbols = selection[broker]
-            if broker_symbols is None:
-                return False
-            if not broker_symbols:
-                return False
-
-            # Level 1: Try exact match first (fast)
-            if symbol in broker_symbols:
-                return True
-
-            # Level 2: Try prefix matching with gap_config (fallback)
-            # Nếu symbol có suffix (như .ra, .m, _ra), kiểm tra xem prefix có trong gap_config không
-            # Điều này cho phép EURUSD.ra, GBPUSD.m được chấp nhận nếu EURUSD, GBPUSD có trong file txt
-            if gap_config:
-                symbol_lower = symbol.lower().strip()
-                # Normalize: loại bỏ các ký tự đặc biệt để get prefix
-                symbol_normalized = re.sub(r'[^a-zA-Z0-9]', '', symbol_lower)
-
-                # Kiểm tra xem normalized symbol có bắt đầu bằng bất kỳ symbol nào trong gap_config không
-                for config_symbol_lower in gap_config_reverse_map.keys():
-                    if symbol_normalized.startswith(config_symbol_lower):
-                        # Found prefix match - symbol này có trong file txt
-                        logger.info(f"✅ Symbol filter: '{symbol}' accepted via prefix match with '{config_symbol_lower}' in gap_config")
-                        return True
-
-            # Không match cả exact và prefix
+        # Highest priority: broker specific list, fallback: wildcard '*'
+        symbols = self.broker_symbols.get(broker, self.wildcard_symbols)
+        if symbols is None:
+            # Broker not configured → allow all symbols for that broker by default
+            return True
+        if not symbols:
             return False
 
-        # Fallback: wildcard '*' if provided
-        wildcard_list = selection.get('*')
-        if wildcard_list is not None:
-            if not wildcard_list:
-                return False
-
-            # Level 1: Exact match
-            if symbol in wildcard_list:
-                return True
+        # Level 1: Exact match
+        if symbol in symbols:
+            return True
 
-            # Level 2: Prefix match with gap_config
-            if gap_config:
-                symbol_lower = symbol.lower().strip()
-                symbol_normalized = re.sub(r'[^a-zA-Z0-9]', '', symbol_lower)
+        # Level 2: Prefix match với gap_config
+        # Nếu symbol có suffix (như .ra, .m, _ra), kiểm tra xem prefix có trong gap_config không
+        # Điều này cho phép EURUSD.ra, GBPUSD.m được chấp nhận nếu EURUSD, GBPUSD có trong file txt
+        if not self.use_prefix:
+            return False
+        if self.has_empty_alias:
+            return True
+        symbol_normalized = re.sub(r'[^a-zA-Z0-9]', '', symbol.lower().strip())
+        accepted = bool(self.prefix_trie.prefixes(symbol_normalized))
+        if accepted:
+            logger.debug(f"Symbol filter: '{broker}_{symbol}' accepted via prefix match in gap_config")
+        return accepted
+
+def get_compiled_symbol_filter():
+    """Symbol filter đã biên dịch cho settings hiện tại (biên dịch lại nếu đã cũ)"""
+    global compiled_symbol_filter
+    selection = symbol_filter_settings.get('selection')
+    compiled = compiled_symbol_filter
+    if compiled is None or not compiled.is_current(selection):
+        compiled = CompiledSymbolFilter(selection, symbol_filter_version)
+        compiled_symbol_filter = compiled
+    return compiled
 
-                for config_symbol_lower in gap_config_reverse_map.keys():
-                    if symbol_normalized.startswith(config_symbol_lower):
-                        logger.info(f"✅ Symbol filter (wildcard): '{symbol}' accepted via prefix match with '{config_symbol_lower}' in gap_config")
-                        return True
+def is_symbol_selected_for_detection(broker, symbol):
+    """
+    Return True if the symbol should be processed for Gap/Spike detection
 
-            return False
+    Hỗ trợ 2 mức độ matching:
+    1. Exact match: Symbol khớp chính xác với danh sách filter
+    2. Prefix match với gap_config: Symbol có prefix khớp với bất kỳ symbol nào trong file txt
+       Ví dụ: EURUSD.ra, EURUSD.m, GBPUSD_ra đều được chấp nhận nếu EURUSD, GBPUSD có trong file txt
 
-        # Broker not configured → allow all symbols for that broker by default
-        return True
+    ⚡ Dùng CompiledSymbolFilter: mỗi (broker, symbol) chỉ tính 1 lần cho tới khi settings/gap_config đổi
+    """
+    try:
+        if not symbol_filter_settings.get('enabled', False):
+            return True
+        return get_compiled_symbol_filter().is_selected(broker, symbol)
     except Exception as e:
         logger.error(f"Error checking symbol filter for {broker}_{symbol}: {e}")
         return True
@@ -1631,7 +3582,7 @@ def is_symbol_selected_for_detection(broker, symbol):
 
 def clear_symbol_detection_results(broker, symbol):
     """Remove existing Gap/Spike results and alerts for a symbol"""
-    key = f"{broker}_{symbol}"
+    key = symbol_key(broker, symbol)
 
     if key in gap_spike_results:
         del gap_spike_results[key]
@@ -1649,7 +3600,7 @@ def cleanup_unselected_symbol_results():
     if not selection:
         return
 
-    with data_lock:
+    with all_partitions_locked('symbol_filter'):
         symbols_to_remove = []
 
         for key, result in list(gap_spike_results.items()):
@@ -1663,7 +3614,7 @@ def cleanup_unselected_symbol_results():
 
         for broker, symbol in symbols_to_remove:
             clear_symbol_detection_results(broker, symbol)
-            combined_key = f"{broker}_{symbol}"
+            combined_key = symbol_key(broker, symbol)
             bid_tracking.pop(combined_key, None)
             candle_data.pop(combined_key, None)
 
@@ -1819,9 +3770,9 @@ def load_product_delay_settings():
     """Load product-specific delay settings from JSON file"""
     global product_delay_settings
     try:
-        if os.path.exists('product_delay_settings.json'):
-            with open('product_delay_settings.json', 'r', encoding='utf-8') as f:
-                product_delay_settings = json.load(f)
+        loaded = load_settings_json('product_delay_settings', 'product_delay_settings.json')
+        if loaded is not None:
+            product_delay_settings = loaded
             logger.info(f"Loaded product delay settings: {len(product_delay_settings)} products configured")
         else:
             logger.info("No product_delay_settings.json found, using defaults")
@@ -1829,10 +3780,9 @@ def load_product_delay_settings():
         logger.error(f"Error loading product delay settings: {e}")
 
 def save_product_delay_settings():
-    """Save product-specific delay settings to JSON file"""
+    """Save product-specific delay settings to JSON file (hoặc settings store)"""
     try:
-        with open('product_delay_settings.json', 'w', encoding='utf-8') as f:
-            json.dump(product_delay_settings, f, ensure_ascii=False, indent=2)
+        save_settings_json('product_delay_settings', 'product_delay_settings.json', product_delay_settings)
         logger.info(f"Saved product delay settings: {len(product_delay_settings)} products configured")
     except Exception as e:
         logger.error(f"Error saving product delay settings: {e}")
@@ -1841,9 +3791,9 @@ def load_hidden_products():
     """Load hidden products list from JSON file"""
     global hidden_products
     try:
-        if os.path.exists('hidden_products.json'):
-            with open('hidden_products.json', 'r', encoding='utf-8') as f:
-                hidden_products = json.load(f)
+        loaded = load_settings_json('hidden_products', 'hidden_products.json')
+        if loaded is not None:
+            hidden_products = loaded
             logger.info(f"Loaded hidden products: {len(hidden_products)} products hidden")
         else:
             logger.info("No hidden_products.json found, using defaults")
@@ -1851,10 +3801,9 @@ def load_hidden_products():
         logger.error(f"Error loading hidden products: {e}")
 
 def save_hidden_products():
-    """Save hidden products list to JSON file"""
+    """Save hidden products list to JSON file (hoặc settings store)"""
     try:
-        with open('hidden_products.json', 'w', encoding='utf-8') as f:
-            json.dump(hidden_products, f, ensure_ascii=False, indent=2)
+        save_settings_json('hidden_products', 'hidden_products.json', hidden_products)
         logger.info(f"Saved hidden products: {len(hidden_products)} products hidden")
     except Exception as e:
         logger.error(f"Error saving hidden products: {e}")
@@ -1988,15 +3937,14 @@ def load_hidden_alert_items():
     """Load hidden alert items from JSON file"""
     global hidden_alert_items
     try:
-        if os.path.exists('hidden_alert_items.json'):
-            with open('hidden_alert_items.json', 'r', encoding='utf-8') as f:
-                loaded = json.load(f)
-                # Clean up expired items
-                current_time = time.time()
-                hidden_alert_items = {
-                    key: value for key, value in loaded.items()
-                    if value.get('hidden_until') is None or value['hidden_until'] > current_time
-                }
+        loaded = load_settings_json('hidden_alert_items', 'hidden_alert_items.json')
+        if loaded is not None:
+            # Clean up expired items
+            current_time = time.time()
+            hidden_alert_items = {
+                key: value for key, value in loaded.items()
+                if value.get('hidden_until') is None or value['hidden_until'] > current_time
+            }
             logger.info(f"Loaded {len(hidden_alert_items)} hidden alert items")
         else:
             hidden_alert_items = {}
@@ -2005,17 +3953,16 @@ def load_hidden_alert_items():
         hidden_alert_items = {}
 
 def save_hidden_alert_items():
-    """Save hidden alert items to JSON file"""
+    """Save hidden alert items to JSON file (hoặc settings store)"""
     try:
-        with open('hidden_alert_items.json', 'w', encoding='utf-8') as f:
-            json.dump(hidden_alert_items, f, ensure_ascii=False, indent=2)
+        save_settings_json('hidden_alert_items', 'hidden_alert_items.json', hidden_alert_items)
         logger.info(f"Saved {len(hidden_alert_items)} hidden alert items")
     except Exception as e:
         logger.error(f"Error saving hidden alert items: {e}")
 
 def is_alert_hidden(broker, symbol):
     """Check if an alert item is currently hidden"""
-    key = f"{broker}_{symbol}"
+    key = symbol_key(broker, symbol)
     if key not in hidden_alert_items:
         return False
 
@@ -2045,7 +3992,7 @@ def hide_alert_item(broker, symbol, duration_minutes=None):
         symbol: Symbol name
         duration_minutes: Duration in minutes, or None for permanent hide
     """
-    key = f"{broker}_{symbol}"
+    key = symbol_key(broker, symbol)
 
     if duration_minutes is None:
         # Permanent hide
@@ -2075,11 +4022,14 @@ def hide_alert_item(broker, symbol, duration_minutes=None):
 
 def unhide_alert_item(broker, symbol):
     """Unhide an alert item"""
-    key = f"{broker}_{symbol}"
+    return unhide_alert_key(symbol_key(broker, symbol))
+
+def unhide_alert_key(key):
+    """Unhide an alert item by its broker_symbol key (key đọc từ file, broker có thể chưa kết nối)"""
     if key in hidden_alert_items:
         del hidden_alert_items[key]
         save_hidden_alert_items()
-        logger.info(f"Unhidden alert: {broker} {symbol}")
+        logger.info(f"Unhidden alert: {key}")
         return True
     return False
 
@@ -2130,19 +4080,18 @@ def capture_chart_screenshot(broker, symbol, detection_type, gap_info=None, spik
         ensure_pictures_folder()
         
         # Get candle data
-        key = f"{broker}_{symbol}"
-        with data_lock:
-            candles = candle_data.get(key, [])
-            if not candles:
-                logger.warning(f"No candle data for screenshot: {key}")
-                return
-            
-            # Get current bid/ask
-            bid = 0
-            ask = 0
-            if broker in market_data and symbol in market_data[broker]:
-                bid = market_data[broker][symbol].get('bid', 0)
-                ask = market_data[broker][symbol].get('ask', 0)
+        key = symbol_key(broker, symbol)
+        candles = candle_data.get(key, [])
+        if not candles:
+            logger.warning(f"No candle data for screenshot: {key}")
+            return
+        
+        # Get current bid/ask
+        bid = 0
+        ask = 0
+        if broker in market_data and symbol in market_data[broker]:
+            bid = market_data[broker][symbol].get('bid', 0)
+            ask = market_data[broker][symbol].get('ask', 0)
         
         # Create figure with Agg backend (non-interactive, thread-safe)
         fig = Figure(figsize=(12, 6), facecolor='#1e1e1e')
@@ -2276,25 +4225,32 @@ def capture_chart_screenshot(broker, symbol, detection_type, gap_info=None, spik
         logger.error(f"Error capturing screenshot: {e}", exc_info=True)
 
 # ===================== ALERT BOARD MANAGEMENT =====================
-def update_alert_board(key, result):
-    """Update Alert Board (Bảng Kèo) với logic xóa sau 15s"""
+def update_alert_board(key, result, board=None):
+    """
+    Update Alert Board (Bảng Kèo) với logic xóa sau 15s
+
+    board: dict alert_board của partition broker (mặc định: alert_board global)
+    """
+    if board is None:
+        board = alert_board
+
     gap_detected = result.get('gap', {}).get('detected', False)
     spike_detected = result.get('spike', {}).get('detected', False)
     is_alert = gap_detected or spike_detected
     
-    current_time = time.time()
+    current_time = clock()
     
     if is_alert:
         # Có alert → Thêm hoặc cập nhật vào bảng kèo
-        if key in alert_board:
+        if key in board:
             # Đã có trong bảng → Cập nhật data và reset grace period
-            alert_board[key]['data'] = result
-            alert_board[key]['last_detected_time'] = current_time
-            alert_board[key]['grace_period_start'] = None
+            board[key]['data'] = result
+            board[key]['last_detected_time'] = current_time
+            board[key]['grace_period_start'] = None
             # Keep screenshot_captured flag (don't reset it)
         else:
             # Chưa có → Thêm mới
-            alert_board[key] = {
+            board[key] = {
                 'data': result,
                 'last_detected_time': current_time,
                 'grace_period_start': None,
@@ -2302,7 +4258,7 @@ def update_alert_board(key, result):
             }
         
         # Capture screenshot - CHỈ nếu chưa chụp
-        if not alert_board[key]['screenshot_captured']:
+        if not board[key]['screenshot_captured']:
             try:
                 # Check if screenshot is enabled
                 if not screenshot_settings.get('enabled', True):
@@ -2333,174 +4289,187 @@ def update_alert_board(key, result):
                 )
 
                 # Mark as captured
-                alert_board[key]['screenshot_captured'] = True
+                board[key]['screenshot_captured'] = True
                 logger.info(f"Screenshot queued for {key} ({detection_type})")
                 
             except Exception as e:
                 logger.error(f"Error starting screenshot thread: {e}")
     else:
         # Không còn alert
-        if key in alert_board:
+        if key in board:
             # Bắt đầu grace period nếu chưa có
-            if alert_board[key]['grace_period_start'] is None:
-                alert_board[key]['grace_period_start'] = current_time
+            if board[key]['grace_period_start'] is None:
+                board[key]['grace_period_start'] = current_time
             else:
                 # Kiểm tra đã hết grace period chưa (15s)
-                elapsed = current_time - alert_board[key]['grace_period_start']
+                elapsed = current_time - board[key]['grace_period_start']
                 if elapsed >= 15:
                     # Xóa khỏi bảng kèo
-                    del alert_board[key]
+                    del board[key]
 
 def cleanup_stale_data():
     """
     Xóa dữ liệu cũ của brokers/symbols không còn active
     Cleanup sau 30 giây không nhận data
+
+    Xử lý từng broker partition (chỉ giữ lock của partition đang xét)
     """
-    current_time = time.time()
+    current_time = clock()
     stale_threshold = 30  # 30 giây
     
-    # Cleanup market_data - Xóa brokers không còn active
-    brokers_to_remove = []
-    for broker, symbols in list(market_data.items()):
-        # Tìm timestamp mới nhất của broker
-        latest_timestamp = 0
-        for symbol_data in symbols.values():
-            ts = symbol_data.get('timestamp', 0)
-            if ts > latest_timestamp:
-                latest_timestamp = ts
-        
-        # Nếu broker không gửi data >30s → Xóa
-        if current_time - latest_timestamp > stale_threshold:
-            brokers_to_remove.append(broker)
-            logger.info(f"Cleanup: Removing stale broker '{broker}' (no data for {int(current_time - latest_timestamp)}s)")
-    
-    for broker in brokers_to_remove:
-        del market_data[broker]
-    
-    # Cleanup gap_spike_results - Xóa keys không còn trong market_data
-    keys_to_remove = []
-    for key in list(gap_spike_results.keys()):
-        broker, symbol = key.split('_', 1)
-        if broker not in market_data or symbol not in market_data.get(broker, {}):
-            keys_to_remove.append(key)
-    
-    for key in keys_to_remove:
-        del gap_spike_results[key]
-        logger.debug(f"Cleanup: Removed gap_spike_result for '{key}'")
-    
-    # Cleanup alert_board - Xóa keys không còn trong market_data
-    keys_to_remove = []
-    for key in list(alert_board.keys()):
-        broker, symbol = key.split('_', 1)
-        if broker not in market_data or symbol not in market_data.get(broker, {}):
-            keys_to_remove.append(key)
-    
-    for key in keys_to_remove:
-        del alert_board[key]
-        logger.debug(f"Cleanup: Removed alert_board for '{key}'")
-    
-    # Cleanup bid_tracking - Xóa keys không còn trong market_data
-    keys_to_remove = []
-    for key in list(bid_tracking.keys()):
-        broker, symbol = key.split('_', 1)
-        if broker not in market_data or symbol not in market_data.get(broker, {}):
-            keys_to_remove.append(key)
-    
-    for key in keys_to_remove:
-        del bid_tracking[key]
-        logger.debug(f"Cleanup: Removed bid_tracking for '{key}'")
+    for partition in iter_broker_partitions():
+        broker = partition.broker
+        with partition.lock.section('cleanup'):
+            symbols = partition.market
+
+            # Cleanup market_data - Xóa brokers không còn active
+            if symbols is not None:
+                # Tìm timestamp mới nhất của broker
+                latest_timestamp = 0
+                for symbol_data in symbols.values():
+                    ts = symbol_data.get('timestamp', 0)
+                    if ts > latest_timestamp:
+                        latest_timestamp = ts
+
+                # Nếu broker không gửi data >30s → Xóa
+                if current_time - latest_timestamp > stale_threshold:
+                    logger.info(f"Cleanup: Removing stale broker '{broker}' (no data for {int(current_time - latest_timestamp)}s)")
+                    partition.market = None
+                    symbols = None
+
+            # Cleanup gap_spike_results, alert_board, bid_tracking - Xóa keys không còn trong market_data
+            prefix_length = len(broker) + 1
+            for name, table in (('gap_spike_result', partition.gap_spike_results),
+                                ('alert_board', partition.alert_board),
+                                ('bid_tracking', partition.bid_tracking)):
+                keys_to_remove = [
+                    key for key in table
+                    if symbols is None or key[prefix_length:] not in symbols
+                ]
+                for key in keys_to_remove:
+                    del table[key]
+                    logger.debug(f"Cleanup: Removed {name} for '{key}'")
 
 # ===================== GAP & SPIKE CALCULATION =====================
-def get_threshold(broker, symbol, threshold_type):
-    """
-    Get threshold with proper priority logic:
-    Priority: Broker_Symbol > Broker_* > Symbol > * > Default
+# Ngưỡng % (gap/spike): Broker_Symbol > Broker_* > Symbol > * > Default
+# Ngưỡng Point (gap_point/spike_point): custom_thresholds[Broker_Symbol] hoặc None
+THRESHOLD_SETTINGS_TYPES = {
+    'gap_settings': ('gap',),
+    'spike_settings': ('spike',),
+    'custom_thresholds': ('gap_point', 'spike_point'),
+}
+THRESHOLD_SOURCE_LABELS = {
+    'broker_symbol': "Custom ({key})",
+    'broker_wildcard': "Broker wildcard ({key})",
+    'symbol': "Symbol ({key})",
+    'global': "Global wildcard (*)",
+}
 
-    ⚡ OPTIMIZED: Uses cache with 60-second TTL to avoid redundant lookups
+class ThresholdTable:
     """
-    # ⚡ Check cache first
-    cache_key = f"{broker}_{symbol}_{threshold_type}"
-    current_time = time.time()
-
-    if cache_key in threshold_cache:
-        cached_value, cached_time = threshold_cache[cache_key]
-        if current_time - cached_time < THRESHOLD_CACHE_TTL:
-            return cached_value
-
-    # Cache miss or expired - perform lookup
-    settings_dict = gap_settings if threshold_type == 'gap' else spike_settings
-    key = f"{broker}_{symbol}"
-    threshold_value = None
-
-    # Priority 1: Broker_Symbol (VD: Exness_EURUSD)
-    if key in settings_dict:
-        threshold_value = settings_dict[key]
-    # Priority 2: Broker_* (VD: Exness_*)
-    elif f"{broker}_*" in settings_dict:
-        threshold_value = settings_dict[f"{broker}_*"]
-    # Priority 3: Symbol (VD: EURUSD)
-    elif symbol in settings_dict:
-        threshold_value = settings_dict[symbol]
-    # Priority 4: Wildcard (*)
-    elif '*' in settings_dict:
-        threshold_value = settings_dict['*']
-    # Priority 5: Default
-    else:
-        threshold_value = DEFAULT_GAP_THRESHOLD if threshold_type == 'gap' else DEFAULT_SPIKE_THRESHOLD
+    Ngưỡng đã resolve theo (broker, symbol, type) kèm nguồn
 
-    # ⚡ Store in cache
-    threshold_cache[cache_key] = (threshold_value, current_time)
+    Entry: (value, source, source_key)
+        source: 'broker_symbol' | 'broker_wildcard' | 'symbol' | 'global' | 'default' (gap/spike)
+                'custom' | 'none' (gap_point/spike_point)
+        source_key: key trong settings đã cho ra value (None nếu default/none)
 
-    return threshold_value
+    Mỗi entry nhớ các key settings nó phụ thuộc → khi ObservedSettings báo key thay đổi
+    chỉ bỏ đúng các entry đó (resolve lại ở lần đọc sau), không có TTL
+    """
 
-def get_threshold_for_display(broker, symbol, threshold_type):
-    """Return numeric threshold only (float), not tuple!!"""
+    def __init__(self):
+        self._entries = {}  # {(broker, symbol, type): (value, source, source_key)}
+        self._deps = {}     # {(type, settings_key): set((broker, symbol, type))}
+        self._lock = threading.Lock()
+        self.stats = {'resolved': 0, 'invalidated': 0}
+
+    def lookup(self, broker, symbol, threshold_type):
+        """⚡ 1 lần đọc dict khi đã resolve"""
+        entry = self._entries.get((broker, symbol, threshold_type))
+        if entry is None:
+            entry = self._resolve(broker, symbol, threshold_type)
+        return entry
+
+    def _resolve(self, broker, symbol, threshold_type):
+        entry_key = (broker, symbol, threshold_type)
+        key = symbol_key(broker, symbol)
+        # Resolve trong lock: settings đổi giữa chừng thì invalidate chạy sau và bỏ entry này
+        with self._lock:
+            if threshold_type in ('gap', 'spike'):
+                settings_dict = gap_settings if threshold_type == 'gap' else spike_settings
+                candidates = ((key, 'broker_symbol'), (f"{broker}_*", 'broker_wildcard'),
+                              (symbol, 'symbol'), ('*', 'global'))
+                entry = None
+                for settings_key, source in candidates:
+                    if settings_key in settings_dict:
+                        entry = (settings_dict[settings_key], source, settings_key)
+                        break
+                if entry is None:
+                    default = DEFAULT_GAP_THRESHOLD if threshold_type == 'gap' else DEFAULT_SPIKE_THRESHOLD
+                    entry = (default, 'default', None)
+                dep_keys = [settings_key for settings_key, _ in candidates]
+            else:
+                custom = custom_thresholds.get(key)
+                value = custom.get(threshold_type) if custom else None
+                entry = (value, 'custom', key) if value is not None else (None, 'none', None)
+                dep_keys = [key]
+
+            for settings_key in dep_keys:
+                dependents = self._deps.get((threshold_type, settings_key))
+                if dependents is None:
+                    dependents = self._deps[(threshold_type, settings_key)] = set()
+                dependents.add(entry_key)
+            self._entries[entry_key] = entry
+            self.stats['resolved'] += 1
+        return entry
+
+    def on_settings_changed(self, name, keys):
+        """Listener của ObservedSettings: bỏ các entry phụ thuộc key đã thay đổi"""
+        types = THRESHOLD_SETTINGS_TYPES.get(name)
+        if not types:
+            return
+        with self._lock:
+            if keys is None:
+                self._entries = {k: v for k, v in self._entries.items() if k[2] not in types}
+                self._deps = {k: v for k, v in self._deps.items() if k[0] not in types}
+                return
+            for threshold_type in types:
+                for settings_key in keys:
+                    for entry_key in self._deps.pop((threshold_type, settings_key), ()):
+                        if self._entries.pop(entry_key, None) is not None:
+                            self.stats['invalidated'] += 1
 
-    settings_dict = gap_settings if threshold_type == 'gap' else spike_settings
-    key1 = f"{broker}_{symbol}"     # Broker_Symbol
-    key2 = f"{broker}_*"            # Broker_*
-    key3 = symbol                   # Symbol
-    key4 = '*'                      # Global wildcard
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._deps = {}
 
-    # Priority 1: broker_symbol
-    if key1 in settings_dict:
-        return float(settings_dict[key1])
+    def __len__(self):
+        return len(self._entries)
 
-    # Priority 2: broker_*
-    if key2 in settings_dict:
-        return float(settings_dict[key2])
+threshold_table = ThresholdTable()
+add_settings_listener(threshold_table.on_settings_changed)
 
-    # Priority 3: symbol
-    if key3 in settings_dict:
-        return float(settings_dict[key3])
+def get_threshold(broker, symbol, threshold_type):
+    """
+    Get threshold with proper priority logic:
+    Priority: Broker_Symbol > Broker_* > Symbol > * > Default
 
-    # Priority 4: *
-    if key4 in settings_dict:
-        return float(settings_dict[key4])
+    ⚡ OPTIMIZED: Đọc từ threshold_table (bỏ ngay khi settings liên quan thay đổi)
+    """
+    return threshold_table.lookup(broker, symbol, threshold_type)[0]
 
-    # Priority 5: Default
-    return DEFAULT_GAP_THRESHOLD if threshold_type == 'gap' else DEFAULT_SPIKE_THRESHOLD
+def get_threshold_for_display(broker, symbol, threshold_type):
+    """Return numeric threshold only (float), not tuple!!"""
+    return float(threshold_table.lookup(broker, symbol, threshold_type)[0])
 
 
 def get_threshold_source(broker, symbol, threshold_type):
     """Get source of threshold (for display)"""
-    settings_dict = gap_settings if threshold_type == 'gap' else spike_settings
-    key = f"{broker}_{symbol}"
-    
-    if key in settings_dict:
-        return f"Custom ({broker}_{symbol})"
-    
-    broker_wildcard = f"{broker}_*"
-    if broker_wildcard in settings_dict:
-        return f"Broker wildcard ({broker}_*)"
-    
-    if symbol in settings_dict:
-        return f"Symbol ({symbol})"
-    
-    if '*' in settings_dict:
-        return "Global wildcard (*)"
-    
-    return "default"
+    _, source, source_key = threshold_table.lookup(broker, symbol, threshold_type)
+    label = THRESHOLD_SOURCE_LABELS.get(source)
+    return label.format(key=source_key) if label else "default"
 
 def calculate_spread_percent(bid, ask):
     """Tính spread percent - helper function để tránh duplicate code"""
@@ -2557,7 +4526,7 @@ def calculate_gap(symbol, broker, data, spread_percent=None):
             # Fast day number extraction (no datetime object creation)
             prev_day = timestamp_to_date_day(prev_timestamp)
             current_day = timestamp_to_date_day(current_timestamp)
-            today_day = timestamp_to_date_day(time.time())
+            today_day = timestamp_to_date_day(clock())
 
             # Kiểm tra nến trước và nến gap có cùng ngày không
             if prev_day != current_day:
@@ -2815,300 +4784,2119 @@ def calculate_spike(symbol, broker, data, spread_percent=None):
             'message': f'Lỗi: {str(e)}'
         }
 
-# ===================== FLASK ENDPOINTS =====================
-@app.route('/api/receive_data', methods=['POST'])
-def receive_data():
-    """Nhận dữ liệu từ EA MT4/MT5"""
-    try:
-        data = request.get_json(force=True)
-        broker = data.get('broker', 'Unknown')
-        timestamp = data.get('timestamp', int(time.time()))
-        symbols_data = data.get('data', [])
+# ===================== BATCH DETECTION ENGINE =====================
+# ⚡ OPTIMIZATION: Tính Gap/Spike cho cả payload của 1 broker trong 1 lượt bằng NumPy
+# Thay vì gọi calculate_gap/calculate_spike (hoặc bản _point) cho từng symbol,
+# dữ liệu được nạp thành các cột (bid, ask, OHLC, points, ngưỡng) và tính toán vector hóa.
+# Kết quả đọc như dict gap_info/spike_info, giống hệt các hàm tính theo từng symbol.
+# Các dòng "bất thường" (dữ liệu không phải số, có timestamp nến, ngưỡng không phải số...)
+# được chuyển về hàm scalar để đảm bảo kết quả y hệt.
+USE_BATCH_DETECTION = True
+
+# Kết quả của engine là cột số liệu + cờ (DetectionBatch), không tạo dict/message cho từng dòng:
+# - DetectionRecord giữ 1 DetectionInfo cho gap + 1 cho spike, ghi đè slots tại chỗ mỗi tick
+# - message chỉ được format khi GUI/API đọc info['message']
+DIRECTION_NAMES = ('none', 'up', 'down')
+
+class DetectionInfo(Mapping):
+    """
+    Kết quả Gap hoặc Spike của 1 symbol - số liệu/cờ trong __slots__, đọc như dict của hàm scalar
 
-        # Kiểm tra xem broker có được chọn để nhận dữ liệu hay không
-        if not is_broker_enabled(broker):
-            return jsonify({
-                'status': 'ignored',
-                'message': f'Broker "{broker}" is not enabled for data reception'
-            }), 200
-        
-        with data_lock:
-            # Optimize: Use setdefault() instead of if-check (faster dict access)
-            broker_data = market_data.setdefault(broker, {})
+    state chọn bộ key (giống từng nhánh return của hàm scalar), 'message' format khi đọc
+    """
 
-            for symbol_data in symbols_data:
-                symbol = symbol_data.get('symbol', '')
-                if not symbol:
-                    continue
-                
-                # Lưu dữ liệu market
-                current_bid = symbol_data.get('bid', 0)
-                broker_data[symbol] = {
-                    'timestamp': timestamp,
-                    'bid': current_bid,
-                    'ask': symbol_data.get('ask', 0),
-                    'digits': symbol_data.get('digits', 5),
-                    'points': symbol_data.get('points', 0.00001),
-                    'isOpen': symbol_data.get('isOpen', True),
-                    'prev_ohlc': symbol_data.get('prev_ohlc', {}),
-                    'current_ohlc': symbol_data.get('current_ohlc', {}),
-                    'trade_sessions': symbol_data.get('trade_sessions', {}),
-                    'group': symbol_data.get('group', '')
-                }
-                
-                key = f"{broker}_{symbol}"
+    __slots__ = ()
+    FIELDS = ()  # state → tuple key (đúng thứ tự dict của hàm scalar)
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def load(self, columns, row):
+        """Ghi dòng row của các cột (cùng thứ tự __slots__) - True nếu có giá trị khác"""
+        changed = False
+        for name, column in zip(self.__slots__, columns):
+            value = column[row]
+            if not changed:
+                current = getattr(self, name)
+                changed = current is not value and current != value
+            setattr(self, name, value)
+        return changed
+
+    def format_message(self):
+        raise NotImplementedError
+
+    def __getitem__(self, field):
+        if field in self.FIELDS[self.state]:
+            return self.format_message() if field == 'message' else getattr(self, field)
+        raise KeyError(field)
+
+    def get(self, field, default=None):
+        if field in self.FIELDS[self.state]:
+            return self.format_message() if field == 'message' else getattr(self, field)
+        return default
+
+    def __contains__(self, field):
+        return field in self.FIELDS[self.state]
+
+    def __iter__(self):
+        return iter(self.FIELDS[self.state])
+
+    def __len__(self):
+        return len(self.FIELDS[self.state])
+
+    def copy(self):
+        """dict thật (JSON, metadata screenshot)"""
+        return {field: self[field] for field in self.FIELDS[self.state]}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.copy()!r})"
+
+class PercentGapInfo(DetectionInfo):
+    """Gap theo % - giống calculate_gap()"""
+
+    __slots__ = ('state', 'detected', 'direction', 'percentage', 'previous_close', 'current_open',
+                 'current_ask', 'threshold', 'spread')
+    NO_DATA, READY = 0, 1
+    FIELDS = (
+        ('detected', 'direction', 'percentage', 'previous_close', 'current_open', 'current_ask', 'message'),
+        ('detected', 'direction', 'percentage', 'previous_close', 'current_open', 'current_ask', 'threshold',
+         'message'),
+    )
+
+    def format_message(self):
+        if self.state == self.NO_DATA:
+            return 'Chưa đủ dữ liệu'
+        gap, threshold, spread = self.percentage, self.threshold, self.spread
+        current_open, current_ask, prev_close = self.current_open, self.current_ask, self.previous_close
+        if self.detected:
+            if self.direction == 'down':
+                return (
+                    f"GAP DOWN: {gap:.3f}% (Open: {current_open:.5f}, Ask: {current_ask:.5f} < Close_prev: {prev_close:.5f}, "
+                    f"ngưỡng: {threshold}%)"
+                )
+            return (
+                f"GAP UP: {gap:.3f}% (Open: {current_open:.5f}, Close_prev: {prev_close:.5f}, "
+                f"ngưỡng: {threshold}% / spread: {spread:.3f}%)"
+            )
+        threshold_met = gap >= threshold
+        if self.direction == 'up' and threshold_met and not gap > spread:
+            return f"Gap Up: {gap:.3f}% <= Spread {spread:.3f}% - Không hợp lệ"
+        if self.direction == 'down' and threshold_met and current_ask >= prev_close:
+            return f"Gap Down: {gap:.3f}% (Ask {current_ask:.5f} >= Close_prev {prev_close:.5f} - Không hợp lệ)"
+        return f"Gap: {gap:.3f}%"
+
+class PercentSpikeInfo(DetectionInfo):
+    """Spike theo % - giống calculate_spike()"""
+
+    __slots__ = ('state', 'detected', 'strength', 'spike_up', 'spike_down', 'spike_up_abs', 'spike_down_abs',
+                 'spike_type', 'previous_close', 'current_high', 'current_low', 'current_ask', 'threshold', 'spread')
+    NO_PREV, NO_CURRENT, READY = 0, 1, 2
+    FIELDS = (
+        ('detected', 'strength', 'message'),
+        ('detected', 'strength', 'message'),
+        ('detected', 'strength', 'spike_up', 'spike_down', 'spike_up_abs', 'spike_down_abs', 'spike_type',
+         'previous_close', 'current_high', 'current_low', 'current_ask', 'threshold', 'message'),
+    )
+
+    def format_message(self):
+        if self.state == self.NO_PREV:
+            return 'Không có dữ liệu prev_close'
+        if self.state == self.NO_CURRENT:
+            return 'Không có dữ liệu current OHLC'
+        up_abs, down_abs, threshold, spread = self.spike_up_abs, self.spike_down_abs, self.threshold, self.spread
+        current_ask, prev_close = self.current_ask, self.previous_close
+        up_threshold_met = up_abs >= threshold
+        up_spread_met = up_abs > spread
+        down_threshold_met = down_abs >= threshold
+        if self.detected:
+            up_detected = up_threshold_met and up_spread_met
+            down_detected = down_threshold_met and current_ask < prev_close
+            low_detail = f"Low: {self.current_low:.5f}, Ask: {current_ask:.5f} < Close_prev: {prev_close:.5f}"
+            if up_detected and down_detected:
+                price_detail = f"High: {self.current_high:.5f}" if self.spike_type == 'UP' else low_detail
+            elif up_detected:
+                price_detail = f"High: {self.current_high:.5f}, Spread: {spread:.3f}%"
+            else:
+                price_detail = low_detail
+            return f"SPIKE {self.spike_type}: {self.strength:.3f}% ({price_detail}, ngưỡng: {threshold}%)"
+        if up_threshold_met and not up_spread_met:
+            return f"Spike Up: {up_abs:.3f}% <= Spread {spread:.3f}% - Không hợp lệ"
+        if down_threshold_met and current_ask >= prev_close:
+            return f"Spike Down: {down_abs:.3f}% (Ask {current_ask:.5f} >= Close_prev {prev_close:.5f} - Không hợp lệ)"
+        return f"Spike: Up {up_abs:.3f}% / Down {down_abs:.3f}%"
+
+class PointGapInfo(DetectionInfo):
+    """Gap theo Point - giống calculate_gap_point()"""
+
+    __slots__ = ('state', 'detected', 'direction', 'point_gap', 'threshold_point', 'default_gap_percent',
+                 'previous_close', 'current_open', 'current_ask', 'point_value', 'digits', 'symbol_chuan',
+                 'matched_alias')
+    NOT_READY, READY = 0, 1
+    FIELDS = (
+        ('detected', 'direction', 'point_gap', 'threshold_point', 'message'),
+        ('detected', 'direction', 'point_gap', 'threshold_point', 'default_gap_percent', 'previous_close',
+         'current_open', 'current_ask', 'point_value', 'digits', 'message', 'symbol_chuan', 'matched_alias'),
+    )
+
+    def format_message(self):
+        if self.state == self.NOT_READY:
+            return 'Chưa đủ dữ liệu'
+        point_gap, threshold_point = self.point_gap, self.threshold_point
+        current_ask, prev_close = self.current_ask, self.previous_close
+        if self.detected:
+            if self.direction == 'up':
+                return (
+                    f"GAP UP (Point): {point_gap:.1f} points "
+                    f"(Open: {self.current_open:.5f}, Close_prev: {prev_close:.5f}, "
+                    f"ngưỡng: {threshold_point:.1f} points / {self.default_gap_percent}%)"
+                )
+            return (
+                f"GAP DOWN (Point): {point_gap:.1f} points "
+                f"(Open: {self.current_open:.5f}, Ask: {current_ask:.5f} < Close_prev: {prev_close:.5f}, "
+                f"ngưỡng: {threshold_point:.1f} points / {self.default_gap_percent}%)"
+            )
+        if self.direction == 'down' and point_gap >= threshold_point:
+            return f"Gap Down: {point_gap:.1f} points (Ask {current_ask:.5f} >= Close_prev {prev_close:.5f} - Không hợp lệ)"
+        return f"Gap: {point_gap:.1f} points"
+
+class PointSpikeInfo(DetectionInfo):
+    """Spike theo Point - giống calculate_spike_point()"""
+
+    __slots__ = ('state', 'detected', 'spike_point', 'threshold_point', 'default_gap_percent', 'current_bid',
+                 'previous_bid', 'point_value', 'digits', 'symbol_chuan', 'matched_alias')
+    NOT_READY, FIRST_BID, READY = 0, 1, 2
+    FIELDS = (
+        ('detected', 'spike_point', 'threshold_point', 'message'),
+        ('detected', 'spike_point', 'threshold_point', 'default_gap_percent', 'message', 'symbol_chuan',
+         'matched_alias'),
+        ('detected', 'spike_point', 'threshold_point', 'default_gap_percent', 'current_bid', 'previous_bid',
+         'point_value', 'digits', 'message', 'symbol_chuan', 'matched_alias'),
+    )
+
+    def format_message(self):
+        if self.state == self.NOT_READY:
+            return 'Chưa đủ dữ liệu'
+        if self.state == self.FIRST_BID:
+            return 'Đang theo dõi bid đầu tiên'
+        if self.detected:
+            return (
+                f"SPIKE (Point): {self.spike_point:.1f} points "
+                f"(Bid: {self.current_bid:.5f}, Bid_prev: {self.previous_bid:.5f}, "
+                f"ngưỡng: {self.threshold_point:.1f} points / {self.default_gap_percent}%)"
+            )
+        return f"Spike: {self.spike_point:.1f} points"
 
-                # Bỏ qua symbol nếu không nằm trong danh sách được chọn
-                if not is_symbol_selected_for_detection(broker, symbol):
-                    clear_symbol_detection_results(broker, symbol)
-                    bid_tracking.pop(key, None)
-                    candle_data.pop(key, None)
-                    continue
+class DetectionBatch(Sequence):
+    """
+    Kết quả Batch Detection Engine cho các dòng của 1 payload
 
-                # ✨ NGAY KHI NHẬN SYMBOL: Dò với file txt để đảm bảo chính xác 100%
-                # Check symbol config TRƯỚC KHI tính gap/spike (để track tất cả symbols)
-                symbol_chuan_early, config_early, matched_alias_early = find_symbol_config(symbol)
+    - gap_columns/spike_columns: list giá trị theo dòng, cùng thứ tự __slots__ của gap_type/spike_type
+    - gap_overrides/spike_overrides: {row: dict} - dòng tính bằng hàm scalar (fallback)
+    - batch[row] → (gap_info, spike_info) tạo mới; load_row() ghi tại chỗ vào DetectionRecord
+    """
 
-                # Track symbol vào loading state (để progress bar chính xác)
-                loading_state['symbols_seen'].add(key)
+    def __init__(self, count, gap_type, spike_type, gap_columns=(), spike_columns=()):
+        self.count = count
+        self.gap_type = gap_type
+        self.spike_type = spike_type
+        self.gap_columns = gap_columns
+        self.spike_columns = spike_columns
+        self.gap_overrides = {}
+        self.spike_overrides = {}
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(self.count))]
+        if row < 0:
+            row += self.count
+        if not 0 <= row < self.count:
+            raise IndexError(row)
+        return (self._info(row, self.gap_type, self.gap_columns, self.gap_overrides),
+                self._info(row, self.spike_type, self.spike_columns, self.spike_overrides))
+
+    @staticmethod
+    def _info(row, info_type, columns, overrides):
+        info = overrides.get(row)
+        if info is None:
+            info = info_type()
+            info.load(columns, row)
+        return info
+
+    @staticmethod
+    def _load(row, current, info_type, columns, overrides):
+        """(info, changed) của dòng row - ghi tại chỗ vào current nếu current đúng kiểu info_type"""
+        override = overrides.get(row) if overrides else None
+        if override is not None:
+            return override, current is not override and current != override
+        if type(current) is not info_type:
+            current = info_type()
+            current.load(columns, row)
+            return current, True
+        return current, current.load(columns, row)
+
+    def load_row(self, row, record):
+        """Ghi kết quả dòng row vào record.gap/record.spike - True nếu có giá trị khác"""
+        gap, gap_changed = self._load(row, record.gap, self.gap_type, self.gap_columns, self.gap_overrides)
+        spike, spike_changed = self._load(row, record.spike, self.spike_type, self.spike_columns,
+                                          self.spike_overrides)
+        record.gap = gap
+        record.spike = spike
+        return gap_changed or spike_changed
+
+def _float_column(values):
+    """
+    Chuyển list giá trị thành cột float64
 
-                # Track bid changes for delay detection
-                current_time = time.time()
+    Returns:
+        tuple: (column, bad_mask) - bad_mask[i] = True nếu float(values[i]) sẽ lỗi
+    """
+    bad = np.zeros(len(values), dtype=bool)
+    try:
+        column = np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        column = np.zeros(len(values), dtype=np.float64)
+        for i, value in enumerate(values):
+            try:
+                column[i] = float(value)
+            except (TypeError, ValueError):
+                bad[i] = True
+        return column, bad
+
+    # NumPy đổi None thành nan (float(None) thì lỗi) → kiểm tra lại các ô nan
+    nan_positions = np.flatnonzero(np.isnan(column))
+    for i in nan_positions:
+        try:
+            float(values[i])
+        except (TypeError, ValueError):
+            bad[i] = True
+    return column, bad
 
-                # Optimize: Check if symbol exists first
-                if key in bid_tracking:
-                    # Existing symbol - check if bid changed
-                    if bid_tracking[key]['last_bid'] != current_bid:
-                        bid_tracking[key]['last_bid'] = current_bid
-                        bid_tracking[key]['last_change_time'] = current_time
-                else:
-                    # First time seeing this symbol - initialize
-                    bid_tracking[key] = {
-                        'last_bid': current_bid,
-                        'last_change_time': current_time,
-                        'first_seen_time': current_time
-                    }
-                
-                # Store candle data for charting (M1 candles)
-                current_ohlc = symbol_data.get('current_ohlc', {})
-                
-                # IMPORTANT: Check for historical_candles FIRST (populate on chart open)
-                historical_candles = symbol_data.get('historical_candles', [])
-                if historical_candles and len(historical_candles) > 0 and key not in candle_data:
-                    # First time receiving this symbol - restore from historical data
-                    try:
-                        candle_data[key] = []
-                        for candle in historical_candles:
-                            if isinstance(candle, (list, tuple)) and len(candle) >= 5:
-                                ts = int(candle[0])
-                                o = float(candle[1])
-                                h = float(candle[2])
-                                l = float(candle[3])
-                                c = float(candle[4])
-                                candle_data[key].append((ts, o, h, l, c))
-                        
-                        if len(candle_data[key]) > 0:
-                            logger.info(f"Restored {len(candle_data[key])} historical candles for {key}")
-                    except Exception as e:
-                        logger.error(f"Error processing historical_candles for {key}: {e}")
-                        candle_data[key] = []
-                
-                # Then accumulate current candle data (as before)
-                if current_ohlc.get('open') and current_ohlc.get('close'):
-                    # Round timestamp về đầu phút (M1 = 60s)
-                    # VD: 14:30:45 → 14:30:00
-                    candle_time = (timestamp // 60) * 60
-                    
-                    o = float(current_ohlc.get('open', 0))
-                    h = float(current_ohlc.get('high', 0))
-                    l = float(current_ohlc.get('low', 0))
-                    c = float(current_ohlc.get('close', 0))
-                    
-                    # ✅ FIX: LUÔN đảm bảo list được khởi tạo (không chỉ lần đầu)
-                    # Nếu key chưa tồn tại HOẶC list bị xóa, khởi tạo lại
-                    if key not in candle_data or not isinstance(candle_data[key], list):
-                        candle_data[key] = []
-                    
-                    # Kiểm tra nến cuối cùng
-                    if candle_data[key]:
-                        last_candle = candle_data[key][-1]
-                        last_time = last_candle[0]
-
-                        if last_time == candle_time:
-                            # Cùng phút → Update nến hiện tại
-                            # Update High/Low nếu cần
-                            last_o, last_h, last_l, last_c = last_candle[1], last_candle[2], last_candle[3], last_candle[4]
-                            new_h = max(last_h, h)
-                            new_l = min(last_l, l)
-
-                            # Update nến
-                            candle_data[key][-1] = (candle_time, last_o, new_h, new_l, c)
-                        else:
-                            # Phút mới → CHỈ thêm nến mới nếu có thay đổi giá (giống MT4/MT5)
-                            # Lấy Close của nến cuối cùng
-                            last_c = last_candle[4]
-
-                            # Kiểm tra xem có thay đổi giá THỰC SỰ không
-                            # CHỈ tạo nến mới nếu:
-                            # 1. Giá Close thay đổi so với nến cuối (có giao dịch mới)
-                            # 2. HOẶC có volatility trong nến (H != L - có biến động giá)
-                            # 3. HOẶC Open khác Close (có movement trong phút)
-                            has_price_change = (c != last_c) or (h != l) or (o != c)
-
-                            if has_price_change:
-                                # Có thay đổi giá → Tạo nến mới
-                                candle_data[key].append((candle_time, o, h, l, c))
-                            # Nếu không có thay đổi (O=H=L=C và C=last_c) → KHÔNG tạo nến mới
-                    else:
-                        # Nến đầu tiên (list trống)
-                        candle_data[key].append((candle_time, o, h, l, c))
-                    
-                    # Giữ tối đa 200 nến (để chart load nhanh)
-                    if len(candle_data[key]) > 200:
-                        candle_data[key] = candle_data[key][-200:]
-
-                # Tính toán Gap và Spike
-                # Kiểm tra nếu setting "only_check_open_market" được bật
-                should_calculate = True
-                skip_reason = ""
-
-                # Optimize: Reuse broker_data[symbol] instead of market_data[broker][symbol]
-                symbol_market_data = broker_data[symbol]
-
-                if market_open_settings.get('only_check_open_market', False):
-                    # Chỉ tính nếu market đang mở
-                    is_market_open = symbol_market_data.get('isOpen', True)
-                    if not is_market_open:
-                        should_calculate = False
-                        skip_reason = "Market đóng cửa"
-
-                # Kiểm tra skip period sau khi market mở
-                if should_calculate and is_within_skip_period_after_open(symbol, broker, timestamp):
-                    should_calculate = False
-                    skip_minutes = market_open_settings.get('skip_minutes_after_open', 0)
-                    skip_reason = f"Bỏ {skip_minutes} phút đầu sau khi mở cửa"
-
-                # ✨ Kiểm tra startup delay - không xét gap/spike trong 5 phút đầu khi khởi động
-                if should_calculate:
-                    startup_delay_minutes = audio_settings.get('startup_delay_minutes', 5)
-                    startup_delay_seconds = startup_delay_minutes * 60
-                    current_time_check = time.time()
-                    time_since_startup = current_time_check - app_startup_time
-
-                    if time_since_startup < startup_delay_seconds:
-                        should_calculate = False
-                        remaining_seconds = int(startup_delay_seconds - time_since_startup)
-                        remaining_minutes = remaining_seconds // 60
-                        skip_reason = f"Startup delay - còn {remaining_minutes} phút {remaining_seconds % 60} giây"
-
-                # ⚡ OPTIMIZATION: Tính spread 1 lần và truyền vào cả 2 hàm
-                spread_percent = calculate_spread_percent(
-                    symbol_market_data.get('bid', 0),
-                    symbol_market_data.get('ask', 0)
-                )
+def _ohlc_of(data, field):
+    """Lấy dict OHLC (prev_ohlc/current_ohlc), trả về None nếu không đúng kiểu"""
+    ohlc = data.get(field, {})
+    return ohlc if isinstance(ohlc, dict) else None
 
-                # ✨ QUY ĐỊNH BẢNG: Ưu tiên kiểm tra custom_thresholds/gap_settings trước file txt
-                # Logic: custom_thresholds (gap_point/spike_point) > gap_settings/spike_settings > file txt
-                broker_symbol = f"{broker}_{symbol}"
-
-                # 1. Kiểm tra custom_thresholds có gap_point hoặc spike_point → Point-based
-                is_point_based_by_custom = False
-                if broker_symbol in custom_thresholds:
-                    if 'gap_point' in custom_thresholds[broker_symbol] or 'spike_point' in custom_thresholds[broker_symbol]:
-                        is_point_based_by_custom = True
-
-                # 2. Kiểm tra gap_settings hoặc spike_settings → Percent-based (override file txt)
-                is_percent_based_by_settings = (broker_symbol in gap_settings or broker_symbol in spike_settings)
-
-                # 3. Quyết định cuối cùng:
-                #    - Nếu có gap_point/spike_point trong custom_thresholds → Point-based
-                #    - Nếu có trong gap_settings/spike_settings (và không có gap_point) → Percent-based
-                #    - Cuối cùng mới dựa vào file txt (config_early)
-                if is_point_based_by_custom or (config_early and not is_percent_based_by_settings):
-                    # Symbol có cấu hình trong file txt → Point-based
-                    if should_calculate:
-                        # Tính gap/spike thực tế
-                        gap_info = calculate_gap_point(symbol, broker, symbol_market_data, spread_percent)
-                        spike_info = calculate_spike_point(symbol, broker, symbol_market_data, spread_percent)
-                    else:
-                        # Không tính (market đóng/skip period) nhưng vẫn lưu vào point_results
-                        gap_info = {
-                            'detected': False,
-                            'strength': 0.0,
-                            'message': f'{skip_reason} - Không xét gap/spike',
-                            'default_gap_percent': config_early.get('default_gap_percent', 0),
-                            'threshold_point': 0,
-                            'point_gap': 0
-                        }
-                        spike_info = {
-                            'detected': False,
-                            'strength': 0.0,
-                            'message': f'{skip_reason} - Không xét gap/spike',
-                            'spike_point': 0
-                        }
+def load_batch_columns(datas, with_timestamps=False):
+    """
+    Nạp market data của nhiều symbols thành các cột NumPy
 
-                    # ✅ LUÔN lưu vào gap_spike_point_results (kể cả khi không tính)
-                    gap_spike_point_results[key] = {
-                        'symbol': symbol,
-                        'broker': broker,
-                        'timestamp': timestamp,
-                        'price': (symbol_market_data['bid'] + symbol_market_data['ask']) / 2,
-                        'gap': gap_info,
-                        'spike': spike_info,
-                        'symbol_chuan': symbol_chuan_early,
-                        'matched_alias': matched_alias_early,
-                        'calculation_type': 'point'
-                    }
-                else:
-                    # Symbol không có cấu hình → Percent-based
-                    if should_calculate:
-                        gap_info = calculate_gap(symbol, broker, symbol_market_data, spread_percent)
-                        spike_info = calculate_spike(symbol, broker, symbol_market_data, spread_percent)
-                    else:
-                        gap_info = {
-                            'detected': False,
-                            'strength': 0.0,
-                            'message': f'{skip_reason} - Không xét gap/spike'
-                        }
-                        spike_info = {
-                            'detected': False,
-                            'strength': 0.0,
-                            'message': f'{skip_reason} - Không xét gap/spike'
-                        }
+    Args:
+        datas: List market data dict (cùng format với market_data[broker][symbol])
+        with_timestamps: Nạp thêm timestamp của prev/current OHLC (chỉ cần cho Gap %)
 
-                    # ✅ LUÔN lưu vào gap_spike_results (percent-based)
-                    gap_spike_results[key] = {
-                        'symbol': symbol,
-                        'broker': broker,
-                        'timestamp': timestamp,
-                        'price': (symbol_market_data['bid'] + symbol_market_data['ask']) / 2,
-                        'gap': gap_info,
-                        'spike': spike_info
-                    }
+    Returns:
+        dict: {'bid', 'ask', 'points', 'prev_close', 'open', 'high', 'low', ...: np.ndarray,
+               'fallback': mask các dòng phải tính bằng hàm scalar}
+    """
+    count = len(datas)
+    fallback = np.zeros(count, dtype=bool)
+
+    prev_close, cur_open, cur_high, cur_low = [], [], [], []
+    prev_ts, cur_ts = [], []
+    for i, data in enumerate(datas):
+        prev_ohlc = _ohlc_of(data, 'prev_ohlc')
+        current_ohlc = _ohlc_of(data, 'current_ohlc')
+        if prev_ohlc is None or current_ohlc is None:
+            fallback[i] = True
+            prev_ohlc = current_ohlc = {}
+        prev_close.append(prev_ohlc.get('close', 0))
+        cur_open.append(current_ohlc.get('open', 0))
+        cur_high.append(current_ohlc.get('high', 0))
+        cur_low.append(current_ohlc.get('low', 0))
+        if with_timestamps:
+            prev_ts.append(prev_ohlc.get('timestamp', 0))
+            cur_ts.append(current_ohlc.get('timestamp', 0))
+
+    columns = {}
+    raw_columns = {
+        'bid': [data.get('bid', 0) for data in datas],
+        'ask': [data.get('ask', 0) for data in datas],
+        'points': [data.get('points', 0.00001) for data in datas],
+        'prev_close': prev_close,
+        'open': cur_open,
+        'high': cur_high,
+        'low': cur_low,
+    }
+    for name, values in raw_columns.items():
+        column, bad = _float_column(values)
+        columns[name] = column
+        fallback |= bad
+
+    if with_timestamps:
+        for name, values in (('prev_ts', prev_ts), ('cur_ts', cur_ts)):
+            column, bad = _float_column(values)
+            columns[name] = column
+            fallback |= bad
+        # Có timestamp nến → đi nhánh kiểm tra ngày (hiếm gặp) bằng hàm scalar
+        fallback |= (columns['prev_ts'] > 0) & (columns['cur_ts'] > 0)
+
+    columns['fallback'] = fallback
+    return columns
+
+def _threshold_column(broker, symbols, threshold_type):
+    """Lấy ngưỡng cho từng symbol, đánh dấu ngưỡng không phải số (để fallback)"""
+    thresholds = [get_threshold(broker, symbol, threshold_type) for symbol in symbols]
+    bad = np.array([type(t) not in (int, float) for t in thresholds], dtype=bool)
+    values = np.array([t if type(t) in (int, float) else 0.0 for t in thresholds], dtype=np.float64)
+    return thresholds, values, bad
+
+def calculate_percent_batch(broker, rows, columns=None):
+    """
+    Tính Gap/Spike theo % cho nhiều symbols cùng lúc
+
+    Args:
+        broker: Broker name
+        rows: List (symbol, data, spread_percent)
+        columns: Cột NumPy có sẵn theo đúng thứ tự rows (binary ingest) - None = nạp từ data
+
+    Returns:
+        DetectionBatch (PercentGapInfo/PercentSpikeInfo): batch[i] == (calculate_gap(), calculate_spike())
+        của rows[i]
+    """
+    batch = DetectionBatch(len(rows), PercentGapInfo, PercentSpikeInfo)
+    if not rows:
+        return batch
+
+    symbols = [row[0] for row in rows]
+    datas = [row[1] for row in rows]
+    try:
+        cols = columns if columns is not None else load_batch_columns(datas, with_timestamps=True)
+        spread = np.array([row[2] if row[2] is not None else 0.0 for row in rows], dtype=np.float64)
+        # spread_percent=None → hàm scalar tự tính từ bid/ask đã float()
+        missing_spread = np.array([row[2] is None for row in rows], dtype=bool)
+        if missing_spread.any():
+            bid, ask = cols['bid'], cols['ask']
+            with np.errstate(divide='ignore', invalid='ignore'):
+                computed = np.where(bid > 0, np.abs(ask - bid) / np.where(bid > 0, bid, 1.0) * 100, 0.0)
+            spread = np.where(missing_spread, computed, spread)
+
+        gap_thresholds, gap_thr, gap_thr_bad = _threshold_column(broker, symbols, 'gap')
+        spike_thresholds, spike_thr, spike_thr_bad = _threshold_column(broker, symbols, 'spike')
+
+        prev_close, cur_open = cols['prev_close'], cols['open']
+        cur_high, cur_low, cur_ask = cols['high'], cols['low'], cols['ask']
+        fallback = cols['fallback']
+
+        has_prev = prev_close != 0
+        safe_prev = np.where(has_prev, prev_close, 1.0)
+
+        # ----- GAP -----
+        gap_pct = (cur_open - prev_close) / safe_prev * 100
+        gap_abs = np.abs(gap_pct)
+        gap_up = gap_pct > 0
+        gap_down = gap_pct < 0
+        gap_threshold_met = gap_abs >= gap_thr
+        gap_up_spread_met = gap_abs > spread
+        ask_below_prev = cur_ask < prev_close
+        gap_detected = (gap_up & gap_threshold_met & gap_up_spread_met) | (gap_down & gap_threshold_met & ask_below_prev)
+        gap_direction = np.where(has_prev, np.where(gap_up, 1, np.where(gap_down, 2, 0)), 0)
+
+        # ----- SPIKE -----
+        has_current = (cur_high != 0) & (cur_low != 0)
+        spike_up = (cur_high - prev_close) / safe_prev * 100
+        spike_down = (prev_close - cur_low) / safe_prev * 100
+        spike_up_abs = np.abs(spike_up)
+        spike_down_abs = np.abs(spike_down)
+        spike_up_detected = (spike_up_abs >= spike_thr) & (spike_up_abs > spread)
+        spike_down_detected = (spike_down_abs >= spike_thr) & ask_below_prev
+        up_stronger = spike_up_abs > spike_down_abs
+        # Cả 2 chiều / không chiều nào phát hiện → chiều mạnh hơn; 1 chiều phát hiện → chiều đó
+        spike_is_up = np.where(spike_up_detected == spike_down_detected, up_stronger, spike_up_detected)
+        spike_state = np.where(has_prev, np.where(has_current, PercentSpikeInfo.READY, PercentSpikeInfo.NO_CURRENT),
+                               PercentSpikeInfo.NO_PREV)
+        spike_ready = spike_state == PercentSpikeInfo.READY
+
+        # Cột theo đúng thứ tự __slots__ của PercentGapInfo / PercentSpikeInfo
+        batch.gap_columns = [
+            has_prev.astype(np.int8).tolist(),
+            (gap_detected & has_prev).tolist(),
+            [DIRECTION_NAMES[code] for code in gap_direction.tolist()],
+            np.where(has_prev, gap_abs, 0.0).tolist(),
+            np.where(has_prev, prev_close, 0.0).tolist(),
+            np.where(has_prev, cur_open, 0.0).tolist(),
+            np.where(has_prev, cur_ask, 0.0).tolist(),
+            gap_thresholds,
+            spread.tolist(),
+        ]
+        batch.spike_columns = [
+            spike_state.tolist(),
+            ((spike_up_detected | spike_down_detected) & spike_ready).tolist(),
+            np.where(spike_ready, np.where(spike_is_up, spike_up_abs, spike_down_abs), 0.0).tolist(),
+            spike_up.tolist(),
+            spike_down.tolist(),
+            spike_up_abs.tolist(),
+            spike_down_abs.tolist(),
+            ['UP' if is_up else 'DOWN' for is_up in spike_is_up.tolist()],
+            prev_close.tolist(),
+            cur_high.tolist(),
+            cur_low.tolist(),
+            cur_ask.tolist(),
+            spike_thresholds,
+            spread.tolist(),
+        ]
+        gap_fallback = np.flatnonzero(fallback | gap_thr_bad).tolist()
+        spike_fallback = np.flatnonzero(fallback | spike_thr_bad).tolist()
+    except Exception as e:
+        logger.error(f"Batch detection (percent) failed for {broker}, falling back to per-symbol: {e}")
+        gap_fallback = spike_fallback = range(len(rows))
+
+    # Dòng "bất thường" → hàm scalar
+    for i in gap_fallback:
+        symbol, data, spread_percent = rows[i]
+        batch.gap_overrides[i] = calculate_gap(symbol, broker, data, spread_percent)
+    for i in spike_fallback:
+        symbol, data, spread_percent = rows[i]
+        batch.spike_overrides[i] = calculate_spike(symbol, broker, data, spread_percent)
+    return batch
+
+def calculate_point_batch(broker, rows, tracking=None, columns=None, keys=None):
+    """
+    Tính Gap/Spike theo Point cho nhiều symbols cùng lúc
+
+    Args:
+        broker: Broker name
+        rows: List (symbol, data, symbol_chuan, config, matched_alias)
+              - lấy sẵn từ find_symbol_config() để không phải dò lại
+        tracking: Bid tracking dùng để lấy Bid_prev (mặc định: bid_tracking global)
+        columns: Cột NumPy có sẵn theo đúng thứ tự rows (binary ingest) - None = nạp từ data
+        keys: Key bid_tracking (symbol_key) theo đúng thứ tự rows - None = tạo từ broker + symbol
+
+    Returns:
+        DetectionBatch (PointGapInfo/PointSpikeInfo): batch[i] == (calculate_gap_point(),
+        calculate_spike_point()) của rows[i]
+    """
+    batch = DetectionBatch(len(rows), PointGapInfo, PointSpikeInfo)
+    if not rows:
+        return batch
+    if tracking is None:
+        tracking = bid_tracking
+
+    datas = [row[1] for row in rows]
+    try:
+        cols = columns if columns is not None else load_batch_columns(datas)
+        fallback = cols['fallback']
+
+        # Dòng không có config → hàm scalar trả về 'Không có cấu hình'
+        has_config = np.array([bool(row[3]) for row in rows], dtype=bool)
+        default_gaps = [row[3]['default_gap_percent'] if row[3] else 0.0 for row in rows]
+        default_gap = np.array(default_gaps, dtype=np.float64)
+
+        # digits phải int() được như hàm scalar
+        digits = []
+        for i, data in enumerate(datas):
+            try:
+                digits.append(int(data.get('digits', 5)))
+            except (TypeError, ValueError):
+                digits.append(0)
+                fallback[i] = True
+
+        # Bid trước đó (đọc từ bid_tracking tại thời điểm tính, giống hàm scalar)
+        prev_bids = []
+        has_prev_bid = []
+        if keys is None:
+            keys = [symbol_key(broker, row[0]) for row in rows]
+        for key, bid in zip(keys, cols['bid'].tolist()):
+            entry = tracking.get(key)
+            has_prev_bid.append(entry is not None)
+            prev_bids.append(entry.get('last_bid', bid) if entry is not None else 0)
+        prev_bid, prev_bid_bad = _float_column(prev_bids)
+        # last_bid được lưu nguyên giá trị từ EA → chỉ tính vector hóa khi là số
+        prev_bid_bad |= np.array([type(v) not in (int, float) for v in prev_bids], dtype=bool)
+        fallback = fallback | ~has_config
+
+        point_value, prev_close = cols['points'], cols['prev_close']
+        cur_open, cur_ask, cur_bid = cols['open'], cols['ask'], cols['bid']
+        valid_point = point_value != 0
+        safe_point = np.where(valid_point, point_value, 1.0)
+        threshold_point = default_gap / safe_point
+
+        # ----- GAP (Point) -----
+        gap_ready = (prev_close != 0) & valid_point
+        point_gap = np.abs(cur_open - prev_close) / safe_point
+        gap_up = cur_open > prev_close
+        gap_down = cur_open < prev_close
+        gap_threshold_met = point_gap >= threshold_point
+        ask_below_prev = cur_ask < prev_close
+        gap_detected = (gap_up & gap_threshold_met) | (gap_down & gap_threshold_met & ask_below_prev)
+        gap_direction = np.where(gap_ready, np.where(gap_up, 1, np.where(gap_down, 2, 0)), 0)
+
+        # ----- SPIKE (Point) -----
+        spike_ready = valid_point & (cur_bid != 0)
+        spike_point = np.abs(cur_bid - prev_bid) / safe_point
+        spike_detected = spike_point >= threshold_point
+        spike_state = np.where(spike_ready, np.where(has_prev_bid, PointSpikeInfo.READY, PointSpikeInfo.FIRST_BID),
+                               PointSpikeInfo.NOT_READY)
+        spike_has_bid = spike_state == PointSpikeInfo.READY
+
+        symbol_chuans = [row[2] for row in rows]
+        matched_aliases = [row[4] for row in rows]
+        point_values = point_value.tolist()
+        # Cột theo đúng thứ tự __slots__ của PointGapInfo / PointSpikeInfo
+        batch.gap_columns = [
+            gap_ready.astype(np.int8).tolist(),
+            (gap_detected & gap_ready).tolist(),
+            [DIRECTION_NAMES[code] for code in gap_direction.tolist()],
+            np.where(gap_ready, point_gap, 0.0).tolist(),
+            np.where(gap_ready, threshold_point, 0.0).tolist(),
+            default_gaps,
+            prev_close.tolist(),
+            cur_open.tolist(),
+            cur_ask.tolist(),
+            point_values,
+            digits,
+            symbol_chuans,
+            matched_aliases,
+        ]
+        batch.spike_columns = [
+            spike_state.tolist(),
+            (spike_detected & spike_has_bid).tolist(),
+            np.where(spike_has_bid, spike_point, 0.0).tolist(),
+            np.where(spike_ready, threshold_point, 0.0).tolist(),
+            default_gaps,
+            cur_bid.tolist(),
+            prev_bid.tolist(),
+            point_values,
+            digits,
+            symbol_chuans,
+            matched_aliases,
+        ]
+        gap_fallback = np.flatnonzero(fallback).tolist()
+        spike_fallback = np.flatnonzero(fallback | prev_bid_bad).tolist()
+    except Exception as e:
+        logger.error(f"Batch detection (point) failed for {broker}, falling back to per-symbol: {e}")
+        gap_fallback = spike_fallback = range(len(rows))
+
+    # Dòng "bất thường" → hàm scalar
+    for i in gap_fallback:
+        batch.gap_overrides[i] = calculate_gap_point(rows[i][0], broker, rows[i][1])
+    for i in spike_fallback:
+        batch.spike_overrides[i] = calculate_spike_point(rows[i][0], broker, rows[i][1], tracking=tracking)
+    return batch
+
+# ===================== DETECTION RECORDS =====================
+# Kết quả Gap/Spike của 1 symbol trong gap_spike_results / gap_spike_point_results
+# - __slots__ thay cho dict 6-9 key tạo mới mỗi tick: nhỏ hơn ~3 lần, ít rác cho GC
+# - Cập nhật tại chỗ mỗi tick - trừ khi record đang được Bảng Kèo giữ
+#   (alert_board giữ kết quả lúc phát hiện trong grace period → tick sau phải là record mới)
+# - gap/spike: DetectionInfo của record (Batch Detection Engine ghi đè slots tại chỗ, message format khi đọc)
+#   hoặc dict của hàm scalar (dòng fallback, bỏ qua không tính)
+# - Đọc như dict (result['gap'], result.get('symbol_chuan'), in, items) → GUI/API không đổi
+#   as_dict() khi cần dict thật (JSON)
+# - version tăng mỗi lần cập nhật tại chỗ → GUI so (record, version) để biết bảng có đổi không
+class DetectionRecord(Mapping):
+    """Kết quả Gap/Spike 1 symbol - đọc như dict, cập nhật tại chỗ"""
+
+    __slots__ = ('symbol', 'broker', 'timestamp', 'price', 'gap', 'spike',
+                 'symbol_chuan', 'matched_alias', 'calculation_type', 'version')
+
+    PERCENT_FIELDS = ('symbol', 'broker', 'timestamp', 'price', 'gap', 'spike')
+    POINT_FIELDS = PERCENT_FIELDS + ('symbol_chuan', 'matched_alias', 'calculation_type')
+
+    def __init__(self, symbol, broker, timestamp, price, gap, spike,
+                 is_point_based=False, symbol_chuan=None, matched_alias=None):
+        self.symbol = symbol
+        self.broker = broker
+        self.timestamp = timestamp
+        self.price = price
+        self.gap = gap
+        self.spike = spike
+        self.symbol_chuan = symbol_chuan
+        self.matched_alias = matched_alias
+        # Percent-based: không có symbol_chuan/matched_alias/calculation_type (giống dict cũ)
+        self.calculation_type = 'point' if is_point_based else None
+        self.version = 0
+
+    def _set_tick(self, timestamp, price, symbol_chuan, matched_alias):
+        """Ghi timestamp/giá/symbol chuẩn - True nếu có giá trị khác"""
+        if self.calculation_type is None:
+            symbol_chuan = matched_alias = None
+        changed = (timestamp != self.timestamp or price != self.price
+                   or symbol_chuan != self.symbol_chuan or matched_alias != self.matched_alias)
+        if changed:
+            self.timestamp = timestamp
+            self.price = price
+            self.symbol_chuan = symbol_chuan
+            self.matched_alias = matched_alias
+        return changed
+
+    def update_tick(self, timestamp, price, gap, spike, symbol_chuan=None, matched_alias=None):
+        """Ghi kết quả tick mới (dict gap/spike) - version chỉ tăng khi có giá trị khác"""
+        changed = self._set_tick(timestamp, price, symbol_chuan, matched_alias)
+        if (gap is not self.gap and gap != self.gap) or (spike is not self.spike and spike != self.spike):
+            self.gap = gap
+            self.spike = spike
+            changed = True
+        if changed:
+            self.version += 1
+
+    def update_batch_row(self, timestamp, price, batch, row, symbol_chuan=None, matched_alias=None):
+        """Ghi dòng row của DetectionBatch - số liệu ghi tại chỗ vào DetectionInfo của record"""
+        changed = self._set_tick(timestamp, price, symbol_chuan, matched_alias)
+        if batch.load_row(row, self) or changed:
+            self.version += 1
+
+    def _fields(self):
+        return self.POINT_FIELDS if self.calculation_type is not None else self.PERCENT_FIELDS
+
+    def __getitem__(self, field):
+        if field in self._fields():
+            return getattr(self, field)
+        raise KeyError(field)
+
+    def get(self, field, default=None):
+        if field in self._fields():
+            return getattr(self, field)
+        return default
+
+    def __contains__(self, field):
+        return field in self._fields()
+
+    def __iter__(self):
+        return iter(self._fields())
+
+    def __len__(self):
+        return len(self._fields())
+
+    def as_dict(self):
+        result = {field: getattr(self, field) for field in self._fields()}
+        result['gap'] = dict(self.gap)
+        result['spike'] = dict(self.spike)
+        return result
+
+    def __repr__(self):
+        return f"DetectionRecord({self.as_dict()!r}, version={self.version})"
+
+def detection_results_signature(table):
+    """
+    {key: (result, version)} của gap_spike_results / gap_spike_point_results
+    So sánh 2 signature: cùng record → chỉ so version (không so sâu gap/spike info)
+    """
+    return {key: (result, result.version if type(result) is DetectionRecord else 0)
+            for key, result in table.items()}
+
+def _updatable_record(partition, key, is_point_based):
+    """
+    Record hiện có của key nếu được cập nhật tại chỗ (đúng bảng, không bị Bảng Kèo giữ), None = phải tạo mới
+    """
+    table = partition.gap_spike_point_results if is_point_based else partition.gap_spike_results
+    result = table.get(key)
+    if type(result) is not DetectionRecord or (result.calculation_type is not None) != is_point_based:
+        return None
+    board_entry = partition.alert_board.get(key)
+    if board_entry is not None and board_entry['data'] is result:
+        return None
+    return result
+
+def _insert_record(partition, key, result, is_point_based):
+    """Lưu record mới vào bảng Point/Percent"""
+    if is_point_based:
+        table, other_table = partition.gap_spike_point_results, partition.gap_spike_results
+    else:
+        table, other_table = partition.gap_spike_results, partition.gap_spike_point_results
+    table[key] = result
+    # Symbol chỉ nằm ở 1 bảng: bỏ kết quả cũ ở bảng kia (route đổi Percent ↔ Point, hoặc kết quả
+    # tạm theo % của symbol_resolver commit sau khi drop_stale_detection_results đã chạy)
+    other_table.pop(key, None)
+
+def _update_board_for_result(partition, key, result, timer):
+    """
+    Update Alert Board (Bảng Kèo) - gọi khi có detection HOẶC đã có trong alert_board
+    (để có thể xử lý grace period và xóa items đã hết alert)
+    """
+    if result.gap['detected'] or result.spike['detected'] or key in partition.alert_board:
+        if timer is None:
+            update_alert_board(key, result, partition.alert_board)
+        else:
+            start = time.perf_counter()
+            update_alert_board(key, result, partition.alert_board)
+            timer.add('update_alert_board', time.perf_counter() - start)
+
+def store_detection_result(key, symbol, broker, timestamp, symbol_market_data, gap_info, spike_info,
+                           is_point_based, symbol_chuan=None, matched_alias=None, timer=None):
+    """
+    Lưu kết quả Gap/Spike (dict) của 1 symbol vào bảng Point/Percent và cập nhật Bảng Kèo
+    (gọi trong lock của partition broker)
+
+    timer: StageTimer để đo thời gian update_alert_board (optional)
+    """
+    partition = get_broker_partition(broker)
+    price = (symbol_market_data['bid'] + symbol_market_data['ask']) / 2
+
+    # ✅ LUÔN lưu vào gap_spike_point_results / gap_spike_results (kể cả khi không tính)
+    result = _updatable_record(partition, key, is_point_based)
+    if result is not None:
+        # ⚡ Cập nhật tại chỗ - không tạo object mới mỗi tick
+        result.update_tick(timestamp, price, gap_info, spike_info, symbol_chuan, matched_alias)
+    else:
+        result = DetectionRecord(symbol, broker, timestamp, price, gap_info, spike_info,
+                                 is_point_based, symbol_chuan, matched_alias)
+        _insert_record(partition, key, result, is_point_based)
+    _update_board_for_result(partition, key, result, timer)
+
+def store_detection_batch(broker, timestamp, rows, batch, is_point_based, timer=None):
+    """
+    Lưu DetectionBatch của Batch Detection Engine vào bảng Point/Percent và cập nhật Bảng Kèo
+    (gọi trong lock của partition broker)
+
+    Args:
+        rows: Dòng đã gom ở prepare_ingest(), cùng thứ tự batch
+              - Point: (key, symbol, market, symbol_chuan, config, matched_alias)
+              - Percent: (key, symbol, market, spread_percent)
+    """
+    partition = get_broker_partition(broker)
+    for row, item in enumerate(rows):
+        key, symbol, market = item[0], item[1], item[2]
+        symbol_chuan, matched_alias = (item[3], item[5]) if is_point_based else (None, None)
+        price = (market.bid + market.ask) / 2
+
+        result = _updatable_record(partition, key, is_point_based)
+        if result is not None:
+            # ⚡ Ghi số liệu vào slots của record - không tạo dict/message mới
+            result.update_batch_row(timestamp, price, batch, row, symbol_chuan, matched_alias)
+        else:
+            result = DetectionRecord(symbol, broker, timestamp, price, None, None,
+                                     is_point_based, symbol_chuan, matched_alias)
+            batch.load_row(row, result)
+            _insert_record(partition, key, result, is_point_based)
+        _update_board_for_result(partition, key, result, timer)
+
+# ===================== FAST PAYLOAD DECODING =====================
+# Decode body của /api/receive_data 1 lượt thành TypedSymbolRecord:
+#   - Dùng orjson (hoặc msgspec) nếu có cài, fallback json stdlib
+#   - Mỗi symbol được kiểm tra kiểu ngay khi decode và tạo luôn market record
+#     (đúng dạng lưu trong market_data) → prepare_ingest không phải copy lại
+#   - Entry lỗi (không phải dict, thiếu symbol, bid/ask không phải số) bị loại ngay;
+#     field phụ sai kiểu (OHLC, group, digits, points, trade_sessions) → giá trị mặc định, giữ symbol
+#   - Tạm dừng GC trong lúc decode: payload 1000 symbols tạo ~30k dict/list (trade_sessions),
+#     GC chạy giữa chừng chiếm gần nửa thời gian decode
+FAST_PAYLOAD_DECODING = True
+
+if orjson is not None:
+    JSON_DECODER = 'orjson'
+    _json_loads = orjson.loads
+elif msgspec is not None:
+    JSON_DECODER = 'msgspec'
+    _json_loads = msgspec.json.decode
+else:
+    JSON_DECODER = 'json'
+    _json_loads = json.loads
+
+class MarketRecord(Mapping):
+    """
+    Market data 1 symbol (market_data[broker][symbol]) - đọc như dict, cập nhật tại chỗ mỗi tick
+
+    Decode tạo 1 MarketRecord cho tick mới; commit ghi đè giá trị vào record đang có của symbol
+    (BrokerPartition.commit_market) → market_data không giữ object mới mỗi tick
+    """
+
+    __slots__ = ('timestamp', 'bid', 'ask', 'digits', 'points', 'isOpen',
+                 'prev_ohlc', 'current_ohlc', 'trade_sessions', 'group')
+    FIELDS = __slots__
+    _FIELD_SET = frozenset(__slots__)
+
+    def __init__(self, timestamp, bid, ask, digits, points, isOpen, prev_ohlc, current_ohlc, trade_sessions, group):
+        self.timestamp = timestamp
+        self.bid = bid
+        self.ask = ask
+        self.digits = digits
+        self.points = points
+        self.isOpen = isOpen
+        self.prev_ohlc = prev_ohlc
+        self.current_ohlc = current_ohlc
+        self.trade_sessions = trade_sessions
+        self.group = group
+
+    def update_from(self, other):
+        """Ghi giá trị tick mới (MarketRecord khác) vào record này"""
+        self.timestamp = other.timestamp
+        self.bid = other.bid
+        self.ask = other.ask
+        self.digits = other.digits
+        self.points = other.points
+        self.isOpen = other.isOpen
+        self.prev_ohlc = other.prev_ohlc
+        self.current_ohlc = other.current_ohlc
+        self.trade_sessions = other.trade_sessions
+        self.group = other.group
+
+    def __getitem__(self, field):
+        if field in self._FIELD_SET:
+            return getattr(self, field)
+        raise KeyError(field)
+
+    def get(self, field, default=None):
+        if field in self._FIELD_SET:
+            return getattr(self, field)
+        return default
+
+    def __contains__(self, field):
+        return field in self._FIELD_SET
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def copy(self):
+        """dict thật (JSON)"""
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"MarketRecord({self.copy()!r})"
+
+# symbol: tên symbol | market: MarketRecord lưu vào market_data | historical_candles: nến lịch sử (MT4 gửi 1 lần)
+TypedSymbolRecord = namedtuple('TypedSymbolRecord', ['symbol', 'market', 'historical_candles'])
+
+_NUMBER_TYPES = (int, float)  # So sánh bằng type() → loại luôn bool
+
+decode_stats = {
+    'decoder': JSON_DECODER,
+    'payloads': 0,
+    'invalid_payloads': 0,
+    'rejected_entries': 0,
+    'normalized_fields': 0,
+    'duplicate_entries': 0
+}
+decode_stats_lock = threading.Lock()  # Nhiều ingest worker / request decode cùng lúc
+
+def count_decode_stats(payloads=0, invalid_payloads=0, rejected_entries=0, normalized_fields=0,
+                       duplicate_entries=0):
+    """Cộng dồn decode_stats (an toàn khi nhiều thread)"""
+    with decode_stats_lock:
+        decode_stats['payloads'] += payloads
+        decode_stats['invalid_payloads'] += invalid_payloads
+        decode_stats['rejected_entries'] += rejected_entries
+        decode_stats['normalized_fields'] += normalized_fields
+        decode_stats['duplicate_entries'] += duplicate_entries
+
+def get_decode_stats():
+    """Snapshot decode_stats"""
+    with decode_stats_lock:
+        return dict(decode_stats)
+
+class PayloadDecodeError(ValueError):
+    """Body không phải JSON hợp lệ hoặc sai cấu trúc payload của EA"""
+
+_gc_pause_lock = threading.Lock()
+_gc_pause_count = 0
+
+@contextmanager
+def gc_paused():
+    """Tắt GC trong lúc decode (an toàn khi nhiều thread decode cùng lúc)"""
+    global _gc_pause_count
+    with _gc_pause_lock:
+        if _gc_pause_count == 0 and not gc.isenabled():
+            paused = False  # GC đã bị tắt ở nơi khác → không đụng tới
+        else:
+            paused = True
+            _gc_pause_count += 1
+            gc.disable()
+    try:
+        yield
+    finally:
+        if paused:
+            with _gc_pause_lock:
+                _gc_pause_count -= 1
+                if _gc_pause_count == 0:
+                    gc.enable()
+
+def _normalized_field(name, default, issues):
+    """Ghi nhận field sai kiểu và trả về giá trị mặc định thay thế"""
+    if issues is not None:
+        issues.append(name)
+    return default
+
+def _valid_ohlc(ohlc):
+    """OHLC phải là dict với các giá trị số"""
+    if type(ohlc) is not dict:
+        return False
+    for value in ohlc.values():
+        if type(value) not in _NUMBER_TYPES:
+            return False
+    return True
+
+def decode_symbol_metadata(item, issues=None):
+    """
+    Lấy + kiểm tra metadata tĩnh của symbol (group, trade_mode, digits, points, trade_sessions)
+
+    Field sai kiểu → giá trị mặc định (giống khi EA không gửi field đó), tên field được
+    thêm vào issues (nếu truyền list)
+
+    Returns:
+        dict metadata
+    """
+    points = item.get('points', 0.00001)
+    if type(points) not in _NUMBER_TYPES:
+        points = _normalized_field('points', 0.00001, issues)
+    digits = item.get('digits', 5)
+    if type(digits) is float and digits.is_integer():
+        digits = int(digits)
+    elif type(digits) is not int:
+        digits = _normalized_field('digits', 5, issues)
+
+    trade_sessions = item.get('trade_sessions', {})
+    if type(trade_sessions) is not dict:
+        trade_sessions = _normalized_field('trade_sessions', {}, issues)
+    group = item.get('group', '')
+    if type(group) is not str:
+        group = _normalized_field('group', '', issues)
+
+    return {
+        'group': group,
+        'trade_mode': item.get('trade_mode', ''),
+        'digits': digits,
+        'points': points,
+        'trade_sessions': trade_sessions
+    }
+
+def decode_symbol_entry(item, timestamp, metadata=None, issues=None):
+    """
+    Kiểm tra + chuyển 1 entry trong payload['data'] thành TypedSymbolRecord
+
+    Args:
+        item: Entry từ EA
+        timestamp: Timestamp của payload
+        metadata: Metadata tĩnh đã đăng ký (delta ingest v2) - None = lấy từ chính entry
+        issues: List nhận tên các field sai kiểu đã được thay bằng giá trị mặc định
+
+    Returns:
+        TypedSymbolRecord, hoặc None nếu entry không hợp lệ (không phải dict, thiếu symbol,
+        bid/ask không phải số)
+    """
+    if type(item) is not dict:
+        return None
+
+    symbol = item.get('symbol')
+    if not symbol or type(symbol) is not str:
+        return None
+
+    bid = item.get('bid', 0)
+    ask = item.get('ask', 0)
+    if type(bid) not in _NUMBER_TYPES or type(ask) not in _NUMBER_TYPES:
+        return None
+
+    # OHLC sai kiểu → {} (không tính Gap/Spike tick này), vẫn cập nhật giá + delay của symbol
+    prev_ohlc = item.get('prev_ohlc', {})
+    if not _valid_ohlc(prev_ohlc):
+        prev_ohlc = _normalized_field('prev_ohlc', {}, issues)
+    current_ohlc = item.get('current_ohlc', {})
+    if not _valid_ohlc(current_ohlc):
+        current_ohlc = _normalized_field('current_ohlc', {}, issues)
+
+    if metadata is None:
+        metadata = decode_symbol_metadata(item, issues)
+
+    historical_candles = item.get('historical_candles')
+    if historical_candles is not None and type(historical_candles) is not list:
+        historical_candles = None
+
+    return TypedSymbolRecord(symbol, MarketRecord(
+        timestamp, bid, ask, metadata['digits'], metadata['points'], item.get('isOpen', True),
+        prev_ohlc, current_ohlc, metadata['trade_sessions'], metadata['group']
+    ), historical_candles)
+
+def decode_ea_payload(body, default_timestamp=None):
+    """
+    Decode body JSON (bytes/str) từ EA GetData_v4
+
+    Returns:
+        (broker, timestamp, records, rejected)
+        - records: list TypedSymbolRecord
+        - rejected: số entry bị loại
+
+    Raises:
+        PayloadDecodeError: body không phải JSON object hợp lệ
+    """
+    with gc_paused():
+        return _decode_ea_payload(body, default_timestamp)
+
+def _parse_json_object(body):
+    """Parse body JSON, raise PayloadDecodeError nếu không phải JSON object"""
+    try:
+        data = _json_loads(body)
+    except Exception as e:
+        count_decode_stats(invalid_payloads=1)
+        raise PayloadDecodeError(f"Invalid JSON: {e}")
+
+    if type(data) is not dict:
+        count_decode_stats(invalid_payloads=1)
+        raise PayloadDecodeError("Payload must be a JSON object")
+    return data
+
+def _decode_ea_payload(body, default_timestamp):
+    data = _parse_json_object(body)
+
+    broker = data.get('broker', 'Unknown')
+    timestamp = data.get('timestamp')
+    if type(timestamp) not in _NUMBER_TYPES:
+        timestamp = default_timestamp if default_timestamp is not None else int(clock())
+    symbols_data = data.get('data', [])
+    if type(symbols_data) is not list:
+        count_decode_stats(invalid_payloads=1)
+        raise PayloadDecodeError("'data' must be a list")
+
+    records = []
+    rejected = 0
+    issues = []
+    for item in symbols_data:
+        record = decode_symbol_entry(item, timestamp, issues=issues)
+        if record is None:
+            rejected += 1
+        else:
+            records.append(record)
+
+    count_decode_stats(payloads=1, rejected_entries=rejected, normalized_fields=len(issues))
+    return broker, timestamp, records, rejected
+
+# ===================== DELTA INGEST (v2) =====================
+# GetData_v4 gửi lại trade_sessions/group/digits/points/trade_mode của mọi symbol mỗi giây.
+# Protocol v2:
+#   1. POST /api/v2/register_symbols - gửi metadata tĩnh 1 lần → server trả về hash nội dung
+#      {"broker": "...", "symbols": [{"symbol", "group", "trade_mode", "digits", "points", "trade_sessions"}]}
+#   2. POST /api/v2/receive_data - mỗi tick chỉ gửi giá + OHLC + hash metadata
+#      {"timestamp", "broker", "data": [{"symbol", "bid", "ask", "isOpen", "prev_ohlc", "current_ohlc", "meta": "<hash>"}]}
+#      Entry không có "meta" được xử lý như payload v1 (đầy đủ field)
+#      Hash chưa đăng ký → symbol trả về trong "unknown_meta" để EA đăng ký lại
+# Metadata giống nhau (cùng hash) dùng chung 1 object → không tạo dict mới mỗi tick
+# trade_sessions có current_day → hash của mọi symbol đổi mỗi ngày: EA đăng ký lại (broker, symbol)
+# với hash mới thì hash cũ không còn ai dùng bị xóa khỏi registry (tick còn gửi hash cũ → unknown_meta)
+symbol_metadata_registry = {}  # {hash: metadata dict}
+symbol_metadata_refs = {}  # {broker: {symbol: hash}} - hash đang dùng của từng (broker, symbol)
+symbol_metadata_ref_counts = {}  # {hash: số (broker, symbol) đang dùng}
+symbol_metadata_lock = threading.Lock()
+
+def symbol_metadata_hash(metadata):
+    """Hash nội dung metadata (sha1 của JSON chuẩn hóa, 16 ký tự hex)"""
+    canonical = json.dumps(metadata, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+def register_symbol_metadata(broker, symbols):
+    """
+    Đăng ký metadata tĩnh cho danh sách symbols của 1 broker
+
+    Symbol đăng ký lại với metadata khác → hash cũ bị xóa nếu không còn (broker, symbol) nào dùng
+
+    Returns:
+        (hashes, rejected) - hashes: {symbol: hash}
+    """
+    entries = []
+    rejected = 0
+    for item in symbols:
+        symbol = item.get('symbol') if type(item) is dict else None
+        if not symbol or type(symbol) is not str:
+            rejected += 1
+            continue
+        metadata = decode_symbol_metadata(item)
+        entries.append((symbol, symbol_metadata_hash(metadata), metadata))
+
+    hashes = {}
+    with symbol_metadata_lock:
+        refs = symbol_metadata_refs.setdefault(broker, {})
+        counts = symbol_metadata_ref_counts
+        for symbol, meta_hash, metadata in entries:
+            symbol_metadata_registry.setdefault(meta_hash, metadata)
+            previous = refs.get(symbol)
+            if previous != meta_hash:
+                refs[symbol] = meta_hash
+                counts[meta_hash] = counts.get(meta_hash, 0) + 1
+                if previous is not None:
+                    counts[previous] -= 1
+                    if counts[previous] == 0:
+                        del counts[previous]
+                        symbol_metadata_registry.pop(previous, None)
+            hashes[symbol] = meta_hash
+    return hashes, rejected
+
+def decode_ea_payload_v2(body, default_timestamp=None):
+    """
+    Decode body của /api/v2/receive_data
+
+    Returns:
+        (broker, timestamp, records, rejected, unknown_meta)
+        - unknown_meta: symbols có hash chưa đăng ký
+
+    Raises:
+        PayloadDecodeError: body không phải JSON object hợp lệ
+    """
+    with gc_paused():
+        return _decode_market_object_v2(_parse_json_object(body), default_timestamp)
+
+def _decode_market_object_v2(data, default_timestamp):
+    """Decode market payload đã parse (entry v1 đầy đủ hoặc v2 giá + hash)"""
+    broker = data.get('broker', 'Unknown')
+    timestamp = data.get('timestamp')
+    if type(timestamp) not in _NUMBER_TYPES:
+        timestamp = default_timestamp if default_timestamp is not None else int(clock())
+    symbols_data = data.get('data', [])
+    if type(symbols_data) is not list:
+        count_decode_stats(invalid_payloads=1)
+        raise PayloadDecodeError("'data' must be a list")
+
+    records = []
+    rejected = 0
+    issues = []
+    unknown_meta = []
+    registry = symbol_metadata_registry
+    for item in symbols_data:
+        meta_hash = item.get('meta') if type(item) is dict else None
+        if meta_hash is None:
+            record = decode_symbol_entry(item, timestamp, issues=issues)
+        else:
+            metadata = registry.get(meta_hash)
+            if metadata is None:
+                unknown_meta.append(item.get('symbol'))
+                continue
+            record = decode_symbol_entry(item, timestamp, metadata, issues)
+
+        if record is None:
+            rejected += 1
+        else:
+            records.append(record)
+
+    count_decode_stats(payloads=1, rejected_entries=rejected, normalized_fields=len(issues))
+    return broker, timestamp, records, rejected, unknown_meta
+
+# ===================== EA SYNC (market + positions) =====================
+# POST /api/sync - 1 request/giây thay cho receive_data + receive_positions:
+#   body: {"market": <payload receive_data (v1 hoặc v2)>, "positions": <payload receive_positions>}
+#   (có thể thiếu 1 trong 2 phần)
+#   response: {"ok": true, ...} giống receive_data
+# Lệnh cho EA: queue_signal() là hook public để module giao dịch/chiến lược đẩy lệnh,
+# EA lấy qua GET /api/get_signal?broker= (ParseTradeSignal() trong CheckSignalFromServer()).
+# Chưa có producer nào trong server → /api/sync chưa trả lệnh, EA vẫn poll get_signal sau mỗi lần sync
+def decode_sync_payload(body):
+    """
+    Decode body của /api/sync
+
+    Returns:
+        (broker, market, positions)
+        - market: (timestamp, records, rejected, unknown_meta) hoặc None nếu không gửi
+        - positions: payload positions ({timestamp, positions: [...]}) hoặc None
+
+    Raises:
+        PayloadDecodeError: body/market/positions không hợp lệ
+    """
+    with gc_paused():
+        data = _parse_json_object(body)
+        market_payload = data.get('market')
+        positions = data.get('positions')
+        if market_payload is not None and type(market_payload) is not dict:
+            raise PayloadDecodeError("'market' must be a JSON object")
+        if positions is not None and (type(positions) is not dict or type(positions.get('positions', [])) is not list):
+            raise PayloadDecodeError("'positions' must be {broker, timestamp, positions: [...]}")
+
+        broker = data.get('broker')
+        market = None
+        if market_payload is not None:
+            market_broker, timestamp, records, rejected, unknown_meta = _decode_market_object_v2(market_payload, None)
+            broker = broker or market_broker
+            market = (timestamp, records, rejected, unknown_meta)
+        if positions is not None:
+            broker = broker or positions.get('broker')
+        return broker or 'Unknown', market, positions
+
+def store_broker_positions(broker, positions_payload):
+    """Lưu positions mới nhất EA gửi lên (thay toàn bộ lần trước)"""
+    positions = positions_payload.get('positions', [])
+    get_broker_partition(broker).positions = {
+        'timestamp': positions_payload.get('timestamp'),
+        'received_at': time.time(),
+        'positions': positions if isinstance(positions, list) else []
+    }
+
+def get_broker_positions(broker):
+    """Positions mới nhất của broker (None nếu EA chưa gửi)"""
+    partition = broker_partitions.get(broker)
+    return partition.positions if partition is not None else None
+
+def queue_signal(broker, signal):
+    """
+    Hook public: thêm lệnh cho EA của broker (TRADE / CLOSE / CANCEL_PENDING, format giống ParseTradeSignal() của EA)
+    EA nhận ở lần GET /api/get_signal tiếp theo (FIFO, mỗi lần 1 lệnh)
+
+    Raises:
+        ValueError: signal không phải dict hoặc thiếu 'action'
+    """
+    if not isinstance(signal, dict) or not signal.get('action'):
+        raise ValueError("Signal must be a dict with 'action'")
+    get_broker_partition(broker).pending_signals.append(dict(signal))
+
+def pop_pending_signal(broker):
+    """Lấy lệnh đang chờ tiếp theo của broker ({} nếu không có)"""
+    partition = broker_partitions.get(broker)
+    if partition is None:
+        return {}
+    try:
+        return partition.pending_signals.popleft()
+    except IndexError:
+        return {}
+
+# ===================== BINARY INGEST =====================
+# POST /api/v2/receive_binary (application/octet-stream), little-endian:
+#   Header 20 bytes: magic "GSB1" | version u8 | flags u8 | broker_len u16 | timestamp i64 | count u32
+#   broker: UTF-8, broker_len bytes
+#   count × record 88 bytes: symbol_id u32 | flags u32 (bit0 = isOpen) |
+#                            bid, ask, prev O/H/L/C, current O/H/L/C (f64)
+# symbol_id do server cấp khi đăng ký metadata (/api/v2/register_symbols → "ids")
+# ⚡ Decode zero-copy bằng numpy.frombuffer, cột giá đi thẳng vào Batch Detection Engine
+BINARY_MAGIC = b'GSB1'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sBBHqI')
+BINARY_RECORD_DTYPE = np.dtype([
+    ('id', '<u4'), ('flags', '<u4'),
+    ('bid', '<f8'), ('ask', '<f8'),
+    ('prev_open', '<f8'), ('prev_high', '<f8'), ('prev_low', '<f8'), ('prev_close', '<f8'),
+    ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8')
+])
+BINARY_PRICE_FIELDS = BINARY_RECORD_DTYPE.names[2:]
+BINARY_FLAG_OPEN = 1
+
+binary_symbol_table = {}  # {broker: [(symbol, meta_hash), ...]} - vị trí = symbol_id
+binary_symbol_ids = {}  # {broker: {symbol: symbol_id}}
+
+class BinaryFrameRecords(list):
+    """List TypedSymbolRecord của 1 binary frame + cột NumPy (columns['index']: {symbol: vị trí})"""
+    columns = None
+
+def assign_binary_symbol_ids(broker, hashes):
+    """
+    Cấp symbol_id cho binary ingest (symbol đã có giữ nguyên id, chỉ cập nhật hash metadata)
+
+    Args:
+        hashes: {symbol: meta_hash} từ register_symbol_metadata()
+
+    Returns:
+        {symbol: symbol_id}
+    """
+    with symbol_metadata_lock:
+        table = binary_symbol_table.setdefault(broker, [])
+        ids = binary_symbol_ids.setdefault(broker, {})
+        result = {}
+        for symbol, meta_hash in hashes.items():
+            symbol_id = ids.get(symbol)
+            if symbol_id is None:
+                symbol_id = len(table)
+                ids[symbol] = symbol_id
+                table.append((symbol, meta_hash))
+            else:
+                table[symbol_id] = (symbol, meta_hash)
+            result[symbol] = symbol_id
+        return result
+
+def encode_binary_frame(broker, timestamp, symbols_data, symbol_ids):
+    """
+    Encoder tham chiếu (cho test/benchmark/EA): payload GetData_v4 → binary frame
+
+    Args:
+        symbols_data: List entry giống payload['data'] của /api/receive_data
+        symbol_ids: {symbol: symbol_id} từ /api/v2/register_symbols
+    """
+    records = np.zeros(len(symbols_data), dtype=BINARY_RECORD_DTYPE)
+    for i, item in enumerate(symbols_data):
+        prev_ohlc = item.get('prev_ohlc', {})
+        current_ohlc = item.get('current_ohlc', {})
+        records[i] = (
+            symbol_ids[item['symbol']], BINARY_FLAG_OPEN if item.get('isOpen', True) else 0,
+            item.get('bid', 0), item.get('ask', 0),
+            prev_ohlc.get('open', 0), prev_ohlc.get('high', 0), prev_ohlc.get('low', 0), prev_ohlc.get('close', 0),
+            current_ohlc.get('open', 0), current_ohlc.get('high', 0), current_ohlc.get('low', 0), current_ohlc.get('close', 0)
+        )
+    broker_bytes = broker.encode('utf-8')
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, len(broker_bytes), int(timestamp), len(records))
+    return header + broker_bytes + records.tobytes()
+
+def decode_binary_frame(body):
+    """
+    Decode binary frame (zero-copy numpy.frombuffer)
+
+    Returns:
+        (broker, timestamp, records, rejected, unknown_ids)
+        - records: BinaryFrameRecords (TypedSymbolRecord + cột NumPy cho engine)
+        - rejected: số record có giá NaN/inf hoặc trùng symbol_id với record trước đó trong frame
+        - unknown_ids: symbol_id chưa đăng ký hoặc metadata đã bị thay (EA cần gọi lại /api/v2/register_symbols)
+
+    Raises:
+        PayloadDecodeError: Frame sai magic/version/độ dài
+    """
+    if len(body) < BINARY_HEADER.size:
+        raise PayloadDecodeError("Frame too short")
+    magic, version, _, broker_len, timestamp, count = BINARY_HEADER.unpack_from(body, 0)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise PayloadDecodeError("Unsupported frame (magic/version)")
+    offset = BINARY_HEADER.size + broker_len
+    if len(body) != offset + count * BINARY_RECORD_DTYPE.itemsize:
+        raise PayloadDecodeError("Frame length does not match record count")
+
+    broker = bytes(body[BINARY_HEADER.size:offset]).decode('utf-8', errors='replace')
+    frame = np.frombuffer(body, dtype=BINARY_RECORD_DTYPE, count=count, offset=offset)
+
+    # Lấy metadata ngay lúc copy bảng: hash có thể bị xóa khi symbol đăng ký lại metadata mới
+    with symbol_metadata_lock:
+        registry = symbol_metadata_registry
+        table = [(symbol, registry.get(meta_hash)) for symbol, meta_hash in binary_symbol_table.get(broker, ())]
+    ids = frame['id']
+    known = ids < len(table)
+    if known.any():
+        registered = np.fromiter((metadata is not None for _, metadata in table), dtype=bool, count=len(table))
+        known[known] = registered[ids[known]]
+    finite = np.ones(count, dtype=bool)
+    for name in BINARY_PRICE_FIELDS:
+        finite &= np.isfinite(frame[name])
+    unknown_ids = ids[~known].tolist()
+    accepted = known & finite
+    rejected = int(np.count_nonzero(known & ~finite))
+
+    # 1 symbol_id xuất hiện nhiều lần (EA lỗi) → giữ record đầu tiên, các record sau tính là rejected
+    accepted_rows = np.flatnonzero(accepted)
+    _, first_rows = np.unique(ids[accepted_rows], return_index=True)
+    duplicates = len(accepted_rows) - len(first_rows)
+    if duplicates:
+        accepted[:] = False
+        accepted[accepted_rows[first_rows]] = True
+        rejected += duplicates
+    if not accepted.all():
+        frame = frame[accepted]
+
+    records = BinaryFrameRecords()
+    index = {}
+    points = []
+    for row in frame.tolist():
+        symbol, metadata = table[row[0]]
+        index[symbol] = len(records)
+        points.append(metadata['points'])
+        records.append(TypedSymbolRecord(symbol, MarketRecord(
+            timestamp, row[2], row[3], metadata['digits'], metadata['points'], bool(row[1] & BINARY_FLAG_OPEN),
+            {'open': row[4], 'high': row[5], 'low': row[6], 'close': row[7]},
+            {'open': row[8], 'high': row[9], 'low': row[10], 'close': row[11]},
+            metadata['trade_sessions'], metadata['group']
+        ), None))
+
+    points_column, bad_points = _float_column(points)
+    records.columns = {
+        'index': index,
+        'bid': frame['bid'], 'ask': frame['ask'], 'points': points_column,
+        'prev_close': frame['prev_close'], 'open': frame['open'], 'high': frame['high'], 'low': frame['low'],
+        'fallback': bad_points
+    }
+    count_decode_stats(payloads=1, rejected_entries=rejected, duplicate_entries=duplicates)
+    return broker, timestamp, records, rejected, unknown_ids
+
+def take_frame_columns(frame_columns, symbols, with_timestamps=False):
+    """
+    Lấy cột NumPy của binary frame theo đúng thứ tự symbols (cùng format load_batch_columns)
+    """
+    index = frame_columns['index']
+    positions = np.fromiter((index[symbol] for symbol in symbols), dtype=np.intp, count=len(symbols))
+    columns = {
+        name: np.ascontiguousarray(frame_columns[name][positions])
+        for name in ('bid', 'ask', 'points', 'prev_close', 'open', 'high', 'low', 'fallback')
+    }
+    if with_timestamps:
+        # Binary frame không mang timestamp nến → giống entry không có 'timestamp' trong OHLC
+        columns['prev_ts'] = np.zeros(len(symbols))
+        columns['cur_ts'] = np.zeros(len(symbols))
+    return columns
+
+# ===================== CALCULATION ROUTING =====================
+# Symbol vào bảng Point hay Percent: tính 1 lần cho mỗi (broker, symbol), lưu ở partition.routes
+# - Bỏ khi sửa ngưỡng (gap_settings/spike_settings/custom_thresholds - ObservedSettings)
+#   hoặc load lại THAM_SO_GAP_INDICATOR.txt (chỉ symbols có kết quả matching đổi)
+# - Ingest và các bảng GUI dùng chung 1 kết quả
+# symbol_chuan/config/matched_alias: kết quả find_symbol_config() | reason: xem get_calculation_route()
+SymbolRoute = namedtuple('SymbolRoute', ['symbol_chuan', 'config', 'matched_alias', 'is_point_based', 'reason'])
+
+routing_lock = threading.Lock()
+routing_epoch = 0  # Tăng mỗi lần invalidate → route tính dở trên settings/config cũ không được lưu
+
+def get_calculation_route(broker_symbol, config):
+    """
+    ✨ QUY ĐỊNH BẢNG: symbol vào bảng Point hay Percent
+    Logic: custom_thresholds (gap_point/spike_point) > gap_settings/spike_settings > file txt
 
-                # Update Alert Board (Bảng Kèo) - gọi khi có detection HOẶC đã có trong alert_board
-                # (để có thể xử lý grace period và xóa items đã hết alert)
-                # ✨ Sử dụng cùng logic quyết định bảng như ở trên
-                if is_point_based_by_custom or (config_early and not is_percent_based_by_settings):
-                    # Point-based symbols
-                    result = gap_spike_point_results[key]
-                    has_detection = result['gap']['detected'] or result['spike']['detected']
-                    # Gọi nếu có detection HOẶC đã có trong alert_board
-                    if has_detection or key in alert_board:
-                        update_alert_board(key, result)
+    Args:
+        broker_symbol: Key "broker_symbol"
+        config: Config từ file txt (find_symbol_config) hoặc None
+
+    Returns:
+        tuple: (is_point_based, reason)
+               reason: 'custom_point' | 'settings_percent' | 'txt_config' | 'no_config'
+    """
+    # 1. Có gap_point hoặc spike_point trong custom_thresholds → Point-based
+    custom = custom_thresholds.get(broker_symbol)
+    if custom and ('gap_point' in custom or 'spike_point' in custom):
+        return True, 'custom_point'
+
+    # 2. Có trong gap_settings/spike_settings → Percent-based (override file txt)
+    if broker_symbol in gap_settings or broker_symbol in spike_settings:
+        return False, 'settings_percent'
+
+    # 3. Cuối cùng mới dựa vào file txt
+    if config:
+        return True, 'txt_config'
+    return False, 'no_config'
+
+def get_symbol_route(broker, symbol, key=None, partition=None):
+    """
+    Route đã tính của symbol (tính + lưu vào partition.routes nếu chưa có)
+
+    Returns:
+        tuple: (SymbolRoute, pending)
+               pending=True → config chưa dò xong (symbol_resolver), route tạm không được lưu
+    """
+    if partition is None:
+        partition = get_broker_partition(broker)
+    if key is None:
+        key = symbol_key(broker, symbol)
+    route = partition.routes.get(key)
+    if route is not None:
+        return route, False
+
+    epoch = routing_epoch
+    (symbol_chuan, config, matched_alias), pending = lookup_symbol_config(symbol)
+    route = SymbolRoute(symbol_chuan, config, matched_alias, *get_calculation_route(key, config))
+    if not pending:
+        with routing_lock:
+            if epoch == routing_epoch:
+                partition.routes[key] = route
+    return route, pending
+
+def invalidate_symbol_routes(keys=None, symbols=None):
+    """
+    Bỏ route đã tính
+
+    Args:
+        keys: broker_symbol bị ảnh hưởng (sửa ngưỡng)
+        symbols: tên symbol (mọi broker) có kết quả matching đổi (load lại config)
+        Cả 2 None → bỏ tất cả
+    """
+    global routing_epoch
+    with routing_lock:
+        routing_epoch += 1
+        if keys is None and symbols is None:
+            for partition in iter_broker_partitions():
+                partition.routes = {}
+            return
+        for key in keys or ():
+            partition = partition_for_key(key)
+            if partition is not None:
+                partition.routes.pop(key, None)
+        if symbols:
+            # Duyệt route đang có (route chỉ được ghi khi giữ routing_lock), không tạo key
+            # broker_symbol cho các cặp broker × symbol chưa từng nhận dữ liệu
+            symbols = set(symbols)
+            for partition in iter_broker_partitions():
+                routes = partition.routes
+                for key in list(routes):
+                    pair = symbol_registry.pair_of_key(key)
+                    if pair is not None and pair[1] in symbols:
+                        del routes[key]
+
+def on_routing_settings_changed(name, keys):
+    """Listener của ObservedSettings: route phụ thuộc custom_thresholds/gap_settings/spike_settings[broker_symbol]"""
+    if name not in THRESHOLD_SETTINGS_TYPES:
+        return
+    if keys is None:
+        invalidate_symbol_routes()
+    else:
+        invalidate_symbol_routes(keys=keys)
+
+add_settings_listener(on_routing_settings_changed)
+
+# ===================== BULK THRESHOLD OPERATIONS =====================
+# Áp dụng ngưỡng hàng loạt (theo broker / nhóm / symbol chuẩn / danh sách key) như 1 transaction:
+# 1 lượt kiểm tra giá trị → mỗi settings dict 1 lần báo thay đổi (threshold_table, routes, store)
+# → 1 lần ghi file (schedule_save) → GUI refresh 1 lần
+# Field: 'gap'/'spike' → gap_settings/spike_settings[key] (%), 'gap_point'/'spike_point' → custom_thresholds[key]
+# value None = xóa ngưỡng (về default / file txt)
+ThresholdTarget = namedtuple('ThresholdTarget', ['broker', 'symbol', 'key', 'is_point_based'])
+ThresholdChange = namedtuple('ThresholdChange', ['key', 'field', 'value'])
+
+THRESHOLD_FIELDS = {
+    'gap': 'gap_settings',
+    'spike': 'spike_settings',
+    'gap_point': 'custom_thresholds',
+    'spike_point': 'custom_thresholds',
+}
+
+def select_threshold_targets(brokers=None, group=None, symbol_chuan=None, keys=None, table=None):
+    """
+    Chọn các (broker, symbol) để áp dụng ngưỡng hàng loạt từ market data đang có
+
+    Args:
+        brokers: Tên broker hoặc list broker (None = tất cả)
+        group: Nhóm symbol theo classify_symbol_group() (Forex, Metals, ...)
+        symbol_chuan: Symbol chuẩn trong file txt (mọi alias đã khớp)
+        keys: List broker_symbol cụ thể (chọn cả key chưa có market data)
+        table: 'point' | 'percent' - chỉ symbols đang ở bảng này (None = cả 2)
+
+    Returns:
+        list: [ThresholdTarget, ...]
+
+    Raises:
+        ValueError: key trong keys không xác định được broker (xem split_symbol_key)
+    """
+    if isinstance(brokers, str):
+        brokers = (brokers,)
+    broker_set = set(brokers) if brokers is not None else None
+
+    if keys is not None:
+        pairs = []
+        for key in keys:
+            broker, symbol = split_symbol_key(key)
+            pairs.append((broker, symbol, None))
+    else:
+        pairs = []
+        for partition in iter_broker_partitions():
+            if partition.market is None:
+                continue
+            for symbol, data in list(partition.market.items()):
+                pairs.append((partition.broker, symbol, data))
+
+    targets = []
+    for broker, symbol, data in pairs:
+        if broker_set is not None and broker not in broker_set:
+            continue
+        if group is not None:
+            group_path = data.get('group', '') if isinstance(data, dict) else ''
+            if classify_symbol_group(symbol, group_path) != group:
+                continue
+        key = symbol_key(broker, symbol)
+        route = get_symbol_route(broker, symbol, key)[0]
+        if symbol_chuan is not None and route.symbol_chuan != symbol_chuan:
+            continue
+        if table is not None and route.is_point_based != (table == 'point'):
+            continue
+        targets.append(ThresholdTarget(broker, symbol, key, route.is_point_based))
+    return targets
+
+def threshold_changes_for(targets, **values):
+    """
+    Cùng giá trị cho mọi target - vd threshold_changes_for(targets, gap=0.3, spike=1.3)
+
+    Returns:
+        list: [ThresholdChange, ...]
+    """
+    return [ThresholdChange(target.key if isinstance(target, ThresholdTarget) else target, field, value)
+            for target in targets for field, value in values.items()]
+
+def validate_threshold_changes(changes):
+    """
+    1 lượt kiểm tra toàn bộ thay đổi trước khi ghi
+
+    Returns:
+        tuple: (changes đã chuẩn hóa (value float/None), errors)
+    """
+    normalized = []
+    errors = []
+    for change in changes:
+        key, field, value = change
+        if field not in THRESHOLD_FIELDS:
+            errors.append(f"{key}: field không hợp lệ {field!r}")
+            continue
+        if not isinstance(key, str) or '_' not in key:
+            errors.append(f"{key!r}: key phải là broker_symbol")
+            continue
+        if value is not None:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                errors.append(f"{key} {field}: {value!r} không phải số")
+                continue
+            if not math.isfinite(value) or value < 0:
+                errors.append(f"{key} {field}: {value} phải là số >= 0")
+                continue
+        normalized.append(ThresholdChange(key, field, value))
+    return normalized, errors
+
+def apply_threshold_changes(changes, save=True):
+    """
+    Áp dụng nhiều thay đổi ngưỡng như 1 transaction
+
+    - Có lỗi validate → không áp dụng gì (ValueError)
+    - gap_settings / spike_settings / custom_thresholds: mỗi dict 1 lần apply_changes()
+      → listeners (threshold_table, routes, settings store) nhận toàn bộ key trong 1 lần gọi
+    - save=True: mỗi settings dict đã đổi 1 lần schedule_save()
+
+    Returns:
+        dict: {'keys': số key, 'changed': {settings_name: số key đổi}, 'duration_ms': ...}
+
+    Raises:
+        ValueError: Có thay đổi không hợp lệ
+    """
+    started = time.perf_counter()
+    normalized, errors = validate_threshold_changes(changes)
+    if errors:
+        shown = '; '.join(errors[:5]) + (f" (+{len(errors) - 5})" if len(errors) > 5 else "")
+        raise ValueError(f"{len(errors)} thay đổi không hợp lệ: {shown}")
+
+    percent = {'gap_settings': ({}, set()), 'spike_settings': ({}, set())}
+    custom_fields = {}  # {key: {field: value/None}}
+    for key, field, value in normalized:
+        name = THRESHOLD_FIELDS[field]
+        if name == 'custom_thresholds':
+            custom_fields.setdefault(key, {})[field] = value
+            continue
+        sets, deletes = percent[name]
+        if value is None:
+            sets.pop(key, None)
+            deletes.add(key)
+        else:
+            deletes.discard(key)
+            sets[key] = value
+
+    changed = {}
+    for name, settings_dict in (('gap_settings', gap_settings), ('spike_settings', spike_settings)):
+        sets, deletes = percent[name]
+        count = settings_dict.apply_changes(sets, deletes)
+        if count:
+            changed[name] = count
+
+    if custom_fields:
+        custom_sets = {}
+        custom_deletes = set()
+        for key, fields in custom_fields.items():
+            current = custom_thresholds.get(key)
+            merged = dict(current) if current else {}
+            for field, value in fields.items():
+                if value is None:
+                    merged.pop(field, None)
                 else:
-                    # Percent-based symbols
-                    result = gap_spike_results[key]
-                    has_detection = result['gap']['detected'] or result['spike']['detected']
-                    # Gọi nếu có detection HOẶC đã có trong alert_board
-                    if has_detection or key in alert_board:
-                        update_alert_board(key, result)
+                    merged[field] = value
+            if merged:
+                custom_sets[key] = merged
+            else:
+                custom_deletes.add(key)
+        count = custom_thresholds.apply_changes(custom_sets, custom_deletes)
+        if count:
+            changed['custom_thresholds'] = count
+
+    if save:
+        for name in changed:
+            schedule_save(name)
+
+    duration_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Bulk thresholds: {len(normalized)} changes, {changed} in {duration_ms:.1f}ms")
+    return {'keys': len({change.key for change in normalized}), 'changed': changed, 'duration_ms': duration_ms}
+
+# ===================== TWO-PHASE INGEST =====================
+# Phase 1 (prepare_ingest): parse payload, dò symbol config, tính bid tracking/nến/Gap/Spike
+#   KHÔNG giữ data_lock - chỉ đọc state hiện tại, mọi thay đổi được gom vào "plan"
+# Phase 2 (commit_ingest): giữ data_lock thật ngắn, chỉ gán các giá trị đã tính sẵn
+#   (nến và bid tracking được thay bằng object mới - copy-on-write, không sửa tại chỗ)
+TWO_PHASE_INGEST = True
+
+def build_candle_update(key, timestamp, current_ohlc, historical_candles, existing):
+    """
+    Tính list nến M1 mới cho 1 symbol (copy-on-write, không sửa list hiện tại)
 
+    Args:
+        key: broker_symbol
+        timestamp: Timestamp của payload
+        current_ohlc: OHLC nến hiện tại từ EA
+        historical_candles: Nến lịch sử EA gửi kèm (lần đầu) hoặc None
+        existing: List nến hiện tại (hoặc None)
+
+    Returns:
+        list nến mới, hoặc None nếu không có thay đổi
+    """
+    candles = None
+
+    # IMPORTANT: Check for historical_candles FIRST (populate on chart open)
+    if historical_candles and len(historical_candles) > 0 and existing is None:
+        # First time receiving this symbol - restore from historical data
+        try:
+            candles = []
+            for candle in historical_candles:
+                if isinstance(candle, (list, tuple)) and len(candle) >= 5:
+                    ts = int(candle[0])
+                    o = float(candle[1])
+                    h = float(candle[2])
+                    l = float(candle[3])
+                    c = float(candle[4])
+                    candles.append((ts, o, h, l, c))
+
+            if len(candles) > 0:
+                logger.info(f"Restored {len(candles)} historical candles for {key}")
+        except Exception as e:
+            logger.error(f"Error processing historical_candles for {key}: {e}")
+            candles = []
+
+    # Then accumulate current candle data (as before)
+    if current_ohlc.get('open') and current_ohlc.get('close'):
+        # Round timestamp về đầu phút (M1 = 60s)
+        # VD: 14:30:45 → 14:30:00
+        candle_time = (timestamp // 60) * 60
+
+        o = float(current_ohlc.get('open', 0))
+        h = float(current_ohlc.get('high', 0))
+        l = float(current_ohlc.get('low', 0))
+        c = float(current_ohlc.get('close', 0))
+
+        # ✅ FIX: LUÔN đảm bảo list được khởi tạo (không chỉ lần đầu)
+        if candles is None:
+            candles = list(existing) if isinstance(existing, list) else []
+
+        # Kiểm tra nến cuối cùng
+        if candles:
+            last_candle = candles[-1]
+            last_time = last_candle[0]
+
+            if last_time == candle_time:
+                # Cùng phút → Update nến hiện tại (High/Low nếu cần)
+                last_o, last_h, last_l = last_candle[1], last_candle[2], last_candle[3]
+                candles[-1] = (candle_time, last_o, max(last_h, h), min(last_l, l), c)
+            else:
+                # Phút mới → CHỈ thêm nến mới nếu có thay đổi giá (giống MT4/MT5)
+                # 1. Giá Close thay đổi so với nến cuối (có giao dịch mới)
+                # 2. HOẶC có volatility trong nến (H != L - có biến động giá)
+                # 3. HOẶC Open khác Close (có movement trong phút)
+                last_c = last_candle[4]
+                has_price_change = (c != last_c) or (h != l) or (o != c)
+
+                if has_price_change:
+                    candles.append((candle_time, o, h, l, c))
+                # Nếu không có thay đổi (O=H=L=C và C=last_c) → KHÔNG tạo nến mới
+        else:
+            # Nến đầu tiên (list trống)
+            candles.append((candle_time, o, h, l, c))
+
+        # Giữ tối đa 200 nến (để chart load nhanh)
+        if len(candles) > 200:
+            candles = candles[-200:]
+
+    return candles
+
+def make_skipped_detection_infos(skip_reason, is_point_based, default_gap_percent=0):
+    """(gap_info, spike_info) cho symbol không xét gap/spike (market đóng, skip period, startup delay)"""
+    message = f'{skip_reason} - Không xét gap/spike'
+    if is_point_based:
+        return ({
+            'detected': False,
+            'strength': 0.0,
+            'message': message,
+            'default_gap_percent': default_gap_percent,
+            'threshold_point': 0,
+            'point_gap': 0
+        }, {
+            'detected': False,
+            'strength': 0.0,
+            'message': message,
+            'spike_point': 0
+        })
+    return ({
+        'detected': False,
+        'strength': 0.0,
+        'message': message
+    }, {
+        'detected': False,
+        'strength': 0.0,
+        'message': message
+    })
+
+def prepare_ingest(broker, timestamp, symbols_data, timer=None):
+    """
+    Phase 1 của ingest - chạy KHÔNG giữ data_lock
+
+    Parse payload, dò symbol config, tính bid tracking/nến/Gap/Spike dựa trên
+    state hiện tại (chỉ đọc). Không ghi vào state global nào.
+
+    Args:
+        timer: StageTimer nhận thời gian từng giai đoạn (optional)
+
+    Returns:
+        dict: plan cho commit_ingest()
+    """
+    partition = get_broker_partition(broker)
+    perf = time.perf_counter
+    filter_time = config_time = candle_time = detection_time = 0.0
+    records = {}          # {symbol: market record}
+    unselected = []       # [symbol] - không nằm trong symbol filter
+    tracking = {}         # {broker_symbol: bid tracking entry} - view đã cập nhật cho symbol trong payload
+    tracking_updates = {} # {broker_symbol: entry mới} - chỉ các entry thay đổi
+    candle_updates = {}   # {broker_symbol: list nến mới}
+    seen = []             # broker_symbol cho loading state
+    results = []          # args cho store_detection_result()
+    batches = []          # (rows, DetectionBatch, is_point_based) cho store_detection_batch()
+    unresolved = []       # [symbol] - chưa dò xong config (symbol_resolver)
+    skipped_infos = {}    # {(skip_reason, default_gap_percent): (gap_info, spike_info)} - dùng chung cho payload
+
+    # Symbols cần tính Gap/Spike - gom lại cho Batch Detection Engine
+    point_batch = []
+    percent_batch = []
+
+    # ✨ Startup delay - không xét gap/spike trong 5 phút đầu khi khởi động (tính 1 lần cho payload)
+    startup_delay_seconds = audio_settings.get('startup_delay_minutes', 5) * 60
+    time_since_startup = clock() - app_startup_time
+    if time_since_startup < startup_delay_seconds:
+        remaining_seconds = int(startup_delay_seconds - time_since_startup)
+        startup_skip_reason = f"Startup delay - còn {remaining_seconds // 60} phút {remaining_seconds % 60} giây"
+    else:
+        startup_skip_reason = None
+
+    for symbol_data in symbols_data:
+        if type(symbol_data) is TypedSymbolRecord:
+            # ⚡ Đã decode sẵn thành market record đúng kiểu (decode_ea_payload)
+            symbol, symbol_market_data, historical_candles = symbol_data
+        else:
+            symbol = symbol_data.get('symbol', '')
+            if not symbol:
+                continue
+
+            # Lưu dữ liệu market
+            symbol_market_data = MarketRecord(
+                timestamp,
+                symbol_data.get('bid', 0),
+                symbol_data.get('ask', 0),
+                symbol_data.get('digits', 5),
+                symbol_data.get('points', 0.00001),
+                symbol_data.get('isOpen', True),
+                symbol_data.get('prev_ohlc', {}),
+                symbol_data.get('current_ohlc', {}),
+                symbol_data.get('trade_sessions', {}),
+                symbol_data.get('group', '')
+            )
+            historical_candles = symbol_data.get('historical_candles', [])
+        current_bid = symbol_market_data['bid']
+        records[symbol] = symbol_market_data
+
+        key = symbol_key(broker, symbol)
+
+        # Bỏ qua symbol nếu không nằm trong danh sách được chọn
+        started = perf()
+        selected = is_symbol_selected_for_detection(broker, symbol)
+        filter_time += perf() - started
+        if not selected:
+            unselected.append(symbol)
+            continue
+
+        # ✨ NGAY KHI NHẬN SYMBOL: Dò với file txt để đảm bảo chính xác 100%
+        # Check symbol config TRƯỚC KHI tính gap/spike (để track tất cả symbols)
+        # ⚡ Route (config + bảng Point/Percent) tính 1 lần, lưu ở partition.routes
+        # ⚡ Symbol mới (không exact match) được dò theo lô trên symbol_resolver
+        started = perf()
+        route, config_pending = get_symbol_route(broker, symbol, key, partition)
+        symbol_chuan_early, config_early, matched_alias_early, is_point_based, _ = route
+        config_time += perf() - started
+        if config_pending:
+            unresolved.append(symbol)
+
+        # Track symbol vào loading state (để progress bar chính xác)
+        seen.append(key)
+
+        # Track bid changes for delay detection
+        current_time = clock()
+        previous = tracking[key] if key in tracking else partition.bid_tracking.get(key)
+        if previous is None:
+            # First time seeing this symbol - initialize
+            entry = {
+                'last_bid': current_bid,
+                'last_change_time': current_time,
+                'first_seen_time': current_time
+            }
+            tracking_updates[key] = entry
+        elif previous['last_bid'] != current_bid:
+            # Existing symbol - bid changed
+            entry = dict(previous, last_bid=current_bid, last_change_time=current_time)
+            tracking_updates[key] = entry
+        else:
+            entry = previous
+        tracking[key] = entry
+
+        # Store candle data for charting (M1 candles)
+        started = perf()
+        existing_candles = candle_updates[key] if key in candle_updates else partition.candle_data.get(key)
+        new_candles = build_candle_update(
+            key, timestamp, symbol_market_data['current_ohlc'], historical_candles, existing_candles
+        )
+        if new_candles is not None:
+            candle_updates[key] = new_candles
+        candle_time += perf() - started
+
+        if config_pending and SYMBOL_RESOLVE_INTERIM_POLICY == 'skip':
+            # ⏳ Chưa dò xong config → chưa tính Gap/Spike (chưa biết Point hay Percent)
+            continue
+
+        # Tính toán Gap và Spike
+        # Kiểm tra nếu setting "only_check_open_market" được bật
+        should_calculate = True
+        skip_reason = ""
+
+        if market_open_settings.get('only_check_open_market', False):
+            # Chỉ tính nếu market đang mở
+            is_market_open = symbol_market_data.get('isOpen', True)
+            if not is_market_open:
+                should_calculate = False
+                skip_reason = "Market đóng cửa"
+
+        # Kiểm tra skip period sau khi market mở
+        if should_calculate and is_within_skip_period_after_open(symbol, broker, timestamp, symbol_market_data):
+            should_calculate = False
+            skip_minutes = market_open_settings.get('skip_minutes_after_open', 0)
+            skip_reason = f"Bỏ {skip_minutes} phút đầu sau khi mở cửa"
+
+        # ✨ Kiểm tra startup delay - không xét gap/spike trong 5 phút đầu khi khởi động
+        if should_calculate and startup_skip_reason is not None:
+            should_calculate = False
+            skip_reason = startup_skip_reason
+
+        # ⚡ OPTIMIZATION: Tính spread 1 lần và truyền vào cả 2 hàm
+        spread_percent = calculate_spread_percent(
+            symbol_market_data.get('bid', 0),
+            symbol_market_data.get('ask', 0)
+        )
+
+        if should_calculate and USE_BATCH_DETECTION:
+            # ⚡ Gom lại để tính 1 lượt cho cả payload (Batch Detection Engine)
+            if is_point_based:
+                point_batch.append((key, symbol, symbol_market_data, symbol_chuan_early, config_early, matched_alias_early))
+            else:
+                percent_batch.append((key, symbol, symbol_market_data, spread_percent))
+            continue
+
+        started = perf()
+        if not should_calculate:
+            # Không tính (market đóng/skip period) nhưng vẫn lưu vào bảng Point/Percent
+            # Kết quả giống nhau cho mọi symbol cùng lý do → tạo 1 lần cho cả payload (không sửa dict này)
+            default_gap_percent = config_early.get('default_gap_percent', 0) if is_point_based else None
+            skipped = skipped_infos.get((skip_reason, default_gap_percent))
+            if skipped is None:
+                skipped = skipped_infos[(skip_reason, default_gap_percent)] = make_skipped_detection_infos(
+                    skip_reason, is_point_based, default_gap_percent)
+            gap_info, spike_info = skipped
+        elif is_point_based:
+            # Symbol có cấu hình trong file txt → Point-based
+            gap_info = calculate_gap_point(symbol, broker, symbol_market_data, spread_percent)
+            spike_info = calculate_spike_point(symbol, broker, symbol_market_data, spread_percent, tracking=tracking)
+        else:
+            # Symbol không có cấu hình → Percent-based
+            gap_info = calculate_gap(symbol, broker, symbol_market_data, spread_percent)
+            spike_info = calculate_spike(symbol, broker, symbol_market_data, spread_percent)
+        detection_time += perf() - started
+
+        results.append((
+            key, symbol, broker, timestamp, symbol_market_data, gap_info, spike_info,
+            is_point_based, symbol_chuan_early, matched_alias_early
+        ))
+
+    if unresolved:
+        # Dò theo lô ngoài đường ingest - lượt ingest sau dùng kết quả trong cache
+        symbol_resolver.submit(unresolved)
+
+    # ⚡ Batch Detection Engine: tính Gap/Spike cho tất cả symbols đã gom ở trên
+    # Binary ingest: giá đã là cột NumPy (decode_binary_frame) → đưa thẳng vào engine
+    frame_columns = getattr(symbols_data, 'columns', None)
+    started = perf()
+
+    if point_batch:
+        point_results = calculate_point_batch(
+            broker, [(symbol, smd, chuan, cfg, alias) for _, symbol, smd, chuan, cfg, alias in point_batch],
+            tracking=tracking,
+            columns=take_frame_columns(frame_columns, [row[1] for row in point_batch]) if frame_columns else None,
+            keys=[row[0] for row in point_batch]
+        )
+        batches.append((point_batch, point_results, True))
+
+    if percent_batch:
+        percent_results = calculate_percent_batch(
+            broker, [(symbol, smd, spread) for _, symbol, smd, spread in percent_batch],
+            columns=take_frame_columns(frame_columns, [row[1] for row in percent_batch], True) if frame_columns else None
+        )
+        batches.append((percent_batch, percent_results, False))
+
+    if timer is not None:
+        timer.add('symbol_filter', filter_time)
+        timer.add('find_symbol_config', config_time)
+        timer.add('candles', candle_time)
+        timer.add('detection', detection_time + perf() - started)
+
+    return {
+        'broker': broker,
+        'timestamp': timestamp,
+        'records': records,
+        'unselected': unselected,
+        'tracking_updates': tracking_updates,
+        'candle_updates': candle_updates,
+        'seen': seen,
+        'results': results,
+        'batches': batches
+    }
+
+def commit_ingest(plan, timer=None):
+    """
+    Phase 2 của ingest - GỌI TRONG lock của partition broker
+
+    Chỉ gán các giá trị đã tính sẵn ở prepare_ingest() vào state của partition
+    """
+    broker = plan['broker']
+    partition = get_broker_partition(broker)
+
+    partition.commit_market(plan['records'])
+
+    for symbol in plan['unselected']:
+        key = symbol_key(broker, symbol)
+        clear_symbol_detection_results(broker, symbol)
+        partition.bid_tracking.pop(key, None)
+        partition.candle_data.pop(key, None)
+
+    partition.bid_tracking.update(plan['tracking_updates'])
+    partition.candle_data.update(plan['candle_updates'])
+    loading_state['symbols_seen'].update(plan['seen'])
+
+    for result_args in plan['results']:
+        store_detection_result(*result_args, timer=timer)
+    for rows, batch, is_point_based in plan['batches']:
+        store_detection_batch(broker, plan['timestamp'], rows, batch, is_point_based, timer=timer)
+
+# Phần sau commit (âm thanh Bảng Kèo, loading_state, cleanup_stale_data) dùng state chung của mọi
+# broker → các worker của ingest_queue commit song song nhưng chạy phần này lần lượt
+post_ingest_lock = InstrumentedLock('post_ingest')
+
+def process_ingest_payload(broker, timestamp, symbols_data):
+    """
+    Xử lý 1 payload market data của EA (Gap/Spike, Bảng Kèo, âm thanh, loading state, cleanup)
+
+    Gọi từ worker của ingest_queue (ASYNC_INGEST) hoặc trực tiếp trong receive_data
+    """
+    # ⚡ Mỗi broker có lock riêng → các EA khác nhau không chờ nhau
+    partition = get_broker_partition(broker)
+    perf = time.perf_counter
+    timer = StageTimer()
+    started = perf()
+
+    if TWO_PHASE_INGEST:
+        # ⚡ Tính toán ngoài lock, chỉ giữ lock của partition khi commit
+        # ingest_lock: payload khác của cùng broker không prepare trên state chưa commit (mất update)
+        with partition.ingest_lock:
+            entered = perf()
+            plan = prepare_ingest(broker, timestamp, symbols_data, timer)
+            prepared = perf()
+            with partition.lock.section('receive_data'):
+                locked = perf()
+                commit_ingest(plan, timer)
+        timer.add('prepare', prepared - entered)
+        timer.add('commit_lock_wait', (entered - started) + (locked - prepared))
+    else:
+        with partition.lock.section('receive_data'):
+            locked = perf()
+            plan = prepare_ingest(broker, timestamp, symbols_data, timer)
+            prepared = perf()
+            commit_ingest(plan, timer)
+        timer.add('prepare', prepared - locked)
+        timer.add('commit_lock_wait', locked - started)
+    committed = perf()
+    timer.add('commit', committed - max(locked, prepared))
+
+    with post_ingest_lock.section('post_ingest'):
         # 🔊 PHÁT ÂM THANH CẢnh báo cho toàn bộ bảng (sau khi xử lý tất cả symbols)
         # Check and play board alerts (not per-product, but for entire board)
-        check_and_play_board_alert('gap')
-        check_and_play_board_alert('spike')
-        check_and_play_board_alert('delay')
+        check_board_alerts(('gap', 'spike', 'delay'))
+        alerted = perf()
+        timer.add('board_alert', alerted - committed)
 
         # ✨ Update loading state - track processed symbols
         if not loading_state['first_batch_received']:
@@ -3131,21 +6919,527 @@ def receive_data():
                     loading_state['loading_complete_logged'] = True
 
         # Cleanup old/stale data (brokers không còn gửi data)
+        cleanup_started = perf()
         cleanup_stale_data()
+        finished = perf()
+        timer.add('cleanup', finished - cleanup_started)
+    timer.add('total', finished - started)
+    timer.flush()
+    ingest_metrics.record_broker_payload(broker, len(symbols_data))
+
+    logger.info(f"Received data from {broker}: {len(symbols_data)} symbols | Progress: {loading_state['processed_symbols']}/{loading_state['total_symbols']}")
+
+# ===================== ASYNC INGEST QUEUE =====================
+# /api/receive_data chỉ validate + đưa payload vào hàng đợi rồi trả về ngay
+# → WebRequest của EA không phải chờ Python tính xong Gap/Spike.
+# Mỗi broker chỉ giữ payload MỚI NHẤT chưa xử lý (EA luôn gửi snapshot đầy đủ tất cả symbols),
+# payload cũ hơn chưa kịp xử lý sẽ bị bỏ (coalesce).
+ASYNC_INGEST = True
+INGEST_WORKER_COUNT = 4
+
+class IngestQueue:
+    """Hàng đợi ingest theo broker: mỗi broker 1 slot (payload mới nhất), xử lý bởi worker threads"""
+
+    def __init__(self, handler, worker_count=INGEST_WORKER_COUNT):
+        self.handler = handler  # handler(broker, timestamp, symbols_data)
+        self.worker_count = worker_count
+        self._cond = threading.Condition()
+        self._slots = {}  # {broker: (timestamp, symbols_data, received_at)}
+        self._ready = deque()  # Brokers có payload chờ xử lý (mỗi broker tối đa 1 lần)
+        self._in_progress = set()  # Brokers đang được worker xử lý (1 broker chỉ 1 worker)
+        self._workers = []
+        self._stats = {
+            'enqueued': 0,
+            'processed': 0,
+            'dropped': 0,
+            'errors': 0,
+            'lag_total': 0.0,
+            'lag_max': 0.0,
+            'lag_last': 0.0
+        }
+        self._dropped_by_broker = defaultdict(int)
+
+    def start(self):
+        with self._cond:
+            if self._workers:
+                return
+            for i in range(self.worker_count):
+                worker = threading.Thread(target=self._worker_loop, name=f"IngestWorker-{i}", daemon=True)
+                self._workers.append(worker)
+                worker.start()
+        logger.info(f"Ingest queue started with {self.worker_count} workers")
+
+    def submit(self, broker, timestamp, symbols_data, received_at=None):
+        """Đưa payload vào hàng đợi (thay payload cũ chưa xử lý của cùng broker)"""
+        if received_at is None:
+            received_at = time.time()
+        if not self._workers:
+            self.start()
+
+        with self._cond:
+            self._stats['enqueued'] += 1
+            previous = self._slots.get(broker)
+            if previous is not None:
+                # Payload cũ chưa xử lý → bỏ, chỉ giữ snapshot mới nhất
+                self._stats['dropped'] += 1
+                self._dropped_by_broker[broker] += 1
+                carry_over_historical_candles(previous[1], symbols_data)
+            self._slots[broker] = (timestamp, symbols_data, received_at)
+            if previous is None and broker not in self._in_progress:
+                self._ready.append(broker)
+                self._cond.notify()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._ready:
+                    self._cond.wait()
+                broker = self._ready.popleft()
+                timestamp, symbols_data, received_at = self._slots.pop(broker)
+                self._in_progress.add(broker)
+
+            failed = False
+            try:
+                self.handler(broker, timestamp, symbols_data)
+            except Exception as e:
+                failed = True
+                logger.error(f"Error processing queued data from {broker}: {e}")
+
+            lag = time.time() - received_at
+            with self._cond:
+                self._in_progress.discard(broker)
+                if failed:
+                    self._stats['errors'] += 1
+                else:
+                    self._stats['processed'] += 1
+                    self._stats['lag_total'] += lag
+                    self._stats['lag_last'] = lag
+                    if lag > self._stats['lag_max']:
+                        self._stats['lag_max'] = lag
+                if broker in self._slots:
+                    # Payload mới hơn đến trong lúc đang xử lý
+                    self._ready.append(broker)
+                self._cond.notify_all()
+
+    def depth(self):
+        """Số payload đang chờ xử lý"""
+        return len(self._slots)
+
+    def wait_idle(self, timeout=None):
+        """Chờ tới khi hàng đợi rỗng và không còn worker nào đang xử lý"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._slots or self._in_progress:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def get_stats(self):
+        with self._cond:
+            processed = self._stats['processed']
+            return {
+                'depth': len(self._slots),
+                'in_progress': len(self._in_progress),
+                'workers': len(self._workers),
+                'enqueued': self._stats['enqueued'],
+                'processed': processed,
+                'dropped': self._stats['dropped'],
+                'errors': self._stats['errors'],
+                'dropped_by_broker': dict(self._dropped_by_broker),
+                'lag_last_ms': round(self._stats['lag_last'] * 1000, 3),
+                'lag_avg_ms': round(self._stats['lag_total'] / processed * 1000, 3) if processed else 0.0,
+                'lag_max_ms': round(self._stats['lag_max'] * 1000, 3)
+            }
+
+def carry_over_historical_candles(old_symbols_data, new_symbols_data):
+    """
+    Khi bỏ payload cũ: giữ lại historical_candles (EA MT4 chỉ gửi 1 lần cho mỗi symbol)
+
+    Hỗ trợ cả dict thô từ EA và TypedSymbolRecord (sửa new_symbols_data tại chỗ)
+    """
+    historical = {}
+    for item in old_symbols_data:
+        if type(item) is TypedSymbolRecord:
+            if item.historical_candles:
+                historical[item.symbol] = item.historical_candles
+        elif isinstance(item, dict) and item.get('historical_candles'):
+            historical[item.get('symbol')] = item['historical_candles']
+    if not historical:
+        return
+
+    for i, item in enumerate(new_symbols_data):
+        if type(item) is TypedSymbolRecord:
+            if not item.historical_candles and item.symbol in historical:
+                new_symbols_data[i] = item._replace(historical_candles=historical[item.symbol])
+        elif isinstance(item, dict) and not item.get('historical_candles') and item.get('symbol') in historical:
+            item['historical_candles'] = historical[item.get('symbol')]
+
+ingest_queue = IngestQueue(process_ingest_payload)
+
+# ===================== TRAFFIC RECORDER =====================
+# Ghi nguyên body request của EA + thời điểm nhận vào file gzip xoay vòng
+# → phát lại offline bằng replay_traffic.py (benchmark/debug với burst thật: tin tức, mở phiên)
+# File: TRAFFIC_MAGIC, sau đó mỗi record = TRAFFIC_RECORD_HEADER + endpoint (utf-8) + body
+TRAFFIC_MAGIC = b'GSR1'
+TRAFFIC_RECORD_HEADER = struct.Struct('<dHI')  # received_at, len(endpoint), len(body)
+TRAFFIC_FILE_PATTERN = 'traffic_*.gsr.gz'
+TRAFFIC_QUEUE_LIMIT = 2000  # Record chờ ghi tối đa (đầy → bỏ, không chặn request của EA)
+TRAFFIC_FLUSH_INTERVAL = 1.0  # Giây - flush gzip khi rảnh để file đọc được ngay cả khi app bị tắt đột ngột
+
+def load_traffic_recorder_settings():
+    """Load traffic recorder settings from JSON file"""
+    try:
+        if os.path.exists(TRAFFIC_RECORDER_SETTINGS_FILE):
+            with open(TRAFFIC_RECORDER_SETTINGS_FILE, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    traffic_recorder_settings.update(loaded)
+        for field, default in (('max_file_mb', 64), ('max_files', 20)):
+            try:
+                value = int(traffic_recorder_settings.get(field, default))
+            except (TypeError, ValueError):
+                value = default
+            traffic_recorder_settings[field] = value if value > 0 else default
+        traffic_recorder_settings['enabled'] = bool(traffic_recorder_settings.get('enabled', False))
+        logger.info(
+            "Loaded traffic recorder settings: enabled=%s, folder=%s",
+            traffic_recorder_settings['enabled'], traffic_recorder_settings['folder']
+        )
+    except Exception as e:
+        logger.error(f"Error loading traffic recorder settings: {e}")
+
+def save_traffic_recorder_settings():
+    """Save traffic recorder settings to JSON file"""
+    try:
+        with open(TRAFFIC_RECORDER_SETTINGS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(traffic_recorder_settings, f, ensure_ascii=False, indent=2)
+        logger.info(f"Saved traffic recorder settings: enabled={traffic_recorder_settings['enabled']}")
+    except Exception as e:
+        logger.error(f"Error saving traffic recorder settings: {e}")
+
+class TrafficRecorder:
+    """
+    Ghi traffic EA (opt-in) - request thread chỉ đưa body vào hàng đợi,
+    1 writer thread nén gzip và ghi file, đổi file khi vượt max_file_mb,
+    giữ tối đa max_files file mới nhất
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._cond = threading.Condition()
+        self._lifecycle_lock = threading.Lock()  # start/stop không chạy chồng nhau → tối đa 1 writer
+        self._pending = deque()
+        self._writer = None
+        self._raw = None
+        self._gzip = None
+        self._file_index = 0
+        self.current_file = None
+        self._stats = {'recorded': 0, 'dropped': 0, 'bytes': 0, 'files': 0}
+
+    def start(self):
+        """Bật ghi và khởi động writer thread"""
+        with self._lifecycle_lock:
+            self.settings['enabled'] = True
+            with self._cond:
+                # Sentinel của lần stop() trước chưa được writer đọc → bỏ đi để writer (nếu còn sống) chạy tiếp
+                if None in self._pending:
+                    self._pending = deque(item for item in self._pending if item is not None)
+                if self._writer is not None and self._writer.is_alive():
+                    return
+                self._writer = threading.Thread(target=self._writer_loop, name="TrafficRecorder", daemon=True)
+                self._writer.start()
+        logger.info(f"Traffic recorder started → {self.settings['folder']}")
+
+    def stop(self, timeout=5):
+        """Tắt ghi, ghi nốt record đang chờ rồi đóng file"""
+        with self._lifecycle_lock:
+            self.settings['enabled'] = False
+            writer = self._writer
+            if writer is None or not writer.is_alive():
+                self._writer = None
+                return
+            with self._cond:
+                self._pending.append(None)  # Sentinel
+                self._cond.notify()
+            writer.join(timeout)
+            if writer.is_alive():
+                # Writer chưa ghi xong: giữ lại để start() sau không mở writer thứ 2 trên cùng file
+                logger.warning("Traffic recorder: writer still draining after stop()")
+            else:
+                self._writer = None
+        logger.info("Traffic recorder stopped")
+
+    def record(self, endpoint, body, received_at=None):
+        """Gọi từ request thread - không bao giờ chặn (hàng đợi đầy → bỏ record)"""
+        if not self.settings.get('enabled'):
+            return
+        writer = self._writer
+        if writer is None or not writer.is_alive():
+            self.start()
+        with self._cond:
+            if len(self._pending) >= TRAFFIC_QUEUE_LIMIT:
+                self._stats['dropped'] += 1
+                return
+            self._pending.append((received_at if received_at is not None else time.time(), endpoint, bytes(body)))
+            self._cond.notify()
+
+    def _writer_loop(self):
+        dirty = False
+        while True:
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait(TRAFFIC_FLUSH_INTERVAL)
+                item = self._pending.popleft() if self._pending else False
+            try:
+                if item is None:
+                    break
+                if item is False:
+                    # Rảnh → flush để file đọc được ngay
+                    if dirty and self._gzip is not None:
+                        self._gzip.flush()
+                        dirty = False
+                    continue
+                self._write(*item)
+                dirty = True
+            except Exception as e:
+                logger.error(f"Error writing traffic recording: {e}")
+                self._close_file()
+        self._close_file()
+
+    def _write(self, received_at, endpoint, body):
+        if self._gzip is None or self._raw.tell() >= self.settings['max_file_mb'] * 1024 * 1024:
+            self._open_next_file()
+        endpoint_bytes = endpoint.encode('utf-8')
+        self._gzip.write(TRAFFIC_RECORD_HEADER.pack(received_at, len(endpoint_bytes), len(body)))
+        self._gzip.write(endpoint_bytes)
+        self._gzip.write(body)
+        with self._cond:
+            self._stats['recorded'] += 1
+            self._stats['bytes'] += len(body)
+
+    def _open_next_file(self):
+        self._close_file()
+        folder = self.settings['folder']
+        os.makedirs(folder, exist_ok=True)
+        self._file_index += 1
+        name = f"traffic_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self._file_index:03d}.gsr.gz"
+        self.current_file = os.path.join(folder, name)
+        self._raw = open(self.current_file, 'wb')
+        self._gzip = gzip.GzipFile(filename=name, fileobj=self._raw, mode='wb', compresslevel=6)
+        self._gzip.write(TRAFFIC_MAGIC)
+        self._stats['files'] += 1
+        self._prune_old_files()
+
+    def _close_file(self):
+        try:
+            if self._gzip is not None:
+                self._gzip.close()
+            if self._raw is not None:
+                self._raw.close()
+        finally:
+            self._gzip = None
+            self._raw = None
+
+    def _prune_old_files(self):
+        files = list_traffic_recordings(self.settings['folder'])
+        for path in files[:max(0, len(files) - self.settings['max_files'])]:
+            try:
+                os.remove(path)
+                logger.info(f"Traffic recorder: removed old recording {path}")
+            except OSError as e:
+                logger.error(f"Error removing old recording {path}: {e}")
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['enabled'] = bool(self.settings.get('enabled'))
+        stats['current_file'] = self.current_file
+        return stats
+
+def list_traffic_recordings(folder):
+    """File ghi traffic trong folder, cũ → mới (tên file chứa thời điểm tạo)"""
+    return sorted(glob.glob(os.path.join(folder, TRAFFIC_FILE_PATTERN)))
+
+def iter_traffic_records(path):
+    """
+    Đọc file ghi traffic
+
+    Yields:
+        (received_at, endpoint, body) - dừng êm ở record cuối bị cắt dở (app tắt khi đang ghi)
+    """
+    with gzip.open(path, 'rb') as f:
+        if f.read(len(TRAFFIC_MAGIC)) != TRAFFIC_MAGIC:
+            raise ValueError(f"{path}: not a traffic recording")
+        while True:
+            try:
+                header = f.read(TRAFFIC_RECORD_HEADER.size)
+                if len(header) < TRAFFIC_RECORD_HEADER.size:
+                    return
+                received_at, endpoint_length, body_length = TRAFFIC_RECORD_HEADER.unpack(header)
+                endpoint = f.read(endpoint_length)
+                body = f.read(body_length)
+            except (EOFError, gzip.BadGzipFile):
+                return
+            if len(endpoint) < endpoint_length or len(body) < body_length:
+                return
+            yield received_at, endpoint.decode('utf-8'), body
+
+traffic_recorder = TrafficRecorder(traffic_recorder_settings)
 
-        logger.info(f"Received data from {broker}: {len(symbols_data)} symbols | Progress: {loading_state['processed_symbols']}/{loading_state['total_symbols']}")
-        return jsonify({"ok": True, "message": "Data received"})
+# ===================== FLASK ENDPOINTS =====================
+def read_ingest_body(endpoint):
+    """Đọc body request của EA, ghi nhận kích thước payload (và ghi traffic nếu đang bật)"""
+    body = request.get_data()
+    ingest_metrics.observe_payload(endpoint, len(body))
+    traffic_recorder.record(endpoint, body)
+    return body
+
+@app.route('/api/receive_data', methods=['POST'])
+def receive_data():
+    """Nhận dữ liệu từ EA MT4/MT5"""
+    try:
+        received_at = time.time()
+        rejected = 0
+        if FAST_PAYLOAD_DECODING:
+            # ⚡ Decode 1 lượt thành TypedSymbolRecord (orjson/msgspec nếu có)
+            try:
+                body = read_ingest_body('receive_data')
+                with ingest_metrics.stage('decode'):
+                    broker, timestamp, symbols_data, rejected = decode_ea_payload(body)
+            except PayloadDecodeError as e:
+                return jsonify({"ok": False, "error": str(e)}), 400
+            if rejected:
+                logger.warning(f"Rejected {rejected} malformed symbol entries from {broker}")
+        else:
+            read_ingest_body('receive_data')
+            data = request.get_json(force=True)
+            if not isinstance(data, dict):
+                return jsonify({"ok": False, "error": "Invalid payload"}), 400
+
+            broker = data.get('broker', 'Unknown')
+            timestamp = data.get('timestamp', int(time.time()))
+            symbols_data = data.get('data', [])
+            if not isinstance(symbols_data, list):
+                return jsonify({"ok": False, "error": "'data' must be a list"}), 400
+
+        # Kiểm tra xem broker có được chọn để nhận dữ liệu hay không
+        if not is_broker_enabled(broker):
+            return jsonify({
+                'status': 'ignored',
+                'message': f'Broker "{broker}" is not enabled for data reception'
+            }), 200
+
+        if ASYNC_INGEST:
+            # ⚡ Trả về ngay, worker sẽ xử lý (chỉ payload mới nhất của mỗi broker)
+            ingest_queue.submit(broker, timestamp, symbols_data, received_at)
+            return jsonify({"ok": True, "message": "Data queued", "rejected": rejected})
+
+        process_ingest_payload(broker, timestamp, symbols_data)
+        return jsonify({"ok": True, "message": "Data received", "rejected": rejected})
         
     except Exception as e:
         logger.error(f"Error receiving data: {e}")
         return jsonify({"ok": False, "error": str(e)}), 500
 
+@app.route('/api/v2/register_symbols', methods=['POST'])
+def register_symbols_v2():
+    """Delta ingest v2: đăng ký metadata tĩnh của symbols (1 lần), trả về hash cho từng symbol"""
+    try:
+        data = _json_loads(read_ingest_body('v2/register_symbols'))
+        if type(data) is not dict or type(data.get('symbols')) is not list:
+            return jsonify({"ok": False, "error": "Payload must be {broker, symbols: [...]}"}), 400
+
+        broker = data.get('broker', 'Unknown')
+        hashes, rejected = register_symbol_metadata(broker, data['symbols'])
+        ids = assign_binary_symbol_ids(broker, hashes)
+        logger.info(f"Registered metadata from {broker}: {len(hashes)} symbols, {rejected} rejected")
+        return jsonify({"ok": True, "registered": len(hashes), "rejected": rejected, "hashes": hashes, "ids": ids})
+    except Exception as e:
+        logger.error(f"Error registering symbols: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+@app.route('/api/v2/receive_data', methods=['POST'])
+def receive_data_v2():
+    """Delta ingest v2: mỗi tick chỉ có giá + OHLC + hash metadata đã đăng ký"""
+    try:
+        received_at = time.time()
+        try:
+            body = read_ingest_body('v2/receive_data')
+            with ingest_metrics.stage('decode'):
+                broker, timestamp, symbols_data, rejected, unknown_meta = decode_ea_payload_v2(body)
+        except PayloadDecodeError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+        if not is_broker_enabled(broker):
+            return jsonify({
+                'status': 'ignored',
+                'message': f'Broker "{broker}" is not enabled for data reception'
+            }), 200
+
+        response = {"ok": True, "rejected": rejected, "unknown_meta": unknown_meta}
+        if ASYNC_INGEST:
+            ingest_queue.submit(broker, timestamp, symbols_data, received_at)
+            response['message'] = "Data queued"
+        else:
+            process_ingest_payload(broker, timestamp, symbols_data)
+            response['message'] = "Data received"
+        return jsonify(response)
+
+    except Exception as e:
+        logger.error(f"Error receiving v2 data: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+@app.route('/api/v2/receive_binary', methods=['POST'])
+def receive_binary():
+    """Binary ingest: header + record 88 bytes/symbol (xem BINARY INGEST)"""
+    try:
+        received_at = time.time()
+        try:
+            body = read_ingest_body('v2/receive_binary')
+            with ingest_metrics.stage('decode'):
+                broker, timestamp, symbols_data, rejected, unknown_ids = decode_binary_frame(body)
+        except PayloadDecodeError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+        if not is_broker_enabled(broker):
+            return jsonify({
+                'status': 'ignored',
+                'message': f'Broker "{broker}" is not enabled for data reception'
+            }), 200
+
+        response = {"ok": True, "rejected": rejected, "unknown_ids": unknown_ids}
+        if ASYNC_INGEST:
+            ingest_queue.submit(broker, timestamp, symbols_data, received_at)
+            response['message'] = "Data queued"
+        else:
+            process_ingest_payload(broker, timestamp, symbols_data)
+            response['message'] = "Data received"
+        return jsonify(response)
+
+    except Exception as e:
+        logger.error(f"Error receiving binary data: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+
 @app.route('/api/receive_positions', methods=['POST'])
 def receive_positions():
     """Nhận dữ liệu positions từ EA (optional, để tương thích)"""
     try:
         data = request.get_json(force=True)
+        if not isinstance(data, dict):
+            return jsonify({"ok": False, "error": "Invalid payload"}), 400
         broker = data.get('broker', 'Unknown')
+
+        # Giống /api/sync: broker chưa bật nhận dữ liệu → không lưu positions
+        if not is_broker_enabled(broker):
+            return jsonify({
+                'status': 'ignored',
+                'message': f'Broker "{broker}" is not enabled for data reception'
+            }), 200
+
+        store_broker_positions(broker, data)
         logger.info(f"Received positions from {broker}")
         return jsonify({"ok": True, "message": "Positions received"})
     except Exception as e:
@@ -3154,8 +7448,47 @@ def receive_positions():
 
 @app.route('/api/get_signal', methods=['GET'])
 def get_signal():
-    """Endpoint để EA poll lệnh (tương thích, trả về empty)"""
-    return jsonify({})
+    """Endpoint để EA poll lệnh (trả về lệnh đang chờ của broker, {} nếu không có)"""
+    return jsonify(pop_pending_signal(request.args.get('broker', '')))
+
+@app.route('/api/sync', methods=['POST'])
+def sync():
+    """EA gửi market data + positions trong 1 request (xem EA SYNC)"""
+    try:
+        received_at = time.time()
+        try:
+            body = read_ingest_body('sync')
+            with ingest_metrics.stage('decode'):
+                broker, market, positions = decode_sync_payload(body)
+        except PayloadDecodeError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+        response = {"ok": True}
+        if not is_broker_enabled(broker):
+            # Broker chưa bật nhận dữ liệu → không lưu cả market data lẫn positions
+            response['status'] = 'ignored'
+            response['message'] = f'Broker "{broker}" is not enabled for data reception'
+            market = positions = None
+
+        if positions is not None:
+            store_broker_positions(broker, positions)
+
+        if market is not None:
+            timestamp, symbols_data, rejected, unknown_meta = market
+            response['rejected'] = rejected
+            response['unknown_meta'] = unknown_meta
+            if ASYNC_INGEST:
+                ingest_queue.submit(broker, timestamp, symbols_data, received_at)
+                response['message'] = "Data queued"
+            else:
+                process_ingest_payload(broker, timestamp, symbols_data)
+                response['message'] = "Data received"
+
+        return jsonify(response)
+
+    except Exception as e:
+        logger.error(f"Error in EA sync: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -3163,9 +7496,170 @@ def health():
     return jsonify({
         "status": "running",
         "brokers": list(market_data.keys()),
-        "total_symbols": sum(len(symbols) for symbols in market_data.values())
+        "total_symbols": sum(len(symbols) for symbols in market_data.values()),
+        "ingest_queue": ingest_queue.get_stats()
     })
 
+@app.route('/api/ingest_stats', methods=['GET'])
+def ingest_stats():
+    """Thống kê hàng đợi ingest: depth, số payload bị bỏ (coalesce), độ trễ end-to-end, decode"""
+    stats = ingest_queue.get_stats()
+    stats['decoding'] = get_decode_stats()
+    return jsonify(stats)
+
+@app.route('/api/market_symbols', methods=['GET'])
+def market_symbols():
+    """Dump symbols đang có trong market_data theo broker: {broker: [symbol, ...]} (cho symbol_match_audit.py)"""
+    return jsonify({broker: sorted(symbols) for broker, symbols in list(market_data.items())})
+
+@app.route('/api/lock_stats', methods=['GET'])
+def lock_stats():
+    """Thống kê thời gian chờ/giữ data_lock và lock của từng broker theo section (ms)"""
+    locks = [data_lock, post_ingest_lock] + [partition.lock for partition in iter_broker_partitions()]
+    if request.args.get('reset') == '1':
+        for lock in locks:
+            lock.reset_stats()
+        return jsonify({"ok": True, "message": "Lock stats reset"})
+    return jsonify({
+        "two_phase_ingest": TWO_PHASE_INGEST,
+        "locks": {lock.name: lock.get_stats() for lock in locks}
+    })
+
+def get_metrics_snapshot():
+    """
+    Snapshot metrics ingest dạng dict (JSON cho /metrics.json và cửa sổ Hiệu năng ingest)
+
+    Thời gian: ms, kích thước payload: bytes
+    """
+    stages = {}
+    for stage, histogram in list(ingest_metrics.stages.items()):
+        snap = histogram.snapshot()
+        stages[stage] = {
+            'count': snap['count'],
+            'avg_ms': round(snap['sum'] / snap['count'] * 1000, 3) if snap['count'] else 0.0,
+            'p50_ms': round(snap['p50'] * 1000, 3),
+            'p95_ms': round(snap['p95'] * 1000, 3),
+            'p99_ms': round(snap['p99'] * 1000, 3),
+            'max_ms': round(snap['max'] * 1000, 3)
+        }
+    payloads = {}
+    for endpoint, histogram in list(ingest_metrics.payload_bytes.items()):
+        snap = histogram.snapshot()
+        payloads[endpoint] = {
+            'count': snap['count'],
+            'avg_bytes': int(snap['sum'] / snap['count']) if snap['count'] else 0,
+            'p50_bytes': int(snap['p50']),
+            'p99_bytes': int(snap['p99']),
+            'max_bytes': int(snap['max'])
+        }
+    locks = [data_lock, post_ingest_lock] + [partition.lock for partition in iter_broker_partitions()]
+    return {
+        'timestamp': time.time(),
+        'stages': stages,
+        'payload_bytes': payloads,
+        'brokers': ingest_metrics.broker_rates(),
+        'locks': {lock.name: lock.get_stats() for lock in locks},
+        'ingest_queue': ingest_queue.get_stats(),
+        'decoding': get_decode_stats()
+    }
+
+def _prometheus_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render_prometheus_metrics():
+    """Metrics ingest theo Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+
+    def histogram_lines(name, help_text, label_name, histograms):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for label, histogram in histograms:
+            snap = histogram.snapshot()
+            label_text = f'{label_name}="{_prometheus_label(label)}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, snap['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_text},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {snap["count"]}')
+            lines.append(f'{name}_sum{{{label_text}}} {snap["sum"]:.6f}')
+            lines.append(f'{name}_count{{{label_text}}} {snap["count"]}')
+
+    histogram_lines('gapspike_ingest_stage_seconds', 'Thoi gian tung giai doan ingest moi payload',
+                    'stage', list(ingest_metrics.stages.items()))
+    histogram_lines('gapspike_payload_bytes', 'Kich thuoc body EA gui len',
+                    'endpoint', list(ingest_metrics.payload_bytes.items()))
+
+    brokers = ingest_metrics.broker_rates()
+    for name, field, metric_type, help_text in (
+        ('gapspike_broker_payloads_total', 'payloads_total', 'counter', 'So payload da xu ly theo broker'),
+        ('gapspike_broker_symbols_total', 'symbols_total', 'counter', 'So symbol da xu ly theo broker'),
+        ('gapspike_broker_payloads_per_second', 'payloads_per_sec', 'gauge', 'Payload/giay (cua so 60s)'),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for broker, rates in brokers.items():
+            lines.append(f'{name}{{broker="{_prometheus_label(broker)}"}} {rates[field]}')
+
+    locks = [data_lock, post_ingest_lock] + [partition.lock for partition in iter_broker_partitions()]
+    lock_stats_by_name = {lock.name: lock.get_stats() for lock in locks}
+    for name, field, metric_type, scale, help_text in (
+        ('gapspike_lock_acquisitions_total', 'count', 'counter', 1, 'So lan giu lock theo section'),
+        ('gapspike_lock_wait_seconds_max', 'wait_max_ms', 'gauge', 0.001, 'Thoi gian cho lock lau nhat'),
+        ('gapspike_lock_hold_seconds_total', 'hold_total_ms', 'counter', 0.001, 'Tong thoi gian giu lock'),
+        ('gapspike_lock_hold_seconds_max', 'hold_max_ms', 'gauge', 0.001, 'Thoi gian giu lock lau nhat'),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for lock_name, sections in lock_stats_by_name.items():
+            for section, stats in sections.items():
+                value = stats[field] * scale
+                lines.append(f'{name}{{lock="{_prometheus_label(lock_name)}",section="{_prometheus_label(section)}"}} {value:g}')
+
+    queue_stats = ingest_queue.get_stats()
+    for name, field, metric_type in (
+        ('gapspike_ingest_queue_depth', 'depth', 'gauge'),
+        ('gapspike_ingest_queue_processed_total', 'processed', 'counter'),
+        ('gapspike_ingest_queue_dropped_total', 'dropped', 'counter'),
+        ('gapspike_ingest_queue_errors_total', 'errors', 'counter'),
+    ):
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"{name} {queue_stats[field]}")
+    decoding = get_decode_stats()
+    lines.append("# TYPE gapspike_rejected_entries_total counter")
+    lines.append(f"gapspike_rejected_entries_total {decoding['rejected_entries']}")
+    lines.append("# TYPE gapspike_normalized_fields_total counter")
+    lines.append(f"gapspike_normalized_fields_total {decoding['normalized_fields']}")
+    lines.append("# TYPE gapspike_duplicate_entries_total counter")
+    lines.append(f"gapspike_duplicate_entries_total {decoding['duplicate_entries']}")
+    return '\n'.join(lines) + '\n'
+
+@app.route('/api/traffic_recorder', methods=['GET', 'POST'])
+def traffic_recorder_endpoint():
+    """Trạng thái ghi traffic EA; POST {"enabled": true/false} để bật/tắt"""
+    if request.method == 'POST':
+        data = request.get_json(force=True, silent=True)
+        if not isinstance(data, dict) or 'enabled' not in data:
+            return jsonify({"ok": False, "error": "Payload must be {enabled: true/false}"}), 400
+        if data['enabled']:
+            traffic_recorder.start()
+        else:
+            traffic_recorder.stop()
+        save_traffic_recorder_settings()
+    return jsonify(dict(traffic_recorder.get_stats(), ok=True))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Metrics ingest cho Prometheus (text format)"""
+    return render_prometheus_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/metrics.json', methods=['GET'])
+def metrics_json():
+    """Snapshot metrics ingest dạng JSON (?reset=1 để xóa số liệu)"""
+    if request.args.get('reset') == '1':
+        ingest_metrics.reset()
+        return jsonify({"ok": True, "message": "Metrics reset"})
+    return jsonify(get_metrics_snapshot())
+
 # ===================== BROKER SELECTION DIALOGS =====================
 class BrokerSelectionDialog:
     """Dialog chọn sàn khi khởi động ứng dụng"""
@@ -4006,135 +8500,134 @@ class GapSpikeDetectorGUI:
     def update_display(self):
         """Cập nhật hiển thị dữ liệu"""
         try:
-            with data_lock:
-                # ✨ Update loading progress
-                self.update_loading_progress()
+            # ✨ Update loading progress
+            self.update_loading_progress()
+
+            # Update connection status warning
+            self.update_connection_warning()
 
-                # Update connection status warning
-                self.update_connection_warning()
+            # Update delay board
+            self.update_delay_board_display()
 
-                # Update delay board
-                self.update_delay_board_display()
+            # Update alert board
+            self.update_alert_board_display()
 
-                # Update alert board
-                self.update_alert_board_display()
+            # ✨ Update Point-based and Percent-based tables (only if loading complete)
+            if not loading_state['is_loading']:
+                self.update_point_percent_tables()
+            else:
+                # Still loading - clear tables and show loading message
+                for item in self.point_tree.get_children():
+                    self.point_tree.delete(item)
+                for item in self.percent_tree.get_children():
+                    self.percent_tree.delete(item)
+
+                self.point_tree.insert('', 'end', values=(
+                    '⏳ Đang tải...',
+                    'Vui lòng chờ',
+                    'hệ thống dò',
+                    'tất cả sản phẩm',
+                    'với file txt',
+                    'để chính xác',
+                    '100%'
+                ))
 
-                # ✨ Update Point-based and Percent-based tables (only if loading complete)
-                if not loading_state['is_loading']:
-                    self.update_point_percent_tables()
-                else:
-                    # Still loading - clear tables and show loading message
-                    for item in self.point_tree.get_children():
-                        self.point_tree.delete(item)
-                    for item in self.percent_tree.get_children():
-                        self.percent_tree.delete(item)
-
-                    self.point_tree.insert('', 'end', values=(
-                        '⏳ Đang tải...',
-                        'Vui lòng chờ',
-                        'hệ thống dò',
-                        'tất cả sản phẩm',
-                        'với file txt',
-                        'để chính xác',
-                        '100%'
-                    ))
-
-                # Clear existing items (Legacy table)
-                for item in self.tree.get_children():
-                    self.tree.delete(item)
-                
-                # Statistics
-                total_symbols = 0
-                total_gaps = 0
-                total_spikes = 0
-                brokers = set()
-                
-                # Sort by broker name first, then timestamp descending
-                sorted_results = sorted(
-                    gap_spike_results.items(),
-                    key=lambda x: (x[1].get('broker', ''), -x[1].get('timestamp', 0))
-                )
-                
-                for key, result in sorted_results:
-                    symbol = result.get('symbol', '')
-                    broker = result.get('broker', '')
-                    timestamp = result.get('timestamp', 0)
-                    price = result.get('price', 0)
-                    gap_info = result.get('gap', {})
-                    spike_info = result.get('spike', {})
-                    
-                    gap_detected = gap_info.get('detected', False)
-                    spike_detected = spike_info.get('detected', False)
-                    
-                    # Apply filters
-                    if self.filter_gap_only.get() and not gap_detected:
-                        continue
-                    if self.filter_spike_only.get() and not spike_detected:
-                        continue
-                    
-                    total_symbols += 1
-                    brokers.add(broker)
-                    if gap_detected:
-                        total_gaps += 1
-                    if spike_detected:
-                        total_spikes += 1
-                    
-                    # Format data (server time - không convert timezone)
-                    time_str = server_timestamp_to_datetime(timestamp).strftime('%H:%M:%S')
+            # Clear existing items (Legacy table)
+            for item in self.tree.get_children():
+                self.tree.delete(item)
+            
+            # Statistics
+            total_symbols = 0
+            total_gaps = 0
+            total_spikes = 0
+            brokers = set()
+            
+            # Sort by broker name first, then timestamp descending
+            sorted_results = sorted(
+                gap_spike_results.items(),
+                key=lambda x: (x[1].get('broker', ''), -x[1].get('timestamp', 0))
+            )
+            
+            for key, result in sorted_results:
+                symbol = result.get('symbol', '')
+                broker = result.get('broker', '')
+                timestamp = result.get('timestamp', 0)
+                price = result.get('price', 0)
+                gap_info = result.get('gap', {})
+                spike_info = result.get('spike', {})
+                
+                gap_detected = gap_info.get('detected', False)
+                spike_detected = spike_info.get('detected', False)
+                
+                # Apply filters
+                if self.filter_gap_only.get() and not gap_detected:
+                    continue
+                if self.filter_spike_only.get() and not spike_detected:
+                    continue
+                
+                total_symbols += 1
+                brokers.add(broker)
+                if gap_detected:
+                    total_gaps += 1
+                if spike_detected:
+                    total_spikes += 1
+                
+                # Format data (server time - không convert timezone)
+                time_str = server_timestamp_to_datetime(timestamp).strftime('%H:%M:%S')
 
-                    # Hướng gap (để dùng trong Status)
-                    gap_dir = gap_info.get('direction', 'none').upper()
+                # Hướng gap (để dùng trong Status)
+                gap_dir = gap_info.get('direction', 'none').upper()
     
-                    # Lấy ngưỡng từ settings (Broker_Symbol > Broker_* > Symbol > * > default)
-                    gap_threshold = get_threshold_for_display(broker, symbol, 'gap')
-                    spike_threshold = get_threshold_for_display(broker, symbol, 'spike')
+                # Lấy ngưỡng từ settings (Broker_Symbol > Broker_* > Symbol > * > default)
+                gap_threshold = get_threshold_for_display(broker, symbol, 'gap')
+                spike_threshold = get_threshold_for_display(broker, symbol, 'spike')
     
-                    # Status
-                    status_parts = []
-                    if gap_detected:
-                        status_parts.append(f"GAP {gap_dir}")
-                    if spike_detected:
-                        status_parts.append("SPIKE")
-                    status = " + ".join(status_parts) if status_parts else "Normal"
-
-                    # Determine tag
-                    tag = ''
-                    if gap_detected and spike_detected:
-                        tag = 'both_detected'
-                    elif gap_detected:
-                        tag = 'gap_detected'
-                    elif spike_detected:
-                        tag = 'spike_detected'
-
-                    # Insert row  (các cột: Time, Broker, Symbol, Price, Gap Threshold, Spike Threshold, Status)
-                    self.tree.insert('', 'end', values=(
-                        time_str,
-                        broker,
-                        symbol,
-                        f"{price:.5f}",
-                        f"{gap_threshold:.3f}%" if gap_threshold is not None else "",
-                        f"{spike_threshold:.3f}%" if spike_threshold is not None else "",
-                        status
-                    ), tags=(tag,))
+                # Status
+                status_parts = []
+                if gap_detected:
+                    status_parts.append(f"GAP {gap_dir}")
+                if spike_detected:
+                    status_parts.append("SPIKE")
+                status = " + ".join(status_parts) if status_parts else "Normal"
 
+                # Determine tag
+                tag = ''
+                if gap_detected and spike_detected:
+                    tag = 'both_detected'
+                elif gap_detected:
+                    tag = 'gap_detected'
+                elif spike_detected:
+                    tag = 'spike_detected'
 
-                # Sau khi fill xong, nếu đang có keyword search thì áp dụng lại filter
-                if hasattr(self, 'search_symbol_var'):
-                    current_search = self.search_symbol_var.get().strip()
-                    if current_search:
-                        try:
-                            self.filter_symbols_by_search()
-                        except Exception as _e:
-                            logger.error(f"Error reapplying search filter: {_e}")
-                    else:
-                        # Không search thì auto scroll về đầu nếu bật
-                        if self.auto_scroll.get() and self.tree.get_children():
-                            self.tree.see(self.tree.get_children()[0])
+                # Insert row  (các cột: Time, Broker, Symbol, Price, Gap Threshold, Spike Threshold, Status)
+                self.tree.insert('', 'end', values=(
+                    time_str,
+                    broker,
+                    symbol,
+                    f"{price:.5f}",
+                    f"{gap_threshold:.3f}%" if gap_threshold is not None else "",
+                    f"{spike_threshold:.3f}%" if spike_threshold is not None else "",
+                    status
+                ), tags=(tag,))
+
+
+            # Sau khi fill xong, nếu đang có keyword search thì áp dụng lại filter
+            if hasattr(self, 'search_symbol_var'):
+                current_search = self.search_symbol_var.get().strip()
+                if current_search:
+                    try:
+                        self.filter_symbols_by_search()
+                    except Exception as _e:
+                        logger.error(f"Error reapplying search filter: {_e}")
                 else:
-                    # Trường hợp hiếm: chưa có search_symbol_var
+                    # Không search thì auto scroll về đầu nếu bật
                     if self.auto_scroll.get() and self.tree.get_children():
                         self.tree.see(self.tree.get_children()[0])
-                    
+            else:
+                # Trường hợp hiếm: chưa có search_symbol_var
+                if self.auto_scroll.get() and self.tree.get_children():
+                    self.tree.see(self.tree.get_children()[0])
+                
         except Exception as e:
             logger.error(f"Error updating display: {e}")
 
@@ -4162,7 +8655,7 @@ class GapSpikeDetectorGUI:
                 has_active_symbol = False
                 
                 for symbol in broker_symbols:
-                    key = f"{broker}_{symbol}"
+                    key = symbol_key(broker, symbol)
                     if key in bid_tracking:
                         last_change_time = bid_tracking[key]['last_change_time']
                         delay_duration = current_time - last_change_time
@@ -4230,7 +8723,7 @@ class GapSpikeDetectorGUI:
 
             # Only show if delay >= threshold (custom or default)
             if delay_duration >= product_delay_threshold:
-                broker, symbol = key.split('_', 1)
+                broker, symbol = split_symbol_key(key)
 
                 # 🔒 Skip nếu bị hide thủ công
                 if key in manual_hidden_delays:
@@ -4488,19 +8981,19 @@ class GapSpikeDetectorGUI:
         - Bảng 1: Point-based (symbols có cấu hình)
         - Bảng 2: Percent-based (symbols không có cấu hình)
         """
-        # ⚡ Check if data changed
-        point_data_changed = (gap_spike_point_results !=
-                             last_data_snapshot.get('gap_spike_point_results', {}))
-        percent_data_changed = (gap_spike_results !=
-                               last_data_snapshot.get('gap_spike_results', {}))
+        # ⚡ Check if data changed (record cập nhật tại chỗ → so (record, version), không so sâu)
+        point_signature = detection_results_signature(gap_spike_point_results)
+        percent_signature = detection_results_signature(gap_spike_results)
+        point_data_changed = point_signature != last_data_snapshot.get('gap_spike_point_results', {})
+        percent_data_changed = percent_signature != last_data_snapshot.get('gap_spike_results', {})
 
         if not point_data_changed and not percent_data_changed:
             # No data changes, skip update
             return
 
         # Update snapshots
-        last_data_snapshot['gap_spike_point_results'] = gap_spike_point_results.copy()
-        last_data_snapshot['gap_spike_results'] = gap_spike_results.copy()
+        last_data_snapshot['gap_spike_point_results'] = point_signature
+        last_data_snapshot['gap_spike_results'] = percent_signature
 
         # 💾 Lưu selection hiện tại trước khi clear
         point_selected_keys = set()
@@ -4535,7 +9028,7 @@ class GapSpikeDetectorGUI:
         for key, result in sorted_point_results:
             symbol = result.get('symbol', '')
             broker = result.get('broker', '')
-            broker_symbol = f"{broker}_{symbol}"
+            broker_symbol = symbol_key(broker, symbol)
             symbol_chuan = result.get('symbol_chuan', '')
             matched_alias = result.get('matched_alias', '')
             gap_info = result.get('gap', {})
@@ -4551,9 +9044,9 @@ class GapSpikeDetectorGUI:
             spike_point = spike_info.get('spike_point', 0)
 
             # Apply custom threshold if exists
-            if broker_symbol in custom_thresholds:
-                if 'gap_point' in custom_thresholds[broker_symbol]:
-                    threshold_point = custom_thresholds[broker_symbol]['gap_point']
+            custom_gap_point = threshold_table.lookup(broker, symbol, 'gap_point')[0]
+            if custom_gap_point is not None:
+                threshold_point = custom_gap_point
 
             # Status
             status_parts = []
@@ -4617,7 +9110,7 @@ class GapSpikeDetectorGUI:
         for key, result in sorted_percent_results:
             symbol = result.get('symbol', '')
             broker = result.get('broker', '')
-            broker_symbol = f"{broker}_{symbol}"
+            broker_symbol = symbol_key(broker, symbol)
 
             # Skip if this symbol is in point-based results
             if key in gap_spike_point_results:
@@ -4745,7 +9238,7 @@ class GapSpikeDetectorGUI:
             values = self.point_tree.item(item, 'values')
             broker = values[0]
             symbol = values[1]
-            broker_symbol = f"{broker}_{symbol}"
+            broker_symbol = symbol_key(broker, symbol)
 
             # Column 4 is 'Threshold (Point)' - allow editing
             if column_index == 4:
@@ -4789,7 +9282,7 @@ class GapSpikeDetectorGUI:
             values = self.percent_tree.item(item, 'values')
             broker = values[0]
             symbol = values[1]
-            broker_symbol = f"{broker}_{symbol}"
+            broker_symbol = symbol_key(broker, symbol)
 
             # Column 2 is 'Gap %', Column 3 is 'Spike %' - allow editing
             if column_index == 2:
@@ -5010,7 +9503,7 @@ class GapSpikeDetectorGUI:
                 for item_data in selected_data:
                     broker = item_data['broker']
                     symbol = item_data['symbol']
-                    broker_symbol = f"{broker}_{symbol}"
+                    broker_symbol = symbol_key(broker, symbol)
 
                     # Save as percent-based configuration
                     gap_settings[broker_symbol] = gap_percent
@@ -5144,7 +9637,7 @@ class GapSpikeDetectorGUI:
                 for item_data in selected_data:
                     broker = item_data['broker']
                     symbol = item_data['symbol']
-                    broker_symbol = f"{broker}_{symbol}"
+                    broker_symbol = symbol_key(broker, symbol)
 
                     # Save as point-based configuration
                     if broker_symbol not in custom_thresholds:
@@ -5219,7 +9712,7 @@ class GapSpikeDetectorGUI:
 
     def clear_alerts(self):
         """Xóa tất cả alerts"""
-        with data_lock:
+        with all_partitions_locked('clear_alerts'):
             gap_spike_results.clear()
             alert_board.clear()
         self.log("Đã xóa tất cả alerts và bảng kèo")
@@ -5281,7 +9774,7 @@ class GapSpikeDetectorGUI:
             else:
                 self.log("🔄 Đang reset Python connection (giữ chart data)...")
 
-            with data_lock:
+            with all_partitions_locked('reset'):
                 market_data.clear()
                 gap_spike_results.clear()
                 gap_spike_point_results.clear()  # ✨ Clear point-based results
@@ -5289,12 +9782,15 @@ class GapSpikeDetectorGUI:
                 bid_tracking.clear()
                 # candle_data.clear()  # ← KHÔNG xóa để giữ lại chart data
 
-                # ✅ Clear symbol config cache chỉ khi manual reset (để dò lại sản phẩm)
-                # Auto reset sẽ KHÔNG clear cache (không dò lại sản phẩm)
+                # ✅ Manual reset: dò lại sản phẩm chỉ khi THAM_SO_GAP_INDICATOR.txt đã thay đổi
+                # (kết quả matching chỉ phụ thuộc nội dung file config)
+                # Auto reset sẽ KHÔNG dò lại sản phẩm
                 if reason == "manual":
-                    symbol_config_cache.clear()
                     loading_state['loading_complete_logged'] = False  # Reset flag để log lại khi loading complete
-                    self.log("🔍 Đã clear cache matching - sẽ dò lại sản phẩm khi nhận data mới")
+                    if reload_gap_config_if_changed():
+                        self.log("🔍 File config đã thay đổi - đã load lại, sẽ dò lại sản phẩm khi nhận data mới")
+                    else:
+                        self.log(f"🔍 File config không đổi - giữ cache matching ({len(symbol_config_cache)} symbols)")
 
             self.tree.delete(*self.tree.get_children())
             self.alert_tree.delete(*self.alert_tree.get_children())
@@ -5564,6 +10060,10 @@ class GapSpikeDetectorGUI:
     def open_connected_brokers(self):
         """Mở cửa sổ Connected Brokers"""
         ConnectedBrokersWindow(self.root, self)
+
+    def open_ingest_metrics(self):
+        """Mở cửa sổ Hiệu năng ingest"""
+        IngestMetricsWindow(self.root, self)
     
     def open_raw_data_viewer(self):
         """Mở cửa sổ Raw Data Viewer"""
@@ -5676,7 +10176,7 @@ class GapSpikeDetectorGUI:
                     # Cập nhật settings
                     global gap_settings, spike_settings
                     settings_dict = gap_settings if threshold_type == 'gap' else spike_settings
-                    key = f"{broker}_{symbol}"
+                    key = symbol_key(broker, symbol)
 
                     if new_value == "":
                         # Xóa override riêng -> quay về dùng wildcard/default
@@ -5716,7 +10216,7 @@ class GapSpikeDetectorGUI:
 
                     # Cập nhật settings
                     settings_dict = gap_settings if threshold_type == 'gap' else spike_settings
-                    key = f"{broker}_{symbol}"
+                    key = symbol_key(broker, symbol)
 
                     if new_value == "":
                         # Xóa override riêng -> quay về dùng wildcard/default
@@ -5830,7 +10330,7 @@ class GapSpikeDetectorGUI:
             def on_save():
                 gap_value = gap_var.get().strip()
                 spike_value = spike_var.get().strip()
-                key = f"{broker}_{symbol}"
+                key = symbol_key(broker, symbol)
 
                 # Update Gap settings
                 if gap_value == "":
@@ -5887,7 +10387,7 @@ class GapSpikeDetectorGUI:
         """Edit Gap/Spike Point thresholds from context menu (Bảng 1 - Point-based)"""
         global custom_thresholds, gap_config
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
 
             # Get current thresholds
             # Try to get from custom_thresholds first, then fallback to gap_config
@@ -6011,7 +10511,7 @@ class GapSpikeDetectorGUI:
         """Edit Gap/Spike % thresholds from context menu (Bảng 2 - Percent-based)"""
         global gap_settings, spike_settings
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
 
             # Get current thresholds
             gap_percent = gap_settings.get(key, None)
@@ -6187,16 +10687,11 @@ class GapSpikeDetectorGUI:
             # Create context menu
             context_menu = tk.Menu(self.root, tearoff=0)
 
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
 
             # ⚙️ Gap/Spike Settings
-            # Determine if this is point-based or percent-based
-            is_point_based = False
-            if key in custom_thresholds:
-                if 'gap_point' in custom_thresholds[key] or 'spike_point' in custom_thresholds[key]:
-                    is_point_based = True
-            elif key in gap_spike_point_results:
-                is_point_based = True
+            # Determine if this is point-based or percent-based (dùng chung route với ingest)
+            is_point_based = get_symbol_route(broker, symbol, key)[0].is_point_based
 
             # Get current thresholds for display
             if is_point_based:
@@ -6282,7 +10777,7 @@ class GapSpikeDetectorGUI:
         """Edit Gap/Spike thresholds from alert board context menu"""
         global custom_thresholds, gap_settings, spike_settings
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
 
             if is_point_based:
                 # Point-based editing
@@ -6443,7 +10938,7 @@ class GapSpikeDetectorGUI:
         """Apply Gap/Spike thresholds to all products"""
         global custom_thresholds, gap_settings, spike_settings
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
 
             if is_point_based:
                 gap_point = custom_thresholds.get(key, {}).get('gap_point')
@@ -6460,17 +10955,12 @@ class GapSpikeDetectorGUI:
                 if not confirm:
                     return
 
-                count = 0
-                for product_key in list(price_data.keys()):
-                    if product_key not in custom_thresholds:
-                        custom_thresholds[product_key] = {}
-                    if gap_point is not None:
-                        custom_thresholds[product_key]['gap_point'] = gap_point
-                    if spike_point is not None:
-                        custom_thresholds[product_key]['spike_point'] = spike_point
-                    count += 1
-
-                save_custom_thresholds()
+                # ⚡ 1 transaction cho mọi sản phẩm đang có market data
+                values = {field: value for field, value in (('gap_point', gap_point), ('spike_point', spike_point))
+                          if value is not None}
+                targets = select_threshold_targets()
+                apply_threshold_changes(threshold_changes_for(targets, **values))
+                count = len(targets)
                 self.log(f"✅ Đã áp dụng Point thresholds cho {count} sản phẩm")
                 messagebox.showinfo("Thành công", f"Đã áp dụng cho {count} sản phẩm")
 
@@ -6489,16 +10979,12 @@ class GapSpikeDetectorGUI:
                 if not confirm:
                     return
 
-                count = 0
-                for product_key in list(price_data.keys()):
-                    if gap_percent is not None:
-                        gap_settings[product_key] = gap_percent
-                    if spike_percent is not None:
-                        spike_settings[product_key] = spike_percent
-                    count += 1
-
-                schedule_save('gap_settings')
-                schedule_save('spike_settings')
+                # ⚡ 1 transaction cho mọi sản phẩm đang có market data
+                values = {field: value for field, value in (('gap', gap_percent), ('spike', spike_percent))
+                          if value is not None}
+                targets = select_threshold_targets()
+                apply_threshold_changes(threshold_changes_for(targets, **values))
+                count = len(targets)
                 self.log(f"✅ Đã áp dụng % thresholds cho {count} sản phẩm")
                 messagebox.showinfo("Thành công", f"Đã áp dụng cho {count} sản phẩm")
 
@@ -6510,7 +10996,7 @@ class GapSpikeDetectorGUI:
         """Clear custom Gap/Spike thresholds"""
         global custom_thresholds, gap_settings, spike_settings
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
 
             confirm = messagebox.askyesno(
                 "Xác nhận",
@@ -6567,7 +11053,7 @@ class GapSpikeDetectorGUI:
             # Create context menu
             context_menu = tk.Menu(self.root, tearoff=0)
             
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
             
             if key in manual_hidden_delays:
                 # If already hidden manually, show Unhide option
@@ -6619,7 +11105,7 @@ class GapSpikeDetectorGUI:
     def hide_delay_symbol(self, broker, symbol):
         """Hide symbol manually from delay board"""
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
             manual_hidden_delays[key] = True
             save_manual_hidden_delays()
             
@@ -6635,7 +11121,7 @@ class GapSpikeDetectorGUI:
     def unhide_delay_symbol(self, broker, symbol):
         """Unhide symbol from delay board"""
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
             if key in manual_hidden_delays:
                 del manual_hidden_delays[key]
                 save_manual_hidden_delays()
@@ -6652,7 +11138,7 @@ class GapSpikeDetectorGUI:
     def set_product_delay_dialog(self, broker, symbol):
         """Show dialog to set custom delay for a product"""
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
             current_delay = product_delay_settings.get(key, None)
 
             # Create dialog
@@ -6738,7 +11224,7 @@ class GapSpikeDetectorGUI:
     def apply_delay_to_all_products(self, broker, symbol):
         """Apply the delay setting of this product to all products"""
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
             delay_minutes = product_delay_settings.get(key, None)
 
             if delay_minutes is None:
@@ -6777,7 +11263,7 @@ class GapSpikeDetectorGUI:
     def clear_product_delay(self, broker, symbol):
         """Clear custom delay for a product"""
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
 
             if key not in product_delay_settings:
                 messagebox.showinfo("Info", f"{symbol} does not have a custom delay setting.")
@@ -6817,7 +11303,7 @@ class RealTimeChartWindow:
         self.main_app = main_app
         self.broker = broker
         self.symbol = symbol
-        self.key = f"{broker}_{symbol}"
+        self.key = symbol_key(broker, symbol)
         
         self.window = tk.Toplevel(parent)
         self.window.title(f"📈 {symbol} - {broker} (M1)")
@@ -6956,52 +11442,51 @@ class RealTimeChartWindow:
     def update_chart(self):
         """Update chart với data mới"""
         try:
-            with data_lock:
-                # Get candle data
-                candles = candle_data.get(self.key, [])
-                
-                # Update candle count label
-                candle_count = len(candles)
-                max_candles = 60
-                self.candle_count_label.config(text=f"Candles: {candle_count}/{max_candles}")
-                
-                # Draw candlesticks
-                self.draw_candlesticks(candles)
+            # Get candle data
+            candles = candle_data.get(self.key, [])
+            
+            # Update candle count label
+            candle_count = len(candles)
+            max_candles = 60
+            self.candle_count_label.config(text=f"Candles: {candle_count}/{max_candles}")
+            
+            # Draw candlesticks
+            self.draw_candlesticks(candles)
+            
+            # Get current bid/ask
+            if self.broker in market_data and self.symbol in market_data[self.broker]:
+                symbol_data = market_data[self.broker][self.symbol]
+                bid = symbol_data.get('bid', 0)
+                ask = symbol_data.get('ask', 0)
+                digits = symbol_data.get('digits', 5)
                 
-                # Get current bid/ask
-                if self.broker in market_data and self.symbol in market_data[self.broker]:
-                    symbol_data = market_data[self.broker][self.symbol]
-                    bid = symbol_data.get('bid', 0)
-                    ask = symbol_data.get('ask', 0)
-                    digits = symbol_data.get('digits', 5)
+                # Draw bid/ask lines
+                if bid > 0 and ask > 0:
+                    # Bid line (red)
+                    if self.bid_line:
+                        self.bid_line.remove()
+                    self.bid_line = self.ax.axhline(y=bid, color='#ef5350', linestyle='--', 
+                                                    linewidth=1.5, alpha=0.8, label=f'Bid: {bid:.{digits}f}')
                     
-                    # Draw bid/ask lines
-                    if bid > 0 and ask > 0:
-                        # Bid line (red)
-                        if self.bid_line:
-                            self.bid_line.remove()
-                        self.bid_line = self.ax.axhline(y=bid, color='#ef5350', linestyle='--', 
-                                                        linewidth=1.5, alpha=0.8, label=f'Bid: {bid:.{digits}f}')
-                        
-                        # Ask line (green)
-                        if self.ask_line:
-                            self.ask_line.remove()
-                        self.ask_line = self.ax.axhline(y=ask, color='#26a69a', linestyle='--', 
-                                                        linewidth=1.5, alpha=0.8, label=f'Ask: {ask:.{digits}f}')
-                        
-                        # Legend
-                        self.ax.legend(loc='upper left', fontsize=9, facecolor='#2d2d30', 
-                                     edgecolor='#404040', labelcolor='white')
-                        
-                        # Update price label
-                        self.price_label.config(text=f"Bid: {bid:.{digits}f} | Ask: {ask:.{digits}f}")
-                
-                # Update time label
-                self.time_label.config(text=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-                
-                # Redraw canvas
-                self.canvas.draw()
-                
+                    # Ask line (green)
+                    if self.ask_line:
+                        self.ask_line.remove()
+                    self.ask_line = self.ax.axhline(y=ask, color='#26a69a', linestyle='--', 
+                                                    linewidth=1.5, alpha=0.8, label=f'Ask: {ask:.{digits}f}')
+                    
+                    # Legend
+                    self.ax.legend(loc='upper left', fontsize=9, facecolor='#2d2d30', 
+                                 edgecolor='#404040', labelcolor='white')
+                    
+                    # Update price label
+                    self.price_label.config(text=f"Bid: {bid:.{digits}f} | Ask: {ask:.{digits}f}")
+            
+            # Update time label
+            self.time_label.config(text=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            
+            # Redraw canvas
+            self.canvas.draw()
+            
         except Exception as e:
             logger.error(f"Error updating chart: {e}")
     
@@ -7486,7 +11971,7 @@ class SettingsWindow:
                     if search_text and search_text not in symbol.lower():
                         continue
 
-                    key = f"{broker}_{symbol}"
+                    key = symbol_key(broker, symbol)
 
                     # Skip hidden products
                     if key in hidden_products:
@@ -7544,7 +12029,7 @@ class SettingsWindow:
                 values = self.pdm_tree.item(item_id, 'values')
                 broker = values[0]
                 symbol = values[1]
-                key = f"{broker}_{symbol}"
+                key = symbol_key(broker, symbol)
 
                 product_delay_settings[key] = delay_minutes
 
@@ -7589,7 +12074,7 @@ class SettingsWindow:
                 values = self.pdm_tree.item(item_id, 'values')
                 broker = values[0]
                 symbol = values[1]
-                key = f"{broker}_{symbol}"
+                key = symbol_key(broker, symbol)
 
                 if key in product_delay_settings:
                     del product_delay_settings[key]
@@ -7646,7 +12131,7 @@ class SettingsWindow:
 
             if new_delay is not None:
                 # Update delay settings
-                key = f"{broker}_{symbol}"
+                key = symbol_key(broker, symbol)
                 product_delay_settings[key] = new_delay
 
                 # Save to file
@@ -7721,7 +12206,7 @@ class SettingsWindow:
 
             if new_delay is not None:
                 # Update delay settings
-                key = f"{broker}_{symbol}"
+                key = symbol_key(broker, symbol)
                 product_delay_settings[key] = new_delay
 
                 # Save to file
@@ -7740,7 +12225,7 @@ class SettingsWindow:
     def hide_product(self, broker, symbol):
         """Hide product from delay management"""
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
 
             # Confirm with user
             confirm = messagebox.askyesno(
@@ -7808,10 +12293,10 @@ class SettingsWindow:
             # Populate listbox
             for product_key in sorted(hidden_products):
                 # Format: "Broker - Symbol"
-                parts = product_key.split('_', 1)
-                if len(parts) == 2:
-                    display_text = f"{parts[0]} - {parts[1]}"
-                else:
+                try:
+                    broker, symbol = split_symbol_key(product_key)
+                    display_text = f"{broker} - {symbol}"
+                except ValueError:
                     display_text = product_key
                 listbox.insert(tk.END, display_text)
 
@@ -8189,11 +12674,10 @@ Cách sử dụng:
             for item in self.symbol_filter_tree.get_children():
                 self.symbol_filter_tree.delete(item)
 
-            with data_lock:
-                market_snapshot = {
-                    broker: {symbol: data for symbol, data in symbols_dict.items()}
-                    for broker, symbols_dict in market_data.items()
-                }
+            market_snapshot = {
+                broker: {symbol: data for symbol, data in symbols_dict.items()}
+                for broker, symbols_dict in market_data.items()
+            }
 
             selection = self.symbol_filter_selection
 
@@ -8435,6 +12919,7 @@ Cách sử dụng:
                     payload[broker] = sorted(symbols)
 
             symbol_filter_settings['selection'] = payload
+            invalidate_symbol_filter_cache()
             schedule_save('symbol_filter_settings')
 
             cleanup_unselected_symbol_results()
@@ -8814,6 +13299,39 @@ Cách sử dụng:
                   command=self.main_app.open_connected_brokers,
                   width=30).pack(anchor=tk.W, pady=5)
 
+        # Ingest metrics section
+        metrics_section = ttk.LabelFrame(tools_frame, text="📈 Hiệu năng ingest", padding="20")
+        metrics_section.pack(fill=tk.X, pady=10)
+
+        ttk.Label(metrics_section,
+                 text="Thời gian xử lý từng giai đoạn (p50/p95/p99), lock, tốc độ nhận theo broker",
+                 foreground='blue').pack(anchor=tk.W, pady=5)
+
+        ttk.Button(metrics_section, text="📈 Mở hiệu năng ingest",
+                  command=self.main_app.open_ingest_metrics,
+                  width=30).pack(anchor=tk.W, pady=5)
+
+        # Traffic recorder section
+        recorder_section = ttk.LabelFrame(tools_frame, text="🎙️ Ghi traffic EA", padding="20")
+        recorder_section.pack(fill=tk.X, pady=10)
+
+        ttk.Label(recorder_section,
+                 text="Ghi nguyên dữ liệu EA gửi lên (nén, xoay vòng) để phát lại bằng replay_traffic.py",
+                 foreground='blue').pack(anchor=tk.W, pady=5)
+
+        self.traffic_recorder_enabled_var = tk.BooleanVar(value=traffic_recorder_settings.get('enabled', False))
+        ttk.Checkbutton(
+            recorder_section,
+            text=f"Bật ghi traffic (folder: {traffic_recorder_settings['folder']})",
+            variable=self.traffic_recorder_enabled_var
+        ).pack(anchor=tk.W, pady=2)
+
+        ttk.Button(
+            recorder_section,
+            text="💾 Lưu cài đặt ghi traffic",
+            command=self.save_traffic_recorder_settings_ui
+        ).pack(anchor=tk.W, pady=10)
+
     def create_auto_send_tab(self):
         """Create Auto-Send Google Sheets Settings tab"""
         auto_send_frame = ttk.Frame(self.notebook, padding="10")
@@ -8970,30 +13488,47 @@ Cách sử dụng:
             logger.error(f"Error saving Python reset settings: {e}")
             messagebox.showerror("Lỗi", f"Không thể lưu Auto Reset Python: {e}")
 
+    def save_traffic_recorder_settings_ui(self):
+        """Bật/tắt ghi traffic EA và lưu cài đặt"""
+        try:
+            if self.traffic_recorder_enabled_var.get():
+                traffic_recorder.start()
+            else:
+                traffic_recorder.stop()
+            save_traffic_recorder_settings()
+
+            status = "BẬT" if traffic_recorder_settings['enabled'] else "TẮT"
+            messagebox.showinfo(
+                "Ghi traffic EA",
+                f"Đã lưu cài đặt ghi traffic!\n\nTrạng thái: {status}\nFolder: {traffic_recorder_settings['folder']}"
+            )
+        except Exception as e:
+            logger.error(f"Error saving traffic recorder settings: {e}")
+            messagebox.showerror("Lỗi", f"Không thể lưu cài đặt ghi traffic: {e}")
+
     def refresh_statistics(self):
         """Refresh and display current statistics"""
         try:
-            with data_lock:
-                total_symbols = 0
-                total_gaps = 0
-                total_spikes = 0
-                brokers = set()
+            total_symbols = 0
+            total_gaps = 0
+            total_spikes = 0
+            brokers = set()
 
-                # Count from gap_spike_results
-                for key, result in gap_spike_results.items():
-                    broker = result.get('broker', '')
-                    gap_info = result.get('gap', {})
-                    spike_info = result.get('spike', {})
+            # Count from gap_spike_results
+            for key, result in gap_spike_results.items():
+                broker = result.get('broker', '')
+                gap_info = result.get('gap', {})
+                spike_info = result.get('spike', {})
 
-                    gap_detected = gap_info.get('detected', False)
-                    spike_detected = spike_info.get('detected', False)
+                gap_detected = gap_info.get('detected', False)
+                spike_detected = spike_info.get('detected', False)
 
-                    total_symbols += 1
-                    brokers.add(broker)
-                    if gap_detected:
-                        total_gaps += 1
-                    if spike_detected:
-                        total_spikes += 1
+                total_symbols += 1
+                brokers.add(broker)
+                if gap_detected:
+                    total_gaps += 1
+                if spike_detected:
+                    total_spikes += 1
 
             # Update labels
             self.stats_brokers_label.config(text=f"Brokers: {len(brokers)}")
@@ -9108,7 +13643,7 @@ Cách sử dụng:
                 symbol, threshold = line.split(':', 1)
                 new_settings[symbol.strip().upper()] = float(threshold.strip())
             
-            gap_settings = new_settings
+            gap_settings.replace(new_settings)
             save_gap_settings()
             
             messagebox.showinfo("Success", f"Đã lưu {len(gap_settings)} gap settings")
@@ -9131,7 +13666,7 @@ Cách sử dụng:
                 symbol, threshold = line.split(':', 1)
                 new_settings[symbol.strip().upper()] = float(threshold.strip())
             
-            spike_settings = new_settings
+            spike_settings.replace(new_settings)
             save_spike_settings()
             
             messagebox.showinfo("Success", f"Đã lưu {len(spike_settings)} spike settings")
@@ -9151,11 +13686,10 @@ Cách sử dụng:
             symbols_set = set()
             brokers_set = set()
 
-            with data_lock:
-                for broker, symbols_dict in market_data.items():
-                    brokers_set.add(broker)
-                    for symbol in symbols_dict.keys():
-                        symbols_set.add((broker, symbol))
+            for broker, symbols_dict in market_data.items():
+                brokers_set.add(broker)
+                for symbol in symbols_dict.keys():
+                    symbols_set.add((broker, symbol))
 
             # Update broker selector dropdown
             broker_list = sorted(list(brokers_set))
@@ -9181,7 +13715,7 @@ Cách sử dụng:
                 if current_filter != "All Brokers" and broker != current_filter:
                     continue
 
-                key = f"{broker}_{symbol}"
+                key = symbol_key(broker, symbol)
 
                 # ✨ Kiểm tra xem symbol có match với file txt không
                 symbol_chuan, config, matched_alias = find_symbol_config(symbol)
@@ -9230,45 +13764,12 @@ Cách sử dụng:
             logger.error(f"Error filtering symbols: {e}")
     
     def get_threshold_for_display(self, broker, symbol, threshold_type):
-        """Get threshold for display (check broker_symbol, symbol, *, default)"""
-        settings_dict = gap_settings if threshold_type == 'gap' else spike_settings
-        key = f"{broker}_{symbol}"
-        
-        # Priority: Broker_Symbol > Broker_* > Symbol > * > None
-        if key in settings_dict:
-            return settings_dict[key]
-        
-        broker_wildcard = f"{broker}_*"
-        if broker_wildcard in settings_dict:
-            return settings_dict[broker_wildcard]
-        
-        if symbol in settings_dict:
-            return settings_dict[symbol]
-        
-        if '*' in settings_dict:
-            return settings_dict['*']
-        
-        return DEFAULT_GAP_THRESHOLD if threshold_type == 'gap' else DEFAULT_SPIKE_THRESHOLD
+        """Get threshold for display (Broker_Symbol > Broker_* > Symbol > * > default) - từ threshold_table"""
+        return threshold_table.lookup(broker, symbol, threshold_type)[0]
     
     def get_threshold_source(self, broker, symbol, threshold_type):
-        """Get source of threshold (for display)"""
-        settings_dict = gap_settings if threshold_type == 'gap' else spike_settings
-        key = f"{broker}_{symbol}"
-        
-        if key in settings_dict:
-            return f"{key}"
-        
-        broker_wildcard = f"{broker}_*"
-        if broker_wildcard in settings_dict:
-            return broker_wildcard
-        
-        if symbol in settings_dict:
-            return symbol
-        
-        if '*' in settings_dict:
-            return "*"
-        
-        return "default"
+        """Get source of threshold (key settings đã khớp, hoặc "default")"""
+        return threshold_table.lookup(broker, symbol, threshold_type)[2] or "default"
     
     def edit_threshold(self, event):
         """Edit threshold on double-click"""
@@ -9359,23 +13860,8 @@ Cách sử dụng:
             )
 
             if confirm:
-                count = 0
-                skipped = 0
-                for item in self.gs_tree.get_children():
-                    tags = self.gs_tree.item(item, 'tags')
-
-                    # ✨ CHỈ áp dụng cho symbols Percent-based (Bảng 2)
-                    if 'percent_based' in tags:
-                        values = list(self.gs_tree.item(item, 'values'))
-                        values[2] = f"{gap_val:.3f}"
-                        values[3] = f"{spike_val:.3f}"
-                        self.gs_tree.item(item, values=values)
-                        count += 1
-                    elif 'point_based' in tags:
-                        skipped += 1
-
-                # Tự động lưu luôn (không hiện messagebox)
-                self.save_gap_spike_from_tree(show_message=False)
+                # ✨ CHỈ áp dụng cho symbols Percent-based (Bảng 2), lưu luôn (1 transaction)
+                count, skipped = self.apply_quick_thresholds_to_tree(gap_val, spike_val)
 
                 messagebox.showinfo("Success",
                                   f"✅ Đã apply và LƯU thresholds cho BẢNG 2\n\n"
@@ -9396,44 +13882,25 @@ Cách sử dụng:
             messagebox.showerror("Error", f"Lỗi: {str(e)}")
     
     def apply_to_broker(self):
-        """Apply threshold to all symbols of selected broker (legacy - from tree selection)"""
+        """
+        Apply threshold cho broker của dòng đang chọn trong tree (CHỈ ÁP DỤNG CHO BẢNG 2)
+
+        Giống apply_to_selected_broker_from_dropdown(): bỏ qua dòng Point-based (Bảng 1 không lưu
+        ngưỡng %) và lưu ngay - dialog xác nhận ghi rõ số dòng apply/bỏ qua
+        """
         try:
             selected = self.gs_tree.selection()
             if not selected:
                 messagebox.showwarning("No Selection", "Vui lòng chọn symbol từ broker cần apply")
                 return
-            
+
             # Get broker from selected item
             values = self.gs_tree.item(selected[0], 'values')
-            broker = values[0]
-            
-            gap_val = float(self.quick_gap_var.get())
-            spike_val = float(self.quick_spike_var.get())
-            
-            confirm = messagebox.askyesno(
-                "Confirm",
-                f"Apply Gap: {gap_val}% và Spike: {spike_val}% cho TẤT CẢ symbols từ broker {broker}?"
-            )
-            
-            if confirm:
-                count = 0
-                for item in self.gs_tree.get_children():
-                    item_values = list(self.gs_tree.item(item, 'values'))
-                    if item_values[0] == broker:
-                        item_values[2] = f"{gap_val:.3f}"
-                        item_values[3] = f"{spike_val:.3f}"
-                        self.gs_tree.item(item, values=item_values)
-                        count += 1
-                
-                messagebox.showinfo("Success", f"Đã apply cho {count} symbols từ {broker}")
-                logger.info(f"Applied Gap:{gap_val}%, Spike:{spike_val}% to {broker}: {count} symbols")
-            
-        except ValueError:
-            messagebox.showerror("Error", "Invalid number format")
+            self.apply_quick_thresholds_to_broker(values[0])
         except Exception as e:
             logger.error(f"Error applying to broker: {e}")
             messagebox.showerror("Error", f"Lỗi: {str(e)}")
-    
+
     def apply_to_selected_broker_from_dropdown(self):
         """Apply threshold to all symbols from broker selected in dropdown (CHỈ ÁP DỤNG CHO BẢNG 2)"""
         try:
@@ -9441,7 +13908,14 @@ Cách sử dụng:
             if not broker:
                 messagebox.showwarning("No Selection", "Vui lòng chọn broker từ dropdown")
                 return
+            self.apply_quick_thresholds_to_broker(broker)
+        except Exception as e:
+            logger.error(f"Error applying to broker from dropdown: {e}")
+            messagebox.showerror("Error", f"Lỗi: {str(e)}")
 
+    def apply_quick_thresholds_to_broker(self, broker):
+        """Xác nhận + apply Gap/Spike % cho các dòng Bảng 2 (Percent-based) của 1 broker, lưu ngay"""
+        try:
             gap_val = float(self.quick_gap_var.get())
             spike_val = float(self.quick_spike_var.get())
 
@@ -9473,28 +13947,13 @@ Cách sử dụng:
                 f"Spike Threshold: {spike_val}%\n\n"
                 f"📊 Bảng 2 (sẽ apply): {percent_count} symbols\n"
                 f"📄 Bảng 1 (bỏ qua): {point_count} symbols (Point-based từ file txt)\n\n"
+                f"💾 Settings được lưu ngay (không cần bấm Save)\n\n"
                 f"Continue?"
             )
 
             if confirm:
-                count = 0
-                skipped = 0
-                for item in self.gs_tree.get_children():
-                    item_values = list(self.gs_tree.item(item, 'values'))
-                    tags = self.gs_tree.item(item, 'tags')
-
-                    if item_values[0] == broker:
-                        # ✨ CHỈ áp dụng cho symbols Percent-based (Bảng 2)
-                        if 'percent_based' in tags:
-                            item_values[2] = f"{gap_val:.3f}"
-                            item_values[3] = f"{spike_val:.3f}"
-                            self.gs_tree.item(item, values=item_values)
-                            count += 1
-                        elif 'point_based' in tags:
-                            skipped += 1
-
-                # Tự động lưu luôn (không hiện messagebox)
-                self.save_gap_spike_from_tree(show_message=False)
+                # ✨ CHỈ áp dụng cho symbols Percent-based (Bảng 2), lưu luôn (1 transaction)
+                count, skipped = self.apply_quick_thresholds_to_tree(gap_val, spike_val, broker=broker)
 
                 messagebox.showinfo("Success",
                                   f"✅ Đã apply và LƯU thresholds cho broker {broker}\n\n"
@@ -9509,10 +13968,45 @@ Cách sử dụng:
 
         except ValueError:
             messagebox.showerror("Error", "Invalid number format - vui lòng nhập số hợp lệ")
-        except Exception as e:
-            logger.error(f"Error applying to broker from dropdown: {e}")
-            messagebox.showerror("Error", f"Lỗi: {str(e)}")
-    
+
+    def apply_quick_thresholds_to_tree(self, gap_val, spike_val, broker=None):
+        """
+        ⚡ Áp dụng Gap/Spike % cho các dòng Bảng 2 (Percent-based) trong tree
+        qua apply_threshold_changes(): 1 lần validate, 1 lần invalidate cache, 1 lần ghi file
+
+        Args:
+            broker: Chỉ các dòng của broker này (None = tất cả)
+
+        Returns:
+            tuple: (số symbols đã apply, số symbols Point-based bỏ qua)
+
+        Raises:
+            ValueError: Ngưỡng không hợp lệ (không áp dụng gì)
+        """
+        rows = []
+        skipped = 0
+        for item in self.gs_tree.get_children():
+            values = self.gs_tree.item(item, 'values')
+            if broker is not None and values[0] != broker:
+                continue
+            tags = self.gs_tree.item(item, 'tags')
+            if 'percent_based' in tags:
+                rows.append((item, values))
+            elif 'point_based' in tags:
+                skipped += 1
+
+        keys = [symbol_key(values[0], str(values[1])) for _, values in rows]
+        apply_threshold_changes(threshold_changes_for(keys, gap=gap_val, spike=spike_val))
+
+        # Chỉ cập nhật các dòng đã apply (không ghi lại settings của cả tree)
+        gap_text, spike_text = f"{gap_val:.3f}", f"{spike_val:.3f}"
+        for item, values in rows:
+            values = list(values)
+            values[2] = gap_text
+            values[3] = spike_text
+            self.gs_tree.item(item, values=values)
+        return len(rows), skipped
+
     def save_gap_spike_from_tree(self, show_message=True):
         """Save Gap/Spike settings from treeview (CHỈ LƯU BẢNG 2 - PERCENT-BASED)"""
         global gap_settings, spike_settings
@@ -9536,7 +14030,7 @@ Cách sử dụng:
                 gap_str = values[2]
                 spike_str = values[3]
 
-                key = f"{broker}_{symbol}"
+                key = symbol_key(broker, symbol)
 
                 # Save Gap if has value
                 if gap_str and gap_str.strip():
@@ -9555,8 +14049,8 @@ Cách sử dụng:
                 saved_count += 1
 
             # Update global settings
-            gap_settings = new_gap_settings
-            spike_settings = new_spike_settings
+            gap_settings.replace(new_gap_settings)
+            spike_settings.replace(new_spike_settings)
 
             # Save to files
             save_gap_settings()
@@ -9655,7 +14149,10 @@ Cách sử dụng:
             # Add all hidden alert items
             current_time = time.time()
             for key, info in sorted(hidden_alert_items.items()):
-                broker, symbol = key.split('_', 1)
+                try:
+                    broker, symbol = split_symbol_key(key)
+                except ValueError:
+                    broker, symbol = '', key  # Broker chưa gửi data trong phiên này
 
                 # Determine type
                 hidden_until = info.get('hidden_until')
@@ -9706,7 +14203,7 @@ Cách sử dụng:
     def unhide_alert_from_context(self, broker, symbol):
         """Unhide alert item from context menu"""
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
             if key in hidden_alert_items:
                 unhide_alert_item(broker, symbol)
                 self.refresh_alert_hidden_list()
@@ -9728,8 +14225,7 @@ Cách sử dụng:
             count = 0
             for item in selected:
                 key = self.hidden_alert_tree.item(item, 'tags')[0]
-                broker, symbol = key.split('_', 1)
-                unhide_alert_item(broker, symbol)
+                unhide_alert_key(key)
                 count += 1
 
             if count > 0:
@@ -9781,7 +14277,10 @@ Cách sử dụng:
 
             # 1. Add manually hidden delays
             for key in manual_hidden_delays.keys():
-                broker, symbol = key.split('_', 1)
+                try:
+                    broker, symbol = split_symbol_key(key)
+                except ValueError:
+                    broker, symbol = '', key  # Broker chưa gửi data trong phiên này
                 all_hidden[key] = {
                     'broker': broker,
                     'symbol': symbol,
@@ -9799,7 +14298,7 @@ Cách sử dụng:
 
                 # Check if auto-hidden (delay >= threshold AND >= auto_hide_time)
                 if delay_duration >= delay_threshold and delay_duration >= auto_hide_time:
-                    broker, symbol = key.split('_', 1)
+                    broker, symbol = split_symbol_key(key)
 
                     # Check if market is open (only show if supposed to be trading)
                     if broker in market_data and symbol in market_data[broker]:
@@ -9878,7 +14377,7 @@ Cách sử dụng:
     def unhide_delay_from_context(self, broker, symbol):
         """Unhide delay item from context menu"""
         try:
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
             if key in manual_hidden_delays:
                 del manual_hidden_delays[key]
                 save_manual_hidden_delays()
@@ -10048,114 +14547,113 @@ class HiddenDelaysWindow:
     def update_display(self):
         """Cập nhật hiển thị hidden delays"""
         try:
-            with data_lock:
-                # Clear existing items
-                for item in self.tree.get_children():
-                    self.tree.delete(item)
-                
-                current_time = time.time()
-                delay_threshold = self.main_app.delay_threshold.get()
-                
-                # Find symbols with delay >= 60 minutes
-                hidden_symbols = []
+            # Clear existing items
+            for item in self.tree.get_children():
+                self.tree.delete(item)
+            
+            current_time = time.time()
+            delay_threshold = self.main_app.delay_threshold.get()
+            
+            # Find symbols with delay >= 60 minutes
+            hidden_symbols = []
+            
+            for key, tracking_info in bid_tracking.items():
+                last_change_time = tracking_info['last_change_time']
+                delay_duration = current_time - last_change_time
                 
-                for key, tracking_info in bid_tracking.items():
-                    last_change_time = tracking_info['last_change_time']
-                    delay_duration = current_time - last_change_time
+                # Only show if delay >= threshold AND >= 60 minutes (3600s)
+                if delay_duration >= delay_threshold and delay_duration >= 3600:
+                    broker, symbol = split_symbol_key(key)
                     
-                    # Only show if delay >= threshold AND >= 60 minutes (3600s)
-                    if delay_duration >= delay_threshold and delay_duration >= 3600:
-                        broker, symbol = key.split('_', 1)
+                    # Get current data
+                    if broker in market_data and symbol in market_data[broker]:
+                        symbol_data = market_data[broker][symbol]
+                        current_bid = symbol_data.get('bid', 0)
+                        is_open = symbol_data.get('isOpen', False)
                         
-                        # Get current data
-                        if broker in market_data and symbol in market_data[broker]:
-                            symbol_data = market_data[broker][symbol]
-                            current_bid = symbol_data.get('bid', 0)
-                            is_open = symbol_data.get('isOpen', False)
-                            
-                            # Chỉ hiển thị symbols đang trong giờ giao dịch
-                            if not is_open:
-                                continue  # Bỏ qua nếu đóng cửa
-                            
-                            hidden_symbols.append({
-                                'broker': broker,
-                                'symbol': symbol,
-                                'bid': current_bid,
-                                'is_open': is_open,
-                                'last_change_time': last_change_time,
-                                'delay_duration': delay_duration
-                            })
+                        # Chỉ hiển thị symbols đang trong giờ giao dịch
+                        if not is_open:
+                            continue  # Bỏ qua nếu đóng cửa
+                        
+                        hidden_symbols.append({
+                            'broker': broker,
+                            'symbol': symbol,
+                            'bid': current_bid,
+                            'is_open': is_open,
+                            'last_change_time': last_change_time,
+                            'delay_duration': delay_duration
+                        })
+            
+            # Sort by delay duration (longest first)
+            hidden_symbols.sort(key=lambda x: x['delay_duration'], reverse=True)
+            
+            # Add to tree
+            for item in hidden_symbols:
+                broker = item['broker']
+                symbol = item['symbol']
+                bid = item['bid']
+                is_open = item['is_open']
+                last_change_time = item['last_change_time']
+                delay_duration = item['delay_duration']
                 
-                # Sort by delay duration (longest first)
-                hidden_symbols.sort(key=lambda x: x['delay_duration'], reverse=True)
+                # Format display
+                last_change_str = server_timestamp_to_datetime(last_change_time).strftime('%Y-%m-%d %H:%M:%S')
                 
-                # Add to tree
-                for item in hidden_symbols:
-                    broker = item['broker']
-                    symbol = item['symbol']
-                    bid = item['bid']
-                    is_open = item['is_open']
-                    last_change_time = item['last_change_time']
-                    delay_duration = item['delay_duration']
-                    
-                    # Format display
-                    last_change_str = server_timestamp_to_datetime(last_change_time).strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    # Format delay time
-                    delay_hours = int(delay_duration / 3600)
-                    delay_minutes = int((delay_duration % 3600) / 60)
-                    
-                    if delay_hours > 0:
-                        delay_str = f"{delay_hours}h {delay_minutes}m"
-                    else:
-                        delay_str = f"{delay_minutes}m"
-                    
-                    # Determine tag/status
-                    if delay_duration >= 86400:  # >= 24 hours
-                        tag = 'hidden_extreme'
-                        status = f"🔴 EXTREME DELAY ({delay_str})"
-                    elif delay_duration >= 21600:  # >= 6 hours
-                        tag = 'hidden_extreme'
-                        status = f"🔴 VERY LONG DELAY ({delay_str})"
-                    else:
-                        tag = 'hidden_long'
-                        status = f"🟠 LONG DELAY ({delay_str})"
-                    
-                    # Market status
-                    market_status = "🟢 Trading" if is_open else "🔴 Closed"
-                    
-                    # Insert row
-                    gap_threshold = self.get_threshold_for_display(broker, symbol, 'gap')
-                    spike_threshold = self.get_threshold_for_display(broker, symbol, 'spike')
+                # Format delay time
+                delay_hours = int(delay_duration / 3600)
+                delay_minutes = int((delay_duration % 3600) / 60)
+                
+                if delay_hours > 0:
+                    delay_str = f"{delay_hours}h {delay_minutes}m"
+                else:
+                    delay_str = f"{delay_minutes}m"
+                
+                # Determine tag/status
+                if delay_duration >= 86400:  # >= 24 hours
+                    tag = 'hidden_extreme'
+                    status = f"🔴 EXTREME DELAY ({delay_str})"
+                elif delay_duration >= 21600:  # >= 6 hours
+                    tag = 'hidden_extreme'
+                    status = f"🔴 VERY LONG DELAY ({delay_str})"
+                else:
+                    tag = 'hidden_long'
+                    status = f"🟠 LONG DELAY ({delay_str})"
+                
+                # Market status
+                market_status = "🟢 Trading" if is_open else "🔴 Closed"
+                
+                # Insert row
+                gap_threshold = self.get_threshold_for_display(broker, symbol, 'gap')
+                spike_threshold = self.get_threshold_for_display(broker, symbol, 'spike')
 
-                    # Insert row (columns: Time, Broker, Symbol, Price, Gap Threshold, Spike Threshold, Status)
-                    self.tree.insert('', 'end', values=(
-                        time_str,
-                        broker,
-                        symbol,
-                        f"{price:.5f}",
-                        f"{gap_threshold:.3f}",
-                        f"{spike_threshold:.3f}",
-                        status
-                    ), tags=(tag,))
+                # Insert row (columns: Time, Broker, Symbol, Price, Gap Threshold, Spike Threshold, Status)
+                self.tree.insert('', 'end', values=(
+                    time_str,
+                    broker,
+                    symbol,
+                    f"{price:.5f}",
+                    f"{gap_threshold:.3f}",
+                    f"{spike_threshold:.3f}",
+                    status
+                ), tags=(tag,))
 
+            
+            # Update info label
+            self.info_label.config(text=f"Total: {len(hidden_symbols)} hidden symbol(s)")
+            
+            # If no hidden delays, show message
+            if not hidden_symbols:
+                self.tree.insert('', 'end', values=(
+                    'No hidden delays',
+                    '-',
+                    '-',
+                    '-',
+                    '-',
+                    '✅ Không có symbols bị ẩn',
+                    '-'
+                ))
+                self.info_label.config(text="Total: 0 hidden symbols")
                 
-                # Update info label
-                self.info_label.config(text=f"Total: {len(hidden_symbols)} hidden symbol(s)")
-                
-                # If no hidden delays, show message
-                if not hidden_symbols:
-                    self.tree.insert('', 'end', values=(
-                        'No hidden delays',
-                        '-',
-                        '-',
-                        '-',
-                        '-',
-                        '✅ Không có symbols bị ẩn',
-                        '-'
-                    ))
-                    self.info_label.config(text="Total: 0 hidden symbols")
-                    
         except Exception as e:
             logger.error(f"Error updating hidden delays display: {e}")
     
@@ -10196,7 +14694,7 @@ def on_symbol_double_click(self, event):
             new_value = new_value.strip()
             global gap_settings, spike_settings
             settings_dict = gap_settings if threshold_type == 'gap' else spike_settings
-            key = f"{broker}_{symbol}"
+            key = symbol_key(broker, symbol)
 
             if new_value == "":
                 if key in settings_dict:
@@ -10381,8 +14879,7 @@ class RawDataViewerWindow:
             # Simple check first
             broker_count = 0
             try:
-                with data_lock:
-                    broker_count = len(market_data)
+                broker_count = len(market_data)
                 logger.info(f"Raw Data Viewer: Found {broker_count} brokers")
             except Exception as check_err:
                 logger.error(f"Raw Data Viewer: Error checking data: {check_err}")
@@ -10443,9 +14940,8 @@ class RawDataViewerWindow:
             # Quick data collection with timeout protection
             brokers = []
             try:
-                with data_lock:
-                    # Get all brokers (quick)
-                    brokers = sorted(list(market_data.keys()))
+                # Get all brokers (quick)
+                brokers = sorted(list(market_data.keys()))
             except Exception as lock_err:
                 logger.error(f"Error getting brokers: {lock_err}")
                 return
@@ -10484,54 +14980,53 @@ class RawDataViewerWindow:
             # Collect data quickly with lock (with timeout protection)
             symbols_to_display = []
             try:
-                with data_lock:
-                    current_time = time.time()
-                    
-                    # Collect symbols (limit to 100 for faster load)
-                    count = 0
-                    max_symbols = 100  # Reduced from 500 for speed
+                current_time = time.time()
+                
+                # Collect symbols (limit to 100 for faster load)
+                count = 0
+                max_symbols = 100  # Reduced from 500 for speed
+                
+                for broker in sorted(market_data.keys()):
+                    # Apply filter
+                    if current_filter != "All Brokers" and broker != current_filter:
+                        continue
                     
-                    for broker in sorted(market_data.keys()):
-                        # Apply filter
-                        if current_filter != "All Brokers" and broker != current_filter:
-                            continue
+                    symbols = market_data.get(broker, {})
+                    for symbol in sorted(symbols.keys()):
+                        if count >= max_symbols:  # Safety limit
+                            break
                         
-                        symbols = market_data.get(broker, {})
-                        for symbol in sorted(symbols.keys()):
-                            if count >= max_symbols:  # Safety limit
-                                break
-                            
-                            data = symbols.get(symbol, {})
-                            bid = data.get('bid', 0)
-                            ask = data.get('ask', 0)
-                            timestamp = data.get('timestamp', 0)
-                            digits = data.get('digits', 5)
-                            
-                            # Format last update (simplified)
-                            if timestamp > 0:
-                                age = current_time - timestamp
-                                if age < 60:
-                                    last_update = f"{int(age)}s"
-                                elif age < 3600:
-                                    last_update = f"{int(age/60)}m"
-                                else:
-                                    last_update = f"{int(age/3600)}h"
+                        data = symbols.get(symbol, {})
+                        bid = data.get('bid', 0)
+                        ask = data.get('ask', 0)
+                        timestamp = data.get('timestamp', 0)
+                        digits = data.get('digits', 5)
+                        
+                        # Format last update (simplified)
+                        if timestamp > 0:
+                            age = current_time - timestamp
+                            if age < 60:
+                                last_update = f"{int(age)}s"
+                            elif age < 3600:
+                                last_update = f"{int(age/60)}m"
                             else:
-                                last_update = "N/A"
-                            
-                            symbols_to_display.append((
-                                broker,
-                                symbol,
-                                f"{bid:.{digits}f}" if bid > 0 else "N/A",
-                                f"{ask:.{digits}f}" if ask > 0 else "N/A",
-                                last_update,
-                                f"{broker}_{symbol}"
-                            ))
-                            count += 1
+                                last_update = f"{int(age/3600)}h"
+                        else:
+                            last_update = "N/A"
+                        
+                        symbols_to_display.append((
+                            broker,
+                            symbol,
+                            f"{bid:.{digits}f}" if bid > 0 else "N/A",
+                            f"{ask:.{digits}f}" if ask > 0 else "N/A",
+                            last_update,
+                            f"{broker}_{symbol}"
+                        ))
+                        count += 1
+                    
+                    if count >= max_symbols:
+                        break
                         
-                        if count >= max_symbols:
-                            break
-                            
             except Exception as lock_err:
                 logger.error(f"Error collecting symbol data: {lock_err}", exc_info=True)
                 self.status_label.config(text="Error reading data", foreground='red')
@@ -10582,180 +15077,179 @@ class RawDataViewerWindow:
             if not self.selected_broker or not self.selected_symbol:
                 return
             
-            with data_lock:
-                # Check if data exists
-                if self.selected_broker not in market_data:
-                    self.detail_text.delete(1.0, tk.END)
-                    self.detail_text.insert(tk.END, "⚠️ Broker not found in market_data")
-                    return
-                
-                if self.selected_symbol not in market_data[self.selected_broker]:
-                    self.detail_text.delete(1.0, tk.END)
-                    self.detail_text.insert(tk.END, "⚠️ Symbol not found in market_data")
-                    return
-                
-                # Get data
-                data = market_data[self.selected_broker][self.selected_symbol]
-                key = f"{self.selected_broker}_{self.selected_symbol}"
-                
-                # Update title
-                self.detail_title.config(
-                    text=f"📊 {self.selected_broker} - {self.selected_symbol}"
-                )
-                
-                # Build detailed view
-                detail_lines = []
-                detail_lines.append("=" * 80)
-                detail_lines.append(f"BROKER: {self.selected_broker}")
-                detail_lines.append(f"SYMBOL: {self.selected_symbol}")
-                detail_lines.append("=" * 80)
-                detail_lines.append("")
-                
-                # Current Prices
-                detail_lines.append("📈 CURRENT PRICES")
-                detail_lines.append("-" * 80)
-                bid = data.get('bid', 0)
-                ask = data.get('ask', 0)
-                digits = data.get('digits', 5)
-                spread = data.get('spread', 0)
-                
-                detail_lines.append(f"  Bid:        {bid:.{digits}f}")
-                detail_lines.append(f"  Ask:        {ask:.{digits}f}")
-                detail_lines.append(f"  Spread:     {spread}")
-                detail_lines.append(f"  Digits:     {digits}")
-                detail_lines.append("")
-                
-                # Timestamp
-                detail_lines.append("⏰ TIMESTAMP")
-                detail_lines.append("-" * 80)
-                timestamp = data.get('timestamp', 0)
-                if timestamp > 0:
-                    dt = server_timestamp_to_datetime(timestamp)
-                    age = time.time() - timestamp
-                    detail_lines.append(f"  Timestamp:  {timestamp}")
-                    detail_lines.append(f"  DateTime:   {dt.strftime('%Y-%m-%d %H:%M:%S')}")
-                    detail_lines.append(f"  Age:        {age:.2f} seconds ago")
-                else:
-                    detail_lines.append(f"  Timestamp:  N/A")
-                detail_lines.append("")
-                
-                # Previous OHLC (Index 1 - Candle đã đóng)
-                detail_lines.append("📊 PREVIOUS CANDLE (M1 Index 1 - Đã đóng)")
-                detail_lines.append("-" * 80)
-                prev_ohlc = data.get('prev_ohlc', {})
-                if prev_ohlc:
-                    detail_lines.append(f"  Open:       {prev_ohlc.get('open', 'N/A')}")
-                    detail_lines.append(f"  High:       {prev_ohlc.get('high', 'N/A')}")
-                    detail_lines.append(f"  Low:        {prev_ohlc.get('low', 'N/A')}")
-                    detail_lines.append(f"  Close:      {prev_ohlc.get('close', 'N/A')}")
-                else:
-                    detail_lines.append(f"  N/A")
-                detail_lines.append("")
-                
-                # Current OHLC (Index 0 - Candle đang hình thành)
-                detail_lines.append("📊 CURRENT CANDLE (M1 Index 0 - Đang hình thành)")
-                detail_lines.append("-" * 80)
-                current_ohlc = data.get('current_ohlc', {})
-                if current_ohlc:
-                    detail_lines.append(f"  Open:       {current_ohlc.get('open', 'N/A')}")
-                    detail_lines.append(f"  High:       {current_ohlc.get('high', 'N/A')}")
-                    detail_lines.append(f"  Low:        {current_ohlc.get('low', 'N/A')}")
-                    detail_lines.append(f"  Close:      {current_ohlc.get('close', 'N/A')}")
-                else:
-                    detail_lines.append(f"  N/A")
-                detail_lines.append("")
-                
-                # Market Status
-                detail_lines.append("🕐 MARKET STATUS")
-                detail_lines.append("-" * 80)
-                is_open = data.get('isOpen', 'N/A')
-                detail_lines.append(f"  Market Open: {is_open}")
-                detail_lines.append("")
-                
-                # Bid Tracking Info
-                detail_lines.append("📍 BID TRACKING")
-                detail_lines.append("-" * 80)
-                if key in bid_tracking:
-                    bt = bid_tracking[key]
-                    last_bid = bt.get('last_bid', 'N/A')
-                    last_change = bt.get('last_change_time', 0)
-                    first_seen = bt.get('first_seen_time', 0)
-                    
-                    detail_lines.append(f"  Last Bid:        {last_bid}")
-                    if last_change > 0:
-                        dt_change = server_timestamp_to_datetime(last_change)
-                        age_change = time.time() - last_change
-                        detail_lines.append(f"  Last Change:     {dt_change.strftime('%Y-%m-%d %H:%M:%S')}")
-                        detail_lines.append(f"  Change Age:      {age_change:.2f} seconds ago")
-                    if first_seen > 0:
-                        dt_first = server_timestamp_to_datetime(first_seen)
-                        detail_lines.append(f"  First Seen:      {dt_first.strftime('%Y-%m-%d %H:%M:%S')}")
-                else:
-                    detail_lines.append(f"  N/A")
-                detail_lines.append("")
-                
-                # Candle Data Count
-                detail_lines.append("📊 CANDLE DATA (Chart)")
-                detail_lines.append("-" * 80)
-                if key in candle_data:
-                    candle_count = len(candle_data[key])
-                    detail_lines.append(f"  Candles Stored:  {candle_count}")
-                    if candle_count > 0:
-                        last_candle = candle_data[key][-1]
-                        detail_lines.append(f"  Last Candle:")
-                        detail_lines.append(f"    Time:   {server_timestamp_to_datetime(last_candle[0]).strftime('%Y-%m-%d %H:%M:%S')}")
-                        detail_lines.append(f"    Open:   {last_candle[1]}")
-                        detail_lines.append(f"    High:   {last_candle[2]}")
-                        detail_lines.append(f"    Low:    {last_candle[3]}")
-                        detail_lines.append(f"    Close:  {last_candle[4]}")
-                else:
-                    detail_lines.append(f"  N/A")
-                detail_lines.append("")
+            # Check if data exists
+            if self.selected_broker not in market_data:
+                self.detail_text.delete(1.0, tk.END)
+                self.detail_text.insert(tk.END, "⚠️ Broker not found in market_data")
+                return
+            
+            if self.selected_symbol not in market_data[self.selected_broker]:
+                self.detail_text.delete(1.0, tk.END)
+                self.detail_text.insert(tk.END, "⚠️ Symbol not found in market_data")
+                return
+            
+            # Get data
+            data = market_data[self.selected_broker][self.selected_symbol]
+            key = f"{self.selected_broker}_{self.selected_symbol}"
+            
+            # Update title
+            self.detail_title.config(
+                text=f"📊 {self.selected_broker} - {self.selected_symbol}"
+            )
+            
+            # Build detailed view
+            detail_lines = []
+            detail_lines.append("=" * 80)
+            detail_lines.append(f"BROKER: {self.selected_broker}")
+            detail_lines.append(f"SYMBOL: {self.selected_symbol}")
+            detail_lines.append("=" * 80)
+            detail_lines.append("")
+            
+            # Current Prices
+            detail_lines.append("📈 CURRENT PRICES")
+            detail_lines.append("-" * 80)
+            bid = data.get('bid', 0)
+            ask = data.get('ask', 0)
+            digits = data.get('digits', 5)
+            spread = data.get('spread', 0)
+            
+            detail_lines.append(f"  Bid:        {bid:.{digits}f}")
+            detail_lines.append(f"  Ask:        {ask:.{digits}f}")
+            detail_lines.append(f"  Spread:     {spread}")
+            detail_lines.append(f"  Digits:     {digits}")
+            detail_lines.append("")
+            
+            # Timestamp
+            detail_lines.append("⏰ TIMESTAMP")
+            detail_lines.append("-" * 80)
+            timestamp = data.get('timestamp', 0)
+            if timestamp > 0:
+                dt = server_timestamp_to_datetime(timestamp)
+                age = time.time() - timestamp
+                detail_lines.append(f"  Timestamp:  {timestamp}")
+                detail_lines.append(f"  DateTime:   {dt.strftime('%Y-%m-%d %H:%M:%S')}")
+                detail_lines.append(f"  Age:        {age:.2f} seconds ago")
+            else:
+                detail_lines.append(f"  Timestamp:  N/A")
+            detail_lines.append("")
+            
+            # Previous OHLC (Index 1 - Candle đã đóng)
+            detail_lines.append("📊 PREVIOUS CANDLE (M1 Index 1 - Đã đóng)")
+            detail_lines.append("-" * 80)
+            prev_ohlc = data.get('prev_ohlc', {})
+            if prev_ohlc:
+                detail_lines.append(f"  Open:       {prev_ohlc.get('open', 'N/A')}")
+                detail_lines.append(f"  High:       {prev_ohlc.get('high', 'N/A')}")
+                detail_lines.append(f"  Low:        {prev_ohlc.get('low', 'N/A')}")
+                detail_lines.append(f"  Close:      {prev_ohlc.get('close', 'N/A')}")
+            else:
+                detail_lines.append(f"  N/A")
+            detail_lines.append("")
+            
+            # Current OHLC (Index 0 - Candle đang hình thành)
+            detail_lines.append("📊 CURRENT CANDLE (M1 Index 0 - Đang hình thành)")
+            detail_lines.append("-" * 80)
+            current_ohlc = data.get('current_ohlc', {})
+            if current_ohlc:
+                detail_lines.append(f"  Open:       {current_ohlc.get('open', 'N/A')}")
+                detail_lines.append(f"  High:       {current_ohlc.get('high', 'N/A')}")
+                detail_lines.append(f"  Low:        {current_ohlc.get('low', 'N/A')}")
+                detail_lines.append(f"  Close:      {current_ohlc.get('close', 'N/A')}")
+            else:
+                detail_lines.append(f"  N/A")
+            detail_lines.append("")
+            
+            # Market Status
+            detail_lines.append("🕐 MARKET STATUS")
+            detail_lines.append("-" * 80)
+            is_open = data.get('isOpen', 'N/A')
+            detail_lines.append(f"  Market Open: {is_open}")
+            detail_lines.append("")
+            
+            # Bid Tracking Info
+            detail_lines.append("📍 BID TRACKING")
+            detail_lines.append("-" * 80)
+            if key in bid_tracking:
+                bt = bid_tracking[key]
+                last_bid = bt.get('last_bid', 'N/A')
+                last_change = bt.get('last_change_time', 0)
+                first_seen = bt.get('first_seen_time', 0)
                 
-                # Gap & Spike Results
-                detail_lines.append("⚡ GAP & SPIKE RESULTS")
-                detail_lines.append("-" * 80)
-                if key in gap_spike_results:
-                    results = gap_spike_results[key]
-                    gap_info = results.get('gap', {})
-                    spike_info = results.get('spike', {})
-                    
-                    detail_lines.append(f"  Gap Detected:    {gap_info.get('detected', False)}")
-                    detail_lines.append(f"  Gap %:           {gap_info.get('percentage', 0):.4f}%")
-                    detail_lines.append(f"  Gap Direction:   {gap_info.get('direction', 'N/A')}")
-                    detail_lines.append(f"  Gap Threshold:   {gap_info.get('threshold', 'N/A')}%")
-                    detail_lines.append("")
-                    detail_lines.append(f"  Spike Detected:  {spike_info.get('detected', False)}")
-                    detail_lines.append(f"  Spike %:         {spike_info.get('strength', 0):.4f}%")
-                    detail_lines.append(f"  Spike Type:      {spike_info.get('spike_type', 'N/A')}")
-                    detail_lines.append(f"  Spike UP %:      {spike_info.get('spike_up_abs', 0):.4f}%")
-                    detail_lines.append(f"  Spike DOWN %:    {spike_info.get('spike_down_abs', 0):.4f}%")
-                    detail_lines.append(f"  Spike Threshold: {spike_info.get('threshold', 'N/A')}%")
-                else:
-                    detail_lines.append(f"  N/A")
-                detail_lines.append("")
+                detail_lines.append(f"  Last Bid:        {last_bid}")
+                if last_change > 0:
+                    dt_change = server_timestamp_to_datetime(last_change)
+                    age_change = time.time() - last_change
+                    detail_lines.append(f"  Last Change:     {dt_change.strftime('%Y-%m-%d %H:%M:%S')}")
+                    detail_lines.append(f"  Change Age:      {age_change:.2f} seconds ago")
+                if first_seen > 0:
+                    dt_first = server_timestamp_to_datetime(first_seen)
+                    detail_lines.append(f"  First Seen:      {dt_first.strftime('%Y-%m-%d %H:%M:%S')}")
+            else:
+                detail_lines.append(f"  N/A")
+            detail_lines.append("")
+            
+            # Candle Data Count
+            detail_lines.append("📊 CANDLE DATA (Chart)")
+            detail_lines.append("-" * 80)
+            if key in candle_data:
+                candle_count = len(candle_data[key])
+                detail_lines.append(f"  Candles Stored:  {candle_count}")
+                if candle_count > 0:
+                    last_candle = candle_data[key][-1]
+                    detail_lines.append(f"  Last Candle:")
+                    detail_lines.append(f"    Time:   {server_timestamp_to_datetime(last_candle[0]).strftime('%Y-%m-%d %H:%M:%S')}")
+                    detail_lines.append(f"    Open:   {last_candle[1]}")
+                    detail_lines.append(f"    High:   {last_candle[2]}")
+                    detail_lines.append(f"    Low:    {last_candle[3]}")
+                    detail_lines.append(f"    Close:  {last_candle[4]}")
+            else:
+                detail_lines.append(f"  N/A")
+            detail_lines.append("")
+            
+            # Gap & Spike Results
+            detail_lines.append("⚡ GAP & SPIKE RESULTS")
+            detail_lines.append("-" * 80)
+            if key in gap_spike_results:
+                results = gap_spike_results[key]
+                gap_info = results.get('gap', {})
+                spike_info = results.get('spike', {})
                 
-                # Manual Hidden Status
-                detail_lines.append("👁️ VISIBILITY STATUS")
-                detail_lines.append("-" * 80)
-                is_hidden = key in manual_hidden_delays
-                detail_lines.append(f"  Manually Hidden: {is_hidden}")
+                detail_lines.append(f"  Gap Detected:    {gap_info.get('detected', False)}")
+                detail_lines.append(f"  Gap %:           {gap_info.get('percentage', 0):.4f}%")
+                detail_lines.append(f"  Gap Direction:   {gap_info.get('direction', 'N/A')}")
+                detail_lines.append(f"  Gap Threshold:   {gap_info.get('threshold', 'N/A')}%")
                 detail_lines.append("")
-                
-                # RAW JSON (simplified to avoid freeze)
-                detail_lines.append("📄 RAW JSON DATA")
-                detail_lines.append("-" * 80)
-                try:
-                    import json
-                    # Limit JSON to prevent freeze with large data
-                    json_str = json.dumps(data, indent=2, default=str)
-                    # Limit to first 5000 characters to prevent UI freeze
-                    if len(json_str) > 5000:
-                        json_str = json_str[:5000] + "\n... (truncated - data too large)"
-                    detail_lines.append(json_str)
-                except Exception as json_err:
-                    detail_lines.append(f"⚠️ Error serializing JSON: {str(json_err)}")
-                    detail_lines.append(f"Data keys: {list(data.keys())}")
+                detail_lines.append(f"  Spike Detected:  {spike_info.get('detected', False)}")
+                detail_lines.append(f"  Spike %:         {spike_info.get('strength', 0):.4f}%")
+                detail_lines.append(f"  Spike Type:      {spike_info.get('spike_type', 'N/A')}")
+                detail_lines.append(f"  Spike UP %:      {spike_info.get('spike_up_abs', 0):.4f}%")
+                detail_lines.append(f"  Spike DOWN %:    {spike_info.get('spike_down_abs', 0):.4f}%")
+                detail_lines.append(f"  Spike Threshold: {spike_info.get('threshold', 'N/A')}%")
+            else:
+                detail_lines.append(f"  N/A")
+            detail_lines.append("")
+            
+            # Manual Hidden Status
+            detail_lines.append("👁️ VISIBILITY STATUS")
+            detail_lines.append("-" * 80)
+            is_hidden = key in manual_hidden_delays
+            detail_lines.append(f"  Manually Hidden: {is_hidden}")
+            detail_lines.append("")
+            
+            # RAW JSON (simplified to avoid freeze)
+            detail_lines.append("📄 RAW JSON DATA")
+            detail_lines.append("-" * 80)
+            try:
+                import json
+                # Limit JSON to prevent freeze with large data
+                json_str = json.dumps(dict(data), indent=2, default=str)
+                # Limit to first 5000 characters to prevent UI freeze
+                if len(json_str) > 5000:
+                    json_str = json_str[:5000] + "\n... (truncated - data too large)"
+                detail_lines.append(json_str)
+            except Exception as json_err:
+                detail_lines.append(f"⚠️ Error serializing JSON: {str(json_err)}")
+                detail_lines.append(f"Data keys: {list(data.keys())}")
             
             # Update text widget (outside data_lock to avoid blocking)
             self.detail_text.delete(1.0, tk.END)
@@ -11251,13 +15745,12 @@ class PictureGalleryWindow:
             gap_meta = metadata.get('gap') or {}
             spike_meta = metadata.get('spike') or {}
 
-            result_key = f"{broker}_{symbol}"
+            result_key = symbol_key(broker, symbol)
             needs_gap_fallback = not gap_meta or ('percentage' not in gap_meta and 'message' not in gap_meta)
             needs_spike_fallback = not spike_meta or ('strength' not in spike_meta and 'message' not in spike_meta)
 
             if needs_gap_fallback or needs_spike_fallback or (server_time == 'N/A' and server_timestamp is None):
-                with data_lock:
-                    fallback_result = gap_spike_results.get(result_key)
+                fallback_result = gap_spike_results.get(result_key)
                 if fallback_result:
                     if needs_gap_fallback:
                         gap_meta = (fallback_result.get('gap') or {}).copy()
@@ -11542,90 +16035,89 @@ class ConnectedBrokersWindow:
     def update_display(self):
         """Cập nhật hiển thị brokers với connection status"""
         try:
-            with data_lock:
-                # Clear existing items
-                for item in self.tree.get_children():
-                    self.tree.delete(item)
+            # Clear existing items
+            for item in self.tree.get_children():
+                self.tree.delete(item)
+            
+            # Get broker info from market_data
+            current_time = time.time()
+            connection_timeout = 20  # 20 seconds như yêu cầu
+            broker_info = {}
+            
+            for broker, symbols in market_data.items():
+                symbol_count = len(symbols)
                 
-                # Get broker info from market_data
-                current_time = time.time()
-                connection_timeout = 20  # 20 seconds như yêu cầu
-                broker_info = {}
+                # Check if ANY symbol is still updating (< 20s delay)
+                has_active_symbol = False
+                latest_timestamp = 0
                 
-                for broker, symbols in market_data.items():
-                    symbol_count = len(symbols)
+                for symbol_name in symbols.keys():
+                    key = symbol_key(broker, symbol_name)
                     
-                    # Check if ANY symbol is still updating (< 20s delay)
-                    has_active_symbol = False
-                    latest_timestamp = 0
-                    
-                    for symbol_name in symbols.keys():
-                        key = f"{broker}_{symbol_name}"
+                    # Check bid tracking
+                    if key in bid_tracking:
+                        last_change_time = bid_tracking[key]['last_change_time']
+                        delay_duration = current_time - last_change_time
                         
-                        # Check bid tracking
-                        if key in bid_tracking:
-                            last_change_time = bid_tracking[key]['last_change_time']
-                            delay_duration = current_time - last_change_time
-                            
-                            if delay_duration < connection_timeout:
-                                has_active_symbol = True
-                            
-                            if last_change_time > latest_timestamp:
-                                latest_timestamp = last_change_time
+                        if delay_duration < connection_timeout:
+                            has_active_symbol = True
                         
-                        # Also check regular timestamp
-                        symbol_data = symbols[symbol_name]
-                        ts = symbol_data.get('timestamp', 0)
-                        if ts > latest_timestamp:
-                            latest_timestamp = ts
+                        if last_change_time > latest_timestamp:
+                            latest_timestamp = last_change_time
                     
-                    # Broker is connected if at least 1 symbol is active
-                    is_connected = has_active_symbol
-                    age = current_time - latest_timestamp if latest_timestamp > 0 else 999999
-                    
-                    broker_info[broker] = {
-                        'symbols': symbol_count,
-                        'timestamp': latest_timestamp,
-                        'connected': is_connected,
-                        'age': age
-                    }
+                    # Also check regular timestamp
+                    symbol_data = symbols[symbol_name]
+                    ts = symbol_data.get('timestamp', 0)
+                    if ts > latest_timestamp:
+                        latest_timestamp = ts
                 
-                # Add brokers to tree
-                for broker, info in sorted(broker_info.items()):
-                    symbols = info['symbols']
-                    timestamp = info['timestamp']
-                    connected = info['connected']
-                    age = info['age']
-                    
-                    if timestamp > 0:
-                        last_update = server_timestamp_to_datetime(timestamp).strftime('%H:%M:%S')
-                        if age < 60:
-                            age_str = f"{int(age)}s ago"
-                        else:
-                            age_str = f"{int(age/60)}m ago"
-                        last_update_str = f"{last_update} ({age_str})"
+                # Broker is connected if at least 1 symbol is active
+                is_connected = has_active_symbol
+                age = current_time - latest_timestamp if latest_timestamp > 0 else 999999
+                
+                broker_info[broker] = {
+                    'symbols': symbol_count,
+                    'timestamp': latest_timestamp,
+                    'connected': is_connected,
+                    'age': age
+                }
+            
+            # Add brokers to tree
+            for broker, info in sorted(broker_info.items()):
+                symbols = info['symbols']
+                timestamp = info['timestamp']
+                connected = info['connected']
+                age = info['age']
+                
+                if timestamp > 0:
+                    last_update = server_timestamp_to_datetime(timestamp).strftime('%H:%M:%S')
+                    if age < 60:
+                        age_str = f"{int(age)}s ago"
                     else:
-                        last_update_str = "Never"
-                    
-                    status = "🟢 Connected" if connected else "🔴 Disconnected"
-                    tag = 'connected' if connected else 'disconnected'
-                    
-                    self.tree.insert('', 'end', values=(
-                        broker,
-                        symbols,
-                        last_update_str,
-                        status
-                    ), tags=(tag,))
+                        age_str = f"{int(age/60)}m ago"
+                    last_update_str = f"{last_update} ({age_str})"
+                else:
+                    last_update_str = "Never"
+                
+                status = "🟢 Connected" if connected else "🔴 Disconnected"
+                tag = 'connected' if connected else 'disconnected'
+                
+                self.tree.insert('', 'end', values=(
+                    broker,
+                    symbols,
+                    last_update_str,
+                    status
+                ), tags=(tag,))
+            
+            # If no brokers, show message
+            if not broker_info:
+                self.tree.insert('', 'end', values=(
+                    'No brokers connected',
+                    '-',
+                    '-',
+                    '⚠️ Waiting...'
+                ))
                 
-                # If no brokers, show message
-                if not broker_info:
-                    self.tree.insert('', 'end', values=(
-                        'No brokers connected',
-                        '-',
-                        '-',
-                        '⚠️ Waiting...'
-                    ))
-                    
         except Exception as e:
             logger.error(f"Error updating connected brokers display: {e}")
     
@@ -11635,6 +16127,94 @@ class ConnectedBrokersWindow:
             self.update_display()
             self.window.after(5000, self.auto_refresh)
 
+# ===================== INGEST METRICS WINDOW =====================
+class IngestMetricsWindow:
+    """Hiển thị get_metrics_snapshot() (giống /metrics.json), tự làm mới mỗi 2 giây"""
+
+    def __init__(self, parent, main_app):
+        self.main_app = main_app
+        self.window = tk.Toplevel(parent)
+        self.window.title("Hiệu năng ingest")
+        self.window.geometry("900x600")
+        self.window.transient(parent)
+        self.window.lift()
+
+        top_frame = ttk.Frame(self.window, padding="10")
+        top_frame.pack(fill=tk.X)
+        ttk.Label(top_frame, text="📈 Hiệu năng ingest", font=('Arial', 14, 'bold')).pack(side=tk.LEFT, padx=10)
+        ttk.Button(top_frame, text="🔄 Refresh", command=self.update_display).pack(side=tk.LEFT, padx=5)
+        ttk.Button(top_frame, text="🗑️ Reset", command=self.reset_metrics).pack(side=tk.LEFT, padx=5)
+        self.summary_label = ttk.Label(top_frame, text="", foreground='gray')
+        self.summary_label.pack(side=tk.LEFT, padx=10)
+
+        stage_frame = ttk.LabelFrame(self.window, text="Giai đoạn (ms / payload)", padding="10")
+        stage_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.stage_tree = self._make_tree(stage_frame, (
+            ('Stage', 'Giai đoạn', 180), ('Count', 'Số payload', 90), ('p50', 'p50', 90),
+            ('p95', 'p95', 90), ('p99', 'p99', 90), ('Max', 'Max', 90)
+        ), height=12)
+
+        broker_frame = ttk.LabelFrame(self.window, text="Broker (60s gần nhất)", padding="10")
+        broker_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.broker_tree = self._make_tree(broker_frame, (
+            ('Broker', 'Broker', 250), ('Payloads', 'Payload/s', 100), ('Symbols', 'Symbol/s', 100),
+            ('Total', 'Tổng payload', 120), ('Lock', 'Giữ lock max (ms)', 140)
+        ), height=6)
+
+        self.update_display()
+        self.auto_refresh()
+
+    def _make_tree(self, frame, columns, height):
+        tree = ttk.Treeview(frame, columns=[c[0] for c in columns], show='headings', height=height)
+        for column, heading, width in columns:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor=tk.W if column in ('Stage', 'Broker') else tk.E)
+        vsb = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=vsb.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        return tree
+
+    def update_display(self):
+        """Cập nhật bảng giai đoạn và broker từ snapshot metrics"""
+        try:
+            snapshot = get_metrics_snapshot()
+
+            self.stage_tree.delete(*self.stage_tree.get_children())
+            for stage in INGEST_STAGES:
+                stats = snapshot['stages'].get(stage)
+                if not stats or not stats['count']:
+                    continue
+                self.stage_tree.insert('', 'end', values=(
+                    stage, stats['count'], f"{stats['p50_ms']:.2f}", f"{stats['p95_ms']:.2f}",
+                    f"{stats['p99_ms']:.2f}", f"{stats['max_ms']:.2f}"
+                ))
+
+            self.broker_tree.delete(*self.broker_tree.get_children())
+            for broker, rates in sorted(snapshot['brokers'].items()):
+                lock_stats = snapshot['locks'].get(f"broker:{broker}", {}).get('receive_data', {})
+                self.broker_tree.insert('', 'end', values=(
+                    broker, f"{rates['payloads_per_sec']:.2f}", f"{rates['symbols_per_sec']:.0f}",
+                    rates['payloads_total'], f"{lock_stats.get('hold_max_ms', 0):.2f}"
+                ))
+
+            queue = snapshot['ingest_queue']
+            self.summary_label.config(
+                text=f"Hàng đợi: {queue['depth']} | Đã xử lý: {queue['processed']} | Bỏ (coalesce): {queue['dropped']}"
+            )
+        except Exception as e:
+            logger.error(f"Error updating ingest metrics display: {e}")
+
+    def reset_metrics(self):
+        ingest_metrics.reset()
+        self.update_display()
+
+    def auto_refresh(self):
+        """Auto refresh every 2 seconds"""
+        if self.window.winfo_exists():
+            self.update_display()
+            self.window.after(2000, self.auto_refresh)
+
 # ===================== HIDDEN ALERTS WINDOW =====================
 class HiddenAlertsWindow:
     def __init__(self, parent, main_app):
@@ -11716,12 +16296,11 @@ class HiddenAlertsWindow:
 
             for key, hidden_info in sorted_items:
                 # Parse key
-                parts = key.split('_', 1)
-                if len(parts) != 2:
+                try:
+                    broker, symbol = split_symbol_key(key)
+                except ValueError:
                     continue
 
-                broker, symbol = parts
-
                 hidden_at = hidden_info.get('hidden_at', 0)
                 hidden_until = hidden_info.get('hidden_until')
 
@@ -12007,77 +16586,76 @@ class TradingHoursWindow:
     def update_display(self):
         """Cập nhật hiển thị trading hours"""
         try:
-            with data_lock:
-                # Clear existing items
-                for item in self.tree.get_children():
-                    self.tree.delete(item)
-                
-                # Update broker filter
-                broker_list = ['All'] + sorted(market_data.keys())
-                self.broker_filter['values'] = broker_list
-                if not self.broker_filter.get():
-                    self.broker_filter.set('All')
-                
-                selected_broker = self.broker_filter.get()
-                
-                # Get current time
-                now = datetime.now()
-                current_time_str = now.strftime('%H:%M:%S')
-                current_day_name = now.strftime('%A')
+            # Clear existing items
+            for item in self.tree.get_children():
+                self.tree.delete(item)
+            
+            # Update broker filter
+            broker_list = ['All'] + sorted(market_data.keys())
+            self.broker_filter['values'] = broker_list
+            if not self.broker_filter.get():
+                self.broker_filter.set('All')
+            
+            selected_broker = self.broker_filter.get()
+            
+            # Get current time
+            now = datetime.now()
+            current_time_str = now.strftime('%H:%M:%S')
+            current_day_name = now.strftime('%A')
+            
+            # Statistics
+            total_symbols = 0
+            trading_count = 0
+            closed_count = 0
+            
+            # Sort by broker, then symbol
+            for broker in sorted(market_data.keys()):
+                if selected_broker != 'All' and broker != selected_broker:
+                    continue
                 
-                # Statistics
-                total_symbols = 0
-                trading_count = 0
-                closed_count = 0
+                symbols_dict = market_data[broker]
                 
-                # Sort by broker, then symbol
-                for broker in sorted(market_data.keys()):
-                    if selected_broker != 'All' and broker != selected_broker:
-                        continue
+                for symbol in sorted(symbols_dict.keys()):
+                    symbol_data = symbols_dict[symbol]
+                    trade_sessions = symbol_data.get('trade_sessions', {})
                     
-                    symbols_dict = market_data[broker]
+                    # Check if trading now
+                    is_trading, active_session, all_sessions = self.check_if_trading_now(trade_sessions)
                     
-                    for symbol in sorted(symbols_dict.keys()):
-                        symbol_data = symbols_dict[symbol]
-                        trade_sessions = symbol_data.get('trade_sessions', {})
-                        
-                        # Check if trading now
-                        is_trading, active_session, all_sessions = self.check_if_trading_now(trade_sessions)
-                        
-                        total_symbols += 1
-                        if is_trading:
-                            trading_count += 1
-                            status = "🟢 TRADING"
-                            tag = 'open'
-                        else:
-                            closed_count += 1
-                            status = "🔴 CLOSED"
-                            tag = 'closed'
-                        
-                        # Format session info
-                        if active_session:
-                            active_session_str = active_session
-                        else:
-                            active_session_str = "None"
-                        
-                        all_sessions_str = self.format_sessions_list(all_sessions)
-                        
-                        # Insert row
-                        self.tree.insert('', 'end', values=(
-                            broker,
-                            symbol,
-                            status,
-                            current_day_name,
-                            current_time_str,
-                            active_session_str,
-                            all_sessions_str
-                        ), tags=(tag,))
-                
-                # Update status
-                self.status_label.config(
-                    text=f"Total: {total_symbols} | 🟢 Trading: {trading_count} | 🔴 Closed: {closed_count}"
-                )
-                
+                    total_symbols += 1
+                    if is_trading:
+                        trading_count += 1
+                        status = "🟢 TRADING"
+                        tag = 'open'
+                    else:
+                        closed_count += 1
+                        status = "🔴 CLOSED"
+                        tag = 'closed'
+                    
+                    # Format session info
+                    if active_session:
+                        active_session_str = active_session
+                    else:
+                        active_session_str = "None"
+                    
+                    all_sessions_str = self.format_sessions_list(all_sessions)
+                    
+                    # Insert row
+                    self.tree.insert('', 'end', values=(
+                        broker,
+                        symbol,
+                        status,
+                        current_day_name,
+                        current_time_str,
+                        active_session_str,
+                        all_sessions_str
+                    ), tags=(tag,))
+            
+            # Update status
+            self.status_label.config(
+                text=f"Total: {total_symbols} | 🟢 Trading: {trading_count} | 🔴 Closed: {closed_count}"
+            )
+            
         except Exception as e:
             logger.error(f"Error updating trading hours display: {e}")
     
@@ -12087,16 +16665,385 @@ class TradingHoursWindow:
             self.update_display()
             self.window.after(5000, self.auto_refresh)
 
+# ===================== HTTP SERVER BACKEND =====================
+def load_server_settings():
+    """Load HTTP server settings (backend, worker pool, timeouts) from JSON file"""
+    try:
+        if os.path.exists(SERVER_SETTINGS_FILE):
+            with open(SERVER_SETTINGS_FILE, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    server_settings.update(loaded)
+        if server_settings.get('backend') not in HTTP_SERVER_BACKENDS:
+            logger.error(f"Unknown server backend {server_settings.get('backend')!r}, using 'pooled'")
+            server_settings['backend'] = 'pooled'
+        for field, default in (('max_workers', 64), ('max_connections', 500), ('keep_alive_timeout', 10),
+                               ('request_timeout', 30), ('max_request_mb', 32), ('backlog', 256)):
+            try:
+                value = int(server_settings.get(field, default))
+            except (TypeError, ValueError):
+                value = default
+            server_settings[field] = value if value > 0 else default
+        logger.info(
+            "Loaded server settings: backend=%s, max_workers=%d, keep_alive=%ds",
+            server_settings['backend'], server_settings['max_workers'], server_settings['keep_alive_timeout']
+        )
+    except Exception as e:
+        logger.error(f"Error loading server settings: {e}")
+
+class PooledRequestHandler(BaseHTTPRequestHandler):
+    """
+    Request handler HTTP/1.1 keep-alive cho WSGI app
+
+    Werkzeug luôn trả "Connection: close" → mỗi request của EA phải mở kết nối TCP mới.
+    Handler này đọc hết body theo Content-Length rồi mới gọi app, nên giữ được kết nối
+    cho request tiếp theo.
+
+    1 handler / kết nối, nhưng mỗi lần chỉ xử lý 1 request (serve_one) - giữa các request
+    kết nối nằm trong selector của PooledWSGIServer, không chiếm worker.
+    - Đọc request: request_timeout
+    - Chờ request tiếp theo trên cùng kết nối: keep_alive_timeout (PooledWSGIServer đóng kết nối idle)
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, request, client_address, server):
+        # Không gọi BaseRequestHandler.__init__ (setup → handle → finish liền 1 lượt)
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.setup()
+
+    def serve_one(self):
+        """
+        Xử lý 1 request (và các request EA đã gửi sẵn trong buffer)
+
+        Returns:
+            bool: True nếu kết nối còn giữ được cho request tiếp theo
+        """
+        while True:
+            self.connection.settimeout(self.server.request_timeout)
+            self.close_connection = True
+            self.handle_one_request()
+            if self.close_connection:
+                return False
+            if not self._has_buffered_request():
+                return True
+
+    def _has_buffered_request(self):
+        # Request tiếp theo đã nằm trong buffer của rfile → selector sẽ không báo, xử lý luôn
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+
+    def close(self):
+        try:
+            self.finish()
+        except OSError:
+            pass
+        finally:
+            self.server.shutdown_request(self.request)
+
+    def log_message(self, format, *args):
+        pass  # Giống werkzeug logger (đã tắt ở FLASK APP)
+
+    def run_wsgi(self):
+        self.connection.settimeout(self.server.request_timeout)
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.send_error(411, "Content-Length required")
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            self.send_error(400, "Bad Content-Length")
+            return
+        if length > self.server.max_request_bytes:
+            self.close_connection = True  # Không đọc body → không dùng lại kết nối được
+            self.send_error(413, "Request body too large")
+            return
+        body = self.rfile.read(length) if length > 0 else b''
+
+        path, _, query = self.path.partition('?')
+        environ = {
+            'REQUEST_METHOD': self.command,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote(path, 'latin-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.server.server_name,
+            'SERVER_PORT': str(self.server.server_port),
+            'SERVER_PROTOCOL': self.request_version,
+            'REMOTE_ADDR': self.client_address[0],
+            'REMOTE_PORT': str(self.client_address[1]),
+            'CONTENT_TYPE': self.headers.get('Content-Type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in self.headers.items():
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            if key not in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+        response = []
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+            return chunks.append
+
+        try:
+            result = self.server.app(environ, start_response)
+            try:
+                chunks.extend(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except Exception as e:
+            logger.error(f"Error handling {self.command} {path}: {e}")
+            self.send_error(500)
+            return
+
+        status, headers = response
+        code, _, reason = status.partition(' ')
+        payload = b''.join(chunks)
+        self.send_response(int(code), reason)
+        for name, value in headers:
+            if name.lower() not in ('content-length', 'connection', 'transfer-encoding'):
+                self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        elif self.request_version == 'HTTP/1.0':
+            self.send_header('Connection', 'keep-alive')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = do_OPTIONS = run_wsgi
+
+class PooledWSGIServer(HTTPServer):
+    """
+    HTTP server với worker pool giới hạn (ThreadPoolExecutor) + keep-alive
+
+    Khác Flask dev server (threaded=True): không tạo thread mới cho mỗi kết nối.
+    Worker được cấp theo request, không theo kết nối: kết nối idle (giữa 2 request keep-alive,
+    hoặc vừa accept chưa gửi gì) nằm trong 1 selector do thread "http-idle" theo dõi, có dữ
+    liệu mới giao cho worker. Nhiều EA hơn max_workers vẫn không phải chờ kết nối idle nhả worker.
+    - Kết nối idle quá keep_alive_timeout (mới accept: request_timeout) bị đóng
+    - Tối đa max_connections kết nối idle, vượt quá → đóng kết nối idle lâu nhất
+      (kết nối mới luôn được phục vụ, EA bị đóng kết nối keep-alive sẽ tự mở lại)
+    """
+    allow_reuse_address = True
+    IDLE_POLL_INTERVAL = 0.5  # Giây - chu kỳ kiểm tra kết nối idle hết hạn
+
+    def __init__(self, host, port, wsgi_app, max_workers=64, keep_alive_timeout=10,
+                 request_timeout=30, backlog=256, max_connections=500, max_request_mb=32):
+        self.app = wsgi_app
+        self.request_queue_size = backlog
+        self.keep_alive_timeout = keep_alive_timeout
+        self.request_timeout = request_timeout
+        self.max_connections = max_connections
+        self.max_request_bytes = int(max_request_mb * 1024 * 1024)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='http-worker')
+        super().__init__((host, port), PooledRequestHandler)
+
+        # Kết nối idle: chỉ thread http-idle đụng vào selector, worker đưa kết nối về qua _to_park
+        self._selector = selectors.DefaultSelector()
+        self._deadlines = {}  # handler → thời điểm đóng nếu vẫn idle
+        self._to_park = deque()
+        self._park_lock = threading.Lock()
+        self._closing = False
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._idle_thread = threading.Thread(target=self._idle_loop, name='http-idle', daemon=True)
+        self._idle_thread.start()
+
+    def process_request(self, request, client_address):
+        # Kết nối mới: chờ request đầu tiên trong selector (không chiếm worker)
+        try:
+            handler = PooledRequestHandler(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        self._park(handler, self.request_timeout)
+
+    def _serve(self, handler):
+        try:
+            keep = handler.serve_one()
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+            keep = False
+        if keep:
+            self._park(handler, self.keep_alive_timeout)
+        else:
+            handler.close()
+
+    def _park(self, handler, timeout):
+        with self._park_lock:
+            if self._closing:
+                handler.close()
+                return
+            self._to_park.append((handler, time.monotonic() + timeout))
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass  # Buffer đầy = thread idle đã có tín hiệu chưa đọc
+
+    def _idle_loop(self):
+        while not self._closing:
+            try:
+                events = self._selector.select(self.IDLE_POLL_INTERVAL)
+            except OSError:
+                break
+            for key, _ in events:
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                handler = key.data
+                self._selector.unregister(handler.connection)
+                del self._deadlines[handler]
+                try:
+                    self.executor.submit(self._serve, handler)
+                except RuntimeError:  # Executor đã shutdown
+                    handler.close()
+
+            with self._park_lock:
+                parked, self._to_park = self._to_park, deque()
+            for handler, deadline in parked:
+                if len(self._deadlines) >= self.max_connections:
+                    self._evict_oldest()
+                try:
+                    handler.connection.settimeout(None)
+                    self._selector.register(handler.connection, selectors.EVENT_READ, handler)
+                except (OSError, ValueError):
+                    handler.close()
+                    continue
+                self._deadlines[handler] = deadline
+
+            now = time.monotonic()
+            for handler in [h for h, deadline in self._deadlines.items() if deadline <= now]:
+                self._selector.unregister(handler.connection)
+                del self._deadlines[handler]
+                handler.close()
+
+        for handler in list(self._deadlines):
+            handler.close()
+        self._deadlines.clear()
+
+    def _evict_oldest(self):
+        """Đóng kết nối idle lâu nhất (_deadlines giữ thứ tự park, park lại sau mỗi request)"""
+        handler = next(iter(self._deadlines), None)
+        if handler is None:
+            return
+        self._selector.unregister(handler.connection)
+        del self._deadlines[handler]
+        handler.close()
+
+    def idle_connections(self):
+        """Số kết nối keep-alive đang idle (không chiếm worker)"""
+        return len(self._deadlines)
+
+    def handle_error(self, request, client_address):
+        logger.error(f"HTTP connection error from {client_address[0]}: {sys.exc_info()[1]}")
+
+    def server_close(self):
+        super().server_close()
+        with self._park_lock:
+            self._closing = True
+            for handler, _ in self._to_park:
+                handler.close()
+            self._to_park.clear()
+        self._wake()
+        self._idle_thread.join(self.IDLE_POLL_INTERVAL * 4)
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class WaitressServer:
+    """Adapter cho waitress (optional) - cùng interface serve_forever()/shutdown()"""
+
+    def __init__(self, host, port, wsgi_app, max_workers=64, keep_alive_timeout=10,
+                 request_timeout=30, backlog=256, max_connections=500, max_request_mb=32):
+        import waitress  # Optional dependency
+        self.server = waitress.create_server(
+            wsgi_app, host=host, port=port, threads=max_workers,
+            channel_timeout=keep_alive_timeout, backlog=backlog, ident=None,
+            connection_limit=max_connections, max_request_body_size=int(max_request_mb * 1024 * 1024)
+        )
+        self.server_port = self.server.effective_port
+
+    def serve_forever(self):
+        self.server.run()
+
+    def shutdown(self):
+        self.server.close()
+
+    def server_close(self):
+        pass
+
+HTTP_SERVER_BACKENDS = ('werkzeug', 'pooled', 'waitress')
+
+def make_http_server(backend=None, host=None, port=None, settings=None):
+    """
+    Tạo HTTP server cho Flask app theo backend cấu hình trong server_settings.json
+
+    Args:
+        backend: 'werkzeug' | 'pooled' | 'waitress' (mặc định: server_settings['backend'])
+        host, port: Mặc định HTTP_HOST/HTTP_PORT (port=0 → port ngẫu nhiên, dùng cho benchmark)
+
+    Returns:
+        Server có serve_forever()/shutdown()/server_close() và thuộc tính server_port
+    """
+    settings = {**server_settings, **(settings or {})}
+    backend = backend or settings['backend']
+    host = HTTP_HOST if host is None else host
+    port = HTTP_PORT if port is None else port
+    options = {field: settings[field] for field in ('max_workers', 'keep_alive_timeout', 'request_timeout', 'backlog',
+                                                    'max_connections', 'max_request_mb')}
+
+    if backend == 'waitress':
+        try:
+            return WaitressServer(host, port, app, **options)
+        except ImportError:
+            logger.error("waitress is not installed, falling back to 'pooled' server backend")
+            backend = 'pooled'
+    if backend == 'pooled':
+        return PooledWSGIServer(host, port, app, **options)
+    # 'werkzeug': giống app.run(threaded=True) - 1 thread mới cho mỗi kết nối
+    return make_server(host, port, app, threaded=True)
+
 # ===================== MAIN APPLICATION =====================
 def run_flask_server():
     """Chạy Flask server trong thread riêng"""
     try:
-        app.run(host=HTTP_HOST, port=HTTP_PORT, debug=False, threaded=True)
+        server = make_http_server()
+        logger.info(f"HTTP server backend: {server_settings['backend']} ({type(server).__name__})")
+        server.serve_forever()
     except Exception as e:
         logger.error(f"Error starting Flask server: {e}")
 
 def main():
     """Main application entry point"""
+    # Settings store (JSON / SQLite) phải mở trước khi load settings
+    load_settings_store_settings()
+    open_settings_store()
+
     # Load settings
     load_gap_settings()
     load_spike_settings()
@@ -12110,11 +17057,16 @@ def main():
     load_screenshot_settings()
     load_market_open_settings()
     load_auto_send_settings()
+    load_server_settings()
+    load_traffic_recorder_settings()
     load_python_reset_settings()
     load_hidden_alert_items()
 
     # Load gap/spike config from file (Point-based calculation)
     load_gap_config_file()
+    # Tự load lại khi file config được sửa (không cần restart/reset)
+    gap_config_watcher = GapConfigWatcher()
+    gap_config_watcher.start()
 
     # Load custom user-defined thresholds
     load_custom_thresholds()
@@ -12160,6 +17112,11 @@ def main():
     # Run GUI main loop
     root.mainloop()
 
+    # Ghi nốt kết quả matching chưa lưu (debounce chưa kịp chạy)
+    if pending_writes['symbol_match_cache']:
+        save_symbol_match_cache()
+    close_settings_store()
+
 if __name__ == '__main__':
     main()
 
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Migrate Settings (JSON ↔ settings store SQLite / journal)
+- import: đọc các file JSON settings (gap/spike, custom thresholds, product delay, hidden items,
+  symbol filter) vào file SQLite hoặc folder journal
+- export: ghi settings trong store ra lại các file JSON (format như backend 'json')
+
+Bật/tắt store trong settings_store.json: {"backend": "sqlite", "path": "settings.db"}
+hoặc {"backend": "journal", "journal_folder": "settings_journal"}
+(--enable / --disable ghi file này sau khi import/export)
+
+Chạy: python migrate_settings.py import|export [--backend sqlite|journal] [--db settings.db|folder]
+                                               [--folder .] [--enable|--disable]
+"""
+
+import argparse
+import logging
+import os
+
+import gap_spike_detector as gsd
+
+
+def migrate(action, db_path, folder='.', backend='sqlite'):
+    """
+    Args:
+        db_path: File SQLite hoặc folder journal
+
+    Returns:
+        list: Namespace đã import/export
+    """
+    store = gsd.SQLiteSettingsStore(db_path) if backend == 'sqlite' else gsd.SettingsJournal(db_path)
+    try:
+        if action == 'import':
+            namespaces = gsd.import_json_settings(store, folder)
+            if backend == 'journal':
+                store.compact()  # Import = snapshot mới, journal rỗng
+            return namespaces
+        return gsd.export_json_settings(store, folder)
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Chuyển settings giữa các file JSON và settings store (SQLite / journal)")
+    parser.add_argument('action', choices=('import', 'export'),
+                        help="import: JSON → store, export: store → JSON")
+    parser.add_argument('--backend', choices=('sqlite', 'journal'),
+                        help="Loại store (mặc định theo settings_store.json, không thì sqlite)")
+    parser.add_argument('--db', help="File SQLite / folder journal (mặc định theo settings_store.json)")
+    parser.add_argument('--folder', default='.', help="Folder chứa các file JSON settings")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--enable', action='store_true', help="Dùng store này từ lần chạy sau")
+    mode.add_argument('--disable', action='store_true', help="Quay lại các file JSON từ lần chạy sau")
+    parser.add_argument('--verbose', action='store_true', help="Hiện log INFO")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    gsd.load_settings_store_settings()
+    backend = args.backend or ('journal' if gsd.settings_store_settings['backend'] == 'journal' else 'sqlite')
+    db_path = args.db or gsd.settings_store_settings['path' if backend == 'sqlite' else 'journal_folder']
+
+    if args.action == 'export' and not os.path.exists(db_path):
+        parser.error(f"không tìm thấy {db_path}")
+    namespaces = migrate(args.action, db_path, args.folder, backend)
+    print(f"{args.action}: {len(namespaces)} settings ({', '.join(namespaces) or '-'}) "
+          f"{'→' if args.action == 'import' else '←'} {db_path}")
+
+    if args.enable or args.disable:
+        gsd.settings_store_settings['backend'] = backend if args.enable else 'json'
+        gsd.settings_store_settings['path' if backend == 'sqlite' else 'journal_folder'] = db_path
+        gsd.save_settings_store_settings()
+        print(f"settings_store.json: backend = {gsd.settings_store_settings['backend']}")
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay Traffic
+Phát lại traffic EA đã ghi (Cài đặt → Công cụ → Ghi traffic EA, file traffic_*.gsr.gz)
+qua đúng đường ingest của server (endpoint Flask → decode → process_ingest_payload)
+
+- Đồng hồ ảo: gsd.clock trả về thời điểm nhận gốc của request đang phát
+  → bid tracking, grace period Bảng Kèo, cleanup 30s chạy như lúc ghi
+- Tốc độ: --speed 1 (như thực tế), --speed N (nhanh gấp N), --speed max (nhanh nhất có thể)
+- Báo cáo: throughput, thời gian từng giai đoạn ingest, Gap/Spike phát hiện
+
+Chạy: python replay_traffic.py <file|folder> [--speed 1|N|max] [--events events.jsonl]
+                                [--default-settings] [--keep-startup-delay]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import gap_spike_detector as gsd
+
+BINARY_ENDPOINTS = ('v2/receive_binary',)
+
+
+class VirtualClock:
+    """Đồng hồ ảo cho gsd.clock - thời gian = received_at của request đang phát"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+def load_server_settings():
+    """
+    Nạp settings giống main() (không GUI) để kết quả detection giống server thật
+
+    Backend sqlite/journal: settings nằm trong store (file JSON có thể đã cũ) → mở store
+    read-only (phát lại không ghi gì vào settings của server)
+    """
+    gsd.load_settings_store_settings()
+    gsd.open_settings_store(read_only=True)
+    gsd.load_gap_settings()
+    gsd.load_spike_settings()
+    gsd.load_audio_settings()
+    gsd.load_symbol_filter_settings()
+    gsd.load_broker_selection_settings()
+    gsd.load_delay_settings()
+    gsd.load_market_open_settings()
+    gsd.load_gap_config_file()
+    gsd.load_custom_thresholds()
+
+
+def collect_paths(target):
+    """File hoặc folder → danh sách file ghi traffic (cũ → mới)"""
+    if os.path.isdir(target):
+        return gsd.list_traffic_recordings(target)
+    return [target]
+
+
+def board_snapshot():
+    """{key: (gap_detected, spike_detected)} của Bảng Kèo tất cả broker"""
+    snapshot = {}
+    for partition in gsd.iter_broker_partitions():
+        for key, item in list(partition.alert_board.items()):
+            result = item.get('data', {})
+            snapshot[key] = (result.get('gap', {}).get('detected', False),
+                             result.get('spike', {}).get('detected', False))
+    return snapshot
+
+
+def replay(paths, speed=None, events_file=None, keep_startup_delay=False):
+    """
+    Phát lại các file ghi traffic theo thứ tự
+
+    Args:
+        paths: Danh sách file traffic_*.gsr.gz
+        speed: None = nhanh nhất có thể, 1 = thời gian thực, N = nhanh gấp N
+        events_file: File object để ghi sự kiện Bảng Kèo (JSON lines), optional
+        keep_startup_delay: Giữ startup delay (không xét gap/spike N phút đầu của bản ghi)
+
+    Returns:
+        dict: báo cáo replay
+    """
+    clock = VirtualClock()
+    previous_clock = gsd.clock
+    gsd.clock = clock
+    gsd.ASYNC_INGEST = False
+    gsd.ASYNC_SYMBOL_RESOLVE = False  # Dò symbol ngay trong ingest → kết quả không phụ thuộc tốc độ thread pool
+    gsd.screenshot_settings['enabled'] = False
+    gsd.audio_settings['enabled'] = False
+    gsd.traffic_recorder_settings['enabled'] = False  # Không ghi lại chính traffic đang phát
+    gsd.ingest_metrics.reset()
+
+    client = gsd.app.test_client()
+    report = {
+        'requests': 0,
+        'by_endpoint': {},
+        'errors': 0,
+        'gap_events': 0,
+        'spike_events': 0,
+        'cleared_events': 0,
+        'max_behind_s': 0.0
+    }
+    board = {}
+    first_at = last_at = None
+    wall_start = time.perf_counter()
+    try:
+        for path in paths:
+            for received_at, endpoint, body in gsd.iter_traffic_records(path):
+                if first_at is None:
+                    first_at = received_at
+                    gsd.app_startup_time = received_at if keep_startup_delay else 0
+                last_at = received_at
+
+                if speed:
+                    # Chờ tới đúng thời điểm (đã chia tốc độ) của request gốc
+                    target = (received_at - first_at) / speed
+                    behind = time.perf_counter() - wall_start - target
+                    if behind < 0:
+                        time.sleep(-behind)
+                    elif behind > report['max_behind_s']:
+                        report['max_behind_s'] = behind
+
+                clock.now = received_at
+                content_type = 'application/octet-stream' if endpoint in BINARY_ENDPOINTS else 'application/json'
+                response = client.post(f'/api/{endpoint}', data=body, content_type=content_type)
+                report['requests'] += 1
+                report['by_endpoint'][endpoint] = report['by_endpoint'].get(endpoint, 0) + 1
+                if response.status_code != 200:
+                    report['errors'] += 1
+
+                current = board_snapshot()
+                for key, (gap, spike) in current.items():
+                    if board.get(key) != (gap, spike) and (gap or spike):
+                        report['gap_events'] += gap
+                        report['spike_events'] += spike
+                        if events_file is not None:
+                            events_file.write(json.dumps({'time': received_at, 'event': 'alert',
+                                                          'key': key, 'gap': gap, 'spike': spike}) + '\n')
+                for key in board.keys() - current.keys():
+                    report['cleared_events'] += 1
+                    if events_file is not None:
+                        events_file.write(json.dumps({'time': received_at, 'event': 'cleared', 'key': key}) + '\n')
+                board = current
+    finally:
+        gsd.clock = previous_clock
+
+    wall = time.perf_counter() - wall_start
+    metrics = gsd.get_metrics_snapshot()
+    symbols = sum(rates['symbols_total'] for rates in metrics['brokers'].values())
+    span = (last_at - first_at) if first_at is not None else 0.0
+    report.update({
+        'recorded_span_s': span,
+        'wall_s': wall,
+        'requests_per_sec': report['requests'] / wall if wall > 0 else 0.0,
+        'symbols_per_sec': symbols / wall if wall > 0 else 0.0,
+        'speedup': span / wall if wall > 0 else 0.0,
+        'symbols': symbols,
+        'brokers': sorted(metrics['brokers']),
+        'stages': metrics['stages'],
+        'alert_board': len(board)
+    })
+    return report
+
+
+def print_report(report):
+    print(f"   Requests: {report['requests']} ({', '.join(f'{k}: {v}' for k, v in report['by_endpoint'].items())})"
+          f" | lỗi: {report['errors']}")
+    print(f"   Bản ghi: {report['recorded_span_s']:.1f}s → phát lại {report['wall_s']:.2f}s "
+          f"(x{report['speedup']:.1f}), chậm tối đa {report['max_behind_s'] * 1000:.1f} ms")
+    print(f"   Throughput: {report['requests_per_sec']:.1f} request/s, {report['symbols_per_sec']:.0f} symbol/s"
+          f" | {len(report['brokers'])} broker")
+    print(f"   Detection: {report['gap_events']} gap, {report['spike_events']} spike, "
+          f"{report['cleared_events']} hết hạn | Bảng Kèo cuối: {report['alert_board']}")
+    print(f"   {'Giai đoạn':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage in gsd.INGEST_STAGES:
+        stats = report['stages'].get(stage)
+        if stats and stats['count']:
+            print(f"   {stage:<20}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+                  f"{stats['p99_ms']:>10.3f}{stats['max_ms']:>10.3f}")
+
+
+def parse_speed(value):
+    if value == 'max':
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be > 0 or 'max'")
+    return speed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Phát lại traffic EA đã ghi qua đường ingest")
+    parser.add_argument('target', help="File traffic_*.gsr.gz hoặc folder chứa các file")
+    parser.add_argument('--speed', type=parse_speed, default=None, help="1 = thời gian thực, N = nhanh gấp N, max (mặc định)")
+    parser.add_argument('--events', help="Ghi sự kiện Bảng Kèo ra file JSON lines")
+    parser.add_argument('--default-settings', action='store_true', help="Không nạp settings đã lưu (dùng mặc định)")
+    parser.add_argument('--keep-startup-delay', action='store_true', help="Giữ startup delay như khi app vừa khởi động")
+    parser.add_argument('--verbose', action='store_true', help="Hiện log INFO của server")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    if not args.default_settings:
+        load_server_settings()
+
+    paths = collect_paths(args.target)
+    if not paths:
+        print(f"Không tìm thấy file ghi traffic trong {args.target}")
+        sys.exit(1)
+
+    print("=" * 70)
+    print(f"REPLAY TRAFFIC - {len(paths)} file, tốc độ {'max' if args.speed is None else f'x{args.speed:g}'}")
+    print("=" * 70)
+    events_file = open(args.events, 'w', encoding='utf-8') if args.events else None
+    try:
+        print_report(replay(paths, args.speed, events_file, args.keep_startup_delay))
+    finally:
+        if events_file is not None:
+            events_file.close()
+    print("=" * 70)
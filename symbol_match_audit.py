@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Symbol Match Audit
+Dò lại mọi symbol đã thấy qua find_symbol_config() (cache rỗng) và báo cáo cho từng (broker, symbol):
+- Mức khớp (exact / prefix / subsequence / none), alias đã khớp, symbol chuẩn
+- Bảng Point hay Percent + lý do (custom_point / settings_percent / txt_config / no_config)
+- Thời gian dò mỗi lần gọi (µs)
+- Symbol MƠ HỒ: nhiều alias thuộc các symbol chuẩn khác nhau cùng khớp
+  (kết quả phụ thuộc thứ tự/độ dài alias trong THAM_SO_GAP_INDICATOR.txt)
+
+Nguồn symbols:
+- File/folder ghi traffic (traffic_*.gsr.gz - Cài đặt → Công cụ → Ghi traffic EA)
+- File JSON dump market_data: {broker: {symbol: {...}}}, {broker: [symbol, ...]}
+  (vd lưu từ GET /api/market_symbols của server đang chạy)
+- --url http://127.0.0.1:80 → lấy trực tiếp /api/market_symbols
+
+Chạy: python symbol_match_audit.py <file|folder|dump.json> ... [--url URL] [--only ambiguous|none|...]
+                                     [--csv report.csv] [--json report.json] [--default-settings]
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+import urllib.request
+
+import gap_spike_detector as gsd
+from replay_traffic import BINARY_ENDPOINTS
+
+MATCH_LEVELS = ('exact', 'prefix', 'subsequence', 'none')
+CSV_FIELDS = ('broker', 'symbol', 'level', 'symbol_chuan', 'matched_alias', 'route', 'route_reason',
+              'time_us', 'ambiguous', 'candidates')
+
+
+def load_audit_settings():
+    """
+    Nạp file txt + settings quyết định bảng Point/Percent (không ghi cache matching ra file)
+    Settings đọc từ store đang cấu hình (sqlite/journal, read-only) giống main()
+    """
+    gsd.load_settings_store_settings()
+    gsd.open_settings_store(read_only=True)
+    gsd.load_gap_settings()
+    gsd.load_spike_settings()
+    gsd.load_custom_thresholds()
+    gsd.load_gap_config_file()
+
+
+def add_symbols(pairs, broker, symbols):
+    for symbol in symbols:
+        if isinstance(symbol, dict):
+            symbol = symbol.get('symbol')
+        if broker and isinstance(symbol, str) and symbol:
+            pairs.add((broker, symbol))
+
+
+def collect_from_recording(path, pairs):
+    """Symbols trong các request JSON của file ghi traffic (bỏ qua frame binary)"""
+    for _, endpoint, body in gsd.iter_traffic_records(path):
+        if endpoint in BINARY_ENDPOINTS:
+            continue
+        try:
+            data = json.loads(body)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            for field in ('data', 'symbols'):
+                if isinstance(data.get(field), list):
+                    add_symbols(pairs, data.get('broker'), data[field])
+
+
+def collect_from_dump(data, pairs):
+    """Dump market_data: {broker: {symbol: ...}} hoặc {broker: [symbol, ...]}"""
+    for broker, symbols in data.items():
+        add_symbols(pairs, broker, symbols.keys() if isinstance(symbols, dict) else symbols)
+
+
+def fetch_market_symbols(url):
+    """GET /api/market_symbols của server đang chạy"""
+    with urllib.request.urlopen(url.rstrip('/') + '/api/market_symbols', timeout=10) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def collect_pairs(targets, url=None):
+    """
+    Returns:
+        list: [(broker, symbol), ...] không trùng, đã sort
+    """
+    pairs = set()
+    for target in targets:
+        if os.path.isdir(target):
+            for path in gsd.list_traffic_recordings(target):
+                collect_from_recording(path, pairs)
+        elif target.endswith('.json'):
+            with open(target, 'r', encoding='utf-8') as f:
+                collect_from_dump(json.load(f), pairs)
+        else:
+            collect_from_recording(target, pairs)
+    if url:
+        collect_from_dump(fetch_market_symbols(url), pairs)
+    return sorted(pairs)
+
+
+def qualifying_aliases(symbol):
+    """
+    Tất cả alias khớp symbol ở bất kỳ mức nào (không chỉ alias thắng)
+
+    Returns:
+        list: [(level, alias_lower, symbol_chuan), ...] theo thứ tự ưu tiên của find_symbol_config(),
+              mỗi alias 1 lần ở mức cao nhất
+    """
+    symbol_lower = symbol.lower().strip()
+    found = []
+    seen = set()
+
+    def add(level, alias_lower, symbol_chuan):
+        if alias_lower not in seen:
+            seen.add(alias_lower)
+            found.append((level, alias_lower, symbol_chuan))
+
+    symbol_chuan = gsd.gap_config_reverse_map.get(symbol_lower)
+    if symbol_chuan:
+        add('exact', symbol_lower, symbol_chuan)
+    for _, length, symbol_chuan, _ in reversed(gsd.get_gap_config_prefix_trie().prefixes(symbol_lower)):
+        add('prefix', symbol_lower[:length], symbol_chuan)
+    normalized = gsd.normalize_symbol(symbol_lower).lower()
+    for _, _, alias_normalized, symbol_chuan, matched_alias in gsd.get_gap_config_subsequence_index().candidates(normalized):
+        if gsd.is_normalized_subsequence_match(normalized, alias_normalized):
+            add('subsequence', (matched_alias or symbol_chuan).lower(), symbol_chuan)
+    return found
+
+
+def audit_symbol(broker, symbol):
+    """Dò 1 symbol từ đầu (bỏ cache) và ghi lại kết quả + thời gian"""
+    gsd.symbol_config_cache.pop(symbol, None)
+    gsd.symbol_match_levels.pop(symbol, None)
+    started = time.perf_counter()
+    symbol_chuan, config, matched_alias = gsd.find_symbol_config(symbol)
+    elapsed = time.perf_counter() - started
+
+    level = gsd.symbol_match_levels.get(symbol, 'none')
+    candidates = qualifying_aliases(symbol) if gsd.gap_config else []
+    is_point_based, reason = gsd.get_calculation_route(gsd.symbol_key(broker, symbol), config)
+    return {
+        'broker': broker,
+        'symbol': symbol,
+        'level': level,
+        'symbol_chuan': symbol_chuan,
+        'matched_alias': matched_alias,
+        'route': 'point' if is_point_based else 'percent',
+        'route_reason': reason,
+        'time_us': elapsed * 1e6,
+        # Exact match luôn thắng (1 alias → 1 symbol chuẩn) → chỉ xét mơ hồ ở prefix/subsequence
+        'ambiguous': level != 'exact' and len({candidate[2] for candidate in candidates}) > 1,
+        'candidates': candidates
+    }
+
+
+def audit(pairs):
+    """
+    Returns:
+        tuple: (rows, summary)
+    """
+    rows = [audit_symbol(broker, symbol) for broker, symbol in pairs]
+    timings = sorted(row['time_us'] for row in rows)
+
+    def percentile(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p))] if timings else 0.0
+
+    summary = {
+        'symbols': len(rows),
+        'brokers': len({row['broker'] for row in rows}),
+        'levels': {level: sum(1 for row in rows if row['level'] == level) for level in MATCH_LEVELS},
+        'routes': {},
+        'ambiguous': sum(1 for row in rows if row['ambiguous']),
+        'p50_us': percentile(0.50),
+        'p95_us': percentile(0.95),
+        'max_us': timings[-1] if timings else 0.0,
+        'total_ms': sum(timings) / 1000
+    }
+    for row in rows:
+        summary['routes'][row['route_reason']] = summary['routes'].get(row['route_reason'], 0) + 1
+    return rows, summary
+
+
+def format_candidates(candidates):
+    return ', '.join(f"{level}:{alias}→{symbol_chuan}" for level, alias, symbol_chuan in candidates)
+
+
+def print_report(rows, summary, only=None):
+    shown = [row for row in rows if only is None
+             or (only == 'ambiguous' and row['ambiguous']) or row['level'] == only]
+    print(f"   {'Broker':<16}{'Symbol':<18}{'Mức':<13}{'Alias':<14}{'Symbol chuẩn':<14}"
+          f"{'Bảng':<9}{'Lý do':<18}{'µs':>8}")
+    for row in shown:
+        print(f"   {row['broker'][:15]:<16}{row['symbol'][:17]:<18}{row['level']:<13}"
+              f"{str(row['matched_alias'] or '-')[:13]:<14}{str(row['symbol_chuan'] or '-')[:13]:<14}"
+              f"{row['route']:<9}{row['route_reason']:<18}{row['time_us']:>8.1f}"
+              f"{'  ⚠️' if row['ambiguous'] else ''}")
+        if row['ambiguous']:
+            print(f"      ↳ {format_candidates(row['candidates'])}")
+    print("-" * 70)
+    print(f"   {summary['symbols']} symbols, {summary['brokers']} broker | "
+          + ', '.join(f"{level}: {count}" for level, count in summary['levels'].items()))
+    print(f"   Bảng: " + ', '.join(f"{reason}: {count}" for reason, count in sorted(summary['routes'].items())))
+    print(f"   Mơ hồ (nhiều symbol chuẩn cùng khớp): {summary['ambiguous']}")
+    print(f"   Thời gian dò: p50 {summary['p50_us']:.1f} µs, p95 {summary['p95_us']:.1f} µs, "
+          f"max {summary['max_us']:.1f} µs, tổng {summary['total_ms']:.1f} ms")
+
+
+def write_csv(rows, path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(row, time_us=f"{row['time_us']:.1f}",
+                                 candidates=format_candidates(row['candidates'])))
+
+
+def write_json(rows, summary, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'summary': summary, 'symbols': rows}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Dò lại symbols qua find_symbol_config() và báo cáo matching")
+    parser.add_argument('targets', nargs='*', help="File/folder ghi traffic hoặc file JSON dump market_data")
+    parser.add_argument('--url', help="Lấy symbols từ server đang chạy (GET /api/market_symbols)")
+    parser.add_argument('--only', choices=('ambiguous',) + MATCH_LEVELS, help="Chỉ in các dòng thuộc loại này")
+    parser.add_argument('--csv', help="Ghi báo cáo ra file CSV")
+    parser.add_argument('--json', help="Ghi báo cáo + tổng kết ra file JSON")
+    parser.add_argument('--default-settings', action='store_true',
+                        help="Không nạp gap/spike settings + custom thresholds đã lưu (chỉ file txt)")
+    parser.add_argument('--verbose', action='store_true', help="Hiện log INFO của server")
+    args = parser.parse_args()
+
+    if not args.targets and not args.url:
+        parser.error("cần ít nhất 1 file/folder hoặc --url")
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    if args.default_settings:
+        gsd.load_gap_config_file()
+    else:
+        load_audit_settings()
+    gsd.gap_config_file_hash = None  # Không ghi lại symbol_match_cache.json sau khi dò
+    gsd.ASYNC_SYMBOL_RESOLVE = False
+
+    pairs = collect_pairs(args.targets, args.url)
+    if not pairs:
+        print("Không tìm thấy symbol nào")
+        sys.exit(1)
+
+    print("=" * 70)
+    print(f"SYMBOL MATCH AUDIT - {len(gsd.gap_config)} symbol chuẩn, {len(gsd.gap_config_reverse_map)} alias")
+    print("=" * 70)
+    rows, summary = audit(pairs)
+    print_report(rows, summary, args.only)
+    if args.csv:
+        write_csv(rows, args.csv)
+    if args.json:
+        write_json(rows, summary, args.json)
+    print("=" * 70)
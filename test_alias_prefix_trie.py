@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Alias Prefix Trie
+- Bước 2 (prefix match) của find_symbol_config() dùng trie cho kết quả giống hệt
+  vòng lặp startswith() cũ trên toàn bộ gap_config_reverse_map
+- Dữ liệu: THAM_SO_GAP_INDICATOR.txt thật + symbol sàn có hậu tố
+"""
+
+import random
+import time
+
+import gap_spike_detector as gsd
+from testing_helpers import clear_gap_config, load_real_gap_config, make_broker_symbols
+
+
+def linear_prefix_match(symbol_lower):
+    """Bước 2 cũ: duyệt mọi alias với startswith()"""
+    best_match = None
+    best_match_len = 0
+    best_matched_alias = None
+    for alias_lower, symbol_chuan in gsd.gap_config_reverse_map.items():
+        if symbol_lower.startswith(alias_lower):
+            if len(alias_lower) > best_match_len:
+                best_match = symbol_chuan
+                best_match_len = len(alias_lower)
+                config = gsd.gap_config[symbol_chuan]
+                for alias in config['aliases']:
+                    if alias.lower() == alias_lower:
+                        best_matched_alias = alias
+                        break
+                if not best_matched_alias:
+                    best_matched_alias = symbol_chuan
+    return best_match, best_matched_alias
+
+
+def test_trie_matches_linear_scan():
+    load_real_gap_config()
+    trie = gsd.get_gap_config_prefix_trie()
+    assert trie is gsd.gap_config_prefix_trie  # Build sẵn khi load file
+
+    symbols = make_broker_symbols(random.Random(5))
+    matched = 0
+    for symbol in symbols:
+        symbol_lower = symbol.lower().strip()
+        expected = linear_prefix_match(symbol_lower)
+        assert trie.longest_prefix_match(symbol_lower) == expected, symbol
+        matched += expected[0] is not None
+
+    start = time.perf_counter()
+    for symbol in symbols:
+        linear_prefix_match(symbol.lower())
+    linear_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for symbol in symbols:
+        trie.longest_prefix_match(symbol.lower())
+    trie_ms = (time.perf_counter() - start) * 1000
+    alias_count = len(gsd.gap_config_reverse_map)
+    clear_gap_config()
+    print(f"   ✓ {len(symbols)} symbols ({matched} prefix match) giống vòng lặp cũ | "
+          f"{alias_count} aliases: {linear_ms:.1f} ms → {trie_ms:.1f} ms")
+
+
+def test_alias_quirk_preserved():
+    """Prefix dài hơn không có alias gốc (chính là symbol_chuan) → giữ alias của prefix ngắn hơn trước đó"""
+    clear_gap_config()
+    gsd.gap_config.update({
+        'BTC': {'aliases': ['Bitcoin'], 'default_gap_percent': 0.1, 'custom_gap': 1},
+        'XBT': {'aliases': ['Btc'], 'default_gap_percent': 0.1, 'custom_gap': 1},
+        'BTCUSD': {'aliases': ['BtcUsdT'], 'default_gap_percent': 0.1, 'custom_gap': 1},
+    })
+    for symbol_chuan, config in gsd.gap_config.items():
+        gsd.gap_config_reverse_map[symbol_chuan.lower()] = symbol_chuan
+        for alias in config['aliases']:
+            gsd.gap_config_reverse_map[alias.lower()] = symbol_chuan
+
+    # 'btc' → XBT (alias "Btc" ghi đè), rồi 'btcusd' (symbol_chuan, không có alias gốc)
+    assert linear_prefix_match('btcusd.m') == ('BTCUSD', 'Btc')
+    symbol_chuan, config, matched_alias = gsd.find_symbol_config('BTCUSD.m')
+    assert (symbol_chuan, matched_alias) == ('BTCUSD', 'Btc')
+    assert gsd.find_symbol_config('btcusdt-spot')[::2] == ('BTCUSD', 'BtcUsdT')
+
+    # Sửa trực tiếp reverse_map (không qua load_gap_config_file) → trie tự build lại
+    gsd.gap_config['ETHUSD'] = {'aliases': ['Ether'], 'default_gap_percent': 0.1, 'custom_gap': 1}
+    gsd.gap_config_reverse_map['ether'] = 'ETHUSD'
+    assert gsd.find_symbol_config('ETHER.m')[::2] == ('ETHUSD', 'Ether')
+    clear_gap_config()
+    print("   ✓ Giữ nguyên kết quả alias của vòng lặp cũ, trie cập nhật khi reverse_map đổi")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING ALIAS PREFIX TRIE")
+    print("=" * 60)
+    test_trie_matches_linear_scan()
+    test_alias_quirk_preserved()
+    print("=" * 60)
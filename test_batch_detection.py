@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Batch Detection Engine
+Verify rằng calculate_percent_batch()/calculate_point_batch() cho kết quả giống hệt
+calculate_gap/calculate_spike và calculate_gap_point/calculate_spike_point
+"""
+
+import random
+import time
+
+import gap_spike_detector as gsd
+
+BROKER = "TestBroker-Live"
+
+
+def make_symbol_data(rng, index):
+    """Tạo market data ngẫu nhiên (có cả các trường hợp biên)"""
+    base = rng.choice([1.08, 150.2, 2050.5, 35000.0, 0.65])
+    prev_close = round(base * (1 + rng.uniform(-0.02, 0.02)), 5)
+    current_open = round(prev_close * (1 + rng.uniform(-0.02, 0.02)), 5)
+    high = round(max(prev_close, current_open) * (1 + rng.uniform(0, 0.03)), 5)
+    low = round(min(prev_close, current_open) * (1 - rng.uniform(0, 0.03)), 5)
+    bid = round(current_open * (1 + rng.uniform(-0.005, 0.005)), 5)
+    ask = round(bid * (1 + rng.uniform(0, 0.004)), 5)
+
+    case = index % 12
+    if case == 0:
+        prev_close = 0  # Chưa đủ dữ liệu
+    elif case == 1:
+        high = 0  # Không có current OHLC
+    elif case == 2:
+        current_open = prev_close  # Không có gap
+    elif case == 3:
+        bid = 0
+
+    data = {
+        'timestamp': 1733788800,
+        'bid': bid,
+        'ask': ask,
+        'digits': rng.choice([2, 3, 5]),
+        'points': rng.choice([0.01, 0.001, 0.00001, 0]) if case == 4 else rng.choice([0.01, 0.001, 0.00001]),
+        'isOpen': True,
+        'prev_ohlc': {'open': prev_close, 'high': prev_close, 'low': prev_close, 'close': prev_close},
+        'current_ohlc': {'open': current_open, 'high': high, 'low': low, 'close': bid},
+        'trade_sessions': {},
+        'group': ''
+    }
+    if case == 5:
+        data['bid'] = None  # Dữ liệu lỗi → fallback scalar
+    if case == 6:
+        data['prev_ohlc']['timestamp'] = 1733788740  # Nhánh kiểm tra ngày
+        data['current_ohlc']['timestamp'] = 1733788800
+    return data
+
+
+def test_percent_batch_matches_scalar():
+    rng = random.Random(42)
+    gsd.gap_settings.clear()
+    gsd.spike_settings.clear()
+    gsd.threshold_table.clear()
+    gsd.gap_settings['*'] = 0.05
+    gsd.spike_settings['*'] = 0.1
+    gsd.gap_settings[f"{BROKER}_SYM7"] = 0.5
+
+    rows = []
+    for i in range(600):
+        data = make_symbol_data(rng, i)
+        spread = None if i % 7 == 0 else rng.uniform(0, 0.2)
+        rows.append((f"SYM{i}", data, spread))
+
+    batch = gsd.calculate_percent_batch(BROKER, rows)
+    for (symbol, data, spread), (gap_info, spike_info) in zip(rows, batch):
+        assert gap_info == gsd.calculate_gap(symbol, BROKER, data, spread), symbol
+        assert spike_info == gsd.calculate_spike(symbol, BROKER, data, spread), symbol
+
+    detected = sum(1 for g, s in batch if g['detected'] or s['detected'])
+    print(f"   ✓ Percent batch == scalar cho {len(rows)} symbols ({detected} detected)")
+
+    # Tick tiếp theo: 1/3 symbols đổi giá, ngưỡng của 1 symbol đổi kiểu (float → int)
+    for i, (symbol, data, spread) in enumerate(rows):
+        if i % 3 == 0 and isinstance(data['current_ohlc'].get('high'), (int, float)):
+            data['current_ohlc']['high'] = data['current_ohlc']['high'] * 1.01
+    gsd.gap_settings[f"{BROKER}_SYM7"] = 1  # threshold_table tự bỏ ngưỡng cũ
+
+    batch = gsd.calculate_percent_batch(BROKER, rows)
+    for (symbol, data, spread), (gap_info, spike_info) in zip(rows, batch):
+        assert gap_info == gsd.calculate_gap(symbol, BROKER, data, spread), symbol
+        assert spike_info == gsd.calculate_spike(symbol, BROKER, data, spread), symbol
+    print("   ✓ Tick thứ 2 == scalar")
+
+
+def test_point_batch_matches_scalar():
+    rng = random.Random(7)
+    config = {'aliases': ['POINTSYM'], 'default_gap_percent': 0.005, 'custom_gap': 0.005}
+    gsd.gap_config.clear()
+    gsd.gap_config_reverse_map.clear()
+    gsd.symbol_config_cache.clear()
+    gsd.bid_tracking.clear()
+
+    rows = []
+    for i in range(600):
+        symbol = f"PT{i}"
+        gsd.gap_config[symbol] = config
+        gsd.gap_config_reverse_map[symbol.lower()] = symbol
+        data = make_symbol_data(rng, i)
+        if i % 3:
+            # Bid trước đó khác bid hiện tại → có spike point
+            gsd.bid_tracking[gsd.symbol_key(BROKER, symbol)] = {
+                'last_bid': (data['bid'] or 1.0) * (1 + rng.uniform(-0.01, 0.01)),
+                'last_change_time': time.time(),
+                'first_seen_time': time.time()
+            }
+        symbol_chuan, cfg, alias = gsd.find_symbol_config(symbol)
+        rows.append((symbol, data, symbol_chuan, cfg, alias))
+
+    batch = gsd.calculate_point_batch(BROKER, rows)
+    for (symbol, data, _, _, _), (gap_info, spike_info) in zip(rows, batch):
+        assert gap_info == gsd.calculate_gap_point(symbol, BROKER, data), symbol
+        assert spike_info == gsd.calculate_spike_point(symbol, BROKER, data), symbol
+
+    detected = sum(1 for g, s in batch if g['detected'] or s['detected'])
+    print(f"   ✓ Point batch == scalar cho {len(rows)} symbols ({detected} detected)")
+
+    # Tick tiếp theo: bid thay đổi ở 1 nửa symbols
+    for i, (symbol, data, _, _, _) in enumerate(rows):
+        if i % 2 == 0 and isinstance(data['bid'], float):
+            data['bid'] = data['bid'] * 1.002
+
+    batch = gsd.calculate_point_batch(BROKER, rows)
+    for (symbol, data, _, _, _), (gap_info, spike_info) in zip(rows, batch):
+        assert gap_info == gsd.calculate_gap_point(symbol, BROKER, data), symbol
+        assert spike_info == gsd.calculate_spike_point(symbol, BROKER, data), symbol
+    print("   ✓ Tick thứ 2 == scalar")
+
+
+def test_batch_speed():
+    rng = random.Random(1)
+    rows = [(f"SPEED{i}", make_symbol_data(rng, i * 12 + 7), 0.01) for i in range(1000)]
+
+    start = time.perf_counter()
+    for symbol, data, spread in rows:
+        gsd.calculate_gap(symbol, BROKER, data, spread)
+        gsd.calculate_spike(symbol, BROKER, data, spread)
+    scalar_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    gsd.calculate_percent_batch(BROKER, rows)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    # Tick kế tiếp: 10% symbols có giá mới
+    for i in range(0, len(rows), 10):
+        rows[i][1]['current_ohlc']['high'] = rows[i][1]['current_ohlc']['high'] * 1.0001
+    start = time.perf_counter()
+    gsd.calculate_percent_batch(BROKER, rows)
+    next_tick_ms = (time.perf_counter() - start) * 1000
+
+    print(f"   ✓ 1000 symbols: scalar {scalar_ms:.2f}ms | batch {batch_ms:.2f}ms | batch tick kế (10% đổi) {next_tick_ms:.2f}ms")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING BATCH DETECTION ENGINE")
+    print("=" * 60)
+    test_percent_batch_matches_scalar()
+    test_point_batch_matches_scalar()
+    test_batch_speed()
+    print("=" * 60)
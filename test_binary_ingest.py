@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Binary Ingest
+- /api/v2/receive_binary cho market_data/kết quả giống hệt payload v1 JSON
+- symbol_id giữ nguyên khi đăng ký lại
+- Frame sai format → HTTP 400, symbol_id chưa đăng ký → unknown_ids, giá NaN bị loại
+- symbol_id lặp lại trong 1 frame → giữ record đầu tiên, record sau tính là rejected
+"""
+
+import time
+
+import numpy as np
+
+import gap_spike_detector as gsd
+from benchmark_ingest import make_getdata_v4_payload, make_v2_payloads
+from testing_helpers import reset_state, setup
+
+
+def register(client, payload):
+    register_payload, _ = make_v2_payloads(payload)
+    return client.post('/api/v2/register_symbols', json=register_payload).get_json()['ids']
+
+
+def test_binary_matches_v1():
+    setup()
+    client = gsd.app.test_client()
+    payload = make_getdata_v4_payload(100, seed=21, broker="Binary-Broker", timestamp=int(time.time()))
+    ids = register(client, payload)
+    assert sorted(ids.values()) == list(range(100))
+    assert register(client, payload) == ids
+
+    assert client.post('/api/receive_data', json=payload).status_code == 200
+    v1_market = dict(gsd.market_data['Binary-Broker'])
+    v1_results = gsd.gap_spike_results.copy()
+
+    reset_state()
+    frame = gsd.encode_binary_frame(payload['broker'], payload['timestamp'], payload['data'], ids)
+    assert len(frame) == gsd.BINARY_HEADER.size + len("Binary-Broker") + 100 * gsd.BINARY_RECORD_DTYPE.itemsize
+    response = client.post('/api/v2/receive_binary', data=frame, content_type='application/octet-stream').get_json()
+    assert response['ok'] and response['rejected'] == 0 and response['unknown_ids'] == []
+    assert dict(gsd.market_data['Binary-Broker']) == v1_market
+    assert gsd.gap_spike_results.copy() == v1_results
+    print(f"   ✓ Binary frame {len(frame) / 1024:.1f} KB cho market_data/kết quả giống hệt v1")
+
+
+def test_rejects_bad_frames():
+    setup()
+    client = gsd.app.test_client()
+    payload = make_getdata_v4_payload(3, seed=22, broker="Binary-Bad", timestamp=int(time.time()))
+    ids = register(client, payload)
+    frame = gsd.encode_binary_frame(payload['broker'], payload['timestamp'], payload['data'], ids)
+
+    for body in (frame[:10], frame[:-1], b'XXXX' + frame[4:]):
+        response = client.post('/api/v2/receive_binary', data=body, content_type='application/octet-stream')
+        assert response.status_code == 400
+
+    payload['data'][1]['bid'] = float('nan')
+    frame = gsd.encode_binary_frame(payload['broker'], payload['timestamp'], payload['data'],
+                                    {**ids, 'SYM0002.m': 999})
+    broker, _, records, rejected, unknown_ids = gsd.decode_binary_frame(frame)
+    assert broker == "Binary-Bad" and rejected == 1 and unknown_ids == [999]
+    assert [r.symbol for r in records] == ['SYM0000.m']
+    assert records.columns['bid'].tolist() == [payload['data'][0]['bid']]
+    assert isinstance(records.columns['bid'], np.ndarray)
+    print("   ✓ Frame lỗi → HTTP 400, id chưa đăng ký → unknown_ids, giá NaN bị loại")
+
+
+def test_rejects_duplicate_ids():
+    setup()
+    payload = make_getdata_v4_payload(3, seed=23, broker="Binary-Dup", timestamp=int(time.time()))
+    ids = register(gsd.app.test_client(), payload)
+    # EA lỗi gửi SYM0000.m 2 lần (record thứ 3 mang id của record đầu)
+    frame = gsd.encode_binary_frame(payload['broker'], payload['timestamp'], payload['data'],
+                                    {**ids, 'SYM0002.m': ids['SYM0000.m']})
+    before = gsd.get_decode_stats()['duplicate_entries']
+    _, _, records, rejected, unknown_ids = gsd.decode_binary_frame(frame)
+    assert rejected == 1 and unknown_ids == []
+    assert [r.symbol for r in records] == ['SYM0000.m', 'SYM0001.m']
+    assert records.columns['bid'].tolist() == [entry['bid'] for entry in payload['data'][:2]]
+    assert records.columns['index'] == {'SYM0000.m': 0, 'SYM0001.m': 1}
+    assert gsd.get_decode_stats()['duplicate_entries'] == before + 1
+    print("   ✓ symbol_id trùng trong frame → giữ record đầu, tính là rejected")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING BINARY INGEST")
+    print("=" * 60)
+    test_binary_matches_v1()
+    test_rejects_bad_frames()
+    test_rejects_duplicate_ids()
+    print("=" * 60)
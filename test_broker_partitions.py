@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Broker Partitions
+- Mỗi broker có lock riêng: broker A đang giữ lock không chặn ingest của broker B
+- Key "broker_symbol" được route đúng partition (kể cả broker có dấu '_')
+- Duyệt market_data/gap_spike_results trong lúc ingest không lỗi
+- all_partitions_locked (thao tác GUI nhiều broker) chặn ingest commit xen giữa
+- Kiểm tra Bảng Kèo/Delay cho âm thanh: 1 lượt duyệt partitions, không snapshot cả view
+"""
+
+import random
+import threading
+import time
+
+import gap_spike_detector as gsd
+from testing_helpers import make_payload, reset_state
+
+
+def ingest(payload):
+    broker = payload['broker']
+    plan = gsd.prepare_ingest(broker, payload['timestamp'], payload['data'])
+    with gsd.get_broker_partition(broker).lock.section('receive_data'):
+        gsd.commit_ingest(plan)
+
+
+def make_broker_payload(broker, count=50, seed=1):
+    payload = make_payload(random.Random(seed), count, int(time.time()))
+    payload['broker'] = broker
+    return payload
+
+
+def test_routing_and_cleanup():
+    gsd.app_startup_time = 0
+    gsd.screenshot_settings['enabled'] = False
+    gsd.symbol_filter_settings['enabled'] = False
+    reset_state()
+
+    ingest(make_broker_payload('IC_Markets'))
+    ingest(make_broker_payload('IC'))
+
+    assert 'IC_Markets_SYM1' in gsd.get_broker_partition('IC_Markets').gap_spike_results
+    assert 'IC_SYM1' in gsd.get_broker_partition('IC').gap_spike_results
+    assert gsd.gap_spike_results['IC_Markets_SYM1']['broker'] == 'IC_Markets'
+    assert len(gsd.gap_spike_results) == 100
+
+    # cleanup_stale_data không được xóa kết quả của broker có dấu '_'
+    gsd.cleanup_stale_data()
+    assert len(gsd.gap_spike_results) == 100
+    assert sorted(gsd.market_data.keys()) == ['IC', 'IC_Markets']
+    print("   ✓ Route key theo broker (kể cả broker có '_'), cleanup giữ nguyên dữ liệu")
+
+
+def test_brokers_do_not_block_each_other():
+    reset_state()
+    partition_a = gsd.get_broker_partition('Broker-A')
+    done = threading.Event()
+
+    with partition_a.lock:
+        # Broker A đang giữ lock → ingest của Broker B vẫn chạy xong
+        worker = threading.Thread(target=lambda: (ingest(make_broker_payload('Broker-B')), done.set()))
+        worker.start()
+        assert done.wait(5), "Broker-B bị chặn bởi lock của Broker-A"
+    worker.join()
+    assert 'Broker-B' in gsd.market_data
+    print("   ✓ Ingest Broker-B không chờ lock của Broker-A")
+
+
+def test_snapshot_iteration_during_ingest():
+    reset_state()
+    stop = threading.Event()
+    errors = []
+
+    def writer(broker):
+        seed = 0
+        while not stop.is_set():
+            seed += 1
+            try:
+                ingest(make_broker_payload(broker, count=100, seed=seed))
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(f"Broker-{i}",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+
+    reads = 0
+    deadline = time.time() + 1.0
+    try:
+        while time.time() < deadline:
+            for broker, symbols in gsd.market_data.items():
+                for symbol in symbols:
+                    pass
+            for key, result in gsd.gap_spike_results.items():
+                pass
+            len(gsd.alert_board)
+            reads += 1
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert not errors, errors
+    print(f"   ✓ {reads} lần duyệt snapshot trong lúc 3 EA ghi song song - không lỗi")
+
+
+def test_all_partitions_locked_excludes_ingest():
+    reset_state()
+    ingest(make_broker_payload('Broker-A'))
+    ingest(make_broker_payload('Broker-B'))
+    done = threading.Event()
+
+    with gsd.all_partitions_locked('test'):
+        # Thao tác GUI sửa nhiều broker (reset, xóa alerts) → ingest chờ tới khi xong
+        worker = threading.Thread(target=lambda: (ingest(make_broker_payload('Broker-B', seed=2)), done.set()))
+        worker.start()
+        assert not done.wait(0.3), "Ingest commit xen giữa thao tác giữ all_partitions_locked"
+        gsd.gap_spike_results.clear()
+        assert len(gsd.gap_spike_results) == 0
+    assert done.wait(5)
+    worker.join()
+    assert len(gsd.gap_spike_results) == 50
+    print("   ✓ all_partitions_locked: ingest chờ tới khi thao tác nhiều broker xong")
+
+
+def test_board_alert_presence_single_pass():
+    reset_state()
+    payload = make_broker_payload('Broker-A')
+    ingest(payload)
+    gsd.alert_board.clear()
+    partition = gsd.get_broker_partition('Broker-A')
+    key = next(iter(partition.gap_spike_results))
+    result = dict(partition.gap_spike_results[key])
+    result['gap'] = {'detected': False, 'strength': 0.0, 'message': '-'}
+    result['spike'] = {'detected': True, 'strength': 1.0, 'message': 'Spike'}
+    partition.alert_board[key] = {'data': result, 'last_detected_time': time.time(), 'grace_period_start': None}
+    partition.bid_tracking[key]['last_change_time'] = time.time() - 10 * 3600
+
+    # Không snapshot cả view: chỉ đọc values của từng partition
+    original = gsd.PartitionedKeyView.snapshot
+    gsd.PartitionedKeyView.snapshot = lambda self: (_ for _ in ()).throw(AssertionError("view snapshot"))
+    try:
+        assert gsd.board_alert_presence() == {'gap': False, 'spike': True, 'delay': True}
+    finally:
+        gsd.PartitionedKeyView.snapshot = original
+    print("   ✓ Bảng Kèo / Bảng Delay: 1 lượt duyệt partitions cho gap/spike/delay")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING BROKER PARTITIONS")
+    print("=" * 60)
+    test_routing_and_cleanup()
+    test_brokers_do_not_block_each_other()
+    test_snapshot_iteration_during_ingest()
+    test_all_partitions_locked_excludes_ingest()
+    test_board_alert_presence_single_pass()
+    print("=" * 60)
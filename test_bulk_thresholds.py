@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Bulk Threshold Operations
+- Chọn symbols theo broker / nhóm / symbol chuẩn / bảng Point-Percent / danh sách key
+- apply_threshold_changes(): 1 lượt validate (lỗi → không áp dụng gì), mỗi settings dict 1 lần báo
+  thay đổi (threshold_table, routes), mỗi settings 1 lần schedule_save
+- Thời gian theo số key: không có chi phí theo từng key ngoài việc ghi dict
+"""
+
+import time
+from unittest import mock
+
+import gap_spike_detector as gsd
+from testing_helpers import (ROUTE_SYMBOLS, clear_gap_config, make_real_symbol_payload, post, set_route_config,
+                             setup, tables)
+
+BROKERS = ('Bulk-A', 'Bulk-B')
+GROUPS = {'EURUSD.m': 'Forex\\Majors', 'GBPUSD.m': 'Forex\\Majors', 'XAUUSD.m': 'Metals\\Spot'}
+
+
+def ingest(client, timestamp):
+    for broker in BROKERS:
+        payload = make_real_symbol_payload(ROUTE_SYMBOLS, broker, timestamp)
+        for entry in payload['data']:
+            entry['group'] = GROUPS.get(entry['symbol'], 'Others')
+        post(client, payload)
+
+
+def cleanup():
+    for broker in BROKERS:
+        gsd.broker_partitions.pop(broker, None)
+    gsd._key_partition_cache.clear()
+    clear_gap_config()
+
+
+def pairs(targets):
+    return sorted((target.broker, target.symbol) for target in targets)
+
+
+def test_select_targets():
+    setup()
+    set_route_config()
+    client = gsd.app.test_client()
+    try:
+        ingest(client, int(time.time()))
+        assert pairs(gsd.select_threshold_targets(brokers='Bulk-A')) == sorted(('Bulk-A', s) for s in ROUTE_SYMBOLS)
+        assert pairs(gsd.select_threshold_targets(group='Metals')) == [('Bulk-A', 'XAUUSD.m'), ('Bulk-B', 'XAUUSD.m')]
+        assert pairs(gsd.select_threshold_targets(group='Forex', brokers=['Bulk-B'])) == \
+            [('Bulk-B', 'EURUSD.m'), ('Bulk-B', 'GBPUSD.m')]
+        by_chuan = gsd.select_threshold_targets(symbol_chuan='EURUSD')
+        assert pairs(by_chuan) == [('Bulk-A', 'EURUSD.m'), ('Bulk-B', 'EURUSD.m')]
+        assert all(target.is_point_based for target in by_chuan)
+        assert pairs(gsd.select_threshold_targets(brokers='Bulk-A', table='percent')) == \
+            [('Bulk-A', 'GBPUSD.m'), ('Bulk-A', 'QQQTEST2'), ('Bulk-A', 'ZZZTEST1')]
+        explicit = gsd.select_threshold_targets(keys=['Bulk-B_ZZZTEST1', 'Bulk-A_NOT.LIVE'])
+        assert pairs(explicit) == [('Bulk-A', 'NOT.LIVE'), ('Bulk-B', 'ZZZTEST1')]
+    finally:
+        cleanup()
+    print("   ✓ Chọn theo broker / nhóm / symbol chuẩn / bảng / danh sách key")
+
+
+def test_apply_is_one_transaction():
+    setup()
+    set_route_config()
+    client = gsd.app.test_client()
+    notified = []
+    gsd.add_settings_listener(lambda name, keys: notified.append((name, len(keys or ()))))
+    try:
+        with mock.patch.dict(gsd.gap_settings), mock.patch.dict(gsd.spike_settings), \
+                mock.patch.dict(gsd.custom_thresholds), mock.patch.object(gsd, 'schedule_save') as saves:
+            ingest(client, int(time.time()))
+            percent = gsd.select_threshold_targets(table='percent')
+            point = gsd.select_threshold_targets(table='point')
+            gsd.custom_thresholds['Bulk-A_EURUSD.m'] = {'gap_point': 10.0, 'spike_point': 20.0}
+            for target in percent:
+                gsd.get_threshold(target.broker, target.symbol, 'gap')  # Resolve trước → phải bị bỏ
+            notified.clear()
+            saves.reset_mock()
+
+            # Giá trị lỗi → không áp dụng gì
+            bad = gsd.threshold_changes_for(percent, gap=0.5) + [gsd.ThresholdChange('Bulk-A_GBPUSD.m', 'spike', 'abc')]
+            try:
+                gsd.apply_threshold_changes(bad)
+                assert False, "phải raise ValueError"
+            except ValueError as e:
+                assert 'abc' in str(e)
+            assert notified == [] and saves.call_count == 0
+            assert all(target.key not in gsd.gap_settings for target in percent)
+
+            changes = gsd.threshold_changes_for(percent, gap=0.5, spike=2.0)
+            changes += gsd.threshold_changes_for(point, spike_point=None)  # Xóa spike_point, giữ gap_point
+            result = gsd.apply_threshold_changes(changes)
+            assert sorted(notified) == [('custom_thresholds', 1), ('gap_settings', len(percent)),
+                                        ('spike_settings', len(percent))]
+            assert sorted(call.args[0] for call in saves.call_args_list) == \
+                ['custom_thresholds', 'gap_settings', 'spike_settings']
+            assert result['changed'] == {'gap_settings': len(percent), 'spike_settings': len(percent),
+                                         'custom_thresholds': 1}
+            assert all(gsd.get_threshold(t.broker, t.symbol, 'gap') == 0.5 for t in percent)
+            assert dict(gsd.custom_thresholds['Bulk-A_EURUSD.m']) == {'gap_point': 10.0}
+
+            # Áp dụng lại cùng giá trị → không báo/ghi gì
+            notified.clear()
+            saves.reset_mock()
+            assert gsd.apply_threshold_changes(changes)['changed'] == {}
+            assert notified == [] and saves.call_count == 0
+
+            # Point thủ công cho cả nhóm Forex → route đổi, lượt ingest sau vào bảng Point
+            forex = gsd.select_threshold_targets(group='Forex')
+            gsd.apply_threshold_changes(gsd.threshold_changes_for(forex, gap_point=50))
+            ingest(client, int(time.time()) + 1)
+            for broker in BROKERS:
+                assert 'GBPUSD.m' in tables(gsd.broker_partitions[broker])[0]
+    finally:
+        gsd.settings_change_listeners.pop()
+        cleanup()
+    print(f"   ✓ {len(changes)} thay đổi: 1 lần báo / 1 lần lưu mỗi settings, lỗi → không áp dụng gì")
+
+
+def test_timing_flat_in_key_count():
+    timings = {}
+    with mock.patch.dict(gsd.gap_settings), mock.patch.dict(gsd.spike_settings), \
+            mock.patch.object(gsd, 'schedule_save'):
+        for size in (1000, 10000):
+            keys = [f"Bulk-Timing{size}_SYM{i}" for i in range(size)]
+            result = gsd.apply_threshold_changes(gsd.threshold_changes_for(keys, gap=0.4, spike=1.1))
+            assert result['keys'] == size
+            timings[size] = result['duration_ms'] / size * 1000
+    print(f"   ✓ µs/key: 1000 keys {timings[1000]:.1f}, 10000 keys {timings[10000]:.1f}")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING BULK THRESHOLD OPERATIONS")
+    print("=" * 60)
+    test_select_targets()
+    test_apply_is_one_transaction()
+    test_timing_flat_in_key_count()
+    print("=" * 60)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Delta Ingest v2
+- Metadata tĩnh đăng ký 1 lần (/api/v2/register_symbols), tick chỉ gửi giá + hash
+- market_data sau khi nhận v2 giống hệt khi nhận payload v1 đầy đủ
+- Hash chưa đăng ký → trả về trong unknown_meta
+- Đăng ký lại khi đổi ngày (current_day) → hash cũ không còn ai dùng bị xóa, registry không phình
+"""
+
+import time
+
+import gap_spike_detector as gsd
+from benchmark_ingest import make_getdata_v4_payload, make_v2_payloads
+from testing_helpers import reset_state, setup
+
+
+def test_v2_matches_v1():
+    setup()
+    client = gsd.app.test_client()
+    payload = make_getdata_v4_payload(100, seed=11, broker="Delta-Broker", timestamp=int(time.time()))
+    register, tick = make_v2_payloads(payload)
+
+    response = client.post('/api/v2/register_symbols', json=register).get_json()
+    assert response['registered'] == 100 and response['rejected'] == 0
+    assert response['hashes'] == {item['symbol']: item['meta'] for item in tick['data']}
+
+    assert client.post('/api/receive_data', json=payload).status_code == 200
+    v1_market = dict(gsd.market_data['Delta-Broker'])
+    v1_results = gsd.gap_spike_results.copy()
+
+    reset_state()
+    response = client.post('/api/v2/receive_data', json=tick).get_json()
+    assert response['ok'] and response['unknown_meta'] == [] and response['rejected'] == 0
+    assert dict(gsd.market_data['Delta-Broker']) == v1_market
+    assert gsd.gap_spike_results.copy() == v1_results
+
+    # Tick tiếp theo dùng lại đúng object metadata (không tạo trade_sessions mới)
+    first = gsd.market_data['Delta-Broker']['SYM0000.m']['trade_sessions']
+    client.post('/api/v2/receive_data', json=tick)
+    assert gsd.market_data['Delta-Broker']['SYM0000.m']['trade_sessions'] is first
+    print("   ✓ v2 (giá + hash) cho market_data/kết quả giống hệt v1")
+
+
+def test_unknown_meta_and_mixed_entries():
+    setup()
+    client = gsd.app.test_client()
+    payload = make_getdata_v4_payload(3, seed=12, broker="Delta-Mixed", timestamp=int(time.time()))
+    _, tick = make_v2_payloads(payload)
+    tick['data'][0]['meta'] = 'ffffffffffffffff'  # Chưa đăng ký
+    tick['data'][1] = payload['data'][1]  # Entry v1 đầy đủ (không có meta)
+    gsd.register_symbol_metadata('Delta-Mixed', [payload['data'][2]])
+
+    response = client.post('/api/v2/receive_data', json=tick).get_json()
+    assert response['unknown_meta'] == ['SYM0000.m']
+    assert sorted(gsd.market_data['Delta-Mixed'].keys()) == ['SYM0001.m', 'SYM0002.m']
+    print("   ✓ Hash chưa đăng ký → unknown_meta, entry v1 trong payload v2 vẫn nhận")
+
+
+def test_reregister_drops_unused_hashes():
+    setup()
+    client = gsd.app.test_client()
+    payload = make_getdata_v4_payload(50, seed=13, broker="Delta-Days", timestamp=int(time.time()))
+    other = make_getdata_v4_payload(50, seed=13, broker="Delta-Days-2", timestamp=int(time.time()))
+    for item in other['data']:
+        item['trade_sessions'] = dict(item['trade_sessions'], current_day='Friday')
+    client.post('/api/v2/register_symbols', json=make_v2_payloads(other)[0])
+    before = len(gsd.symbol_metadata_registry)
+
+    ticks = []
+    for day in ('Monday', 'Tuesday', 'Wednesday', 'Thursday'):
+        for item in payload['data']:
+            item['trade_sessions'] = dict(item['trade_sessions'], current_day=day)
+        register, tick = make_v2_payloads(payload)
+        assert client.post('/api/v2/register_symbols', json=register).get_json()['registered'] == 50
+        ticks.append(tick)
+    # Chỉ metadata của ngày mới nhất còn trong registry (Delta-Days-2 vẫn giữ hash của mình)
+    assert len(gsd.symbol_metadata_registry) - before <= 50
+    assert all(item['meta'] in gsd.symbol_metadata_registry for item in ticks[-1]['data'])
+
+    # Tick còn gửi hash ngày cũ → unknown_meta (trừ hash trùng metadata broker khác đang dùng)
+    response = client.post('/api/v2/receive_data', json=ticks[0]).get_json()
+    unknown = set(response['unknown_meta'])
+    assert len(unknown) >= 45
+    assert all(gsd.symbol_metadata_ref_counts.get(item['meta']) for item in ticks[0]['data']
+               if item['symbol'] not in unknown)
+    assert set(gsd.symbol_metadata_refs['Delta-Days'].values()) == {item['meta'] for item in ticks[-1]['data']}
+    response = client.post('/api/v2/receive_data', json=ticks[-1]).get_json()
+    assert response['unknown_meta'] == []
+    assert gsd.market_data['Delta-Days']['SYM0000.m']['trade_sessions']['current_day'] == 'Thursday'
+    _, other_tick = make_v2_payloads(other)
+    assert client.post('/api/v2/receive_data', json=other_tick).get_json()['unknown_meta'] == []
+    print(f"   ✓ 4 lần đăng ký lại (đổi current_day) → registry chỉ giữ hash đang dùng "
+          f"({len(gsd.symbol_metadata_registry)} entries)")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING DELTA INGEST v2")
+    print("=" * 60)
+    test_v2_matches_v1()
+    test_unknown_meta_and_mixed_entries()
+    test_reregister_drops_unused_hashes()
+    print("=" * 60)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Slotted Detection Records
+- gap_spike_results / gap_spike_point_results giữ DetectionRecord (__slots__), cập nhật tại chỗ mỗi tick
+- Đọc như dict cũ (result['gap'], get, in, ==), as_dict() cho JSON
+- Record đang được Bảng Kèo giữ (grace period) không bị ghi đè → tick sau tạo record mới
+- GUI: signature (record, version) chỉ đổi khi kết quả đổi
+- Tick mới không tạo object mới: MarketRecord + DetectionInfo của Batch Detection Engine ghi đè tại chỗ,
+  message chỉ format khi đọc
+"""
+
+import json
+import sys
+import time
+from unittest import mock
+
+import gap_spike_detector as gsd
+from testing_helpers import ROUTE_SYMBOLS, make_real_symbol_payload, post, set_route_config, setup
+
+BROKER = 'Record-Broker'
+MARKET = {'bid': 1.1000, 'ask': 1.1002}
+
+
+def info(detected=False, message='-'):
+    return {'detected': detected, 'strength': 0.0, 'message': message}
+
+
+def cleanup():
+    gsd.broker_partitions.pop(BROKER, None)
+    gsd._key_partition_cache.clear()
+
+
+def test_records_updated_in_place_by_ingest():
+    setup()
+    set_route_config()
+    client = gsd.app.test_client()
+    now = int(time.time())
+    try:
+        post(client, make_real_symbol_payload(ROUTE_SYMBOLS, BROKER, now))
+        partition = gsd.broker_partitions[BROKER]
+        first = dict(partition.gap_spike_results)
+        first.update(partition.gap_spike_point_results)
+        assert all(type(record) is gsd.DetectionRecord for record in first.values())
+
+        post(client, make_real_symbol_payload(ROUTE_SYMBOLS, BROKER, now + 1))
+        second = dict(partition.gap_spike_results)
+        second.update(partition.gap_spike_point_results)
+        # Symbol đang ở Bảng Kèo: record cũ được Bảng Kèo giữ → tick sau là record mới
+        on_board = {key for key in first if key in partition.alert_board}
+        assert len(on_board) < len(first)
+        assert all((second[key] is first[key]) == (key not in on_board) for key in first)
+        assert all(record['timestamp'] == now + 1 for record in second.values())
+        assert all(second[key].version == 1 for key in first if key not in on_board)
+    finally:
+        cleanup()
+    print(f"   ✓ {len(first) - len(on_board)}/{len(first)} symbols cập nhật tại chỗ "
+          f"({len(on_board)} đang ở Bảng Kèo → record mới)")
+
+
+def test_dict_compatible_reads():
+    percent = gsd.DetectionRecord('EURUSD', BROKER, 100, 1.1001, info(), info())
+    point = gsd.DetectionRecord('XAUUSD.m', BROKER, 100, 2000.5, info(), info(), True, 'XAUUSD', 'xauusd')
+    assert percent == {'symbol': 'EURUSD', 'broker': BROKER, 'timestamp': 100, 'price': 1.1001,
+                       'gap': info(), 'spike': info()}
+    assert 'symbol_chuan' not in percent and percent.get('symbol_chuan') is None
+    assert point['calculation_type'] == 'point' and point.get('symbol_chuan') == 'XAUUSD'
+    assert list(point.keys())[-3:] == ['symbol_chuan', 'matched_alias', 'calculation_type']
+    assert json.loads(json.dumps(point.as_dict()))['matched_alias'] == 'xauusd'
+    try:
+        percent['calculation_type']
+        assert False, "phải raise KeyError"
+    except KeyError:
+        pass
+    assert sys.getsizeof(point) < sys.getsizeof(point.as_dict())
+    print(f"   ✓ Đọc như dict, record {sys.getsizeof(point)} byte vs dict {sys.getsizeof(point.as_dict())} byte")
+
+
+def test_alert_board_keeps_detected_record():
+    key = gsd.symbol_key(BROKER, 'EURUSD')
+    try:
+        with mock.patch.dict(gsd.screenshot_settings, {'enabled': False}):
+            gsd.store_detection_result(key, 'EURUSD', BROKER, 100, MARKET, info(), info(), False)
+            record = gsd.broker_partitions[BROKER].gap_spike_results[key]
+            gsd.store_detection_result(key, 'EURUSD', BROKER, 101, MARKET, info(True, 'GAP'), info(), False)
+            partition = gsd.broker_partitions[BROKER]
+            assert partition.gap_spike_results[key] is record
+            assert partition.alert_board[key]['data'] is record
+
+            # Hết alert → grace period: Bảng Kèo vẫn hiện kết quả lúc phát hiện
+            gsd.store_detection_result(key, 'EURUSD', BROKER, 102, MARKET, info(), info(), False)
+            current = partition.gap_spike_results[key]
+            assert current is not record and current['timestamp'] == 102
+            assert partition.alert_board[key]['data']['gap']['message'] == 'GAP'
+            assert record['timestamp'] == 101
+
+            # Chuyển sang bảng Point → record riêng của bảng Point
+            gsd.store_detection_result(key, 'EURUSD', BROKER, 103, MARKET, info(), info(), True, 'EURUSD', 'eurusd')
+            assert partition.gap_spike_point_results[key]['calculation_type'] == 'point'
+    finally:
+        cleanup()
+    print("   ✓ Record Bảng Kèo đang giữ không bị ghi đè trong grace period")
+
+
+def test_gui_signature_tracks_changes():
+    key = gsd.symbol_key(BROKER, 'GBPUSD')
+    gap, spike = info(), info()
+    try:
+        gsd.store_detection_result(key, 'GBPUSD', BROKER, 100, MARKET, gap, spike, False)
+        table = gsd.broker_partitions[BROKER].gap_spike_results
+        before = gsd.detection_results_signature(table)
+
+        gsd.store_detection_result(key, 'GBPUSD', BROKER, 100, MARKET, gap, dict(spike), False)
+        assert gsd.detection_results_signature(table) == before  # Giá trị không đổi
+
+        gsd.store_detection_result(key, 'GBPUSD', BROKER, 100, MARKET, gap, info(message='Spike: 0.2%'), False)
+        assert gsd.detection_results_signature(table) != before
+    finally:
+        cleanup()
+    print("   ✓ Signature (record, version) chỉ đổi khi kết quả đổi")
+
+
+def test_batch_ticks_reuse_objects():
+    setup()
+    set_route_config()
+    client = gsd.app.test_client()
+    now = int(time.time())
+    formatted = []
+    original_getitem, original_get = gsd.DetectionInfo.__getitem__, gsd.DetectionInfo.get
+
+    def counting_getitem(self, field):
+        if field == 'message':
+            formatted.append(self)
+        return original_getitem(self, field)
+
+    def counting_get(self, field, default=None):
+        if field == 'message':
+            formatted.append(self)
+        return original_get(self, field, default)
+
+    try:
+        post(client, make_real_symbol_payload(ROUTE_SYMBOLS, BROKER, now))
+        partition = gsd.broker_partitions[BROKER]
+        markets = dict(partition.market)
+        records = dict(partition.gap_spike_results)
+        records.update(partition.gap_spike_point_results)
+        infos = {key: (record.gap, record.spike) for key, record in records.items()
+                 if key not in partition.alert_board}
+        assert any(isinstance(item, gsd.DetectionInfo) for pair in infos.values() for item in pair)
+
+        with mock.patch.object(gsd.DetectionInfo, '__getitem__', counting_getitem), \
+                mock.patch.object(gsd.DetectionInfo, 'get', counting_get):
+            post(client, make_real_symbol_payload(ROUTE_SYMBOLS, BROKER, now + 1))
+            assert not formatted  # Ingest không format message
+
+            assert all(type(market) is gsd.MarketRecord and partition.market[symbol] is market
+                       and market['timestamp'] == now + 1 for symbol, market in markets.items())
+            reused = 0
+            for key, (gap, spike) in infos.items():
+                record = records[key]
+                for before, after in ((gap, record.gap), (spike, record.spike)):
+                    if isinstance(before, gsd.DetectionInfo):
+                        assert after is before
+                        reused += 1
+
+            record = next(records[key] for key, pair in infos.items()
+                          if isinstance(pair[0], gsd.DetectionInfo))
+            message = record['gap']['message']
+            assert isinstance(message, str) and formatted == [record.gap]
+            assert json.loads(json.dumps(record.as_dict()))['gap']['message'] == message
+    finally:
+        cleanup()
+    print(f"   ✓ {len(markets)} MarketRecord + {reused} DetectionInfo dùng lại ở tick sau, "
+          f"message chỉ format khi đọc")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING SLOTTED DETECTION RECORDS")
+    print("=" * 60)
+    test_records_updated_in_place_by_ingest()
+    test_dict_compatible_reads()
+    test_alert_board_keeps_detected_record()
+    test_gui_signature_tracks_changes()
+    test_batch_ticks_reuse_objects()
+    print("=" * 60)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test EA Sync (/api/sync)
+- 1 request: market data được ingest, positions được lưu
+- Lệnh từ queue_signal() chỉ trả qua get_signal (sync không lấy lệnh khỏi hàng đợi)
+- receive_positions cũ dùng chung positions với sync
+- Broker chưa bật nhận dữ liệu → không lưu market data lẫn positions (cả /api/receive_positions)
+- Body lỗi → HTTP 400
+"""
+
+import time
+
+import gap_spike_detector as gsd
+from benchmark_ingest import make_getdata_v4_payload
+from testing_helpers import setup
+
+
+def make_positions(broker):
+    return {
+        "timestamp": int(time.time()),
+        "broker": broker,
+        "positions": [{"ticket": 1001, "symbol": "SYM0000.m", "type": "BUY", "volume": 0.10,
+                       "open_price": 1.2345, "current_price": 1.2350, "sl": 0, "tp": 0,
+                       "profit": 5.0, "comment": "", "open_time": 1700000000}]
+    }
+
+
+def test_sync_round_trip():
+    setup()
+    client = gsd.app.test_client()
+    broker = "Sync-Broker"
+    market = make_getdata_v4_payload(20, seed=31, broker=broker, timestamp=int(time.time()))
+
+    response = client.post('/api/sync', json={"market": market, "positions": make_positions(broker)}).get_json()
+    assert response['ok'] and response['message'] == "Data received" and response['rejected'] == 0
+    assert 'signal' not in response
+    assert len(gsd.market_data[broker]) == 20
+    assert gsd.get_broker_positions(broker)['positions'][0]['ticket'] == 1001
+
+    response = client.post('/api/sync', json={"positions": {**make_positions(broker), "positions": []}}).get_json()
+    assert response['ok'] and 'message' not in response
+    assert gsd.get_broker_positions(broker)['positions'] == []
+    print("   ✓ 1 request: ingest market data + lưu positions")
+
+
+def test_legacy_routes_share_state():
+    setup()
+    client = gsd.app.test_client()
+    broker = "Legacy-Broker"
+    gsd.queue_signal(broker, {"action": "TRADE", "symbol": "EURUSD", "side": "BUY", "volume": 0.01})
+    gsd.queue_signal(broker, {"action": "CANCEL_PENDING", "ticket": 7})
+
+    assert client.post('/api/sync', json={"broker": broker}).get_json() == {"ok": True}
+    assert client.get(f'/api/get_signal?broker={broker}').get_json()['action'] == "TRADE"
+    assert client.get(f'/api/get_signal?broker={broker}').get_json()['action'] == "CANCEL_PENDING"
+    assert client.get(f'/api/get_signal?broker={broker}').get_json() == {}
+    assert client.get('/api/get_signal').get_json() == {}
+
+    assert client.post('/api/receive_positions', json=make_positions(broker)).status_code == 200
+    assert len(gsd.get_broker_positions(broker)['positions']) == 1
+    print("   ✓ queue_signal → get_signal theo thứ tự (sync không lấy lệnh), receive_positions dùng chung positions")
+
+
+def test_disabled_broker_ignored():
+    setup()
+    client = gsd.app.test_client()
+    broker = "Sync-Disabled"
+    market = make_getdata_v4_payload(5, seed=32, broker=broker, timestamp=int(time.time()))
+    gsd.broker_selection_settings['enabled_brokers'] = ["Sync-Other"]
+    try:
+        response = client.post('/api/sync', json={"market": market, "positions": make_positions(broker)}).get_json()
+        legacy = client.post('/api/receive_positions', json=make_positions(broker))
+    finally:
+        gsd.broker_selection_settings['enabled_brokers'] = []
+    assert response['ok'] and response['status'] == 'ignored'
+    assert legacy.status_code == 200 and legacy.get_json()['status'] == 'ignored'
+    assert broker not in gsd.market_data
+    assert not gsd.get_broker_positions(broker) and broker not in gsd.broker_partitions
+    print("   ✓ Broker chưa bật: /api/sync và /api/receive_positions bỏ qua cả market data và positions")
+
+
+def test_rejects_malformed():
+    client = gsd.app.test_client()
+    for body in (b'[1]', b'{"market": [1]}', b'{"positions": {"positions": "none"}}', b'{"market": {"data": {}}}'):
+        response = client.post('/api/sync', data=body, content_type='application/json')
+        assert response.status_code == 400, body
+    try:
+        gsd.queue_signal("B", {"symbol": "EURUSD"})
+        raise AssertionError("Lệnh không có action phải bị từ chối")
+    except ValueError:
+        pass
+    print("   ✓ Body lỗi → HTTP 400, lệnh không có action bị từ chối")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING EA SYNC")
+    print("=" * 60)
+    test_sync_round_trip()
+    test_legacy_routes_share_state()
+    test_disabled_broker_ignored()
+    test_rejects_malformed()
+    print("=" * 60)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Hot Reload THAM_SO_GAP_INDICATOR.txt
+- Sửa file config → chỉ kết quả matching bị ảnh hưởng bị hủy, phần còn lại giống dò lại từ đầu
+- Symbol đổi kết quả matching bị xóa khỏi bảng Point/Percent (xếp lại bảng ở lượt ingest sau)
+- Ingest dò symbol trong lúc swap config không bao giờ thấy config load dở
+- GapConfigWatcher: chờ file ổn định 1 chu kỳ rồi mới load lại
+"""
+
+import random
+import shutil
+import tempfile
+import threading
+
+import gap_spike_detector as gsd
+from benchmark_symbol_matching import collect_broker_symbols
+from testing_helpers import clear_gap_config, make_broker_symbols, use_temp_files, write_lines
+
+
+def read_lines():
+    with open(gsd.GAP_CONFIG_FILE, 'r', encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+def edit_config(rng, lines):
+    """Thêm alias, xóa alias, đổi ngưỡng, thêm dòng mới (giữ thứ tự các dòng cũ)"""
+    data_lines = [i for i, line in enumerate(lines) if line.strip() and not line.startswith(('#', '//'))
+                  and len(line.split(';')) >= 4]
+    for i in rng.sample(data_lines, 3):
+        parts = lines[i].split(';')
+        lines[i] = ';'.join(parts[:-2] + [parts[1] + 'X'] + parts[-2:])
+    for i in rng.sample(data_lines, 3):
+        parts = lines[i].split(';')
+        if len(parts) > 4:
+            lines[i] = ';'.join(parts[:1] + parts[2:])
+    for i in rng.sample(data_lines, 3):
+        parts = lines[i].split(';')
+        lines[i] = ';'.join(parts[:-2] + [str(float(parts[-2]) * 2), parts[-1]])
+    lines.append('HOTSYM;HOTALIAS;HOTUSD;0.1;5')
+    return lines
+
+
+def test_incremental_invalidation_matches_full_reload():
+    folder = tempfile.mkdtemp()
+    original = use_temp_files(folder)
+    try:
+        gsd.load_gap_config_file()
+        rng = random.Random(16)
+        symbols = sorted(set(collect_broker_symbols() + make_broker_symbols(rng, 1500) + ['hotalias.m', 'HOTUSD']))
+        for symbol in symbols:
+            gsd.find_symbol_config(symbol)
+        before = dict(gsd.symbol_config_cache)
+
+        write_lines(edit_config(rng, read_lines()))
+        affected = gsd.hot_reload_gap_config()
+        assert affected and len(affected) < len(before) // 2, len(affected)
+        kept = dict(gsd.symbol_config_cache)
+        assert set(kept) == set(before) - affected
+
+        # Kết quả giữ lại = dò lại từ đầu với config mới; object config còn đúng
+        gsd.symbol_config_cache.clear()
+        gsd.symbol_match_levels.clear()
+        for symbol, result in kept.items():
+            assert gsd.find_symbol_config(symbol) == result, symbol
+            if result[0] is not None:
+                assert result[1] is gsd.gap_config[result[0]]
+        assert gsd.find_symbol_config('hotalias.m')[::2] == ('HOTSYM', 'HOTALIAS')
+        assert gsd.hot_reload_gap_config() is None  # Nội dung không đổi
+        print(f"   ✓ {len(before)} symbols: dò lại {len(affected)}, giữ {len(kept)} (giống dò lại từ đầu)")
+
+        # Đổi thứ tự dòng → thứ tự alias ảnh hưởng kết quả → hủy tất cả
+        for symbol in symbols[:50]:
+            gsd.find_symbol_config(symbol)
+        cached = len(gsd.symbol_config_cache)
+        lines = read_lines()
+        write_lines(lines[-1:] + lines[:-1])
+        assert len(gsd.hot_reload_gap_config()) == cached and gsd.symbol_config_cache == {}
+        print("   ✓ Đổi thứ tự alias → dò lại tất cả")
+    finally:
+        gsd.GAP_CONFIG_FILE, gsd.SYMBOL_MATCH_CACHE_FILE = original
+        gsd.pending_writes['symbol_match_cache'] = False
+        clear_gap_config()
+        shutil.rmtree(folder)
+
+
+def test_routing_results_dropped():
+    folder = tempfile.mkdtemp()
+    original = use_temp_files(folder)
+    try:
+        write_lines(['ROUTEA;ZetaAlias;0.1;5', 'ROUTEB;OmegaAlias;0.1;5'])
+        gsd.load_gap_config_file()
+        assert gsd.find_symbol_config('ZetaAlias.m')[0] == 'ROUTEA'
+        assert gsd.find_symbol_config('OmegaAlias.m')[0] == 'ROUTEB'
+        partition = gsd.get_broker_partition('Hot-Broker')
+        partition.gap_spike_point_results['Hot-Broker_ZetaAlias.m'] = {'symbol': 'ZetaAlias.m', 'broker': 'Hot-Broker'}
+        partition.gap_spike_point_results['Hot-Broker_OmegaAlias.m'] = {'symbol': 'OmegaAlias.m', 'broker': 'Hot-Broker'}
+
+        # Bỏ alias ZetaAlias → ZetaAlias.m chuyển sang Percent
+        write_lines(['ROUTEA;0.1;5', 'ROUTEB;OmegaAlias;0.1;5'])
+        assert gsd.reload_gap_config_if_changed()
+        assert 'Hot-Broker_ZetaAlias.m' not in partition.gap_spike_point_results
+        assert 'Hot-Broker_OmegaAlias.m' in partition.gap_spike_point_results
+        assert gsd.find_symbol_config('ZetaAlias.m') == (None, None, None)
+        print("   ✓ Symbol đổi kết quả matching bị xóa khỏi bảng Point, symbol khác giữ nguyên")
+    finally:
+        gsd.GAP_CONFIG_FILE, gsd.SYMBOL_MATCH_CACHE_FILE = original
+        gsd.pending_writes['symbol_match_cache'] = False
+        gsd.broker_partitions.pop('Hot-Broker', None)
+        clear_gap_config()
+        shutil.rmtree(folder)
+
+
+def test_swap_is_atomic_for_ingest():
+    folder = tempfile.mkdtemp()
+    original = use_temp_files(folder)
+    errors = []
+    stop = threading.Event()
+
+    def ingest_loop():
+        rng = random.Random(99)
+        i = 0
+        while not stop.is_set():
+            try:
+                # Symbol mới mỗi lần → luôn dò trong lúc config có thể đang bị swap
+                gsd.find_symbol_config(f"{rng.choice(['BTC', 'XAU', 'EUR', 'US'])}{i}.m")
+            except Exception as e:
+                errors.append(e)
+            i += 1
+
+    try:
+        gsd.load_gap_config_file()
+        lines = read_lines()
+        workers = [threading.Thread(target=ingest_loop) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for i in range(6):
+            # Xen kẽ 2 phiên bản: có/không có 1/3 số dòng cuối
+            write_lines(lines if i % 2 else lines[:len(lines) * 2 // 3])
+            assert gsd.reload_gap_config_if_changed()
+        stop.set()
+        for worker in workers:
+            worker.join()
+        assert not errors, errors[:3]
+        for symbol, (symbol_chuan, config, _) in list(gsd.symbol_config_cache.items()):
+            if symbol_chuan is not None:
+                assert gsd.gap_config[symbol_chuan] is config, symbol
+        print("   ✓ 6 lần hot reload trong lúc 3 thread dò symbol: không lỗi, cache khớp config hiện tại")
+    finally:
+        stop.set()
+        gsd.GAP_CONFIG_FILE, gsd.SYMBOL_MATCH_CACHE_FILE = original
+        gsd.pending_writes['symbol_match_cache'] = False
+        clear_gap_config()
+        shutil.rmtree(folder)
+
+
+def test_watcher_waits_for_stable_file():
+    folder = tempfile.mkdtemp()
+    original = use_temp_files(folder)
+    try:
+        gsd.load_gap_config_file()
+        watcher = gsd.GapConfigWatcher(interval=0.05)
+        assert not watcher.poll()
+
+        write_lines(read_lines() + ['WATCHSYM;WATCHALIAS;0.1;5'])
+        assert not watcher.poll()  # Vừa đổi → chờ thêm 1 chu kỳ
+        assert 'WATCHSYM' not in gsd.gap_config
+        assert watcher.poll() and 'WATCHSYM' in gsd.gap_config
+        assert not watcher.poll()
+
+        watcher.start()
+        write_lines(read_lines() + ['WATCHSYM2;WATCHALIAS2;0.1;5'])
+        for _ in range(100):
+            if 'WATCHSYM2' in gsd.gap_config:
+                break
+            threading.Event().wait(0.05)
+        watcher.stop()
+        assert 'WATCHSYM2' in gsd.gap_config and watcher.reloads == 2
+        print("   ✓ Watcher load lại sau khi file ổn định (poll thủ công + background thread)")
+    finally:
+        gsd.GAP_CONFIG_FILE, gsd.SYMBOL_MATCH_CACHE_FILE = original
+        gsd.pending_writes['symbol_match_cache'] = False
+        clear_gap_config()
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING GAP CONFIG HOT RELOAD")
+    print("=" * 60)
+    test_incremental_invalidation_matches_full_reload()
+    test_routing_results_dropped()
+    test_swap_is_atomic_for_ingest()
+    test_watcher_waits_for_stable_file()
+    print("=" * 60)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test HTTP Server Backend
+- Backend 'pooled': nhiều request trên 1 kết nối keep-alive, đóng kết nối idle theo timeout
+- Kết nối idle không chiếm worker: nhiều EA hơn max_workers không phải chờ
+- Đủ max_connections kết nối idle: kết nối mới vẫn có response, kết nối idle lâu nhất bị đóng
+- Body vượt max_request_mb → 413
+- Backend không hợp lệ trong server_settings.json → dùng 'pooled'
+"""
+
+import http.client
+import json
+import threading
+import time
+
+import gap_spike_detector as gsd
+
+
+def start_server(backend, **settings):
+    server = gsd.make_http_server(backend, host='127.0.0.1', port=0, settings=settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_pooled_keep_alive():
+    server = start_server('pooled', keep_alive_timeout=1)
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=5)
+        sockets = set()
+        for _ in range(3):
+            conn.request('POST', '/api/receive_positions', body=json.dumps({'broker': 'HTTP-Test'}),
+                         headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            assert response.status == 200 and response.getheader('Connection') is None
+            assert json.loads(response.read())['ok']
+            sockets.add(id(conn.sock))
+            conn.request('GET', '/api/get_signal')
+            response = conn.getresponse()
+            assert response.status == 200 and response.read() == b'{}\n'
+        assert len(sockets) == 1, "Kết nối bị mở lại giữa các request"
+
+        time.sleep(1.5)
+        try:
+            conn.request('GET', '/api/get_signal')
+            conn.getresponse()
+            raise AssertionError("Kết nối idle không bị đóng")
+        except (http.client.RemoteDisconnected, ConnectionError):
+            pass
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("   ✓ 6 request trên 1 kết nối keep-alive, kết nối idle bị đóng sau keep_alive_timeout")
+
+
+def test_idle_connections_do_not_hold_workers():
+    server = start_server('pooled', max_workers=2, keep_alive_timeout=5)
+    try:
+        conns = [http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=5) for _ in range(6)]
+        started = time.perf_counter()
+        for _ in range(2):
+            for conn in conns:
+                conn.request('GET', '/api/get_signal')
+                response = conn.getresponse()
+                assert response.status == 200 and response.read() == b'{}\n'
+        elapsed = time.perf_counter() - started
+        # 6 kết nối keep-alive idle, 2 worker: không kết nối nào phải chờ keep_alive_timeout
+        assert elapsed < 2, f"{elapsed:.2f}s"
+        deadline = time.time() + 2
+        while server.idle_connections() < len(conns) and time.time() < deadline:
+            time.sleep(0.01)
+        assert server.idle_connections() == len(conns)
+        for conn in conns:
+            conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    print(f"   ✓ 6 kết nối keep-alive / 2 worker: 12 request trong {elapsed * 1000:.0f} ms")
+
+
+def test_max_connections_serves_new_client():
+    server = start_server('pooled', max_connections=3, keep_alive_timeout=5)
+    conns = [http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=5) for _ in range(4)]
+    try:
+        for conn in conns[:3]:
+            conn.request('GET', '/api/get_signal')
+            assert conn.getresponse().read() == b'{}\n'
+        deadline = time.time() + 2
+        while server.idle_connections() < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        assert server.idle_connections() == 3
+
+        conns[3].request('GET', '/api/get_signal')
+        response = conns[3].getresponse()
+        assert response.status == 200 and response.read() == b'{}\n'
+        assert server.idle_connections() <= 3
+
+        # Kết nối idle lâu nhất bị đóng để nhường chỗ
+        try:
+            conns[0].request('GET', '/api/get_signal')
+            conns[0].getresponse()
+            raise AssertionError("Kết nối idle lâu nhất không bị đóng")
+        except (http.client.RemoteDisconnected, ConnectionError):
+            pass
+    finally:
+        for conn in conns:
+            conn.close()
+        server.shutdown()
+        server.server_close()
+    print("   ✓ max_connections=3: client thứ 4 vẫn có response, kết nối idle lâu nhất bị đóng")
+
+
+def test_request_body_limit():
+    server = start_server('pooled', max_request_mb=0.001)
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=5)
+        conn.request('POST', '/api/receive_positions', body=b'x' * 4096,
+                     headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        assert response.status == 413 and response.getheader('Connection') == 'close'
+        conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("   ✓ Body vượt max_request_mb → 413, đóng kết nối")
+
+
+def test_invalid_backend_setting():
+    original = dict(gsd.server_settings)
+    try:
+        gsd.server_settings.update({'backend': 'gunicorn', 'max_workers': 'many'})
+        gsd.load_server_settings()
+        assert gsd.server_settings['backend'] == 'pooled'
+        assert gsd.server_settings['max_workers'] == 64
+    finally:
+        gsd.server_settings.clear()
+        gsd.server_settings.update(original)
+    print("   ✓ Backend/max_workers không hợp lệ → giá trị mặc định")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING HTTP SERVER BACKEND")
+    print("=" * 60)
+    test_pooled_keep_alive()
+    test_idle_connections_do_not_hold_workers()
+    test_max_connections_serves_new_client()
+    test_request_body_limit()
+    test_invalid_backend_setting()
+    print("=" * 60)
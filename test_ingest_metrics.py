@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Ingest Metrics
+- Histogram ước lượng p50/p95/p99 đúng bucket
+- Mỗi payload ghi nhận thời gian từng giai đoạn, kích thước payload, tốc độ broker
+- /metrics (Prometheus text) và /metrics.json
+"""
+
+import time
+
+import gap_spike_detector as gsd
+from benchmark_ingest import make_getdata_v4_payload
+from testing_helpers import setup
+
+
+def test_histogram_quantiles():
+    histogram = gsd.Histogram((1, 2, 5, 10))
+    for value in [0.5] * 50 + [1.5] * 45 + [8] * 4 + [20]:
+        histogram.observe(value)
+    snap = histogram.snapshot()
+    assert snap['count'] == 100 and snap['max'] == 20
+    assert snap['counts'] == [50, 45, 0, 4, 1]
+    assert 0 < snap['p50'] <= 1
+    assert 1 < snap['p95'] <= 2
+    assert 5 < snap['p99'] <= 10
+    print(f"   ✓ p50={snap['p50']:.2f} p95={snap['p95']:.2f} p99={snap['p99']:.2f}")
+
+
+def test_stages_recorded_per_payload():
+    setup()
+    gsd.ingest_metrics.reset()
+    client = gsd.app.test_client()
+    for seed in range(3):
+        payload = make_getdata_v4_payload(50, seed=seed, broker="Metrics-Broker", timestamp=int(time.time()))
+        assert client.post('/api/receive_data', json=payload).status_code == 200
+
+    snapshot = client.get('/metrics.json').get_json()
+    for stage in ('decode', 'symbol_filter', 'find_symbol_config', 'candles', 'detection',
+                  'prepare', 'commit_lock_wait', 'commit', 'board_alert', 'cleanup', 'total'):
+        assert snapshot['stages'][stage]['count'] == 3, stage
+    total = snapshot['stages']['total']
+    assert total['p50_ms'] <= total['p99_ms'] <= total['max_ms'] + 1e-9
+    assert snapshot['brokers']['Metrics-Broker']['payloads_total'] == 3
+    assert snapshot['brokers']['Metrics-Broker']['symbols_total'] == 150
+    assert snapshot['payload_bytes']['receive_data']['count'] == 3
+    assert 'broker:Metrics-Broker' in snapshot['locks']
+    print(f"   ✓ 3 payload → 11 giai đoạn, total p50 {total['p50_ms']:.2f}ms")
+
+
+def test_prometheus_format():
+    client = gsd.app.test_client()
+    response = client.get('/metrics')
+    assert response.status_code == 200 and response.content_type.startswith('text/plain')
+    lines = response.get_data(as_text=True).splitlines()
+    samples = [line for line in lines if line and not line.startswith('#')]
+    for line in samples:
+        name, value = line.rsplit(' ', 1)
+        float(value)
+    assert any(line.startswith('gapspike_ingest_stage_seconds_bucket{stage="total",le="+Inf"}') for line in samples)
+    assert any(line.startswith('gapspike_broker_payloads_total{broker="Metrics-Broker"}') for line in samples)
+
+    assert client.get('/metrics.json?reset=1').get_json()['ok']
+    assert client.get('/metrics.json').get_json()['stages']['total']['count'] == 0
+    print(f"   ✓ /metrics: {len(samples)} samples hợp lệ, reset về 0")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING INGEST METRICS")
+    print("=" * 60)
+    test_histogram_quantiles()
+    test_stages_recorded_per_payload()
+    test_prometheus_format()
+    print("=" * 60)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Async Ingest Queue
+- Payload cũ chưa xử lý của cùng broker bị bỏ (chỉ xử lý snapshot mới nhất)
+- /api/receive_data trả về ngay, dữ liệu được worker xử lý sau
+- Nhiều worker xử lý nhiều broker cùng lúc: âm thanh Bảng Kèo chỉ phát 1 lần, loading_state nhất quán
+"""
+
+import random
+import threading
+import time
+from unittest import mock
+
+import gap_spike_detector as gsd
+from testing_helpers import make_payload, reset_state
+
+
+def test_coalescing():
+    processed = []
+    release = threading.Event()
+
+    def handler(broker, timestamp, symbols_data):
+        release.wait(5)
+        processed.append((broker, timestamp))
+
+    queue = gsd.IngestQueue(handler, worker_count=1)
+    queue.submit('A', 1, [])  # Worker đang xử lý (bị giữ bởi release)
+    time.sleep(0.05)
+    queue.submit('A', 2, [{'symbol': 'EURUSD', 'historical_candles': [[1, 1, 1, 1, 1]]}])
+    queue.submit('B', 1, [])
+    new_data = [{'symbol': 'EURUSD'}]
+    queue.submit('A', 3, new_data)  # Bỏ payload timestamp=2
+    assert queue.depth() == 2
+
+    release.set()
+    assert queue.wait_idle(5)
+
+    stats = queue.get_stats()
+    assert sorted(processed) == [('A', 1), ('A', 3), ('B', 1)], processed
+    assert stats['dropped'] == 1 and stats['dropped_by_broker'] == {'A': 1}
+    assert stats['processed'] == 3 and stats['depth'] == 0
+    # historical_candles của payload bị bỏ được giữ lại
+    assert new_data[0]['historical_candles'] == [[1, 1, 1, 1, 1]]
+    print(f"   ✓ Coalesce: 4 payload → xử lý 3, bỏ 1 (lag max {stats['lag_max_ms']:.1f}ms)")
+
+
+def test_endpoint_returns_before_processing():
+    gsd.app_startup_time = 0
+    gsd.screenshot_settings['enabled'] = False
+    gsd.symbol_filter_settings['enabled'] = False
+    gsd.broker_selection_settings['enabled_brokers'] = []
+    gsd.ASYNC_INGEST = True
+    reset_state()
+    client = gsd.app.test_client()
+
+    payload = make_payload(random.Random(5), 200, int(time.time()))
+    response = client.post('/api/receive_data', json=payload)
+    assert response.get_json()['message'] == 'Data queued'
+    assert gsd.ingest_queue.wait_idle(10)
+    assert len(gsd.market_data[payload['broker']]) == 200
+
+    response = client.post('/api/receive_data', data='[1, 2]', content_type='application/json')
+    assert response.status_code == 400
+
+    stats = client.get('/api/ingest_stats').get_json()
+    assert stats['processed'] >= 1
+    print(f"   ✓ Endpoint trả về ngay, worker xử lý xong (lag avg {stats['lag_avg_ms']:.1f}ms)")
+
+
+def test_post_commit_section_is_serialized():
+    gsd.app_startup_time = 0
+    gsd.screenshot_settings['enabled'] = False
+    gsd.symbol_filter_settings['enabled'] = False
+    reset_state()
+    gsd.audio_alert_state['gap'].update(board_had_items=False, last_alert_time=0)
+    plays = []
+    active = []
+    overlaps = []
+
+    def presence(alert_types):
+        active.append(1)
+        overlaps.append(len(active))
+        time.sleep(0.02)  # Worker khác commit xong trong lúc này → phải chờ post_ingest_lock
+        active.pop()
+        return {alert_type: alert_type == 'gap' for alert_type in alert_types}
+
+    payloads = []
+    for i in range(4):
+        payload = make_payload(random.Random(i), 50, int(time.time()))
+        payloads.append((f"Post-Broker-{i}", payload['timestamp'], payload['data']))
+
+    with mock.patch.dict(gsd.audio_settings, {'enabled': True, 'startup_delay_minutes': 0}), \
+            mock.patch.object(gsd, 'board_alert_presence', presence), \
+            mock.patch.object(gsd, '_play_audio_for_type', plays.append):
+        threads = [threading.Thread(target=gsd.process_ingest_payload, args=args) for args in payloads]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert max(overlaps) == 1 and len(overlaps) == 4, overlaps
+    assert plays == ['gap'], plays
+    assert gsd.loading_state['total_symbols'] == 200
+    assert gsd.loading_state['processed_symbols'] == 200 and not gsd.loading_state['is_loading']
+    for broker, _, _ in payloads:
+        gsd.broker_partitions.pop(broker, None)
+    gsd._key_partition_cache.clear()
+    print("   ✓ 4 broker ingest song song → Bảng Kèo phát 1 lần, loading_state 200/200")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING ASYNC INGEST QUEUE")
+    print("=" * 60)
+    test_coalescing()
+    test_endpoint_returns_before_processing()
+    test_post_commit_section_is_serialized()
+    print("=" * 60)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Fast Payload Decoding
+- decode_ea_payload() cho market record giống hệt đường cũ (json + copy dict)
+- Entry lỗi (thiếu symbol, bid/ask sai kiểu) bị loại, field phụ sai kiểu → giá trị mặc định, body lỗi → HTTP 400
+- decode_stats cộng dồn đúng khi nhiều thread decode cùng lúc
+"""
+
+import json
+import threading
+
+import gap_spike_detector as gsd
+from benchmark_ingest import make_getdata_v4_payload, encode_json_body, decode_current_path
+
+
+def test_matches_current_path():
+    body = encode_json_body(make_getdata_v4_payload(300, seed=4))
+    expected = decode_current_path(body)
+
+    broker, timestamp, records, rejected = gsd.decode_ea_payload(body)
+    assert rejected == 0
+    assert {r.symbol: r.market for r in records} == expected
+
+    original_loads = gsd._json_loads
+    try:
+        gsd._json_loads = json.loads
+        _, _, fallback_records, _ = gsd.decode_ea_payload(body)
+    finally:
+        gsd._json_loads = original_loads
+    assert fallback_records == records
+    print(f"   ✓ {len(records)} records giống đường cũ (decoder: {gsd.JSON_DECODER} + json stdlib)")
+
+
+def test_prepare_ingest_with_typed_records():
+    gsd.app_startup_time = 0
+    gsd.screenshot_settings['enabled'] = False
+    gsd.symbol_filter_settings['enabled'] = False
+    payload = make_getdata_v4_payload(200, seed=9, broker="Decode-Broker")
+    body = encode_json_body(payload)
+
+    plan_dicts = gsd.prepare_ingest(payload['broker'], payload['timestamp'], json.loads(body)['data'])
+    _, _, records, _ = gsd.decode_ea_payload(body)
+    plan_typed = gsd.prepare_ingest(payload['broker'], payload['timestamp'], records)
+
+    assert plan_typed['records'] == plan_dicts['records']
+    assert [r[5:7] for r in plan_typed['results']] == [r[5:7] for r in plan_dicts['results']]
+    assert [list(batch) for _, batch, _ in plan_typed['batches']] == [list(batch) for _, batch, _ in plan_dicts['batches']]
+    print("   ✓ prepare_ingest(TypedSymbolRecord) == prepare_ingest(dict)")
+
+
+def test_rejects_malformed():
+    good = make_getdata_v4_payload(1, seed=2)['data'][0]
+    bad_entries = [
+        "EURUSD",
+        {**good, 'symbol': ''},
+        {**good, 'bid': "1.2345"},
+        {**good, 'ask': True},
+    ]
+    # Field phụ sai kiểu → giữ symbol, chỉ field đó lấy giá trị mặc định
+    normalized_entries = [
+        ({**good, 'symbol': 'DIGITS', 'digits': 2.5}, 'digits', 5),
+        ({**good, 'symbol': 'PREV', 'prev_ohlc': [1, 2, 3, 4]}, 'prev_ohlc', {}),
+        ({**good, 'symbol': 'CUR', 'current_ohlc': {'open': None, 'high': 1, 'low': 1, 'close': 1}}, 'current_ohlc', {}),
+        ({**good, 'symbol': 'SESS', 'trade_sessions': "24/7"}, 'trade_sessions', {}),
+        ({**good, 'symbol': 'GROUP', 'group': 7}, 'group', ''),
+    ]
+    before = gsd.get_decode_stats()
+    body = json.dumps({'timestamp': 1, 'broker': 'B',
+                       'data': [good] + bad_entries + [entry for entry, _, _ in normalized_entries]})
+    _, _, records, rejected = gsd.decode_ea_payload(body)
+    assert len(records) == 1 + len(normalized_entries) and rejected == len(bad_entries)
+    markets = {record.symbol: record.market for record in records}
+    for entry, field, default in normalized_entries:
+        market = markets[entry['symbol']]
+        assert market[field] == default and market['bid'] == good['bid']
+        assert all(market[name] == markets[good['symbol']][name] for name in ('group', 'points', 'prev_ohlc')
+                   if name != field)
+    after = gsd.get_decode_stats()
+    assert after['normalized_fields'] - before['normalized_fields'] == len(normalized_entries)
+    assert after['rejected_entries'] - before['rejected_entries'] == len(bad_entries)
+
+    for body in (b'{"broker": "B", "data": [', b'[1, 2]', b'{"data": {}}'):
+        try:
+            gsd.decode_ea_payload(body)
+            raise AssertionError(f"Không reject: {body}")
+        except gsd.PayloadDecodeError:
+            pass
+
+    client = gsd.app.test_client()
+    response = client.post('/api/receive_data', data=b'{"broker": ', content_type='application/json')
+    assert response.status_code == 400
+    print(f"   ✓ Loại {rejected} entry lỗi, giữ {len(normalized_entries)} entry có field phụ sai kiểu, body lỗi → HTTP 400")
+
+
+def test_concurrent_decode_stats():
+    body = encode_json_body(make_getdata_v4_payload(20, seed=3))
+    before = gsd.get_decode_stats()['payloads']
+
+    def worker():
+        for _ in range(200):
+            gsd.decode_ea_payload(body)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert gsd.get_decode_stats()['payloads'] - before == 800
+    print("   ✓ 4 thread x 200 payload → decode_stats đếm đủ 800")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING FAST PAYLOAD DECODING")
+    print("=" * 60)
+    test_matches_current_path()
+    test_prepare_ingest_with_typed_records()
+    test_rejects_malformed()
+    test_concurrent_decode_stats()
+    print("=" * 60)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Append-only Settings Journal (backend 'journal')
+- Sửa 1 ngưỡng / ẩn-hiện 1 alert → append vài chục byte thay vì ghi lại cả file JSON
+- Khởi động: replay snapshot + journal, dòng cuối ghi dở (crash) bị cắt bỏ
+- Compact: snapshot ghi atomic rồi xóa journal; crash giữa chừng vẫn replay ra đúng nội dung
+- fsync theo lô (background), background compact khi journal đủ lớn
+"""
+
+import json
+import os
+import shutil
+import time
+from unittest import mock
+
+import gap_spike_detector as gsd
+from testing_helpers import temp_store
+
+
+def reopen(folder):
+    gsd.close_settings_store()
+    return gsd.open_settings_store(os.path.join(folder, 'journal'), 'journal')
+
+
+def test_edit_appends_small_record():
+    with temp_store('journal') as (folder, journal):
+        gsd.gap_settings.replace({f"Broker{i // 50}_SYM{i}": 0.1 for i in range(500)})
+        gsd.save_gap_settings()
+        full_json = len(json.dumps(dict(gsd.gap_settings), ensure_ascii=False, indent=2).encode('utf-8'))
+
+        written = journal.stats['bytes']
+        gsd.gap_settings['Broker3_SYM150'] = 0.25
+        gsd.save_gap_settings()
+        edit_bytes = journal.stats['bytes'] - written
+        assert edit_bytes < 64 < full_json
+
+        with mock.patch.object(gsd, 'hidden_alert_items', {}):
+            gsd.save_hidden_alert_items()
+            gsd.hidden_alert_items['BrokerA_EURUSD'] = {'hidden_until': None}
+            gsd.save_hidden_alert_items()  # Ẩn
+            del gsd.hidden_alert_items['BrokerA_EURUSD']
+            gsd.save_hidden_alert_items()  # Hiện lại
+
+        expected = dict(gsd.gap_settings)
+        journal = reopen(folder)
+        assert journal.load('gap_settings') == expected
+        assert journal.load('hidden_alert_items') == {}
+        assert not os.path.exists('gap_settings.json')
+    print(f"   ✓ Sửa 1 ngưỡng: {edit_bytes} byte journal (file JSON: {full_json} byte), replay đúng")
+
+
+def test_partial_record_truncated_on_replay():
+    with temp_store('journal') as (folder, journal):
+        gsd.spike_settings.replace({'EURUSD': 0.05, 'B_XAUUSD': 0.2})
+        gsd.save_spike_settings()
+        journal.sync()
+        # Crash giữa lúc ghi: dòng cuối thiếu
+        with open(journal.journal_path, 'ab') as f:
+            f.write(b'["s", "spike_settings", "B_BTC')
+
+        journal = reopen(folder)
+        assert journal.stats['truncated'] > 0
+        assert journal.load('spike_settings') == {'EURUSD': 0.05, 'B_XAUUSD': 0.2}
+
+        # Ghi tiếp sau khi cắt → không dính vào dòng hỏng
+        gsd.spike_settings['B_BTCUSD'] = 0.3
+        gsd.save_spike_settings()
+        journal = reopen(folder)
+        assert journal.stats['truncated'] == 0
+        assert journal.load('spike_settings') == {'EURUSD': 0.05, 'B_XAUUSD': 0.2, 'B_BTCUSD': 0.3}
+    print("   ✓ Dòng ghi dở lúc crash bị cắt, settings trước đó còn nguyên")
+
+
+def test_compaction_and_crash_between_steps():
+    with temp_store('journal') as (folder, journal):
+        gsd.custom_thresholds.replace({f"Broker_SYM{i}": {'gap_point': i} for i in range(50)})
+        gsd.save_custom_thresholds()
+        for i in range(10):
+            gsd.custom_thresholds[f"Broker_SYM{i}"]['gap_point'] = 100 + i
+            gsd.save_custom_thresholds()
+        expected = json.loads(json.dumps(gsd.custom_thresholds))
+        before = journal.journal_size()
+        stale_journal = os.path.join(folder, 'stale.journal')
+        journal.sync()
+        shutil.copyfile(journal.journal_path, stale_journal)
+
+        journal.compact()
+        assert journal.journal_size() == 0 < before and os.path.exists(journal.snapshot_path)
+        journal = reopen(folder)
+        assert journal.load('custom_thresholds') == expected
+
+        # Crash sau khi thay snapshot, trước khi xóa journal → replay journal cũ trên snapshot mới
+        gsd.close_settings_store()
+        shutil.copyfile(stale_journal, os.path.join(folder, 'journal', gsd.SettingsJournal.JOURNAL_FILE))
+        journal = reopen(folder)
+        assert journal.load('custom_thresholds') == expected
+    print(f"   ✓ Compact: journal {before} byte → 0, crash giữa 2 bước vẫn đúng nội dung")
+
+
+def test_batched_fsync_and_background_compaction():
+    with temp_store('journal') as (folder, journal):
+        with mock.patch.object(gsd.os, 'fsync', wraps=os.fsync) as fsyncs:
+            for i in range(20):
+                gsd.gap_settings[f"B_SYM{i}"] = 0.1
+                gsd.save_gap_settings()
+            assert fsyncs.call_count == 0
+            journal.sync()
+            assert fsyncs.call_count == 1
+
+        journal.stop()
+        journal.fsync_interval, journal.compact_interval, journal.compact_min_bytes = 0.01, 0, 0
+        journal.start()
+        deadline = time.time() + 5
+        while journal.stats['compactions'] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert journal.stats['compactions'] >= 1 and journal.journal_size() == 0
+    print("   ✓ 20 lần save → 1 fsync, background thread tự compact")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING APPEND-ONLY SETTINGS JOURNAL")
+    print("=" * 60)
+    test_edit_appends_small_record()
+    test_partial_record_truncated_on_replay()
+    test_compaction_and_crash_between_steps()
+    test_batched_fsync_and_background_compaction()
+    print("=" * 60)
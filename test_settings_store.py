@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test SQLite Settings Store
+- Mỗi key của settings = 1 dòng: sửa 1 ngưỡng chỉ upsert 1 dòng (không ghi lại toàn bộ)
+- Lần đầu bật SQLite: settings chưa có trong store được import từ file JSON cũ
+- Symbol filter: mỗi broker trong selection 1 dòng
+- Export ra JSON giống file do backend 'json' ghi, file SQLite ở chế độ WAL
+- Mặc định (backend 'json') vẫn ghi file JSON như cũ
+- Công cụ offline (replay, audit) đọc settings từ store đang cấu hình, read-only
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import gap_spike_detector as gsd
+from migrate_settings import migrate
+from testing_helpers import temp_store
+
+
+def row_count(store, namespace):
+    return store._conn.execute('SELECT COUNT(*) FROM settings WHERE namespace = ?', (namespace,)).fetchone()[0]
+
+
+def test_single_edit_writes_single_row():
+    with temp_store() as (folder, store):
+        gsd.gap_settings.replace({f"Broker{i // 50}_SYM{i}": 0.1 for i in range(500)})
+        gsd.save_gap_settings()
+        assert store.stats['upserts'] == 500 and row_count(store, 'gap_settings') == 500
+        assert not os.path.exists('gap_settings.json')
+
+        gsd.gap_settings['Broker3_SYM150'] = 0.25
+        assert store.save('gap_settings', gsd.gap_settings) == (1, 0)
+        del gsd.gap_settings['Broker9_SYM499']
+        assert store.save('gap_settings', gsd.gap_settings) == (0, 1)
+        # Sửa lồng trong custom_thresholds → chỉ dòng của key đó
+        gsd.custom_thresholds.replace({f"Broker_SYM{i}": {'gap_point': 5} for i in range(100)})
+        gsd.save_custom_thresholds()
+        gsd.custom_thresholds['Broker_SYM7']['spike_point'] = 9
+        assert store.save('custom_thresholds', gsd.custom_thresholds) == (1, 0)
+
+        # Mở lại file → đọc đúng nội dung
+        expected_gap, expected_custom = dict(gsd.gap_settings), json.loads(json.dumps(gsd.custom_thresholds))
+        gsd.close_settings_store()
+        reopened = gsd.open_settings_store(os.path.join(folder, 'settings.db'))
+        assert reopened.load('gap_settings') == expected_gap
+        assert reopened.load('custom_thresholds') == expected_custom
+    print("   ✓ 500 ngưỡng: sửa 1 → upsert 1 dòng, xóa 1 → xóa 1 dòng, mở lại đọc đúng")
+
+
+def test_first_run_imports_json_files():
+    with temp_store() as (folder, store):
+        with open('gap_settings.json', 'w', encoding='utf-8') as f:
+            json.dump({'EURUSD': 0.02, 'B_XAUUSD': 0.3}, f)
+        with open('hidden_products.json', 'w', encoding='utf-8') as f:
+            json.dump(['B_EURUSD', 'B_GBPUSD'], f)
+        with mock.patch.object(gsd, 'hidden_products', []):
+            gsd.load_gap_settings()
+            gsd.load_hidden_products()
+            assert dict(gsd.gap_settings) == {'EURUSD': 0.02, 'B_XAUUSD': 0.3}
+            assert gsd.hidden_products == ['B_EURUSD', 'B_GBPUSD']
+            assert store.has_namespace('gap_settings') and store.has_namespace('hidden_products')
+
+            # Lần chạy sau đọc từ store, không cần file JSON
+            os.remove('gap_settings.json')
+            os.remove('hidden_products.json')
+            gsd.gap_settings.replace({})
+            gsd.load_gap_settings()
+            gsd.load_hidden_products()
+            assert dict(gsd.gap_settings) == {'EURUSD': 0.02, 'B_XAUUSD': 0.3}
+            assert gsd.hidden_products == ['B_EURUSD', 'B_GBPUSD']
+            assert not os.path.exists('gap_settings.json')
+    print("   ✓ Lần đầu bật SQLite: import từ file JSON, lần sau đọc từ store")
+
+
+def test_symbol_filter_rows_and_export():
+    with temp_store() as (folder, store):
+        gsd.symbol_filter_settings['enabled'] = True
+        gsd.symbol_filter_settings['selection'] = {'BrokerA': ['EURUSD'], 'BrokerB': ['XAUUSD', 'BTCUSD'], 'BrokerC': []}
+        gsd.save_symbol_filter_settings()
+        gsd.symbol_filter_settings['selection']['BrokerB'] = ['XAUUSD']
+        assert store.save('symbol_filter_settings', {
+            'enabled': True, 'selection': gsd.symbol_filter_settings['selection']
+        }, ('selection',)) == (1, 0)
+
+        gsd.symbol_filter_settings['selection'] = {}
+        gsd.load_symbol_filter_settings()
+        assert gsd.symbol_filter_settings['selection'] == {'BrokerA': ['EURUSD'], 'BrokerB': ['XAUUSD'], 'BrokerC': []}
+
+        # Export → giống file JSON do backend 'json' ghi; import lại vào file SQLite khác
+        export_folder = os.path.join(folder, 'export')
+        os.mkdir(export_folder)
+        gsd.gap_settings.replace({'EURUSD': 0.01})
+        gsd.save_gap_settings()
+        exported = gsd.export_json_settings(store, export_folder)
+        assert set(exported) == {'symbol_filter_settings', 'gap_settings'}
+        with open(os.path.join(export_folder, gsd.SYMBOL_FILTER_FILE), encoding='utf-8') as f:
+            assert json.load(f) == {'enabled': True, 'selection': gsd.symbol_filter_settings['selection']}
+        assert set(migrate('import', os.path.join(folder, 'copy.db'), export_folder)) == set(exported)
+        copy = gsd.SQLiteSettingsStore(os.path.join(folder, 'copy.db'))
+        try:
+            assert copy.load('gap_settings') == {'EURUSD': 0.01}
+        finally:
+            copy.close()
+    print("   ✓ Symbol filter: mỗi broker 1 dòng, export/import JSON giữ nguyên nội dung")
+
+
+def test_wal_mode_and_json_default():
+    with temp_store() as (folder, store):
+        assert store._conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    # Backend mặc định 'json' → open_settings_store() không mở gì, save ghi file như cũ
+    assert gsd.settings_store_settings['backend'] == 'json'
+    assert gsd.open_settings_store() is None and gsd.settings_store is None
+    folder = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        with mock.patch.dict(gsd.spike_settings, {'EURUSD': 0.05}, clear=True):
+            gsd.save_spike_settings()
+        with open('spike_settings.json', encoding='utf-8') as f:
+            assert json.load(f) == {'EURUSD': 0.05}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder)
+    print("   ✓ SQLite ở chế độ WAL, backend mặc định vẫn ghi file JSON")
+
+
+def test_offline_tools_read_configured_store():
+    from replay_traffic import load_server_settings
+    from symbol_match_audit import load_audit_settings
+
+    for backend in ('sqlite', 'journal'):
+        with temp_store(backend) as (folder, store):
+            gsd.gap_settings.replace({'B_EURUSD': 0.5})
+            gsd.save_gap_settings()
+            gsd.custom_thresholds.replace({'B_XAUUSD': {'gap_point': 12}})
+            gsd.save_custom_thresholds()
+            if backend == 'journal':
+                store.sync()
+            gsd.close_settings_store()
+            # File JSON cũ (trước khi bật store) không được dùng
+            with open('gap_settings.json', 'w', encoding='utf-8') as f:
+                json.dump({'B_EURUSD': 0.01}, f)
+            config = {'backend': backend, 'path': os.path.join(folder, 'settings.db'),
+                      'journal_folder': os.path.join(folder, 'journal')}
+            if backend == 'journal':
+                journal_path = os.path.join(folder, 'journal', gsd.SettingsJournal.JOURNAL_FILE)
+                with open(journal_path, 'ab') as f:
+                    f.write(b'["s", "gap_settings", "B_GBP')  # Server đang ghi dở
+
+            for load in (load_server_settings, load_audit_settings):
+                gsd.gap_settings.replace({})
+                gsd.custom_thresholds.replace({})
+                with mock.patch.dict(gsd.settings_store_settings, config), \
+                        mock.patch.object(gsd, 'load_settings_store_settings'), \
+                        mock.patch.object(gsd, 'load_gap_config_file'):
+                    load()
+                    assert gsd.settings_store.read_only
+                    assert dict(gsd.gap_settings) == {'B_EURUSD': 0.5}
+                    assert dict(gsd.custom_thresholds) == {'B_XAUUSD': {'gap_point': 12}}
+                    # Read-only: save không ghi vào store của server
+                    gsd.gap_settings['B_EURUSD'] = 0.9
+                    gsd.save_gap_settings()
+                gsd.close_settings_store()
+
+            reopened = gsd.open_settings_store(config['path'] if backend == 'sqlite' else config['journal_folder'],
+                                               backend)
+            assert reopened.load('gap_settings') == {'B_EURUSD': 0.5}
+            if backend == 'journal':
+                assert reopened.stats['truncated'] > 0  # Dòng ghi dở còn nguyên tới khi server mở lại
+            gsd.close_settings_store()
+    print("   ✓ replay_traffic / symbol_match_audit đọc settings từ store (read-only), không dùng JSON cũ")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING SQLITE SETTINGS STORE")
+    print("=" * 60)
+    test_single_edit_writes_single_row()
+    test_first_run_imports_json_files()
+    test_symbol_filter_rows_and_export()
+    test_wal_mode_and_json_default()
+    test_offline_tools_read_configured_store()
+    print("=" * 60)
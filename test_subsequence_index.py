@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Subsequence Alias Index
+- Bước 3 (subsequence match) của find_symbol_config() chỉ so khớp với alias cùng ký tự đầu
+  và độ dài phù hợp, kết quả giống hệt vòng lặp is_subsequence_match() trên mọi alias
+- Không bỏ sót alias ở biên độ dài (len × 0.5, len / 0.5)
+"""
+
+import random
+
+import gap_spike_detector as gsd
+from benchmark_symbol_matching import collect_broker_symbols, linear_find_symbol_config
+from testing_helpers import clear_gap_config, load_real_gap_config
+
+
+def make_noisy_symbols(rng, aliases, count):
+    """Alias bị chèn/bỏ ký tự → phần lớn chỉ khớp được ở Bước 3"""
+    symbols = []
+    for _ in range(count):
+        chars = list(rng.choice(aliases))
+        for _ in range(rng.randint(1, 3)):
+            position = rng.randint(1, len(chars))
+            if rng.random() < 0.5 and len(chars) > 2:
+                del chars[min(position, len(chars) - 1)]
+            else:
+                chars.insert(position, rng.choice('xyz._-0123456789'))
+        symbols.append(('#' if rng.random() < 0.2 else '') + ''.join(chars))
+    return symbols
+
+
+def test_index_matches_linear_scan():
+    load_real_gap_config()
+    rng = random.Random(13)
+    broker_symbols = collect_broker_symbols()
+    aliases = [alias for alias in gsd.gap_config_reverse_map if len(alias) >= 4]
+    symbols = rng.sample(broker_symbols, min(200, len(broker_symbols))) + make_noisy_symbols(rng, aliases, 200)
+
+    gsd.symbol_config_cache.clear()
+    expected = [linear_find_symbol_config(symbol) for symbol in symbols]
+    gsd.symbol_config_cache.clear()
+    results = [gsd.find_symbol_config(symbol) for symbol in symbols]
+    for symbol, result, old in zip(symbols, results, expected):
+        assert result == old, (symbol, result[::2], old[::2])
+    clear_gap_config()
+    matched = sum(1 for result in results if result[0] is not None)
+    print(f"   ✓ {len(symbols)} symbols ({matched} khớp) giống vòng lặp cũ")
+
+
+def test_length_bounds_not_pruned():
+    clear_gap_config()
+    # 'abcde' (5) khớp 'abcdexxxxx' (10): 5/10 = 50% → vừa đủ; 'abcdexxxxxx' (11) không khớp
+    for symbol_chuan in ('ABCDEXXXXX', 'ABCDEXXXXXX', 'QBCDE'):
+        gsd.gap_config[symbol_chuan] = {'aliases': [], 'default_gap_percent': 0.1, 'custom_gap': 1}
+        gsd.gap_config_reverse_map[symbol_chuan.lower()] = symbol_chuan
+
+    index = gsd.get_gap_config_subsequence_index()
+    assert [entry[2] for entry in index.candidates('abcde')] == ['abcdexxxxx']
+    assert gsd.is_subsequence_match('abcde', 'abcdexxxxx')
+    assert not gsd.is_subsequence_match('abcde', 'abcdexxxxxx')
+    assert gsd.find_symbol_config('A.B.C.D.E')[::2] == ('ABCDEXXXXX', 'ABCDEXXXXX')
+    # 10 ký tự → alias dài 5 (= 10 × 0.5) vẫn là ứng viên
+    assert [entry[2] for entry in index.candidates('qbcdeyyyyy')] == ['qbcde']
+    assert index.candidates('abcd') == []  # < 5 ký tự → không bao giờ khớp
+    clear_gap_config()
+    print("   ✓ Biên độ dài và ký tự đầu được giữ đúng")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING SUBSEQUENCE ALIAS INDEX")
+    print("=" * 60)
+    test_index_matches_linear_scan()
+    test_length_bounds_not_pruned()
+    print("=" * 60)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Compiled Symbol Filter
+- is_symbol_selected_for_detection() dùng CompiledSymbolFilter cho kết quả giống hệt cách kiểm tra cũ
+  (list theo broker, wildcard '*', list rỗng, prefix match với gap_config)
+- Quyết định được nhớ theo (broker, symbol), tự biên dịch lại khi selection hoặc gap_config đổi
+- Không còn log INFO cho mỗi symbol được chấp nhận qua prefix match
+"""
+
+import random
+import re
+from unittest import mock
+
+import gap_spike_detector as gsd
+from testing_helpers import clear_gap_config, load_real_gap_config
+
+
+def linear_is_selected(broker, symbol):
+    """is_symbol_selected_for_detection() cũ: duyệt list + startswith() trên mọi alias"""
+    if not gsd.symbol_filter_settings.get('enabled', False):
+        return True
+    selection = gsd.symbol_filter_settings.get('selection', {}) or {}
+    if not selection:
+        return True
+    if broker in selection:
+        broker_symbols = selection.get(broker)
+    elif '*' in selection:
+        broker_symbols = selection.get('*')
+    else:
+        return True
+    if not broker_symbols:
+        return False
+    if symbol in broker_symbols:
+        return True
+    if gsd.gap_config:
+        symbol_normalized = re.sub(r'[^a-zA-Z0-9]', '', symbol.lower().strip())
+        for alias_lower in gsd.gap_config_reverse_map:
+            if symbol_normalized.startswith(alias_lower):
+                return True
+    return False
+
+
+def set_filter(selection, enabled=True):
+    gsd.symbol_filter_settings['enabled'] = enabled
+    gsd.symbol_filter_settings['selection'] = selection
+
+
+def test_compiled_filter_matches_linear():
+    load_real_gap_config()
+    rng = random.Random(15)
+    aliases = [alias for alias in gsd.gap_config_reverse_map if alias]
+    symbols = [rng.choice(aliases).upper() + rng.choice(['', '.m', '_ra', '#', '-spot']) for _ in range(400)]
+    symbols += [''.join(rng.choice('abcxyz0123.') for _ in range(rng.randint(3, 8))) for _ in range(100)]
+    brokers = ['Exness', 'ICMarkets', 'Pepper', 'Unknown']
+    selections = [
+        {},
+        {'Exness': symbols[:50], 'ICMarkets': [], 'Pepper': None},
+        {'Exness': symbols[:5], '*': ['XYZ', symbols[10]]},
+        {'*': []},
+    ]
+    checked = 0
+    try:
+        for selection in selections:
+            set_filter(selection)
+            for broker in brokers:
+                for symbol in symbols:
+                    expected = linear_is_selected(broker, symbol)
+                    assert gsd.is_symbol_selected_for_detection(broker, symbol) == expected, (selection.keys(), broker, symbol)
+                    # Lần 2 lấy từ quyết định đã nhớ
+                    assert gsd.is_symbol_selected_for_detection(broker, symbol) == expected
+                    checked += 1
+
+        # Không có gap_config → chỉ exact match
+        clear_gap_config()
+        set_filter(selections[1])
+        for symbol in symbols[:100]:
+            assert gsd.is_symbol_selected_for_detection('Exness', symbol) == linear_is_selected('Exness', symbol)
+    finally:
+        set_filter({}, enabled=False)
+        clear_gap_config()
+    print(f"   ✓ {checked} quyết định giống cách kiểm tra cũ")
+
+
+def test_invalidation_and_memo():
+    clear_gap_config()
+    gsd.gap_config['EURUSD'] = {'aliases': [], 'default_gap_percent': 0.1, 'custom_gap': 1}
+    gsd.gap_config_reverse_map['eurusd'] = 'EURUSD'
+    try:
+        set_filter({'Exness': ['XAUUSD']})
+        assert gsd.is_symbol_selected_for_detection('Exness', 'EURUSD.m')
+        assert not gsd.is_symbol_selected_for_detection('Exness', 'GBPUSD.m')
+        compiled = gsd.compiled_symbol_filter
+        assert ('Exness', 'GBPUSD.m') in compiled.decisions
+        assert gsd.get_compiled_symbol_filter() is compiled  # Không đổi gì → không biên dịch lại
+
+        # gap_config đổi (reverse_map sửa trực tiếp) → biên dịch lại
+        gsd.gap_config['GBPUSD'] = {'aliases': [], 'default_gap_percent': 0.1, 'custom_gap': 1}
+        gsd.gap_config_reverse_map['gbpusd'] = 'GBPUSD'
+        assert gsd.is_symbol_selected_for_detection('Exness', 'GBPUSD.m')
+        assert gsd.compiled_symbol_filter is not compiled
+
+        # Selection mới (như save_symbol_filter_settings_ui) → biên dịch lại
+        set_filter({'Exness': []})
+        assert not gsd.is_symbol_selected_for_detection('Exness', 'EURUSD.m')
+
+        # Invalidate thủ công (sửa list tại chỗ)
+        set_filter({'Exness': ['XAUUSD']})
+        assert not gsd.is_symbol_selected_for_detection('Exness', 'USDJPY')
+        gsd.symbol_filter_settings['selection']['Exness'].append('USDJPY')
+        gsd.invalidate_symbol_filter_cache()
+        assert gsd.is_symbol_selected_for_detection('Exness', 'USDJPY')
+
+        # Tắt filter → cho qua tất cả, không cần biên dịch
+        gsd.symbol_filter_settings['enabled'] = False
+        assert gsd.is_symbol_selected_for_detection('Exness', 'ANYTHING')
+
+        # Không còn log INFO cho mỗi symbol được chấp nhận qua prefix
+        set_filter({'Exness': ['XAUUSD']})
+        with mock.patch.object(gsd.logger, 'info') as info:
+            for _ in range(100):
+                assert gsd.is_symbol_selected_for_detection('Exness', 'EURUSD.ra')
+        assert info.call_count == 0
+    finally:
+        set_filter({}, enabled=False)
+        clear_gap_config()
+    print("   ✓ Nhớ quyết định, biên dịch lại khi selection/gap_config đổi, không log mỗi lần chấp nhận")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING COMPILED SYMBOL FILTER")
+    print("=" * 60)
+    test_compiled_filter_matches_linear()
+    test_invalidation_and_memo()
+    print("=" * 60)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Symbol Match Audit (symbol_match_audit.py)
+- Gom symbols từ file ghi traffic (JSON + v2 register) và dump market_data (/api/market_symbols)
+- Mỗi symbol: mức khớp, alias, symbol chuẩn, bảng Point/Percent + lý do giống prepare_ingest
+- Symbol mơ hồ: nhiều symbol chuẩn cùng khớp (prefix/subsequence)
+- Ghi báo cáo CSV/JSON
+"""
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import gap_spike_detector as gsd
+from benchmark_ingest import encode_json_body, make_getdata_v4_payload, make_v2_payloads
+from symbol_match_audit import audit, collect_from_dump, collect_pairs, write_csv, write_json
+from testing_helpers import clear_gap_config, load_real_gap_config, setup
+
+
+def set_test_config():
+    clear_gap_config()
+    for symbol_chuan, aliases in (('EURUSD', []), ('BTC', []), ('BTCUSD', ['XBTUSD']), ('XAUUSD', ['GOLD'])):
+        gsd.gap_config[symbol_chuan] = {'aliases': aliases, 'default_gap_percent': 0.1, 'custom_gap': 1}
+        for alias in [symbol_chuan] + aliases:
+            gsd.gap_config_reverse_map[alias.lower()] = symbol_chuan
+
+
+def test_audit_levels_routes_and_ambiguity():
+    set_test_config()
+    pairs = [('Audit-A', 'EURUSD'), ('Audit-A', 'BTCUSD.m'), ('Audit-A', 'XAU_USD_x'),
+             ('Audit-A', 'ZZZ.unknown'), ('Audit-B', 'BTCUSD.m'), ('Audit-B', 'XBTUSD')]
+    try:
+        with mock.patch.dict(gsd.custom_thresholds, {'Audit-A_EURUSD': {'gap_point': 5}}), \
+                mock.patch.dict(gsd.gap_settings, {'Audit-B_BTCUSD.m': 0.2}):
+            rows, summary = audit(pairs)
+        by_pair = {(row['broker'], row['symbol']): row for row in rows}
+
+        row = by_pair[('Audit-A', 'EURUSD')]
+        assert (row['level'], row['symbol_chuan'], row['route_reason']) == ('exact', 'EURUSD', 'custom_point')
+        row = by_pair[('Audit-A', 'BTCUSD.m')]
+        assert (row['level'], row['symbol_chuan'], row['route']) == ('prefix', 'BTCUSD', 'point')
+        # 'btcusd' và 'btc' cùng là prefix → mơ hồ (alias dài nhất thắng)
+        assert row['ambiguous'] and [c[2] for c in row['candidates']] == ['BTCUSD', 'BTC']
+        assert by_pair[('Audit-B', 'BTCUSD.m')]['route_reason'] == 'settings_percent'
+        assert by_pair[('Audit-B', 'XBTUSD')]['matched_alias'] == 'XBTUSD'
+        assert not by_pair[('Audit-B', 'XBTUSD')]['ambiguous']
+        row = by_pair[('Audit-A', 'XAU_USD_x')]
+        assert (row['level'], row['symbol_chuan']) == ('subsequence', 'XAUUSD')
+        row = by_pair[('Audit-A', 'ZZZ.unknown')]
+        assert (row['level'], row['route_reason'], row['candidates']) == ('none', 'no_config', [])
+
+        assert summary['levels'] == {'exact': 2, 'prefix': 2, 'subsequence': 1, 'none': 1}
+        assert summary['ambiguous'] == 2 and summary['brokers'] == 2
+        assert summary['p50_us'] <= summary['p95_us'] <= summary['max_us']
+
+        # Kết quả giống find_symbol_config(), mức khớp giống symbol_match_levels
+        for row in rows:
+            assert gsd.find_symbol_config(row['symbol'])[::2] == (row['symbol_chuan'], row['matched_alias'])
+
+        folder = tempfile.mkdtemp()
+        try:
+            write_csv(rows, os.path.join(folder, 'audit.csv'))
+            write_json(rows, summary, os.path.join(folder, 'audit.json'))
+            with open(os.path.join(folder, 'audit.csv'), encoding='utf-8', newline='') as f:
+                written = list(csv.DictReader(f))
+            assert len(written) == len(rows) and written[1]['candidates'] == 'prefix:btcusd→BTCUSD, prefix:btc→BTC'
+            with open(os.path.join(folder, 'audit.json'), encoding='utf-8') as f:
+                assert json.load(f)['summary']['ambiguous'] == 2
+        finally:
+            shutil.rmtree(folder)
+    finally:
+        clear_gap_config()
+    print(f"   ✓ {summary['symbols']} symbols: mức khớp, bảng Point/Percent + lý do, {summary['ambiguous']} mơ hồ")
+
+
+def test_collect_from_recording_and_dump():
+    setup()
+    folder = tempfile.mkdtemp()
+    recorder = gsd.TrafficRecorder({'enabled': False, 'folder': folder, 'max_file_mb': 64, 'max_files': 20})
+    payload = make_getdata_v4_payload(5, seed=19, broker='Audit-Rec', timestamp=1733788800)
+    register, tick = make_v2_payloads(make_getdata_v4_payload(3, seed=20, broker='Audit-V2', timestamp=1733788800))
+    recorder.start()
+    recorder.record('receive_data', encode_json_body(payload), received_at=1733788800.0)
+    recorder.record('v2/register_symbols', encode_json_body(register), received_at=1733788800.5)
+    recorder.record('v2/receive_data', encode_json_body(tick), received_at=1733788801.0)
+    recorder.stop()
+    try:
+        pairs = collect_pairs([folder])
+        assert len(pairs) == 8
+        assert {broker for broker, _ in pairs} == {'Audit-Rec', 'Audit-V2'}
+
+        # Dump từ server đang chạy: GET /api/market_symbols
+        client = gsd.app.test_client()
+        payload['timestamp'] = int(time.time())  # Dữ liệu cũ bị cleanup khỏi market_data
+        assert client.post('/api/receive_data', json=payload).status_code == 200
+        dump = client.get('/api/market_symbols').get_json()
+        assert dump['Audit-Rec'] == sorted(entry['symbol'] for entry in payload['data'])
+        dumped = set()
+        collect_from_dump(dump, dumped)
+        collect_from_dump({'Audit-Dict': {'EURUSD': {'bid': 1.1}}}, dumped)
+        assert {pair for pair in pairs if pair[0] == 'Audit-Rec'} <= dumped
+        assert ('Audit-Dict', 'EURUSD') in dumped
+    finally:
+        gsd.broker_partitions.pop('Audit-Rec', None)
+        gsd.market_data.pop('Audit-Rec', None)
+        shutil.rmtree(folder)
+    print(f"   ✓ Gom {len(pairs)} symbols từ file ghi traffic, dump /api/market_symbols")
+
+
+def test_real_config_matches_find_symbol_config():
+    load_real_gap_config()
+    try:
+        symbols = ['BTCUSD.m', 'XAUUSD-spot', 'US30.cash', 'EURUSD', 'ZZZ.unknown']
+        rows, summary = audit([('Audit-Real', symbol) for symbol in symbols])
+        for row in rows:
+            assert gsd.symbol_match_levels[row['symbol']] == row['level']
+            assert gsd.symbol_config_cache[row['symbol']][::2] == (row['symbol_chuan'], row['matched_alias'])
+            if row['level'] != 'none':
+                assert row['candidates'], row['symbol']
+    finally:
+        clear_gap_config()
+    print(f"   ✓ File txt thật: {summary['levels']}")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING SYMBOL MATCH AUDIT")
+    print("=" * 60)
+    test_audit_levels_routes_and_ambiguity()
+    test_collect_from_recording_and_dump()
+    test_real_config_matches_find_symbol_config()
+    print("=" * 60)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Symbol Match Cache
+- Kết quả find_symbol_config() (symbol_chuan, alias, mức độ khớp) lưu xuống file
+- Khởi động lại: nạp lại cache, không phải dò lại
+- Nội dung THAM_SO_GAP_INDICATOR.txt thay đổi → chỉ bỏ kết quả bị ảnh hưởng, lưu lại kèm hash mới
+"""
+
+import shutil
+import tempfile
+
+import gap_spike_detector as gsd
+from testing_helpers import clear_gap_config, use_temp_files
+
+SYMBOLS = ['BTCUSD', 'btcusd.m', 'XAUUSD-spot', 'US100Cash', 'AVAXUSD_x', 'ETHUSDTPERP', 'ZZZ.unknown', '#NOPE']
+
+
+def test_cache_survives_restart():
+    folder = tempfile.mkdtemp()
+    original = use_temp_files(folder)
+    try:
+        gsd.load_gap_config_file()
+        results = {symbol: gsd.find_symbol_config(symbol) for symbol in SYMBOLS}
+        levels = dict(gsd.symbol_match_levels)
+        assert set(levels.values()) >= {'exact', 'prefix', 'none'}, levels
+        gsd.save_symbol_match_cache()
+
+        # Khởi động lại: load_gap_config_file() nạp luôn cache matching
+        gsd.symbol_config_cache.clear()
+        gsd.symbol_match_levels.clear()
+        gsd.load_gap_config_file()
+        assert gsd.symbol_match_levels == levels
+        assert {symbol: gsd.symbol_config_cache[symbol] for symbol in SYMBOLS} == results
+        for symbol, (symbol_chuan, config, _) in results.items():
+            if symbol_chuan is not None:
+                assert gsd.symbol_config_cache[symbol][1] is gsd.gap_config[symbol_chuan]
+        assert not gsd.reload_gap_config_if_changed()
+        print(f"   ✓ {len(SYMBOLS)} kết quả matching nạp lại sau khởi động ({sorted(set(levels.values()))})")
+
+        # File config đổi nội dung → chỉ bỏ kết quả bị ảnh hưởng (NEWALIAS không liên quan SYMBOLS)
+        with open(gsd.GAP_CONFIG_FILE, 'a', encoding='utf-8') as f:
+            f.write('\nNEWSYM;NEWALIAS;0.1;5\n')
+        assert gsd.reload_gap_config_if_changed()
+        assert 'NEWSYM' in gsd.gap_config
+        assert {symbol: gsd.symbol_config_cache[symbol] for symbol in SYMBOLS} == results
+        assert gsd.find_symbol_config('newalias.m')[::2] == ('NEWSYM', 'NEWALIAS')
+        gsd.save_symbol_match_cache()
+        gsd.symbol_config_cache.clear()
+        gsd.load_gap_config_file()
+        assert set(gsd.symbol_config_cache) == set(SYMBOLS) | {'newalias.m'}
+        print("   ✓ THAM_SO_GAP_INDICATOR.txt thay đổi → giữ kết quả không bị ảnh hưởng, lưu kèm hash mới")
+
+        # File cache hỏng → bỏ qua, không lỗi
+        with open(gsd.SYMBOL_MATCH_CACHE_FILE, 'w', encoding='utf-8') as f:
+            f.write('{broken')
+        gsd.load_gap_config_file()
+        assert gsd.symbol_config_cache == {}
+        print("   ✓ File cache hỏng được bỏ qua")
+    finally:
+        gsd.GAP_CONFIG_FILE, gsd.SYMBOL_MATCH_CACHE_FILE = original
+        gsd.pending_writes['symbol_match_cache'] = False
+        clear_gap_config()
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING SYMBOL MATCH CACHE")
+    print("=" * 60)
+    test_cache_survives_restart()
+    print("=" * 60)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Symbol Registry
+- Mỗi (broker, symbol) có 1 ID số nguyên + 1 key "broker_symbol" duy nhất, tra ngược được
+- Broker có dấu '_' trong tên: tách key + route partition đúng broker (không split ở '_' đầu tiên)
+- Nhiều thread đăng ký cùng lúc → cùng 1 ID cho mỗi cặp
+"""
+
+import threading
+import time
+from unittest import mock
+
+import gap_spike_detector as gsd
+from benchmark_ingest import make_getdata_v4_payload
+from testing_helpers import setup
+
+
+def test_intern_and_reverse_lookup():
+    registry = gsd.SymbolRegistry()
+    first = registry.intern('Exness', 'EURUSD')
+    assert registry.intern('Exness', 'EURUSD') == first
+    assert registry.intern('Exness', 'GBPUSD') == first + 1
+    key = registry.key('Exness', 'EURUSD')
+    assert key == 'Exness_EURUSD' and registry.key('Exness', 'EURUSD') is key
+    assert registry.key_of(first) is key and registry.pair_of(first) == ('Exness', 'EURUSD')
+    assert registry.id_of_key('Exness_EURUSD') == first
+    assert registry.pair_of_key('Exness_XAUUSD') is None and len(registry) == 2
+    print("   ✓ ID ổn định, key dùng chung 1 object, tra ngược ID/key → (broker, symbol)")
+
+
+def test_underscore_broker_names():
+    setup()
+    gsd.get_broker_partition('RegIC')  # Broker ngắn hơn có cùng prefix
+    key = gsd.symbol_key('RegIC_Markets', 'EUR_USD')
+    assert gsd.split_symbol_key(key) == ('RegIC_Markets', 'EUR_USD')
+    # Partition RegIC_Markets chưa có → vẫn route đúng broker đã đăng ký (không rơi vào 'RegIC')
+    assert gsd.partition_for_key(key) is None
+    assert gsd.partition_for_key(key, create=True).broker == 'RegIC_Markets'
+
+    # Key chưa đăng ký (vd đọc từ file settings) → broker dài nhất đang có partition
+    assert gsd.split_symbol_key('RegIC_Markets_XAUUSD') == ('RegIC_Markets', 'XAUUSD')
+    assert 'RegIC_Markets_XAUUSD' not in gsd._key_partition_cache  # Chỉ cache key đã đăng ký
+    # Không broker nào khớp → không đoán theo dấu '_' đầu tiên, không tạo partition
+    for unknown in ('RegOther_Broker_US30', 'nounderscore'):
+        try:
+            gsd.split_symbol_key(unknown)
+            assert False, "ValueError expected"
+        except ValueError:
+            pass
+    assert gsd.partition_for_key('RegOther_Broker_US30', create=True) is None
+    try:
+        gsd.bid_tracking['RegOther_Broker_US30'] = {'last_bid': 1.0}
+        assert False, "KeyError expected"
+    except KeyError:
+        pass
+    assert 'RegOther' not in gsd.broker_partitions
+    gsd.broker_partitions.pop('RegIC', None)
+    gsd.broker_partitions.pop('RegIC_Markets', None)
+    gsd._key_partition_cache.clear()
+    print("   ✓ Broker có dấu '_': tách key và route partition đúng")
+
+
+def test_ingest_uses_registered_keys():
+    setup()
+    client = gsd.app.test_client()
+    payload = make_getdata_v4_payload(20, seed=17, broker="Reg_Broker_A", timestamp=int(time.time()))
+    assert client.post('/api/receive_data', json=payload).status_code == 200
+
+    partition = gsd.broker_partitions['Reg_Broker_A']
+    assert len(partition.bid_tracking) == 20
+    for key in partition.bid_tracking:
+        assert key is gsd.symbol_key('Reg_Broker_A', gsd.split_symbol_key(key)[1])
+    assert gsd.split_symbol_key('Reg_Broker_A_SYM0003.m') == ('Reg_Broker_A', 'SYM0003.m')
+
+    # Ẩn alert / ngưỡng theo broker có dấu '_' (không ghi hidden_alert_items.json)
+    with mock.patch.object(gsd, 'save_hidden_alert_items'):
+        gsd.hide_alert_item('Reg_Broker_A', 'SYM0003.m', duration_minutes=5)
+        try:
+            assert gsd.is_alert_hidden('Reg_Broker_A', 'SYM0003.m')
+        finally:
+            gsd.hidden_alert_items.pop('Reg_Broker_A_SYM0003.m', None)
+    assert gsd.get_threshold('Reg_Broker_A', 'SYM0003.m', 'gap') == gsd.get_threshold_for_display(
+        'Reg_Broker_A', 'SYM0003.m', 'gap')
+    gsd.broker_partitions.pop('Reg_Broker_A', None)
+    gsd._key_partition_cache.clear()
+    print("   ✓ Ingest dùng key đã đăng ký, hide/threshold đúng với broker có dấu '_'")
+
+
+def test_concurrent_intern():
+    registry = gsd.SymbolRegistry()
+    results = []
+
+    def worker():
+        results.append([registry.intern(f"B{i % 7}", f"S{i}") for i in range(2000)])
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(ids == results[0] for ids in results)
+    assert len(registry) == 2000 and sorted(results[0]) == list(range(2000))
+    print("   ✓ 4 thread đăng ký cùng lúc → cùng ID, không trùng")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING SYMBOL REGISTRY")
+    print("=" * 60)
+    test_intern_and_reverse_lookup()
+    test_underscore_broker_names()
+    test_ingest_uses_registered_keys()
+    test_concurrent_intern()
+    print("=" * 60)
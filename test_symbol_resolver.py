@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Bulk Symbol Resolution
+- Payload đầu của broker mới: ingest chỉ dò exact match, phần còn lại dò theo lô trên symbol_resolver
+- Kết quả dò theo lô giống hệt find_symbol_config()
+- Chính sách tạm 'skip': chưa tính Gap/Spike cho symbol chưa dò xong
+- Chính sách tạm 'percent': tính theo %, dò xong thì bỏ kết quả tạm → lượt sau vào bảng Point
+  (kể cả kết quả tạm commit sau khi dò xong: lưu vào bảng Point thì bỏ key ở bảng Percent)
+- Config đổi (hot reload) trong lúc dò → lô được dò lại trên config mới
+"""
+
+import random
+import time
+
+import gap_spike_detector as gsd
+from benchmark_symbol_matching import collect_broker_symbols, linear_find_symbol_config
+from testing_helpers import clear_gap_config, load_real_gap_config, make_real_symbol_payload, post, setup
+
+
+def test_first_contact_resolved_in_bulk():
+    setup()
+    load_real_gap_config()
+    gsd.ASYNC_SYMBOL_RESOLVE = True
+    client = gsd.app.test_client()
+    symbols = collect_broker_symbols()
+    now = int(time.time())
+    try:
+        first_ms = post(client, make_real_symbol_payload(symbols, 'Resolve-Broker', now))
+        partition = gsd.broker_partitions['Resolve-Broker']
+        exact = [s for s in symbols if s.lower().strip() in gsd.gap_config_reverse_map]
+        # 'skip': chỉ symbol exact match có kết quả ở lượt đầu, các symbol khác vẫn có bid tracking
+        stored = len(partition.gap_spike_results) + len(partition.gap_spike_point_results)
+        assert len(partition.bid_tracking) == len(symbols)
+        assert stored >= len(exact) and stored < len(symbols)
+
+        assert gsd.symbol_resolver.wait(timeout=60)
+        stats = gsd.symbol_resolver.get_stats()
+        assert stats['pending'] == 0 and stats['submitted'] > 0
+        assert all(symbol in gsd.symbol_config_cache for symbol in symbols)
+        for symbol in random.Random(18).sample(symbols, min(300, len(symbols))):
+            assert gsd.symbol_config_cache[symbol] == linear_find_symbol_config(symbol), symbol
+
+        second_ms = post(client, make_real_symbol_payload(symbols, 'Resolve-Broker', now + 1))
+        stored = len(partition.gap_spike_results) + len(partition.gap_spike_point_results)
+        assert stored == len(symbols)
+        print(f"   ✓ {len(symbols)} symbols: lượt đầu {first_ms:.0f} ms ({len(exact)} exact), "
+              f"dò theo lô {stats['batches']} lô, lượt sau {second_ms:.0f} ms đủ kết quả")
+    finally:
+        gsd.ASYNC_SYMBOL_RESOLVE = False
+        gsd.broker_partitions.pop('Resolve-Broker', None)
+        clear_gap_config()
+
+
+def test_percent_interim_policy():
+    setup()
+    load_real_gap_config()
+    gsd.ASYNC_SYMBOL_RESOLVE = True
+    gsd.SYMBOL_RESOLVE_INTERIM_POLICY = 'percent'
+    client = gsd.app.test_client()
+    symbols = ['BTCUSD.m', 'XAUUSD-spot', 'ZZZ.unknown']
+    now = int(time.time())
+    try:
+        post(client, make_real_symbol_payload(symbols, 'Interim-Broker', now))
+        partition = gsd.broker_partitions['Interim-Broker']
+        assert sorted(result['symbol'] for result in partition.gap_spike_results.values()) == sorted(symbols)
+        assert partition.gap_spike_point_results == {}
+
+        assert gsd.symbol_resolver.wait(timeout=30)
+        # Symbol có config: kết quả tạm theo % bị bỏ, symbol không có config giữ nguyên
+        assert [result['symbol'] for result in partition.gap_spike_results.values()] == ['ZZZ.unknown']
+
+        post(client, make_real_symbol_payload(symbols, 'Interim-Broker', now + 1))
+        assert sorted(result['symbol'] for result in partition.gap_spike_point_results.values()) == ['BTCUSD.m', 'XAUUSD-spot']
+        print("   ✓ 'percent': tính theo % khi chờ, dò xong chuyển sang bảng Point")
+    finally:
+        gsd.ASYNC_SYMBOL_RESOLVE = False
+        gsd.SYMBOL_RESOLVE_INTERIM_POLICY = 'skip'
+        gsd.broker_partitions.pop('Interim-Broker', None)
+        clear_gap_config()
+
+
+def test_late_interim_commit_replaced_by_point():
+    setup()
+    load_real_gap_config()
+    gsd.ASYNC_SYMBOL_RESOLVE = True
+    gsd.SYMBOL_RESOLVE_INTERIM_POLICY = 'percent'
+    client = gsd.app.test_client()
+    symbols = ['BTCUSD.m', 'XAUUSD-spot', 'ZZZ.unknown']
+    broker = 'Interim-Late'
+    now = int(time.time())
+    try:
+        # prepare_ingest tính kết quả tạm theo %, symbol_resolver dò xong TRƯỚC khi commit
+        plan = gsd.prepare_ingest(broker, now, make_real_symbol_payload(symbols, broker, now)['data'])
+        assert gsd.symbol_resolver.wait(timeout=30)
+        partition = gsd.get_broker_partition(broker)
+        with partition.lock.section('receive_data'):
+            gsd.commit_ingest(plan)
+        assert len(partition.gap_spike_results) == 3  # Kết quả tạm đã lỡ commit
+
+        post(client, make_real_symbol_payload(symbols, broker, now + 1))
+        assert sorted(result['symbol'] for result in partition.gap_spike_point_results.values()) == ['BTCUSD.m', 'XAUUSD-spot']
+        assert [result['symbol'] for result in partition.gap_spike_results.values()] == ['ZZZ.unknown']
+        print("   ✓ Kết quả tạm commit sau khi dò xong → lượt sau chỉ còn ở bảng Point")
+    finally:
+        gsd.ASYNC_SYMBOL_RESOLVE = False
+        gsd.SYMBOL_RESOLVE_INTERIM_POLICY = 'skip'
+        gsd.broker_partitions.pop(broker, None)
+        clear_gap_config()
+
+
+def test_config_swap_during_batch_retries():
+    load_real_gap_config()
+    rng = random.Random(18)
+    symbols = rng.sample(collect_broker_symbols(), 50)
+    original_compute = gsd.compute_symbol_match
+    calls = []
+
+    def compute_and_swap(*args):
+        if not calls:
+            # Hot reload giữa chừng: reverse_map mới (cùng nội dung) → kết quả lô cũ không được ghi
+            with gsd.gap_config_lock:
+                gsd.swap_gap_config(gsd.gap_config, dict(gsd.gap_config_reverse_map), None,
+                                    gsd.symbol_config_cache, gsd.symbol_match_levels)
+        calls.append(args[0])
+        return original_compute(*args)
+
+    gsd.compute_symbol_match = compute_and_swap
+    try:
+        retried = gsd.symbol_resolver.get_stats()['retried']
+        gsd.symbol_resolver.submit(symbols)
+        assert gsd.symbol_resolver.wait(timeout=30)
+        assert gsd.symbol_resolver.get_stats()['retried'] == retried + 1
+        assert len(calls) == 2 * len(symbols)
+        for symbol in symbols:
+            assert gsd.symbol_config_cache[symbol] == linear_find_symbol_config(symbol), symbol
+        print("   ✓ Config đổi trong lúc dò → lô được dò lại trên config mới")
+    finally:
+        gsd.compute_symbol_match = original_compute
+        clear_gap_config()
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING BULK SYMBOL RESOLUTION")
+    print("=" * 60)
+    test_first_contact_resolved_in_bulk()
+    test_percent_interim_policy()
+    test_late_interim_commit_replaced_by_point()
+    test_config_swap_during_batch_retries()
+    print("=" * 60)
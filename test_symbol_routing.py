@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Cached Point/Percent Routing
+- Route (config + bảng Point/Percent) tính 1 lần cho mỗi (broker, symbol), lưu ở partition.routes
+- Sửa ngưỡng (custom_thresholds gap_point, gap_settings Broker_Symbol) → chỉ bỏ route của key đó,
+  lượt ingest sau xếp symbol vào đúng bảng
+- Load lại THAM_SO_GAP_INDICATOR.txt → chỉ bỏ route của symbols có kết quả matching đổi
+  (không đăng ký key broker_symbol mới vào symbol_registry)
+- Route tính trên settings/config cũ (invalidate giữa chừng) hoặc config chưa dò xong không được lưu
+"""
+
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import gap_spike_detector as gsd
+from testing_helpers import (ROUTE_SYMBOLS, clear_gap_config, make_real_symbol_payload, post, set_route_config,
+                             setup, tables, use_temp_files, write_lines)
+
+BROKER = 'Route-Broker'
+
+
+def cleanup():
+    gsd.broker_partitions.pop(BROKER, None)
+    gsd.broker_partitions.pop('Route-Broker-Idle', None)
+    gsd._key_partition_cache.clear()
+    clear_gap_config()
+
+
+def test_route_computed_once_per_symbol():
+    setup()
+    set_route_config()
+    client = gsd.app.test_client()
+    now = int(time.time())
+    try:
+        post(client, make_real_symbol_payload(ROUTE_SYMBOLS, BROKER, now))
+        partition = gsd.broker_partitions[BROKER]
+        assert tables(partition) == (['EURUSD.m', 'XAUUSD.m'], ['GBPUSD.m', 'QQQTEST2', 'ZZZTEST1'])
+        route = partition.routes[gsd.symbol_key(BROKER, 'EURUSD.m')]
+        assert (route.symbol_chuan, route.is_point_based, route.reason) == ('EURUSD', True, 'txt_config')
+        assert partition.routes[gsd.symbol_key(BROKER, 'ZZZTEST1')].reason == 'no_config'
+
+        with mock.patch.object(gsd, 'get_calculation_route', wraps=gsd.get_calculation_route) as route_calls, \
+                mock.patch.object(gsd, 'lookup_symbol_config', wraps=gsd.lookup_symbol_config) as lookups:
+            for i in range(1, 4):
+                post(client, make_real_symbol_payload(ROUTE_SYMBOLS, BROKER, now + i))
+        assert route_calls.call_count == 0 and lookups.call_count == 0
+        assert tables(partition) == (['EURUSD.m', 'XAUUSD.m'], ['GBPUSD.m', 'QQQTEST2', 'ZZZTEST1'])
+    finally:
+        cleanup()
+    print(f"   ✓ {len(ROUTE_SYMBOLS)} symbols: route tính 1 lần, 3 lượt ingest sau không tính lại")
+
+
+def test_threshold_edits_reroute_only_edited_keys():
+    setup()
+    set_route_config()
+    client = gsd.app.test_client()
+    now = int(time.time())
+    key_gbp = gsd.symbol_key(BROKER, 'GBPUSD.m')
+    key_xau = gsd.symbol_key(BROKER, 'XAUUSD.m')
+    try:
+        with mock.patch.dict(gsd.custom_thresholds), mock.patch.dict(gsd.gap_settings), \
+                mock.patch.object(gsd, 'save_custom_thresholds'):
+            post(client, make_real_symbol_payload(ROUTE_SYMBOLS, BROKER, now))
+            partition = gsd.broker_partitions[BROKER]
+            kept = dict(partition.routes)
+
+            # Point thủ công cho GBPUSD.m (sửa lồng trong custom_thresholds)
+            gsd.custom_thresholds[key_gbp] = {}
+            gsd.custom_thresholds[key_gbp]['gap_point'] = 50.0
+            # XAUUSD.m chuyển sang Percent bằng gap_settings[Broker_Symbol]
+            gsd.gap_settings[key_xau] = 0.4
+            assert set(partition.routes) == set(kept) - {key_gbp, key_xau}
+            assert all(partition.routes[key] is kept[key] for key in partition.routes)
+
+            post(client, make_real_symbol_payload(ROUTE_SYMBOLS, BROKER, now + 1))
+            assert partition.routes[key_gbp].reason == 'custom_point'
+            assert partition.routes[key_xau].reason == 'settings_percent'
+            point, percent = tables(partition)
+            assert 'GBPUSD.m' in point and 'XAUUSD.m' in percent
+    finally:
+        cleanup()
+    print("   ✓ Sửa ngưỡng → chỉ bỏ route của key đã sửa, lượt sau vào đúng bảng")
+
+
+def test_config_reload_reroutes_affected_symbols():
+    setup()
+    folder = tempfile.mkdtemp()
+    original = use_temp_files(folder)
+    client = gsd.app.test_client()
+    now = int(time.time())
+    try:
+        write_lines(['EURUSD;0.1;5', 'XAUUSD;0.1;5'])
+        gsd.load_gap_config_file()
+        post(client, make_real_symbol_payload(ROUTE_SYMBOLS, BROKER, now))
+        partition = gsd.broker_partitions[BROKER]
+        assert len(partition.routes) == len(ROUTE_SYMBOLS)
+
+        write_lines(['EURUSD;0.1;5', 'XAUUSD;0.1;5', 'GBPUSD;0.1;5'])
+        gsd.get_broker_partition('Route-Broker-Idle')  # Broker chưa nhận GBPUSD.m
+        registered = len(gsd.symbol_registry)
+        assert gsd.reload_gap_config_if_changed()
+        # Chỉ bỏ route đang có, không đăng ký cặp broker × symbol chưa từng nhận dữ liệu
+        assert len(gsd.symbol_registry) == registered
+        assert gsd.symbol_key(BROKER, 'GBPUSD.m') not in partition.routes
+        assert gsd.symbol_key(BROKER, 'EURUSD.m') in partition.routes
+
+        post(client, make_real_symbol_payload(ROUTE_SYMBOLS, BROKER, now + 1))
+        assert tables(partition)[0] == ['EURUSD.m', 'GBPUSD.m', 'XAUUSD.m']
+
+        # Load toàn bộ → bỏ tất cả
+        gsd.load_gap_config_file()
+        assert partition.routes == {}
+    finally:
+        gsd.GAP_CONFIG_FILE, gsd.SYMBOL_MATCH_CACHE_FILE = original
+        gsd.pending_writes['symbol_match_cache'] = False
+        cleanup()
+        shutil.rmtree(folder)
+    print("   ✓ Hot reload config → chỉ symbols đổi kết quả matching được xếp lại bảng")
+
+
+def test_stale_or_pending_routes_not_stored():
+    set_route_config()
+    partition = gsd.get_broker_partition(BROKER)
+    original_lookup = gsd.lookup_symbol_config
+
+    def lookup_then_edit(symbol):
+        result = original_lookup(symbol)
+        gsd.invalidate_symbol_routes(keys=[gsd.symbol_key(BROKER, symbol)])  # Sửa ngưỡng giữa chừng
+        return result
+
+    try:
+        with mock.patch.object(gsd, 'lookup_symbol_config', lookup_then_edit):
+            route, pending = gsd.get_symbol_route(BROKER, 'EURUSD.m')
+        assert route.is_point_based and not pending
+        assert gsd.symbol_key(BROKER, 'EURUSD.m') not in partition.routes
+
+        gsd.ASYNC_SYMBOL_RESOLVE = True
+        with mock.patch.object(gsd, 'lookup_symbol_config', return_value=((None, None, None), True)):
+            route, pending = gsd.get_symbol_route(BROKER, 'EURUSDX.m')
+        assert pending and not route.is_point_based
+        assert partition.routes == {}
+
+        assert gsd.get_symbol_route(BROKER, 'EURUSD.m')[0].is_point_based
+        assert gsd.symbol_key(BROKER, 'EURUSD.m') in partition.routes
+    finally:
+        gsd.ASYNC_SYMBOL_RESOLVE = False
+        cleanup()
+    print("   ✓ Route tính trên settings cũ / config chưa dò xong không được lưu")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING CACHED POINT/PERCENT ROUTING")
+    print("=" * 60)
+    test_route_computed_once_per_symbol()
+    test_threshold_edits_reroute_only_edited_keys()
+    test_config_reload_reroutes_affected_symbols()
+    test_stale_or_pending_routes_not_stored()
+    print("=" * 60)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Threshold Table
+- get_threshold()/get_threshold_for_display()/get_threshold_source() đọc từ threshold_table,
+  kết quả giống cách duyệt Broker_Symbol > Broker_* > Symbol > * > Default cũ
+- Sửa gap_settings/spike_settings/custom_thresholds → có hiệu lực ngay (không TTL),
+  chỉ bỏ các ngưỡng phụ thuộc key đã sửa
+- Đọc ngưỡng song song với sửa settings → không giữ lại ngưỡng cũ
+- Timer ghi file chạy song song với replace() → ghi đủ 1 phiên bản, không lỗi "changed size"
+"""
+
+import json
+import os
+import random
+import tempfile
+import threading
+from unittest import mock
+
+import gap_spike_detector as gsd
+
+BROKERS = ['TT-Exness', 'TT-IC_Markets', 'TT-Pepper']
+SYMBOLS = ['EURUSD', 'XAUUSD', 'US30_cash', 'BTCUSD.m', 'GER40']
+
+
+def linear_threshold(broker, symbol, threshold_type):
+    """get_threshold() cũ (không cache)"""
+    settings_dict = gsd.gap_settings if threshold_type == 'gap' else gsd.spike_settings
+    for key in (f"{broker}_{symbol}", f"{broker}_*", symbol, '*'):
+        if key in settings_dict:
+            return settings_dict[key], key
+    return (gsd.DEFAULT_GAP_THRESHOLD if threshold_type == 'gap' else gsd.DEFAULT_SPIKE_THRESHOLD), None
+
+
+def random_settings(rng):
+    keys = ['*'] + SYMBOLS + [f"{b}_*" for b in BROKERS] + [f"{b}_{s}" for b in BROKERS for s in SYMBOLS]
+    return {key: round(rng.uniform(0.01, 2), 3) for key in keys if rng.random() < 0.3}
+
+
+def assert_matches_linear():
+    for broker in BROKERS:
+        for symbol in SYMBOLS:
+            for threshold_type in ('gap', 'spike'):
+                value, source_key = linear_threshold(broker, symbol, threshold_type)
+                assert gsd.get_threshold(broker, symbol, threshold_type) == value, (broker, symbol, threshold_type)
+                assert gsd.get_threshold_for_display(broker, symbol, threshold_type) == float(value)
+                assert gsd.threshold_table.lookup(broker, symbol, threshold_type)[2] == source_key
+
+
+def test_table_matches_linear_lookup():
+    rng = random.Random(20)
+    with mock.patch.dict(gsd.gap_settings, clear=True), mock.patch.dict(gsd.spike_settings, clear=True):
+        for _ in range(30):
+            gsd.gap_settings.replace(random_settings(rng))
+            gsd.spike_settings.replace(random_settings(rng))
+            assert_matches_linear()
+
+        gsd.gap_settings.replace({'TT-Exness_EURUSD': 0.5, 'TT-Exness_*': 0.4, 'XAUUSD': 0.3, '*': 0.2})
+        gsd.spike_settings.replace({})
+        assert gsd.get_threshold_source('TT-Exness', 'EURUSD', 'gap') == "Custom (TT-Exness_EURUSD)"
+        assert gsd.get_threshold_source('TT-Exness', 'GER40', 'gap') == "Broker wildcard (TT-Exness_*)"
+        assert gsd.get_threshold_source('TT-Pepper', 'XAUUSD', 'gap') == "Symbol (XAUUSD)"
+        assert gsd.get_threshold_source('TT-Pepper', 'GER40', 'gap') == "Global wildcard (*)"
+        assert gsd.get_threshold_source('TT-Pepper', 'GER40', 'spike') == "default"
+    print("   ✓ 30 bộ settings ngẫu nhiên: giá trị + nguồn giống cách duyệt cũ")
+
+
+def test_edits_take_effect_immediately():
+    with mock.patch.dict(gsd.gap_settings, {'*': 0.2}, clear=True), \
+            mock.patch.dict(gsd.custom_thresholds, clear=True):
+        assert_matches_linear()
+        resolved = len(gsd.threshold_table)
+        invalidated = gsd.threshold_table.stats['invalidated']
+
+        # Thêm Broker_* → chỉ 5 ngưỡng gap của broker đó bị bỏ
+        gsd.gap_settings['TT-Pepper_*'] = 0.7
+        assert gsd.threshold_table.stats['invalidated'] - invalidated == len(SYMBOLS)
+        assert len(gsd.threshold_table) == resolved - len(SYMBOLS)
+        assert gsd.get_threshold('TT-Pepper', 'EURUSD', 'gap') == 0.7
+        assert gsd.get_threshold('TT-Exness', 'EURUSD', 'gap') == 0.2
+
+        # Xóa / pop / replace chỉ các key khác → có hiệu lực ngay
+        del gsd.gap_settings['TT-Pepper_*']
+        assert gsd.get_threshold('TT-Pepper', 'EURUSD', 'gap') == 0.2
+        gsd.gap_settings.update({'EURUSD': 1.5})
+        assert gsd.get_threshold('TT-Pepper', 'EURUSD', 'gap') == 1.5
+        assert_matches_linear()
+        invalidated = gsd.threshold_table.stats['invalidated']
+        gsd.gap_settings.replace({'*': 0.2, 'EURUSD': 1.5, 'GER40': 0.9})  # Chỉ GER40 đổi
+        assert gsd.threshold_table.stats['invalidated'] - invalidated == len(BROKERS)
+        assert_matches_linear()
+
+        # custom_thresholds lồng: sửa custom_thresholds[key]['gap_point'] tại chỗ
+        assert gsd.threshold_table.lookup('TT-Exness', 'XAUUSD', 'gap_point') == (None, 'none', None)
+        gsd.custom_thresholds['TT-Exness_XAUUSD'] = {}
+        gsd.custom_thresholds['TT-Exness_XAUUSD']['gap_point'] = 25.0
+        assert gsd.threshold_table.lookup('TT-Exness', 'XAUUSD', 'gap_point') == (25.0, 'custom', 'TT-Exness_XAUUSD')
+        del gsd.custom_thresholds['TT-Exness_XAUUSD']['gap_point']
+        assert gsd.threshold_table.lookup('TT-Exness', 'XAUUSD', 'gap_point')[0] is None
+        assert isinstance(gsd.custom_thresholds['TT-Exness_XAUUSD'], gsd.ObservedSettings)
+    assert_matches_linear()  # mock.patch.dict khôi phục settings → bảng cũng theo
+    print("   ✓ Sửa/xóa/replace/custom lồng có hiệu lực ngay, chỉ bỏ ngưỡng phụ thuộc key đã sửa")
+
+
+def test_concurrent_reads_never_keep_stale_value():
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        rng = random.Random(threading.get_ident())
+        while not stop.is_set():
+            try:
+                gsd.get_threshold(rng.choice(BROKERS), rng.choice(SYMBOLS), rng.choice(('gap', 'spike')))
+            except Exception as e:
+                errors.append(e)
+
+    with mock.patch.dict(gsd.gap_settings, clear=True), mock.patch.dict(gsd.spike_settings, clear=True):
+        readers = [threading.Thread(target=reader) for _ in range(3)]
+        for thread in readers:
+            thread.start()
+        rng = random.Random(7)
+        for i in range(300):
+            key = rng.choice(['*', rng.choice(SYMBOLS), f"{rng.choice(BROKERS)}_*"])
+            if i % 4 == 3 and key in gsd.gap_settings:
+                del gsd.gap_settings[key]
+            else:
+                gsd.gap_settings[key] = i
+        stop.set()
+        for thread in readers:
+            thread.join()
+        assert not errors, errors[:3]
+        assert_matches_linear()
+    print("   ✓ 3 thread đọc trong lúc 300 lần sửa settings: ngưỡng cuối cùng đúng")
+
+
+def test_save_during_replace_writes_whole_version():
+    versions = [
+        {f"TT-Save_SYM{i}": {'gap_point': float(i), 'spike_point': float(i) * 2} for i in range(300)},
+        {f"TT-Save_SYM{i}": {'gap_point': float(i) + 0.5} for i in range(0, 300, 2)},
+    ]
+    errors = []
+    stop = threading.Event()
+    path = os.path.join(tempfile.mkdtemp(), 'custom_thresholds.json')
+
+    def saver():
+        while not stop.is_set():
+            try:
+                gsd.save_settings_json('custom_thresholds', path, gsd.custom_thresholds)
+                with open(path, encoding='utf-8') as f:
+                    if json.load(f) not in versions:
+                        errors.append("partial")
+            except Exception as e:
+                errors.append(e)
+
+    with mock.patch.dict(gsd.custom_thresholds), mock.patch.object(gsd, 'settings_store', None):
+        gsd.custom_thresholds.replace(versions[0])
+        thread = threading.Thread(target=saver)
+        thread.start()
+        for i in range(200):
+            gsd.custom_thresholds.replace(versions[i % 2])
+            gsd.custom_thresholds['TT-Save_SYM0']['gap_point'] = 0.0 if i % 2 == 0 else 0.5
+        stop.set()
+        thread.join()
+    assert not errors, errors[:3]
+    print("   ✓ Ghi file song song 200 lần replace(): luôn đủ 1 phiên bản settings")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING THRESHOLD TABLE")
+    print("=" * 60)
+    test_table_matches_linear_lookup()
+    test_edits_take_effect_immediately()
+    test_concurrent_reads_never_keep_stale_value()
+    test_save_during_replace_writes_whole_version()
+    print("=" * 60)
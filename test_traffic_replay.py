@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Traffic Recorder + Replay
+- Ghi body request EA vào file gzip, đọc lại đúng thứ tự
+- Replay qua đường ingest cho kết quả giống lúc nhận trực tiếp
+- Đồng hồ ảo: bid tracking dùng thời điểm nhận gốc, tốc độ x1 giữ đúng khoảng cách giữa các request
+- Xoay vòng file, giữ tối đa max_files
+- stop() rồi start() lại (lưu settings tắt → bật) vẫn ghi được, không chạy 2 writer
+"""
+
+import shutil
+import tempfile
+import time
+
+import gap_spike_detector as gsd
+from benchmark_ingest import encode_json_body, make_getdata_v4_payload, make_v2_payloads
+from replay_traffic import replay
+from testing_helpers import reset_state, setup
+
+
+def result_snapshot():
+    return {key: (r['gap']['detected'], r['spike']['detected'], r['price'])
+            for key, r in gsd.gap_spike_results.items()}
+
+
+def test_record_and_replay_matches_live():
+    setup()
+    folder = tempfile.mkdtemp()
+    recorder = gsd.traffic_recorder
+    default_folder = recorder.settings['folder']
+    recorder.settings['folder'] = folder
+    recorder.start()
+    try:
+        client = gsd.app.test_client()
+        now = int(time.time())
+        payload = make_getdata_v4_payload(60, seed=21, broker="Replay-Broker", timestamp=now)
+        register, tick = make_v2_payloads(payload)
+        assert client.post('/api/receive_data', json=payload).status_code == 200
+        assert client.post('/api/v2/register_symbols', json=register).status_code == 200
+        tick['timestamp'] = now + 1
+        assert client.post('/api/v2/receive_data', json=tick).status_code == 200
+        live = result_snapshot()
+    finally:
+        recorder.stop()
+        recorder.settings['folder'] = default_folder
+
+    files = gsd.list_traffic_recordings(folder)
+    endpoints = [record[1] for path in files for record in gsd.iter_traffic_records(path)]
+    assert endpoints == ['receive_data', 'v2/register_symbols', 'v2/receive_data'], endpoints
+
+    reset_state()
+    report = replay(files)
+    assert report['requests'] == 3 and report['errors'] == 0
+    assert report['symbols'] == 120 and report['brokers'] == ['Replay-Broker']
+    assert result_snapshot() == live
+    assert report['stages']['total']['count'] == 2
+    shutil.rmtree(folder)
+    print(f"   ✓ 3 request ghi/phát lại, {len(live)} kết quả giống lúc nhận trực tiếp")
+
+
+def test_virtual_clock_and_pacing():
+    setup()
+    folder = tempfile.mkdtemp()
+    recorder = gsd.TrafficRecorder({'enabled': False, 'folder': folder, 'max_file_mb': 64, 'max_files': 20})
+    recorded_at = 1733788800.0  # 2024-12-10 00:00:00 UTC
+    recorder.start()
+    for i in range(3):
+        payload = make_getdata_v4_payload(10, seed=i, broker="Clock-Broker", timestamp=int(recorded_at) + i)
+        recorder.record('receive_data', encode_json_body(payload), received_at=recorded_at + i * 0.2)
+    recorder.stop()
+
+    files = gsd.list_traffic_recordings(folder)
+    reset_state()
+    report = replay(files, speed=1)
+    # Đồng hồ ảo = thời điểm nhận gốc → dữ liệu 2024 không bị cleanup coi là cũ
+    tracking = gsd.bid_tracking['Clock-Broker_SYM0000.m']
+    assert tracking['first_seen_time'] == recorded_at
+    assert len(gsd.market_data['Clock-Broker']) == 10
+    assert gsd.clock is time.time  # Replay xong trả lại đồng hồ thật
+    assert report['wall_s'] >= 0.4 and abs(report['recorded_span_s'] - 0.4) < 1e-6
+
+    reset_state()
+    fast = replay(files)
+    assert fast['wall_s'] < report['wall_s']
+    shutil.rmtree(folder)
+    print(f"   ✓ Đồng hồ ảo, x1: {report['wall_s']:.2f}s, max: {fast['wall_s'] * 1000:.0f} ms")
+
+
+def test_rotation_and_truncated_file():
+    folder = tempfile.mkdtemp()
+    recorder = gsd.TrafficRecorder({'enabled': False, 'folder': folder, 'max_file_mb': 0.05, 'max_files': 2})
+    recorder.start()
+    for i in range(12):
+        payload = make_getdata_v4_payload(200, seed=100 + i, broker="Rotate-Broker")
+        recorder.record('receive_data', encode_json_body(payload))
+    recorder.stop()
+    stats = recorder.get_stats()
+    files = gsd.list_traffic_recordings(folder)
+    assert stats['recorded'] == 12 and stats['files'] > 2 and len(files) == 2
+
+    # File bị cắt dở (app tắt khi đang ghi) → đọc được các record đầy đủ, không lỗi
+    with open(files[0], 'rb') as f:
+        data = f.read()
+    truncated = files[0] + '.cut.gsr.gz'
+    with open(truncated, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    complete = list(gsd.iter_traffic_records(files[0]))
+    partial = list(gsd.iter_traffic_records(truncated))
+    assert len(partial) < len(complete) and partial == complete[:len(partial)]
+    shutil.rmtree(folder)
+    print(f"   ✓ {stats['files']} file xoay vòng, giữ 2; file cắt dở đọc được {len(partial)}/{len(complete)} record")
+
+
+def test_restart_after_stop():
+    folder = tempfile.mkdtemp()
+    recorder = gsd.TrafficRecorder({'enabled': False, 'folder': folder, 'max_file_mb': 64, 'max_files': 20})
+    # Lưu settings với recorder tắt rồi bật lại: stop() khi chưa có writer, rồi start()
+    recorder.stop()
+    recorder.start()
+    for i in range(5):
+        recorder.record('receive_data', b'{"i": %d}' % i)
+    recorder.stop()
+    recorder.start()
+    recorder.start()
+    recorder.record('receive_data', b'{"i": 5}')
+    writer = recorder._writer
+    assert writer is not None and writer.is_alive()
+    recorder.stop()
+    assert not writer.is_alive() and recorder._writer is None
+
+    # enabled bật lại trực tiếp trong settings (không qua start) → record() tự khởi động writer
+    recorder.settings['enabled'] = True
+    recorder.record('receive_data', b'{"i": 6}')
+    recorder.stop()
+    stats = recorder.get_stats()
+    assert stats['recorded'] == 7 and stats['pending'] == 0, stats
+    bodies = [record[2] for path in gsd.list_traffic_recordings(folder) for record in gsd.iter_traffic_records(path)]
+    assert len(bodies) == 7
+    shutil.rmtree(folder)
+    print("   ✓ stop → start → record: writer sống lại, ghi đủ 7 record")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("TESTING TRAFFIC RECORDER + REPLAY")
+    print("=" * 60)
+    test_record_and_replay_matches_live()
+    test_virtual_clock_and_pacing()
+    test_rotation_and_truncated_file()
+    test_restart_after_stop()
+    print("=" * 60)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Helper dùng chung cho các file test_*.py (không phải file test, pytest không thu thập)
+- Payload giả lập EA + reset state ingest (make_payload, reset_state, setup, post)
+- Gap config giả/thật, file config + cache matching trong folder tạm
+- Settings store trong folder tạm (temp_store)
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+import gap_spike_detector as gsd
+from benchmark_ingest import make_getdata_v4_payload
+
+PAYLOAD_BROKER = "TwoPhase-Broker"
+ROUTE_SYMBOLS = ['EURUSD.m', 'GBPUSD.m', 'XAUUSD.m', 'ZZZTEST1', 'QQQTEST2']  # 2 symbol có config (set_route_config)
+
+
+# ===================== INGEST =====================
+def make_payload(rng, count, timestamp):
+    """Payload giống GetData_v4.mq5"""
+    items = []
+    for i in range(count):
+        prev_close = round(rng.uniform(1, 2000), 5)
+        current_open = round(prev_close * (1 + rng.uniform(-0.01, 0.01)), 5)
+        bid = round(current_open * (1 + rng.uniform(-0.002, 0.002)), 5)
+        items.append({
+            'symbol': f"SYM{i}",
+            'group': 'Forex',
+            'trade_mode': 4,
+            'bid': bid,
+            'ask': round(bid * 1.0002, 5),
+            'digits': 5,
+            'points': 0.00001,
+            'isOpen': True,
+            'prev_ohlc': {'open': prev_close, 'high': prev_close, 'low': prev_close, 'close': prev_close},
+            'current_ohlc': {'open': current_open, 'high': max(current_open, bid), 'low': min(current_open, bid), 'close': bid},
+            'trade_sessions': {'current_day': 'Monday', 'days': []}
+        })
+    return {'timestamp': timestamp, 'broker': PAYLOAD_BROKER, 'data': items}
+
+
+def make_real_symbol_payload(symbols, broker, timestamp):
+    payload = make_getdata_v4_payload(len(symbols), seed=18, broker=broker, timestamp=timestamp)
+    for entry, symbol in zip(payload['data'], symbols):
+        entry['symbol'] = symbol
+    return payload
+
+
+def reset_state():
+    gsd.market_data.clear()
+    gsd.bid_tracking.clear()
+    gsd.candle_data.clear()
+    gsd.gap_spike_results.clear()
+    gsd.gap_spike_point_results.clear()
+    gsd.alert_board.clear()
+    gsd.threshold_table.clear()
+    gsd.loading_state['symbols_seen'] = set()
+    gsd.ASYNC_SYMBOL_RESOLVE = False  # Dò symbol config ngay trong ingest (không chờ symbol_resolver)
+    gsd.get_broker_partition(PAYLOAD_BROKER).lock.reset_stats()
+
+
+def setup():
+    gsd.app_startup_time = 0
+    gsd.screenshot_settings['enabled'] = False
+    gsd.symbol_filter_settings['enabled'] = False
+    gsd.broker_selection_settings['enabled_brokers'] = []
+    gsd.ASYNC_INGEST = False
+    reset_state()
+
+
+def post(client, payload):
+    started = time.perf_counter()
+    assert client.post('/api/receive_data', json=payload).status_code == 200
+    return (time.perf_counter() - started) * 1000
+
+
+# ===================== GAP CONFIG =====================
+def clear_gap_config():
+    gsd.gap_config.clear()
+    gsd.gap_config_reverse_map.clear()
+    gsd.symbol_config_cache.clear()
+    gsd.symbol_match_levels.clear()
+    gsd.gap_config_file_hash = None  # Không ghi cache matching của config giả xuống file
+    gsd.invalidate_symbol_routes()  # Route Point/Percent đã tính theo config cũ
+
+
+def load_real_gap_config():
+    """THAM_SO_GAP_INDICATOR.txt thật, không ghi cache matching xuống file trong lúc test"""
+    gsd.load_gap_config_file()
+    gsd.gap_config_file_hash = None
+    assert gsd.gap_config, "THAM_SO_GAP_INDICATOR.txt phải có dữ liệu"
+
+
+def make_broker_symbols(rng, count=3000):
+    aliases = [alias for alias in gsd.gap_config_reverse_map if alias]
+    suffixes = ['', '.m', '-spot', '_futures', 'm', '.pro', '#', 'x', 'usd', '.cash', '+']
+    symbols = []
+    for _ in range(count):
+        alias = rng.choice(aliases)
+        style = rng.random()
+        if style < 0.6:
+            symbol = alias + rng.choice(suffixes)
+        elif style < 0.8:
+            symbol = alias[:rng.randint(1, len(alias))]
+        else:
+            symbol = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789.') for _ in range(rng.randint(3, 10)))
+        symbols.append(symbol.upper() if rng.random() < 0.5 else symbol)
+    return symbols
+
+
+def set_route_config():
+    clear_gap_config()
+    for symbol_chuan in ('EURUSD', 'XAUUSD'):
+        gsd.gap_config[symbol_chuan] = {'aliases': [], 'default_gap_percent': 0.1, 'custom_gap': 1}
+        gsd.gap_config_reverse_map[symbol_chuan.lower()] = symbol_chuan
+
+
+def tables(partition):
+    return (sorted(result['symbol'] for result in partition.gap_spike_point_results.values()),
+            sorted(result['symbol'] for result in partition.gap_spike_results.values()))
+
+
+# ===================== FILE TẠM =====================
+def use_temp_files(folder):
+    original = (gsd.GAP_CONFIG_FILE, gsd.SYMBOL_MATCH_CACHE_FILE)
+    config_file = os.path.join(folder, 'THAM_SO_GAP_INDICATOR.txt')
+    shutil.copy(gsd.GAP_CONFIG_FILE, config_file)
+    gsd.GAP_CONFIG_FILE = config_file
+    gsd.SYMBOL_MATCH_CACHE_FILE = os.path.join(folder, 'symbol_match_cache.json')
+    return original
+
+
+def write_lines(lines):
+    with open(gsd.GAP_CONFIG_FILE, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+@contextmanager
+def temp_store(backend='sqlite'):
+    """Chạy trong folder tạm (các file JSON settings là đường dẫn tương đối) với store mới"""
+    folder = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(folder)
+    store = gsd.open_settings_store(os.path.join(folder, 'settings.db' if backend == 'sqlite' else 'journal'),
+                                    backend)
+    try:
+        with mock.patch.dict(gsd.gap_settings), mock.patch.dict(gsd.spike_settings), \
+                mock.patch.dict(gsd.custom_thresholds), mock.patch.dict(gsd.symbol_filter_settings):
+            yield folder, store
+    finally:
+        gsd.close_settings_store()
+        os.chdir(cwd)
+        shutil.rmtree(folder)